@@ -1,10 +1,18 @@
-import ast
+import argparse
 import csv
+import hashlib
+import json
+import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
 ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from frame_lists import parse_frame_column  # noqa: E402
+from parallel_videos import map_videos  # noqa: E402
+
 INPUT_DIRS = [
     ROOT / "Annotation_reports_coral_reef",
     ROOT / "Annotation_reports_Nursery",
@@ -13,7 +21,10 @@ OUTPUT_ROOT = ROOT / "normalized_reports"
 OUT_ALL = OUTPUT_ROOT / "all_with_flags"
 OUT_CUT = OUTPUT_ROOT / "cut_47min"
 SUMMARY_FILE = OUTPUT_ROOT / "normalization_summary.csv"
+MANIFEST_FILE = OUTPUT_ROOT / "normalization_manifest.json"
 
+# Bump whenever process_file changes its output; invalidates incremental runs
+NORMALIZE_VERSION = 1
 TARGET_SECONDS = 47 * 60
 SHORT_VIDEO_NAME = "20240108-nursery-control.csv"
 # Split videos with time resets - to be processed manually
@@ -28,6 +39,20 @@ SPLIT_VIDEO_NAMES = {
 }
 
 
+SUMMARY_FIELDS = [
+    "filename",
+    "area",
+    "rows_total",
+    "rows_kept_47min",
+    "rows_removed_after_47min",
+    "frame_values_total",
+    "frame_values_kept_47min",
+    "max_original_seconds",
+    "is_short_control_nursery",
+    "is_split_video",
+]
+
+
 @dataclass
 class FileSummary:
     filename: str
@@ -43,26 +68,7 @@ class FileSummary:
 
 
 def parse_frame_values(raw: str) -> List[float]:
-    if raw is None:
-        return []
-    text = raw.strip()
-    if not text:
-        return []
-
-    try:
-        value = ast.literal_eval(text)
-    except (ValueError, SyntaxError):
-        return []
-
-    if isinstance(value, (int, float)):
-        return [float(value)]
-    if isinstance(value, list):
-        result: List[float] = []
-        for item in value:
-            if isinstance(item, (int, float)):
-                result.append(float(item))
-        return result
-    return []
+    return parse_frame_column([raw]).row(0).tolist()
 
 
 def format_frame_list(values: List[float]) -> str:
@@ -122,48 +128,58 @@ def process_file(input_path: Path, area: str) -> FileSummary:
         ]
         out_fields = original_fields + [f for f in extra_fields if f not in original_fields]
 
-        with out_all_path.open("w", encoding="utf-8", newline="") as out_all, out_cut_path.open(
-            "w", encoding="utf-8", newline=""
-        ) as out_cut:
-            writer_all = csv.DictWriter(out_all, fieldnames=out_fields)
-            writer_cut = csv.DictWriter(out_cut, fieldnames=out_fields)
-            writer_all.writeheader()
-            writer_cut.writeheader()
-
-            rows_total = 0
-            rows_kept = 0
-            frame_values_total = 0
-            frame_values_kept = 0
-            max_original = 0.0
-
-            for row in reader:
-                rows_total += 1
-                local_values = parse_frame_values(row.get("frames", ""))
-                frame_values_total += len(local_values)
-                if local_values:
-                    max_original = max(max_original, max(local_values))
-
-                kept_values = [v for v in local_values if v <= TARGET_SECONDS]
-                frame_values_kept += len(kept_values)
-                included = len(kept_values) > 0
-                if included:
-                    rows_kept += 1
-
-                row_out = dict(row)
-                row_out["time_sec_local"] = format_frame_list(local_values)
-                row_out["time_sec_local_first"] = f"{local_values[0]:.6f}" if local_values else ""
-                row_out["time_sec_local_last"] = f"{local_values[-1]:.6f}" if local_values else ""
-                row_out["time_sec_local_max"] = f"{max(local_values):.6f}" if local_values else ""
-                row_out["included_47min"] = "TRUE" if included else "FALSE"
-                row_out["is_short_control_nursery"] = "TRUE" if is_short_control_nursery else "FALSE"
-                row_out["is_split_video"] = "FALSE"
-                row_out["frames_kept_47min"] = format_frame_list(kept_values)
-                row_out["frame_count_raw"] = str(len(local_values))
-                row_out["frame_count_kept_47min"] = str(len(kept_values))
-
-                writer_all.writerow(row_out)
-                if included:
-                    writer_cut.writerow(row_out)
+        rows = list(reader)
+
+    # Parse the whole frames column at once (flat values + row offsets)
+    frames = parse_frame_column(row.get("frames", "") for row in rows)
+    kept = frames.filter_values(frames.values <= TARGET_SECONDS)
+    counts_raw = frames.counts()
+    counts_kept = kept.counts()
+
+    rows_total = len(rows)
+    rows_kept = int((counts_kept > 0).sum())
+    frame_values_total = int(counts_raw.sum())
+    frame_values_kept = int(counts_kept.sum())
+    max_original = max(0.0, float(frames.values.max())) if len(frames.values) else 0.0
+
+    # Plain Python lists: per-row slicing and formatting without numpy scalars
+    local_text = [f"{v:.6f}" for v in frames.values.tolist()]
+    kept_text = [f"{v:.6f}" for v in kept.values.tolist()]
+    row_max_text = [f"{v:.6f}" for v in frames.max().tolist()]
+    raw_offsets = frames.offsets.tolist()
+    kept_offsets = kept.offsets.tolist()
+    short_flag = "TRUE" if is_short_control_nursery else "FALSE"
+
+    with out_all_path.open("w", encoding="utf-8", newline="") as out_all, out_cut_path.open(
+        "w", encoding="utf-8", newline=""
+    ) as out_cut:
+        writer_all = csv.writer(out_all)
+        writer_cut = csv.writer(out_cut)
+        writer_all.writerow(out_fields)
+        writer_cut.writerow(out_fields)
+
+        for i, row in enumerate(rows):
+            lo, hi = raw_offsets[i], raw_offsets[i + 1]
+            kept_lo, kept_hi = kept_offsets[i], kept_offsets[i + 1]
+            has_values = hi > lo
+            included = kept_hi > kept_lo
+
+            row_out = dict(row)
+            row_out["time_sec_local"] = "[" + ",".join(local_text[lo:hi]) + "]"
+            row_out["time_sec_local_first"] = local_text[lo] if has_values else ""
+            row_out["time_sec_local_last"] = local_text[hi - 1] if has_values else ""
+            row_out["time_sec_local_max"] = row_max_text[i] if has_values else ""
+            row_out["included_47min"] = "TRUE" if included else "FALSE"
+            row_out["is_short_control_nursery"] = short_flag
+            row_out["is_split_video"] = "FALSE"
+            row_out["frames_kept_47min"] = "[" + ",".join(kept_text[kept_lo:kept_hi]) + "]"
+            row_out["frame_count_raw"] = str(hi - lo)
+            row_out["frame_count_kept_47min"] = str(kept_hi - kept_lo)
+
+            values = [row_out.get(field) for field in out_fields]
+            writer_all.writerow(values)
+            if included:
+                writer_cut.writerow(values)
 
     return FileSummary(
         filename=input_path.name,
@@ -179,51 +195,128 @@ def process_file(input_path: Path, area: str) -> FileSummary:
     )
 
 
-def main() -> None:
+def summary_row(item: FileSummary) -> Dict[str, object]:
+    return {
+        "filename": item.filename,
+        "area": item.area,
+        "rows_total": item.rows_total,
+        "rows_kept_47min": item.rows_kept_47min,
+        "rows_removed_after_47min": item.rows_removed_after_47min,
+        "frame_values_total": item.frame_values_total,
+        "frame_values_kept_47min": item.frame_values_kept_47min,
+        "max_original_seconds": f"{item.max_original_seconds:.6f}",
+        "is_short_control_nursery": "TRUE" if item.is_short_control_nursery else "FALSE",
+        "is_split_video": "TRUE" if item.is_split_video else "FALSE",
+    }
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalization_params() -> Dict[str, object]:
+    """Parameters that invalidate every normalized output when they change."""
+    return {
+        "normalize_version": NORMALIZE_VERSION,
+        "target_seconds": TARGET_SECONDS,
+        "short_video_name": SHORT_VIDEO_NAME,
+        "split_video_names": sorted(SPLIT_VIDEO_NAMES),
+    }
+
+
+def load_manifest() -> Dict[str, object]:
+    if not MANIFEST_FILE.exists():
+        return {}
+    with MANIFEST_FILE.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_summary_rows() -> Dict[Tuple[str, str], Dict[str, str]]:
+    if not SUMMARY_FILE.exists():
+        return {}
+    with SUMMARY_FILE.open("r", encoding="utf-8", newline="") as f:
+        return {(row["area"], row["filename"]): row for row in csv.DictReader(f)}
+
+
+def outputs_exist(area: str, filename: str) -> bool:
+    return (OUT_ALL / area / filename).exists() and (OUT_CUT / area / filename).exists()
+
+
+def prune_orphans(hashes: Dict[str, str]) -> List[str]:
+    """Remove normalized outputs whose input report was deleted or renamed."""
+    removed: List[str] = []
+    for input_dir in INPUT_DIRS:
+        area = input_dir.name
+        for out_root in (OUT_ALL, OUT_CUT):
+            for out_path in sorted((out_root / area).glob("*.csv")):
+                if f"{area}/{out_path.name}" not in hashes:
+                    out_path.unlink()
+                    removed.append(str(out_path.relative_to(OUTPUT_ROOT)))
+    return removed
+
+
+def main(incremental: bool = False, workers: int | None = None) -> None:
     OUTPUT_ROOT.mkdir(parents=True, exist_ok=True)
 
-    summaries: List[FileSummary] = []
+    params = normalization_params()
+    manifest = load_manifest() if incremental else {}
+    known_hashes: Dict[str, str] = manifest.get("files", {}) if manifest.get("params") == params else {}
+    previous_rows = load_summary_rows() if known_hashes else {}
+
+    rows: List[Dict[str, object]] = []
+    hashes: Dict[str, str] = {}
+    processed: List[str] = []
+    pending: List[Tuple[int, Path, str]] = []
     for input_dir in INPUT_DIRS:
         area = input_dir.name
         files = sorted(input_dir.glob("*.csv"))
         for file_path in files:
-            summaries.append(process_file(file_path, area))
+            key = f"{area}/{file_path.name}"
+            content_hash = file_sha256(file_path)
+            hashes[key] = content_hash
+
+            previous = previous_rows.get((area, file_path.name))
+            if known_hashes.get(key) == content_hash and previous is not None and outputs_exist(area, file_path.name):
+                rows.append(previous)
+                continue
+
+            # Placeholder keeps the summary in input order; filled after the parallel run
+            pending.append((len(rows), file_path, area))
+            rows.append({})
+            processed.append(key)
+
+    summaries = map_videos(
+        process_file,
+        [file_path for _, file_path, _ in pending],
+        [area for _, _, area in pending],
+        workers=workers,
+    )
+    for (index, _, _), summary in zip(pending, summaries):
+        rows[index] = summary_row(summary)
+    removed = prune_orphans(hashes)
 
     with SUMMARY_FILE.open("w", encoding="utf-8", newline="") as summary_out:
-        fieldnames = [
-            "filename",
-            "area",
-            "rows_total",
-            "rows_kept_47min",
-            "rows_removed_after_47min",
-            "frame_values_total",
-            "frame_values_kept_47min",
-            "max_original_seconds",
-            "is_short_control_nursery",
-            "is_split_video",
-        ]
-        writer = csv.DictWriter(summary_out, fieldnames=fieldnames)
+        writer = csv.DictWriter(summary_out, fieldnames=SUMMARY_FIELDS)
         writer.writeheader()
-        for item in summaries:
-            writer.writerow(
-                {
-                    "filename": item.filename,
-                    "area": item.area,
-                    "rows_total": item.rows_total,
-                    "rows_kept_47min": item.rows_kept_47min,
-                    "rows_removed_after_47min": item.rows_removed_after_47min,
-                    "frame_values_total": item.frame_values_total,
-                    "frame_values_kept_47min": item.frame_values_kept_47min,
-                    "max_original_seconds": f"{item.max_original_seconds:.6f}",
-                    "is_short_control_nursery": "TRUE" if item.is_short_control_nursery else "FALSE",
-                    "is_split_video": "TRUE" if item.is_split_video else "FALSE",
-                }
-            )
-
-    split_count = sum(1 for s in summaries if s.is_split_video)
-    normalized_count = len(summaries) - split_count
-    
-    print(f"Processed files: {len(summaries)}")
+        for row in rows:
+            writer.writerow(row)
+
+    with MANIFEST_FILE.open("w", encoding="utf-8") as f:
+        json.dump({"params": params, "files": hashes}, f, indent=2, sort_keys=True)
+
+    split_count = sum(1 for r in rows if r["is_split_video"] == "TRUE")
+    normalized_count = len(rows) - split_count
+
+    print(f"Processed files: {len(rows)}")
+    if incremental:
+        print(f"  - Re-normalized (new/changed): {len(processed)}")
+        print(f"  - Unchanged (skipped): {len(rows) - len(processed)}")
+    if removed:
+        print(f"  - Removed outputs without input report: {len(removed)}")
     print(f"  - Split videos (copied for manual processing): {split_count}")
     print(f"  - Continuous videos (normalized to 47min): {normalized_count}")
     print(f"Output (all rows): {OUT_ALL}")
@@ -232,4 +325,17 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Normalize annotation reports to the 47min cutoff.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-process reports whose content hash or normalization parameters changed",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: VIDEO_WORKERS or CPU count; 1 = serial)",
+    )
+    args = parser.parse_args()
+    main(incremental=args.incremental, workers=args.workers)
@@ -21,7 +21,6 @@ Ausgabe:
 from __future__ import annotations
 
 import math
-import re
 from pathlib import Path
 from typing import Dict, List, Tuple
 
@@ -30,6 +29,10 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from effect_sizes import cliffs_delta
+from maxn_engine import maxn_by_video
+from multiple_testing import bh_adjust, holm_adjust
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -65,24 +68,6 @@ FAMILY_TO_WORD_GROUP = {
 }
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    if text in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}:
-        return False
-    return True
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -92,25 +77,6 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
 def extract_family(taxon_key: str) -> str:
     """Extrahiere Familie aus taxon_key."""
     # Format: family::xyz oder family_label::xyz
@@ -121,100 +87,18 @@ def extract_family(taxon_key: str) -> str:
     return ""
 
 
-def parse_frame_time(frame_value: object) -> float | None:
-    text = clean_text(frame_value)
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def load_video_maxn(csv_path: Path) -> Dict[str, object]:
-    """Lade MaxN-Daten aus CSV."""
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-
-    counts: Dict[Tuple[str, float], int] = {}
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-
-        taxon = build_taxon_key(row)
-        if not taxon:
-            continue
-
-        frame_time = parse_frame_time(row.get("frames", ""))
-        if frame_time is None:
-            continue
-
-        key = (taxon, frame_time)
-        counts[key] = counts.get(key, 0) + 1
-
-    maxn_by_taxon: Dict[str, int] = {}
-    for (taxon, _), n in counts.items():
-        if taxon not in maxn_by_taxon or n > maxn_by_taxon[taxon]:
-            maxn_by_taxon[taxon] = int(n)
-
+def load_video_maxn(csv_path: Path, maxn_lookup: Dict[str, Dict[str, int]]) -> Dict[str, object]:
+    """Lade MaxN-Daten eines Videos aus der gemeinsamen MaxN-Berechnung."""
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
         "filename": csv_path.name,
         "date": date,
         "standort": standort,
         "koeder": koeder,
-        "maxn_by_taxon": maxn_by_taxon,
+        "maxn_by_taxon": dict(maxn_lookup.get(csv_path.name, {})),
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def bh_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order, start=1):
-        adjusted_ordered[i - 1] = p_values[idx] * m / i
-    for i in range(m - 2, -1, -1):
-        adjusted_ordered[i] = min(adjusted_ordered[i], adjusted_ordered[i + 1])
-    adjusted_ordered = np.clip(adjusted_ordered, 0.0, 1.0)
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    """Berechne Cliffs Delta für x vs y."""
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = 0
-    lt = 0
-    for xi in x:
-        gt += np.sum(xi > y)
-        lt += np.sum(xi < y)
-    return float((gt - lt) / total)
-
-
 def load_all_videos(site: str) -> pd.DataFrame:
     """Lade alle Video-Daten für einen Standort."""
     if site == "nursery":
@@ -226,12 +110,13 @@ def load_all_videos(site: str) -> pd.DataFrame:
         return pd.DataFrame()
 
     video_files = sorted([f for f in video_dir.glob("*.csv") if "-" in f.name])
+    maxn_lookup = maxn_by_video(level="taxon", behaviour="exclude")
     video_data = []
 
     for csv_file in video_files:
         _, standort, koeder = parse_video_metadata(csv_file.name)
         if standort.lower() == site.lower():
-            meta = load_video_maxn(csv_file)
+            meta = load_video_maxn(csv_file, maxn_lookup)
             if meta["maxn_by_taxon"]:
                 video_data.append(meta)
 
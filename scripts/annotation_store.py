@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Gemeinsamer spaltenorientierter Annotations-Speicher fuer cut_47min.
+
+Alle Videos unter normalized_reports/cut_47min werden einmal eingelesen und
+als eine typisierte Tabelle abgelegt (Parquet, falls pyarrow installiert ist,
+sonst Pickle). Taxon-, Standort- und Koederspalten sind kategorisch,
+frame_time/frame_time_last/frame_time_max/frame_count kommen aus dem
+vektorisierten frames-Parser (frame_lists.py).
+
+Die Analyse-Skripte lesen ueber `read_video_csv` bzw. `load_annotations` aus
+diesem Speicher statt jede CSV erneut zu parsen. Der Speicher wird automatisch
+neu aufgebaut, sobald sich eine Quelldatei aendert (Groesse/mtime). Speicher
+und Manifest werden atomar ersetzt (temporaere Datei + os.replace).
+
+Fuer parallele Auswertungen je Video laedt der Elternprozess den Speicher
+einmal (`read_video_csvs`) und reicht den Worker-Prozessen nur ihre Teilstuecke
+weiter; in einem Worker wird der Speicher nie (neu) gebaut.
+
+Usage:
+    python scripts/annotation_store.py          # Speicher (neu) aufbauen
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from frame_lists import parse_frame_column
+from parallel_videos import in_worker_process, map_videos
+
+ROOT = Path(__file__).resolve().parent.parent
+CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
+CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
+NURSERY_DIR = CUT_ROOT / "Annotation_reports_Nursery"
+AREA_DIRS = [CORAL_REEF_DIR, NURSERY_DIR]
+
+STORE_DIR = ROOT / "normalized_reports" / "annotation_store"
+STORE_STEM = "cut_47min"
+MANIFEST_FILE = STORE_DIR / f"{STORE_STEM}_manifest.json"
+# Bei Aenderungen am Tabellenschema erhoehen, damit alte Speicher neu gebaut werden
+STORE_VERSION = 2
+
+# Originalspalten der Annotationsreports (Reihenfolge wie in den CSVs)
+RAW_COLUMNS = [
+    "video_annotation_label_id",
+    "label_name",
+    "label_hierarchy",
+    "unspecific",
+    "family",
+    "genus",
+    "species",
+    "interested",
+    "feeding",
+    "frames",
+]
+CATEGORY_COLUMNS = [
+    "area",
+    "filename",
+    "standort",
+    "koeder",
+    "label_name",
+    "label_hierarchy",
+    "unspecific",
+    "family",
+    "genus",
+    "species",
+    "interested",
+    "feeding",
+]
+
+_STORE_CACHE: Dict[str, object] = {}
+
+
+def is_truthy(value: object) -> bool:
+    if value is None:
+        return False
+    text = str(value).strip().lower()
+    if text in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}:
+        return False
+    return True
+
+
+def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
+    stem = filename.replace(".csv", "")
+    parts = stem.split("-", 2)
+    if len(parts) < 3:
+        return ("", "unknown", "unknown")
+    date, standort, koeder = parts
+    return (date, standort.lower(), koeder.lower())
+
+
+def list_video_files() -> List[Path]:
+    """Alle cut_47min-CSVs in der Reihenfolge, die die Skripte verwenden."""
+    files: List[Path] = []
+    for area_dir in AREA_DIRS:
+        files.extend(sorted(area_dir.glob("*.csv")))
+    return files
+
+
+def _source_signature(files: Iterable[Path]) -> List[List[object]]:
+    signature: List[List[object]] = []
+    for path in files:
+        stat = path.stat()
+        signature.append([path.parent.name, path.name, int(stat.st_size), int(stat.st_mtime_ns)])
+    return signature
+
+
+def store_signature() -> List[List[object]]:
+    """Signatur der Quelldateien (Groesse/mtime), z. B. fuer abgeleitete Caches."""
+    return [[STORE_VERSION] + entry for entry in _source_signature(list_video_files())]
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _store_path() -> Path:
+    suffix = ".parquet" if _has_pyarrow() else ".pkl"
+    return STORE_DIR / f"{STORE_STEM}{suffix}"
+
+
+def first_frame_time(values: pd.Series) -> np.ndarray:
+    """Erster Zahlenwert je frames-Zelle als float (NaN, wenn keiner vorhanden)."""
+    return parse_frame_column(values.astype(object)).first()
+
+
+def _read_raw_video(csv_path: Path) -> pd.DataFrame:
+    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip", dtype=str)
+    for col in RAW_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+    df = df[RAW_COLUMNS].copy()
+
+    date, standort, koeder = parse_video_metadata(csv_path.name)
+    df.insert(0, "row_in_video", np.arange(len(df), dtype=np.int32))
+    df.insert(0, "koeder", koeder)
+    df.insert(0, "standort", standort)
+    df.insert(0, "date", date)
+    df.insert(0, "filename", csv_path.name)
+    df.insert(0, "area", csv_path.parent.name)
+    return df
+
+
+def _replace_atomic(path: Path, write) -> None:
+    """Schreibt ueber write(tmp_path) in eine temporaere Datei und ersetzt path atomar."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def build_annotation_store(workers: int | None = None) -> pd.DataFrame:
+    """Liest alle cut_47min-Videos einmal ein und schreibt die typisierte Tabelle."""
+    if in_worker_process():
+        raise RuntimeError(
+            "Annotations-Speicher ist veraltet oder fehlt; im Elternprozess laden "
+            "(load_annotation_store/read_video_csvs), bevor Worker gestartet werden."
+        )
+    files = list_video_files()
+    if not files:
+        raise FileNotFoundError("Keine CSV-Dateien unter normalized_reports/cut_47min gefunden.")
+
+    frames = map_videos(_read_raw_video, files, workers=workers)
+    table = pd.concat(frames, ignore_index=True)
+
+    table["video_annotation_label_id"] = pd.to_numeric(
+        table["video_annotation_label_id"], errors="coerce"
+    ).astype("Int64")
+    table["is_feeding"] = table["feeding"].map(is_truthy).astype(bool)
+    table["is_interested"] = table["interested"].map(is_truthy).astype(bool)
+    frames = parse_frame_column(table["frames"].astype(object))
+    table["frame_time"] = frames.first()
+    table["frame_time_last"] = frames.last()
+    table["frame_time_max"] = frames.max()
+    table["frame_count"] = frames.counts().astype(np.int32)
+    for col in CATEGORY_COLUMNS:
+        if col in {"area", "filename"}:
+            # Kategorien in Dateireihenfolge, damit Codes der Videoreihenfolge entsprechen
+            table[col] = pd.Categorical(table[col], categories=table[col].unique())
+        else:
+            table[col] = table[col].astype("category")
+
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    store_path = _store_path()
+    if store_path.suffix == ".parquet":
+        _replace_atomic(store_path, lambda tmp: table.to_parquet(tmp, index=False))
+    else:
+        _replace_atomic(store_path, lambda tmp: table.to_pickle(tmp, compression=None))
+
+    manifest = {
+        "version": STORE_VERSION,
+        "store_file": store_path.name,
+        "sources": _source_signature(files),
+        "n_rows": int(len(table)),
+        "n_videos": int(len(files)),
+    }
+    _replace_atomic(MANIFEST_FILE, lambda tmp: tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8"))
+    _STORE_CACHE["table"] = table
+    _STORE_CACHE["signature"] = manifest["sources"]
+    return table
+
+
+def _store_is_current(signature: List[List[object]]) -> bool:
+    if not MANIFEST_FILE.exists():
+        return False
+    manifest = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    if manifest.get("version") != STORE_VERSION or manifest.get("sources") != signature:
+        return False
+    return (STORE_DIR / str(manifest.get("store_file", ""))).exists()
+
+
+def load_annotation_store(rebuild: bool = False) -> pd.DataFrame:
+    """Gesamte Annotationstabelle; wird bei geaenderten Quelldateien neu gebaut."""
+    signature = _source_signature(list_video_files())
+    if not rebuild and _STORE_CACHE.get("signature") == signature:
+        return _STORE_CACHE["table"]  # type: ignore[return-value]
+
+    if rebuild or not _store_is_current(signature):
+        return build_annotation_store()
+
+    manifest = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    store_path = STORE_DIR / manifest["store_file"]
+    if store_path.suffix == ".parquet":
+        table = pd.read_parquet(store_path)
+    else:
+        table = pd.read_pickle(store_path)
+    _STORE_CACHE["table"] = table
+    _STORE_CACHE["signature"] = signature
+    return table
+
+
+def load_annotations(
+    sites: Iterable[str] | None = None,
+    baits: Iterable[str] | None = None,
+    behaviour: str = "all",
+    columns: Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Gefilterte Sicht auf den Speicher.
+
+    behaviour:
+    - "all": alle Zeilen
+    - "exclude": feeding/interested ausgeschlossen (Standard fuer MaxN/Richness)
+    - "feeding" / "interested": nur die jeweiligen Verhaltenszeilen
+    """
+    table = load_annotation_store()
+    mask = np.ones(len(table), dtype=bool)
+    if sites is not None:
+        mask &= table["standort"].isin(list(sites)).to_numpy()
+    if baits is not None:
+        mask &= table["koeder"].isin(list(baits)).to_numpy()
+
+    if behaviour == "exclude":
+        mask &= ~(table["is_feeding"].to_numpy() | table["is_interested"].to_numpy())
+    elif behaviour == "feeding":
+        mask &= table["is_feeding"].to_numpy()
+    elif behaviour == "interested":
+        mask &= table["is_interested"].to_numpy()
+    elif behaviour != "all":
+        raise ValueError(f"Unbekannter behaviour-Filter: {behaviour}")
+
+    out = table.loc[mask]
+    if columns is not None:
+        out = out[list(columns)]
+    return out.reset_index(drop=True)
+
+
+def load_video_table() -> pd.DataFrame:
+    """Eine Zeile je Video mit Metadaten und Zeilenanzahl."""
+    table = load_annotation_store()
+    videos = (
+        table.groupby(["area", "filename"], observed=True, sort=False)
+        .agg(date=("date", "first"), standort=("standort", "first"), koeder=("koeder", "first"), rows_total=("row_in_video", "size"))
+        .reset_index()
+    )
+    for col in ["area", "filename", "standort", "koeder"]:
+        videos[col] = videos[col].astype(str)
+    return videos
+
+
+def _raw_columns(sub: pd.DataFrame) -> pd.DataFrame:
+    sub = sub[RAW_COLUMNS].reset_index(drop=True)
+    for col in RAW_COLUMNS:
+        if isinstance(sub[col].dtype, pd.CategoricalDtype):
+            sub[col] = sub[col].astype(object)
+    return sub
+
+
+def _is_cut_video(csv_path: Path) -> bool:
+    return csv_path.resolve().parent.parent == CUT_ROOT.resolve()
+
+
+def read_video_csv(csv_path: Path) -> pd.DataFrame:
+    """
+    Ersatz fuer pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    auf einer cut_47min-Datei. Liefert die Originalspalten aus dem Speicher;
+    Dateien ausserhalb von cut_47min werden direkt gelesen.
+    """
+    csv_path = Path(csv_path)
+    if not _is_cut_video(csv_path):
+        return pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+
+    table = load_annotation_store()
+    mask = (table["area"] == csv_path.parent.name).to_numpy() & (table["filename"] == csv_path.name).to_numpy()
+    return _raw_columns(table.loc[mask])
+
+
+def read_video_csvs(csv_paths: Iterable[Path]) -> List[pd.DataFrame]:
+    """
+    read_video_csv fuer mehrere Dateien mit einmaligem Zugriff auf den
+    Speicher; die Teilstuecke koennen an map_videos weitergereicht werden.
+    """
+    csv_paths = [Path(p) for p in csv_paths]
+    rows_by_video: Dict[Tuple[str, str], np.ndarray] = {}
+    if any(_is_cut_video(p) for p in csv_paths):
+        table = load_annotation_store()
+        rows_by_video = table.groupby(["area", "filename"], observed=True, sort=False).indices
+    empty = np.empty(0, dtype=np.int64)
+    out: List[pd.DataFrame] = []
+    for csv_path in csv_paths:
+        if not _is_cut_video(csv_path):
+            out.append(pd.read_csv(csv_path, engine="python", on_bad_lines="skip"))
+            continue
+        rows = rows_by_video.get((csv_path.parent.name, csv_path.name), empty)
+        out.append(_raw_columns(table.iloc[rows]))
+    return out
+
+
+def main() -> None:
+    table = load_annotation_store(rebuild=True)
+    store_path = STORE_DIR / json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))["store_file"]
+    print(f"Annotations-Speicher aufgebaut: {len(table)} Zeilen aus {table['filename'].nunique()} Videos")
+    print(f"Datei: {store_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Ankunftszeiten (Time-to-first-event) je Video und Taxon mit Zensierung.
+
+Ereignisse (behaviour-Filter des Annotations-Speichers):
+- first_seen:       erstes Auftreten ohne feeding/interested
+- first_feeding:    erstes feeding-Ereignis
+- first_interested: erstes interested-Ereignis
+
+Die erste Zeit je (Video, Taxon) ist ein gruppiertes Minimum ueber das
+frame_time-Array aller Annotationen (statt iterrows je Video). Taxa, die in
+einem Video nie ankommen, gelten als rechtszensiert beim Schnitt nach
+CUTOFF_SEC (47 min).
+
+Kaplan-Meier und Log-Rank laufen fuer alle Taxa (Spalten einer
+Video x Taxon-Zeitmatrix) zugleich. Je Spalte werden die Zeilen nur
+paarweise verglichen (n Videos, also n x n je Taxon):
+
+- at risk bei t_i:   #{j: T_j >= t_i}, Ereignisse bei t_i: #{j: T_j = t_i, beobachtet}
+- jede Ereigniszeit zaehlt einmal (erste Zeile mit dieser Zeit)
+- KM: S(t) = prod_{t_i <= t} (1 - d_i / n_i)
+- Log-Rank (k Gruppen): O - E und Kovarianz ueber alle Ereigniszeiten,
+  chi^2 = (O - E)' V^- (O - E) mit k - 1 Freiheitsgraden
+  (wie statsmodels.duration.survdiff)
+- die chi^2-Naeherung braucht genug Ereignisse: Spalten mit weniger als
+  MIN_LOGRANK_EVENTS beobachteten Ankuenften werden nicht getestet (NaN)
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from annotation_store import load_annotations, load_video_table
+from taxonomy import taxon_codes
+
+CUTOFF_SEC = 47 * 60
+EVENTS = {"first_seen": "exclude", "first_feeding": "feeding", "first_interested": "interested"}
+DEFAULT_BATCH_SIZE = 500
+MIN_LOGRANK_EVENTS = 5
+
+
+def earliest_by_key(times: np.ndarray, keys: np.ndarray) -> pd.DataFrame:
+    """
+    Kleinste Zeit und erste Zeile je Schluessel (NaN-Zeiten zaehlen nicht).
+
+    Rueckgabe: key, time, first_row; Schluessel in der Reihenfolge ihrer
+    ersten gueltigen Zeile.
+    """
+    times = np.asarray(times, dtype=float)
+    valid = np.isfinite(times)
+    frame = pd.DataFrame({"key": np.asarray(keys)[valid], "time": times[valid], "first_row": np.flatnonzero(valid)})
+    out = frame.groupby("key", sort=False).agg(time=("time", "min"), first_row=("first_row", "min")).reset_index()
+    return out.sort_values("first_row", kind="stable").reset_index(drop=True)
+
+
+def first_event_times(
+    event: str = "first_seen",
+    level: str = "species_fallback",
+    sites: Iterable[str] | None = None,
+    baits: Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Beobachtete Ankunftszeiten im Langformat.
+
+    Spalten: filename, date, standort, koeder, taxon, time_sec, first_row
+    (erste Zeile des Taxons im Video); Reihenfolge: Videos wie im Speicher,
+    Taxa je Video nach first_row.
+    """
+    if event not in EVENTS:
+        raise ValueError(f"Unbekanntes Ereignis: {event}")
+    ann = load_annotations(sites=sites, baits=baits, behaviour=EVENTS[event])
+    ann = ann[ann["frame_time"].notna()]
+    codes, categories = taxon_codes(ann, level)
+    ann = ann.assign(taxon_code=codes)
+    ann = ann[ann["taxon_code"] >= 0]
+    columns = ["filename", "date", "standort", "koeder", "taxon", "time_sec", "first_row"]
+    if ann.empty:
+        return pd.DataFrame(columns=columns)
+
+    ann = ann.assign(video_order=ann["filename"].cat.codes.to_numpy())
+    per_taxon = (
+        ann.groupby(["video_order", "taxon_code"], sort=False)
+        .agg(time_sec=("frame_time", "min"), first_row=("row_in_video", "min"))
+        .reset_index()
+        .sort_values(["video_order", "first_row"], kind="stable")
+    )
+    videos = ann.drop_duplicates("video_order")[["video_order", "filename", "date", "standort", "koeder"]]
+    out = per_taxon.merge(videos, on="video_order", how="left")
+    out["taxon"] = np.array(categories, dtype=object)[out["taxon_code"].to_numpy()]
+    for col in ["filename", "date", "standort", "koeder"]:
+        out[col] = out[col].astype(str)
+    out["time_sec"] = out["time_sec"].astype(float)
+    return out[columns].reset_index(drop=True)
+
+
+def arrival_table(
+    events: Sequence[str] = tuple(EVENTS),
+    level: str = "species_fallback",
+    sites: Iterable[str] | None = None,
+    baits: Iterable[str] | None = None,
+    cutoff: float = CUTOFF_SEC,
+) -> pd.DataFrame:
+    """
+    Vollstaendige Video x Taxon-Tabelle je Ereignis mit Zensierung.
+
+    Je Standort umfasst die Taxonmenge alle Taxa, die dort bei irgendeinem der
+    Ereignisse beobachtet wurden; Videos ohne Ankunft erhalten time_sec =
+    cutoff und observed = False. Spalten: filename, date, standort, koeder,
+    event, taxon, time_sec, observed.
+    """
+    videos = load_video_table()
+    if sites is not None:
+        videos = videos[videos["standort"].isin(list(sites))]
+    if baits is not None:
+        videos = videos[videos["koeder"].isin(list(baits))]
+    videos = videos[["filename", "date", "standort", "koeder"]]
+
+    observed = {event: first_event_times(event, level, sites, baits) for event in events}
+    site_taxa = pd.concat([df[["standort", "taxon"]] for df in observed.values()]).drop_duplicates()
+
+    frames: List[pd.DataFrame] = []
+    for event, times in observed.items():
+        grid = videos.merge(site_taxa, on="standort", how="inner")
+        grid = grid.merge(times[["filename", "taxon", "time_sec"]], on=["filename", "taxon"], how="left")
+        arrived = grid["time_sec"].notna() & (grid["time_sec"] <= cutoff)
+        grid["observed"] = arrived.to_numpy()
+        grid["time_sec"] = np.where(arrived, grid["time_sec"], float(cutoff))
+        grid.insert(4, "event", event)
+        frames.append(grid)
+    columns = ["filename", "date", "standort", "koeder", "event", "taxon", "time_sec", "observed"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    out = pd.concat(frames, ignore_index=True)[columns]
+    return out.sort_values(["standort", "event", "taxon", "filename"]).reset_index(drop=True)
+
+
+def _event_time_weights(time: np.ndarray, observed: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fuer time/observed (n x m): at-risk-Matrix (n_i x n_j x m), Ereignis-
+    Matrix (gleiche Zeit und beobachtet) und Gewicht je Zeile (1, wenn die
+    Zeile die erste beobachtete Zeile ihrer Ereigniszeit ist).
+    """
+    at_risk = time[None, :, :] >= time[:, None, :]
+    same_event = (time[None, :, :] == time[:, None, :]) & observed[None, :, :]
+    n = time.shape[0]
+    earlier = np.tril(np.ones((n, n), dtype=bool), k=-1)
+    duplicate = (same_event & earlier[:, :, None]).any(axis=1)
+    return at_risk, same_event, observed & ~duplicate
+
+
+def kaplan_meier_columns(
+    time: np.ndarray,
+    observed: np.ndarray,
+    grid: Sequence[float],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    KM-Ueberlebensfunktion (Anteil noch nicht angekommen) je Spalte.
+
+    Rueckgabe: S auf grid (len(grid) x m) und KM-Median je Spalte (kleinste
+    Ereigniszeit mit S <= 0.5, NaN, wenn nicht erreicht).
+    """
+    time = np.asarray(time, dtype=float)
+    observed = np.asarray(observed, dtype=bool)
+    grid = np.asarray(grid, dtype=float)
+    m = time.shape[1]
+    survival = np.ones((len(grid), m))
+    median = np.full(m, np.nan)
+    for lo in range(0, m, batch_size):
+        sl = slice(lo, lo + batch_size)
+        t, e = time[:, sl], observed[:, sl]
+        at_risk, same_event, weight = _event_time_weights(t, e)
+        n_risk = at_risk.sum(axis=1)
+        d = same_event.sum(axis=1)
+        # Faktor 0 (alle Verbleibenden kommen an) getrennt zaehlen, sonst log(0)
+        extinct = weight & (d >= n_risk)
+        log_factor = np.log1p(-np.where(weight & ~extinct, d / np.maximum(n_risk, 1), 0.0))
+        before_grid = (t[None, :, :] <= grid[:, None, None]).astype(float)
+        survival[:, sl] = np.where(
+            np.einsum("kic,ic->kc", before_grid, extinct.astype(float)) > 0,
+            0.0,
+            np.exp(np.einsum("kic,ic->kc", before_grid, log_factor)),
+        )
+        before_event = (t[None, :, :] <= t[:, None, :]).astype(float)
+        at_event = np.where(
+            np.einsum("jic,ic->jc", before_event, extinct.astype(float)) > 0,
+            0.0,
+            np.exp(np.einsum("jic,ic->jc", before_event, log_factor)),
+        )
+        reached = weight & (at_event <= 0.5)
+        median[sl] = np.where(reached.any(axis=0), np.where(reached, t, np.inf).min(axis=0), np.nan)
+    return survival, median
+
+
+def logrank_columns(
+    time: np.ndarray,
+    observed: np.ndarray,
+    groups: Sequence[object],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    min_events: int = MIN_LOGRANK_EVENTS,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Log-Rank-Test ueber die Gruppen je Spalte von time/observed (n x m).
+
+    Rueckgabe (chi^2, p, df); NaN, wenn eine Spalte weniger als min_events
+    beobachtete Ereignisse hat (asymptotisches chi^2 dann unzuverlaessig, z. B.
+    ein einzelnes Ereignis im einzigen Video einer Gruppe) oder weniger
+    als zwei Gruppen vorliegen.
+    """
+    time = np.asarray(time, dtype=float)
+    observed = np.asarray(observed, dtype=bool)
+    codes, uniques = pd.factorize(np.asarray(groups), sort=True)
+    k = len(uniques)
+    m = time.shape[1]
+    chi2 = np.full(m, np.nan)
+    if k < 2:
+        return chi2, chi2.copy(), 0
+    onehot = np.eye(k)[codes]
+    for lo in range(0, m, batch_size):
+        sl = slice(lo, lo + batch_size)
+        at_risk, same_event, weight = _event_time_weights(time[:, sl], observed[:, sl])
+        n_g = np.einsum("ijc,jg->icg", at_risk.astype(float), onehot)
+        d_g = np.einsum("ijc,jg->icg", same_event.astype(float), onehot)
+        n = n_g.sum(axis=-1)
+        d = d_g.sum(axis=-1)
+        w = weight.astype(float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(n[..., None] > 0, n_g / n[..., None], 0.0)
+            o_minus_e = np.einsum("ic,icg->cg", w, d_g - d[..., None] * share)
+            factor = np.where(n > 1, w * d * (n - d) / (n - 1), 0.0)
+        cov = np.einsum("ic,icg,gh->cgh", factor, share, np.eye(k)) - np.einsum("ic,icg,ich->cgh", factor, share, share)
+        sub = cov[:, : k - 1, : k - 1]
+        diff = o_minus_e[:, : k - 1]
+        stat = np.einsum("cg,cgh,ch->c", diff, np.linalg.pinv(sub), diff)
+        chi2[sl] = np.where(observed[:, sl].sum(axis=0) >= max(min_events, 1), stat, np.nan)
+    return chi2, special.chdtrc(k - 1, chi2), k - 1
+
+
+def survival_by_group(
+    table: pd.DataFrame,
+    strata: Sequence[str] = ("standort", "event"),
+    group: str = "koeder",
+    grid: Sequence[float] | None = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    KM-Kurven und Log-Rank-Tests fuer eine arrival_table.
+
+    Je Stratum (z. B. Standort x Ereignis) wird eine Video x Taxon-Matrix
+    gebildet; KM je Gruppe (Koeder) und Log-Rank ueber die Gruppen laufen fuer
+    alle Taxa zugleich.
+
+    Rueckgabe:
+    - curves: strata, group, taxon, time_sec, survival
+    - tests:  strata, taxon, n_videos, n_observed, n_groups, chi2, df, p_value,
+              dazu km_median_sec_<gruppe> und n_observed_<gruppe>
+    """
+    grid = np.arange(0.0, CUTOFF_SEC + 1, 300.0) if grid is None else np.asarray(grid, dtype=float)
+    strata = list(strata)
+    curve_frames: List[pd.DataFrame] = []
+    test_frames: List[pd.DataFrame] = []
+    for key, part in table.groupby(strata, sort=True):
+        key_values = dict(zip(strata, key if isinstance(key, tuple) else (key,)))
+        times = part.pivot(index="filename", columns="taxon", values="time_sec")
+        events = part.pivot(index="filename", columns="taxon", values="observed").astype(bool)
+        labels = part.drop_duplicates("filename").set_index("filename").loc[times.index, group].to_numpy()
+        taxa = list(times.columns)
+        t = times.to_numpy(dtype=float)
+        e = events.to_numpy()
+
+        chi2, p_value, df = logrank_columns(t, e, labels)
+        tests: Dict[str, object] = {
+            **key_values,
+            "taxon": taxa,
+            "n_videos": len(t),
+            "n_observed": e.sum(axis=0),
+            "n_groups": df + 1,
+            "chi2": chi2,
+            "df": df,
+            "p_value": p_value,
+        }
+        for g in sorted(pd.unique(labels)):
+            rows = labels == g
+            survival, median = kaplan_meier_columns(t[rows], e[rows], grid)
+            tests[f"km_median_sec_{g}"] = median
+            tests[f"n_observed_{g}"] = e[rows].sum(axis=0)
+            curve = pd.DataFrame(survival, columns=taxa)
+            curve["time_sec"] = grid
+            curve = curve.melt(id_vars="time_sec", var_name="taxon", value_name="survival")
+            for col, value in key_values.items():
+                curve[col] = value
+            curve[group] = g
+            curve_frames.append(curve[strata + [group, "taxon", "time_sec", "survival"]])
+        test_frames.append(pd.DataFrame(tests))
+
+    curves = pd.concat(curve_frames, ignore_index=True) if curve_frames else pd.DataFrame()
+    tests_df = pd.concat(test_frames, ignore_index=True) if test_frames else pd.DataFrame()
+    return curves, tests_df
@@ -22,6 +22,12 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from annotation_store import read_video_csv
+from distances import jaccard_distance
+from multiple_testing import holm_adjust
+from permanova import permanova
+from taxonomy import taxon_keys
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -45,15 +51,6 @@ def is_truthy(value: object) -> bool:
     return True
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -63,35 +60,12 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
 def load_video_taxa(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
     taxa: set[str] = set()
-
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-        key = build_taxon_key(row)
-        if key:
-            taxa.add(key)
+    non_behavior = ~(df["feeding"].map(is_truthy) | df["interested"].map(is_truthy))
+    keys = taxon_keys(df[non_behavior])
+    taxa.update(keys[keys != ""].tolist())
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
@@ -129,70 +103,6 @@ def significance_label(p_value: float) -> str:
     return "ns"
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m, dtype=float)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    adjusted_ordered = np.maximum.accumulate(adjusted_ordered)
-    adjusted = np.empty(m, dtype=float)
-    adjusted[order] = adjusted_ordered
-    return adjusted.tolist()
-
-
-def jaccard_distance_matrix(binary_matrix: np.ndarray) -> np.ndarray:
-    n = binary_matrix.shape[0]
-    dist = np.zeros((n, n), dtype=float)
-    for i in range(n):
-        a = binary_matrix[i]
-        for j in range(i + 1, n):
-            b = binary_matrix[j]
-            union = np.logical_or(a, b).sum()
-            if union == 0:
-                d = 0.0
-            else:
-                inter = np.logical_and(a, b).sum()
-                d = 1.0 - (inter / union)
-            dist[i, j] = d
-            dist[j, i] = d
-    return dist
-
-
-def permanova_pseudo_f(distance_matrix: np.ndarray, groups: np.ndarray) -> float:
-    n = len(groups)
-    levels = pd.unique(groups)
-    g = len(levels)
-    if n <= g or g < 2:
-        return math.nan
-
-    # Gower-centering on squared distances
-    a = -0.5 * (distance_matrix ** 2)
-    i = np.eye(n)
-    one = np.ones((n, n), dtype=float) / n
-    gower = (i - one) @ a @ (i - one)
-
-    x = np.column_stack([(groups == level).astype(float) for level in levels])
-    h = x @ np.linalg.pinv(x.T @ x) @ x.T
-
-    ss_between = float(np.trace(h @ gower))
-    ss_total = float(np.trace(gower))
-    ss_within = ss_total - ss_between
-
-    df_between = g - 1
-    df_within = n - g
-    if df_between <= 0 or df_within <= 0 or ss_within <= 0:
-        return math.nan
-
-    ms_between = ss_between / df_between
-    ms_within = ss_within / df_within
-    if ms_within <= 0:
-        return math.nan
-    return ms_between / ms_within
-
-
 def permanova_test(binary_matrix: np.ndarray, groups: np.ndarray, n_perm: int, rng: np.random.Generator) -> Dict[str, object]:
     levels = pd.unique(groups)
     n = len(groups)
@@ -216,9 +126,10 @@ def permanova_test(binary_matrix: np.ndarray, groups: np.ndarray, n_perm: int, r
             "note": "Zu wenige Videos fuer Test (n <= Anzahl Gruppen).",
         }
 
-    dist = jaccard_distance_matrix(binary_matrix)
-    obs_f = permanova_pseudo_f(dist, groups)
-    if pd.isna(obs_f):
+    dist = jaccard_distance(binary_matrix)
+    result = permanova(dist, groups, n_perm=n_perm, rng=rng)
+    obs_f = result["pseudo_f"]
+    if not np.isfinite(obs_f):
         return {
             "n": int(n),
             "n_groups": int(len(levels)),
@@ -228,19 +139,11 @@ def permanova_test(binary_matrix: np.ndarray, groups: np.ndarray, n_perm: int, r
             "note": "Pseudo-F nicht berechenbar.",
         }
 
-    ge_count = 0
-    for _ in range(n_perm):
-        perm_groups = rng.permutation(groups)
-        perm_f = permanova_pseudo_f(dist, perm_groups)
-        if not pd.isna(perm_f) and perm_f >= obs_f:
-            ge_count += 1
-
-    p_val = (ge_count + 1.0) / (n_perm + 1.0)
     return {
         "n": int(n),
         "n_groups": int(len(levels)),
         "pseudo_f": float(obs_f),
-        "p_value": float(p_val),
+        "p_value": float(result["p_value"]),
         "n_perm": int(n_perm),
         "note": "",
     }
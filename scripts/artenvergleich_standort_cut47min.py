@@ -23,6 +23,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from annotation_store import read_video_csv
+from taxonomy import taxon_keys
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -48,15 +51,6 @@ def is_truthy(value: object) -> bool:
     return True
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -66,35 +60,13 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
 def load_video_taxa(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
     taxa: set[str] = set()
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-        key = build_taxon_key(row)
-        if key:
-            taxa.add(key)
+    non_behavior = ~(df["feeding"].map(is_truthy) | df["interested"].map(is_truthy))
+    keys = taxon_keys(df[non_behavior])
+    taxa.update(keys[keys != ""].tolist())
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
@@ -8,7 +8,11 @@ from typing import Dict, List, Tuple
 import numpy as np
 import pandas as pd
 from scipy import stats
-from statsmodels.stats.multitest import multipletests
+
+from annotation_store import read_video_csv
+from bootstrap_engine import bootstrap_two_sample
+from effect_sizes import cliffs_delta
+from multiple_testing import adjust_frame
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -94,49 +98,20 @@ def parse_frame_time(value: object) -> float | None:
         return None
 
 
-def cliffs_delta(algae_vals: np.ndarray, fish_vals: np.ndarray) -> float:
-    n = len(algae_vals) * len(fish_vals)
-    if n == 0:
-        return np.nan
-    gt = sum(1 for a in algae_vals for f in fish_vals if a > f)
-    lt = sum(1 for a in algae_vals for f in fish_vals if a < f)
-    return float((gt - lt) / n)
-
-
 def bootstrap_effect_cis(
     algae_vals: np.ndarray,
     fish_vals: np.ndarray,
     n_boot: int,
     rng: np.random.Generator,
 ) -> Dict[str, float]:
-    if len(algae_vals) == 0 or len(fish_vals) == 0:
-        return {
-            "ci_mean_diff_low": np.nan,
-            "ci_mean_diff_high": np.nan,
-            "ci_median_diff_low": np.nan,
-            "ci_median_diff_high": np.nan,
-            "ci_cliffs_delta_low": np.nan,
-            "ci_cliffs_delta_high": np.nan,
-        }
-
-    mean_diffs = np.zeros(n_boot, dtype=float)
-    med_diffs = np.zeros(n_boot, dtype=float)
-    deltas = np.zeros(n_boot, dtype=float)
-
-    for i in range(n_boot):
-        a = rng.choice(algae_vals, size=len(algae_vals), replace=True)
-        f = rng.choice(fish_vals, size=len(fish_vals), replace=True)
-        mean_diffs[i] = float(np.mean(a) - np.mean(f))
-        med_diffs[i] = float(np.median(a) - np.median(f))
-        deltas[i] = cliffs_delta(a, f)
-
+    cis = bootstrap_two_sample(algae_vals, fish_vals, n_boot=n_boot, rng=rng)
     return {
-        "ci_mean_diff_low": float(np.percentile(mean_diffs, 2.5)),
-        "ci_mean_diff_high": float(np.percentile(mean_diffs, 97.5)),
-        "ci_median_diff_low": float(np.percentile(med_diffs, 2.5)),
-        "ci_median_diff_high": float(np.percentile(med_diffs, 97.5)),
-        "ci_cliffs_delta_low": float(np.percentile(deltas, 2.5)),
-        "ci_cliffs_delta_high": float(np.percentile(deltas, 97.5)),
+        "ci_mean_diff_low": cis["mean_diff"]["low"],
+        "ci_mean_diff_high": cis["mean_diff"]["high"],
+        "ci_median_diff_low": cis["median_diff"]["low"],
+        "ci_median_diff_high": cis["median_diff"]["high"],
+        "ci_cliffs_delta_low": cis["cliffs_delta"]["low"],
+        "ci_cliffs_delta_high": cis["cliffs_delta"]["high"],
     }
 
 
@@ -150,7 +125,7 @@ def load_herbivore_feeding_rates() -> pd.DataFrame:
         if site not in SITES or bait_type not in {"fish", "algae"}:
             continue
 
-        raw = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+        raw = read_video_csv(csv_path)
         total = 0
         feeding = 0
 
@@ -242,14 +217,7 @@ def run_bootstrap_effectsizes() -> pd.DataFrame:
     if out.empty:
         return out
 
-    out["q_bh"] = np.nan
-    out["q_holm"] = np.nan
-    for block, idx in out.groupby("analysis_block").groups.items():
-        pvals = out.loc[list(idx), "p_value_mwu_one_sided"].to_numpy(dtype=float)
-        _, q_bh, _, _ = multipletests(pvals, method="fdr_bh")
-        _, q_holm, _, _ = multipletests(pvals, method="holm")
-        out.loc[list(idx), "q_bh"] = q_bh
-        out.loc[list(idx), "q_holm"] = q_holm
+    out = adjust_frame(out, "p_value_mwu_one_sided", {"fdr_bh": "q_bh", "holm": "q_holm"}, by="analysis_block")
 
     out = out.sort_values(["analysis_block", "q_holm", "p_value_mwu_one_sided", "site", "target"]).reset_index(drop=True)
     return out
@@ -265,7 +233,7 @@ def build_family_maxn_matrix() -> pd.DataFrame:
         if site not in SITES or bait_type not in {"fish", "algae"}:
             continue
 
-        raw = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+        raw = read_video_csv(csv_path)
         counts: Dict[Tuple[str, float], int] = {}
 
         for _, row in raw.iterrows():
@@ -374,25 +342,12 @@ def run_prevalence_threshold() -> pd.DataFrame:
     if out.empty:
         return out
 
-    out["q_bh_two_sided_site"] = np.nan
-    out["q_holm_two_sided_site"] = np.nan
-    out["q_bh_directional_site"] = np.nan
-    out["q_holm_directional_site"] = np.nan
-
-    for site, idx in out.groupby("site").groups.items():
-        idx_list = list(idx)
-        p_two = out.loc[idx_list, "fisher_p_two_sided"].to_numpy(dtype=float)
-        p_dir = out.loc[idx_list, "fisher_p_directional"].to_numpy(dtype=float)
-
-        _, q_bh_two, _, _ = multipletests(p_two, method="fdr_bh")
-        _, q_holm_two, _, _ = multipletests(p_two, method="holm")
-        _, q_bh_dir, _, _ = multipletests(p_dir, method="fdr_bh")
-        _, q_holm_dir, _, _ = multipletests(p_dir, method="holm")
-
-        out.loc[idx_list, "q_bh_two_sided_site"] = q_bh_two
-        out.loc[idx_list, "q_holm_two_sided_site"] = q_holm_two
-        out.loc[idx_list, "q_bh_directional_site"] = q_bh_dir
-        out.loc[idx_list, "q_holm_directional_site"] = q_holm_dir
+    out = adjust_frame(
+        out, "fisher_p_two_sided", {"fdr_bh": "q_bh_two_sided_site", "holm": "q_holm_two_sided_site"}, by="site"
+    )
+    out = adjust_frame(
+        out, "fisher_p_directional", {"fdr_bh": "q_bh_directional_site", "holm": "q_holm_directional_site"}, by="site"
+    )
 
     out = out.sort_values(["site", "q_holm_directional_site", "fisher_p_directional", "family"]).reset_index(drop=True)
     return out
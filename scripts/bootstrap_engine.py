@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Gebuendelter Bootstrap fuer Effektgroessen (Konfidenzintervalle).
+
+Statt je Replikat rng.choice aufzurufen und die Statistik in einer Schleife
+zu berechnen, werden alle Resampling-Indizes als eine (n_boot x n)-Matrix je
+Stichprobe gezogen (erst Gruppe a, dann Gruppe b) und die Statistiken fuer
+alle Replikate blockweise vektorisiert ausgewertet:
+
+- mean_diff:    mean(a) - mean(b)
+- median_diff:  median(a) - median(b)
+- cliffs_delta: (#{a > b} - #{a < b}) / (n_a * n_b), rangbasiert ueber die
+                gemeinsamen Werte-Stufen (effect_sizes.cliffs_delta_codes)
+
+Intervalle: "percentile" oder "bca" (bias-korrigiert und beschleunigt).
+Die Beschleunigung kommt aus dem Jackknife je Stichprobe: Abweichungen vom
+Jackknife-Mittel der eigenen Stichprobe, danach ueber die Stichproben
+summiert (wie scipy.stats.bootstrap).
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import stats
+
+from effect_sizes import cliffs_delta_codes
+
+DEFAULT_BATCH_SIZE = 5000
+STATISTICS = ("mean_diff", "median_diff", "cliffs_delta")
+CI_METHODS = ("percentile", "bca")
+
+
+def _as_rng(rng: np.random.Generator | int | None) -> np.random.Generator:
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def resample_indices(n: int, n_boot: int, rng: np.random.Generator) -> np.ndarray:
+    """(n_boot x n)-Indexmatrix; gleicher Zufallsstrom wie rng.choice(values, size=(n_boot, n))."""
+    return rng.integers(0, n, size=(n_boot, n))
+
+
+def _statistic_funcs(
+    a: np.ndarray,
+    b: np.ndarray,
+) -> Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]]:
+    levels, inverse = np.unique(np.concatenate([a, b]), return_inverse=True)
+    codes_a = inverse[: len(a)]
+    codes_b = inverse[len(a) :]
+    return {
+        "mean_diff": lambda ia, ib: a[ia].mean(axis=1) - b[ib].mean(axis=1),
+        "median_diff": lambda ia, ib: np.median(a[ia], axis=1) - np.median(b[ib], axis=1),
+        "cliffs_delta": lambda ia, ib: cliffs_delta_codes(codes_a[ia], codes_b[ib], len(levels)),
+    }
+
+
+def _jackknife_two_sample(
+    func: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    n_a: int,
+    n_b: int,
+) -> List[np.ndarray]:
+    # Leave-one-out je Stichprobe (je Zeile ein ausgelassener Wert)
+    groups = []
+    if n_a > 1:
+        keep_a = np.array([np.delete(np.arange(n_a), i) for i in range(n_a)])
+        groups.append(func(keep_a, np.tile(np.arange(n_b), (n_a, 1))))
+    if n_b > 1:
+        keep_b = np.array([np.delete(np.arange(n_b), i) for i in range(n_b)])
+        groups.append(func(np.tile(np.arange(n_a), (n_b, 1)), keep_b))
+    return groups
+
+
+def _acceleration(jackknife: Sequence[np.ndarray]) -> float:
+    num = 0.0
+    den = 0.0
+    for values in jackknife:
+        n = float(len(values))
+        u = (n - 1.0) * (values.mean() - values)
+        num += float((u**3).sum()) / n**3
+        den += float((u**2).sum()) / n**2
+    return num / (6.0 * den**1.5) if den > 0 else 0.0
+
+
+def _bca_levels(
+    boot: np.ndarray,
+    observed: float,
+    jackknife: Sequence[np.ndarray],
+    alpha: float,
+) -> Tuple[float, float]:
+    prop = float(np.mean(boot < observed))
+    jackknife = [np.asarray(values, dtype=float) for values in jackknife if len(values) > 1]
+    if not jackknife or prop <= 0.0 or prop >= 1.0:
+        return alpha / 2.0, 1.0 - alpha / 2.0
+    z0 = stats.norm.ppf(prop)
+    accel = _acceleration(jackknife)
+    levels = []
+    for z_alpha in stats.norm.ppf([alpha / 2.0, 1.0 - alpha / 2.0]):
+        shifted = z0 + (z0 + z_alpha) / (1.0 - accel * (z0 + z_alpha))
+        levels.append(float(stats.norm.cdf(shifted)))
+    return levels[0], levels[1]
+
+
+def confidence_interval(
+    boot: np.ndarray,
+    observed: float | None = None,
+    jackknife: np.ndarray | Sequence[np.ndarray] | None = None,
+    confidence: float = 0.95,
+    method: str = "percentile",
+) -> Tuple[float, float]:
+    """
+    Intervall aus Bootstrap-Verteilung. BCa braucht observed und jackknife
+    (Array einer Stichprobe oder Liste mit einem Array je Stichprobe).
+    """
+    if method not in CI_METHODS:
+        raise ValueError(f"Unbekannte CI-Methode: {method}")
+    boot = boot[np.isfinite(boot)]
+    if len(boot) == 0:
+        return (np.nan, np.nan)
+    # in Prozent rechnen, damit 95 % exakt die Perzentile 2.5 / 97.5 ergibt
+    tail = (100.0 - 100.0 * confidence) / 2.0
+    low_pct, high_pct = tail, 100.0 - tail
+    if method == "bca":
+        if observed is None or jackknife is None:
+            raise ValueError("BCa benoetigt observed und jackknife")
+        if isinstance(jackknife, np.ndarray):
+            jackknife = [jackknife]
+        low_q, high_q = _bca_levels(boot, observed, jackknife, 1.0 - confidence)
+        low_pct, high_pct = 100.0 * low_q, 100.0 * high_q
+    return float(np.percentile(boot, low_pct)), float(np.percentile(boot, high_pct))
+
+
+def bootstrap_two_sample(
+    a: Sequence[float],
+    b: Sequence[float],
+    n_boot: int = 5000,
+    rng: np.random.Generator | int | None = None,
+    statistics: Sequence[str] = STATISTICS,
+    method: str = "percentile",
+    confidence: float = 0.95,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Bootstrap-Intervalle fuer Unterschiede a - b.
+
+    Rueckgabe je Statistik: {"estimate", "low", "high", "boot_mean"}; bei
+    leerer Gruppe alles NaN (es werden dann keine Zufallszahlen verbraucht).
+    """
+    unknown = set(statistics) - set(STATISTICS)
+    if unknown:
+        raise ValueError(f"Unbekannte Statistik(en): {sorted(unknown)}")
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if len(a) == 0 or len(b) == 0:
+        return {name: {"estimate": np.nan, "low": np.nan, "high": np.nan, "boot_mean": np.nan} for name in statistics}
+
+    generator = _as_rng(rng)
+    idx_a = resample_indices(len(a), n_boot, generator)
+    idx_b = resample_indices(len(b), n_boot, generator)
+    funcs = _statistic_funcs(a, b)
+    full_a = np.arange(len(a))[None, :]
+    full_b = np.arange(len(b))[None, :]
+
+    out: Dict[str, Dict[str, float]] = {}
+    for name in statistics:
+        func = funcs[name]
+        boot = np.empty(n_boot, dtype=float)
+        for start in range(0, n_boot, batch_size):
+            stop = min(start + batch_size, n_boot)
+            boot[start:stop] = func(idx_a[start:stop], idx_b[start:stop])
+        observed = float(func(full_a, full_b)[0])
+        jackknife = _jackknife_two_sample(func, len(a), len(b)) if method == "bca" else None
+        low, high = confidence_interval(boot, observed, jackknife, confidence, method)
+        out[name] = {"estimate": observed, "low": low, "high": high, "boot_mean": float(boot.mean())}
+    return out
+
+
+def bootstrap_mean(
+    values: Sequence[float],
+    n_boot: int = 5000,
+    rng: np.random.Generator | int | None = None,
+    method: str = "percentile",
+    confidence: float = 0.95,
+) -> Tuple[float, float]:
+    """Bootstrap-Intervall fuer den Mittelwert einer Stichprobe."""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return (np.nan, np.nan)
+    idx = resample_indices(len(values), n_boot, _as_rng(rng))
+    boot = values[idx].mean(axis=1)
+    jackknife = None
+    if method == "bca":
+        n = len(values)
+        jackknife = (values.sum() - values) / (n - 1) if n > 1 else np.array([], dtype=float)
+    return confidence_interval(boot, float(values.mean()), jackknife, confidence, method)
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import math
 from pathlib import Path
 from typing import Dict, List, Sequence, Set, Tuple
 
@@ -12,6 +11,13 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from annotation_store import read_video_csv
+from distances import jaccard_distance
+from multiple_testing import bh_adjust, holm_adjust
+from ordination import permdisp
+from rarefaction import accumulation_curves, incidence_matrix, mao_tau, rarefied_richness_mc, richness_estimators
+from taxonomy import taxon_keys
+
 
 ROOT = Path(__file__).resolve().parents[1]
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
@@ -26,6 +32,7 @@ OUT_PERMDISP_ANOVA = OUT_DIR / "permdisp_site_anova.csv"
 OUT_RARE = OUT_DIR / "rarefaction_standardized_by_bait.csv"
 OUT_RARE_NO_CONTROL = OUT_DIR / "rarefaction_standardized_by_bait_no_control.csv"
 OUT_RARE_TYPE = OUT_DIR / "rarefaction_standardized_by_bait_type.csv"
+OUT_ACCUM = OUT_DIR / "accumulation_curves_by_site_bait.csv"
 OUT_REPORT = OUT_DIR / "composition_robustness_open_tests.md"
 
 FIG_PERMDISP = PLOT_DIR / "12_permdisp_dispersion_by_site.png"
@@ -39,15 +46,6 @@ N_RARE_REPS = 4000
 SEED = 42
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def is_truthy(value: object) -> bool:
     if value is None:
         return False
@@ -64,34 +62,11 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return date, standort.lower(), koeder.lower()
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
 def load_video_taxa(csv_path: Path) -> Dict[str, object]:
-    raw = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-    taxa_set: Set[str] = set()
-    for _, row in raw.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-        key = build_taxon_key(row)
-        if key:
-            taxa_set.add(key)
+    raw = read_video_csv(csv_path)
+    non_behavior = ~(raw["feeding"].map(is_truthy) | raw["interested"].map(is_truthy))
+    keys = taxon_keys(raw[non_behavior])
+    taxa_set: Set[str] = set(keys[keys != ""].tolist())
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
@@ -131,144 +106,24 @@ def build_binary_matrix(site_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray,
     return mat, groups, taxa_sets
 
 
-def jaccard_distance_matrix(binary_matrix: np.ndarray) -> np.ndarray:
-    n = binary_matrix.shape[0]
-    dist = np.zeros((n, n), dtype=float)
-    for i in range(n):
-        a = binary_matrix[i]
-        for j in range(i + 1, n):
-            b = binary_matrix[j]
-            union = np.logical_or(a, b).sum()
-            if union == 0:
-                d = 0.0
-            else:
-                inter = np.logical_and(a, b).sum()
-                d = 1.0 - (inter / union)
-            dist[i, j] = d
-            dist[j, i] = d
-    return dist
-
-
-def pcoa(distance_matrix: np.ndarray) -> np.ndarray:
-    n = distance_matrix.shape[0]
-    a = -0.5 * (distance_matrix ** 2)
-    h = np.eye(n) - np.ones((n, n)) / n
-    b = h @ a @ h
-    evals, evecs = np.linalg.eigh(b)
-    idx = np.argsort(evals)[::-1]
-    evals = evals[idx]
-    evecs = evecs[:, idx]
-    pos = evals > 1e-12
-    if not np.any(pos):
-        return np.zeros((n, 1), dtype=float)
-    return evecs[:, pos] * np.sqrt(evals[pos])
-
-
-def distances_to_group_centroid(coords: np.ndarray, groups: np.ndarray) -> np.ndarray:
-    out = np.zeros(len(groups), dtype=float)
-    for g in pd.unique(groups):
-        idx = np.where(groups == g)[0]
-        center = coords[idx].mean(axis=0)
-        out[idx] = np.sqrt(np.sum((coords[idx] - center) ** 2, axis=1))
-    return out
-
-
-def one_way_f_stat(values: np.ndarray, groups: np.ndarray) -> float:
-    overall_mean = float(np.mean(values))
-    uniq = pd.unique(groups)
-    k = len(uniq)
-    n = len(values)
-    if n <= k or k < 2:
-        return math.nan
-
-    ss_between = 0.0
-    ss_within = 0.0
-    for g in uniq:
-        idx = groups == g
-        vg = values[idx]
-        if len(vg) == 0:
-            continue
-        mu = float(np.mean(vg))
-        ss_between += len(vg) * (mu - overall_mean) ** 2
-        ss_within += float(np.sum((vg - mu) ** 2))
-
-    dfb = k - 1
-    dfw = n - k
-    if dfb <= 0 or dfw <= 0 or ss_within <= 0:
-        return math.nan
-    return (ss_between / dfb) / (ss_within / dfw)
-
-
-def permanova_dispersion_test(distances: np.ndarray, groups: np.ndarray, n_perm: int, rng: np.random.Generator) -> Tuple[float, float]:
-    f_obs = one_way_f_stat(distances, groups)
-    if not np.isfinite(f_obs):
-        return math.nan, math.nan
-    ge = 0
-    for _ in range(n_perm):
-        f_perm = one_way_f_stat(distances, rng.permutation(groups))
-        if np.isfinite(f_perm) and f_perm >= f_obs:
-            ge += 1
-    p = (ge + 1) / (n_perm + 1)
-    return float(f_obs), float(p)
-
-
-def bh_adjust(p_vals: Sequence[float]) -> np.ndarray:
-    p = np.asarray(p_vals, dtype=float)
-    mask = np.isfinite(p)
-    out = np.full_like(p, np.nan)
-    if not np.any(mask):
-        return out
-
-    v = p[mask]
-    m = len(v)
-    order = np.argsort(v)
-    ranked = v[order]
-    q = ranked * m / (np.arange(m) + 1)
-    q = np.minimum.accumulate(q[::-1])[::-1]
-    q = np.clip(q, 0.0, 1.0)
-    q_unsorted = np.empty_like(q)
-    q_unsorted[order] = q
-    out[np.where(mask)[0]] = q_unsorted
-    return out
-
-
-def holm_adjust(p_vals: Sequence[float]) -> np.ndarray:
-    p = np.asarray(p_vals, dtype=float)
-    mask = np.isfinite(p)
-    out = np.full_like(p, np.nan)
-    if not np.any(mask):
-        return out
-    v = p[mask]
-    m = len(v)
-    order = np.argsort(v)
-    adj_ordered = np.zeros(m, dtype=float)
-    for i, idx in enumerate(order):
-        adj_ordered[i] = min(1.0, (m - i) * v[idx])
-    adj_ordered = np.maximum.accumulate(adj_ordered)
-    adj = np.empty_like(adj_ordered)
-    adj[order] = adj_ordered
-    out[np.where(mask)[0]] = adj
-    return out
-
-
-def rarefied_union_richness(
-    taxa_sets: Sequence[Set[str]],
-    k: int,
-    n_rep: int,
-    rng: np.random.Generator,
-) -> Tuple[float, float, float]:
-    idx = np.arange(len(taxa_sets))
-    vals = np.zeros(n_rep, dtype=float)
-    for i in range(n_rep):
-        chosen = rng.choice(idx, size=k, replace=False)
-        union: Set[str] = set()
-        for j in chosen:
-            union |= taxa_sets[int(j)]
-        vals[i] = float(len(union))
-    mean = float(np.mean(vals))
-    low = float(np.percentile(vals, 2.5))
-    high = float(np.percentile(vals, 97.5))
-    return mean, low, high
+def rarefaction_row(taxa_sets: Sequence[Set[str]], k: int, rng: np.random.Generator) -> Dict[str, object]:
+    incidence, _ = incidence_matrix(taxa_sets)
+    mean_r, low_r, high_r = rarefied_richness_mc(incidence, k=k, n_rep=N_RARE_REPS, rng=rng)
+    expected = mao_tau(incidence, sizes=[k]).iloc[0]
+    estimators = richness_estimators(incidence)
+    return {
+        "k_standardized_videos": k,
+        "rarefied_union_richness_mean": mean_r,
+        "rarefied_union_richness_ci95_low": low_r,
+        "rarefied_union_richness_ci95_high": high_r,
+        "observed_union_richness": int(estimators["s_obs"]),
+        "mao_tau_expected_richness": float(expected["expected_richness"]),
+        "mao_tau_sd": float(expected["sd"]),
+        "chao2": estimators["chao2"],
+        "ice": estimators["ice"],
+        "jackknife1": estimators["jackknife1"],
+        "jackknife2": estimators["jackknife2"],
+    }
 
 
 def run_permdisp(videos_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -282,11 +137,8 @@ def run_permdisp(videos_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
             continue
 
         mat, groups, _ = build_binary_matrix(site_df)
-        dist = jaccard_distance_matrix(mat)
-        coords = pcoa(dist)
-        d_cent = distances_to_group_centroid(coords, groups)
-
-        f_stat, p_val = permanova_dispersion_test(d_cent, groups, n_perm=N_PERM, rng=rng)
+        dist = jaccard_distance(mat)
+        d_cent, f_stat, p_val = permdisp(dist, groups, n_perm=N_PERM, rng=rng)
 
         site_rows.append(
             {
@@ -337,22 +189,12 @@ def run_rarefaction(videos_df: pd.DataFrame, exclude_control: bool = False) -> p
         k = int(counts.min())
         for bait, part in site_df.groupby("koeder"):
             taxa_sets = [set(x) for x in part["taxa_set"].tolist()]
-            mean_r, low_r, high_r = rarefied_union_richness(
-                taxa_sets=taxa_sets,
-                k=k,
-                n_rep=N_RARE_REPS,
-                rng=rng,
-            )
             rows.append(
                 {
                     "standort": site,
                     "koeder": bait,
                     "n_videos": int(len(part)),
-                    "k_standardized_videos": k,
-                    "rarefied_union_richness_mean": mean_r,
-                    "rarefied_union_richness_ci95_low": low_r,
-                    "rarefied_union_richness_ci95_high": high_r,
-                    "observed_union_richness": int(len(set().union(*taxa_sets))),
+                    **rarefaction_row(taxa_sets, k, rng),
                     "exclude_control": bool(exclude_control),
                 }
             )
@@ -383,22 +225,12 @@ def run_rarefaction_bait_type(videos_df: pd.DataFrame) -> pd.DataFrame:
 
         for bait_type, part in site_df.groupby("bait_type"):
             taxa_sets = [set(x) for x in part["taxa_set"].tolist()]
-            mean_r, low_r, high_r = rarefied_union_richness(
-                taxa_sets=taxa_sets,
-                k=k,
-                n_rep=N_RARE_REPS,
-                rng=rng,
-            )
             rows.append(
                 {
                     "standort": site,
                     "bait_type": bait_type,
                     "n_videos": int(len(part)),
-                    "k_standardized_videos": k,
-                    "rarefied_union_richness_mean": mean_r,
-                    "rarefied_union_richness_ci95_low": low_r,
-                    "rarefied_union_richness_ci95_high": high_r,
-                    "observed_union_richness": int(len(set().union(*taxa_sets))),
+                    **rarefaction_row(taxa_sets, k, rng),
                 }
             )
 
@@ -498,6 +330,8 @@ def write_report(
     lines.append("- Taxa-Komposition: Presence/Absence je Video mit Jaccard-Distanzen.")
     lines.append("- PERMDISP: Distanz jedes Videos zum Koeder-Zentrum im PCoA-Raum; Signifikanz per Permutationstest (5000).")
     lines.append("- Rarefaction: Monte-Carlo-Subsampling je Koeder auf k = minimale Videozahl je Standort (4000 Wiederholungen).")
+    lines.append("- Analytisch: erwartete Richness bei k Videos (Mao Tau) sowie Extrapolation der Gesamt-Richness (Chao2, ICE, Jackknife 1/2).")
+    lines.append("- Akkumulationskurven (Mao Tau mit 95%-Intervall) je Standort x Koeder: accumulation_curves_by_site_bait.csv.")
     lines.append("")
     lines.append("## PERMDISP pro Standort")
     lines.append("")
@@ -524,6 +358,23 @@ def write_report(
             ]
         ]
         lines.append(show.to_markdown(index=False, floatfmt=".4f"))
+        lines.append("")
+        lines.append("## Richness-Extrapolation pro Koeder")
+        lines.append("")
+        show_est = rare_all[
+            [
+                "standort",
+                "koeder",
+                "n_videos",
+                "observed_union_richness",
+                "mao_tau_expected_richness",
+                "chao2",
+                "ice",
+                "jackknife1",
+                "jackknife2",
+            ]
+        ]
+        lines.append(show_est.to_markdown(index=False, floatfmt=".4f"))
 
     lines.append("")
     lines.append("## Rarefied Richness pro Koeder (Sensitivitaet ohne control)")
@@ -593,12 +444,14 @@ def main() -> None:
     rare = run_rarefaction(videos_df, exclude_control=False)
     rare_no_control = run_rarefaction(videos_df, exclude_control=True)
     rare_type = run_rarefaction_bait_type(videos_df)
+    accumulation = accumulation_curves(videos_df["taxa_set"].tolist(), videos_df[["standort", "koeder"]])
 
     permdisp_detail.to_csv(OUT_PERMDISP, index=False)
     permdisp_site.to_csv(OUT_PERMDISP_ANOVA, index=False)
     rare.to_csv(OUT_RARE, index=False)
     rare_no_control.to_csv(OUT_RARE_NO_CONTROL, index=False)
     rare_type.to_csv(OUT_RARE_TYPE, index=False)
+    accumulation.to_csv(OUT_ACCUM, index=False)
 
     plot_df = rare_no_control if not rare_no_control.empty else rare
     make_plots(permdisp_detail, plot_df)
@@ -609,6 +462,7 @@ def main() -> None:
     print(f"Wrote: {OUT_RARE}")
     print(f"Wrote: {OUT_RARE_NO_CONTROL}")
     print(f"Wrote: {OUT_RARE_TYPE}")
+    print(f"Wrote: {OUT_ACCUM}")
     print(f"Wrote: {OUT_REPORT}")
     print(f"Wrote: {FIG_PERMDISP}")
     print(f"Wrote: {FIG_RARE}")
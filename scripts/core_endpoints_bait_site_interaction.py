@@ -7,6 +7,10 @@ from typing import Dict, List
 import numpy as np
 import pandas as pd
 
+from maxn_engine import maxn_by_video
+from multiple_testing import bh_adjust
+from restricted_permutation import restricted_permutation_test
+
 
 ROOT = Path(__file__).resolve().parents[1]
 VIS_PATH = ROOT / "results" / "visibility_analysis" / "visibility_video_level_merged.csv"
@@ -33,33 +37,6 @@ HERBIVORE_CORE_FAMILIES = ["acanthuridae", "siganidae", "scaridae", "blenniidae"
 SITES = ["milimani", "utumbi", "nursery"]
 
 
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    return text not in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}
-
-
-def parse_frame_time(frame_value: object) -> float | None:
-    text = str(frame_value).strip()
-    if not text:
-        return None
-    num = ""
-    found = False
-    for ch in text:
-        if ch.isdigit() or ch in ".-+":
-            num += ch
-            found = True
-        elif found:
-            break
-    if not num:
-        return None
-    try:
-        return round(float(num), 2)
-    except ValueError:
-        return None
-
-
 def parse_video_metadata(filename: str) -> tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -72,34 +49,15 @@ def parse_video_metadata(filename: str) -> tuple[str, str, str]:
 def compute_herbivore_maxn_video_level() -> pd.DataFrame:
     rows: List[Dict[str, object]] = []
     files = sorted(list(CORAL_REEF_DIR.glob("*.csv")) + list(NURSERY_DIR.glob("*.csv")))
+    family_maxn = maxn_by_video(level="family", behaviour="exclude")
 
     for csv_path in files:
         _, site, bait = parse_video_metadata(csv_path.name)
         if site not in SITES:
             continue
 
-        df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-        counts: Dict[tuple[str, float], int] = {}
-
-        for _, row in df.iterrows():
-            if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-                continue
-
-            family = str(row.get("family", "")).strip().lower()
-            if family not in HERBIVORE_CORE_FAMILIES:
-                continue
-
-            frame_time = parse_frame_time(row.get("frames", ""))
-            if frame_time is None:
-                continue
-
-            key = (family, frame_time)
-            counts[key] = counts.get(key, 0) + 1
-
-        maxn_by_family = {f: 0 for f in HERBIVORE_CORE_FAMILIES}
-        for (family, _), n in counts.items():
-            if n > maxn_by_family[family]:
-                maxn_by_family[family] = int(n)
+        video_maxn = family_maxn.get(csv_path.name, {})
+        maxn_by_family = {f: int(video_maxn.get(f, 0)) for f in HERBIVORE_CORE_FAMILIES}
 
         out = {
             "filename": csv_path.name,
@@ -114,18 +72,22 @@ def compute_herbivore_maxn_video_level() -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 
-def build_design(site: pd.Series, bait_is_fish: pd.Series, with_interaction: bool) -> np.ndarray:
+def site_dummies(site: pd.Series) -> List[np.ndarray]:
+    """Dummy-Spalten der beobachteten Standorte ausser dem ersten (leere Standorte entfallen)."""
     site_cat = pd.Categorical(site, categories=SITES)
-    site_dummies = pd.get_dummies(site_cat, drop_first=True)
-    bait = bait_is_fish.astype(float)
+    dummies = pd.get_dummies(site_cat, drop_first=True)
+    cols = [dummies[col].astype(float).to_numpy() for col in dummies.columns]
+    return [col for col in cols if col.any()]
+
 
-    cols = [np.ones(len(site), dtype=float), bait.to_numpy()]
-    for col in site_dummies.columns:
-        cols.append(site_dummies[col].astype(float).to_numpy())
+def build_design(site: pd.Series, bait_is_fish: pd.Series, with_interaction: bool) -> np.ndarray:
+    dummies = site_dummies(site)
+    bait = bait_is_fish.astype(float).to_numpy()
 
+    cols = [np.ones(len(site), dtype=float), bait]
+    cols.extend(dummies)
     if with_interaction:
-        for col in site_dummies.columns:
-            cols.append((bait.to_numpy() * site_dummies[col].astype(float).to_numpy()))
+        cols.extend(bait * col for col in dummies)
 
     return np.column_stack(cols)
 
@@ -155,28 +117,6 @@ def nested_f_stat(y: np.ndarray, X_full: np.ndarray, X_reduced: np.ndarray) -> t
     return float(ms_num / ms_den), sse_full, sse_red, df_num, df_full
 
 
-def permute_bait_within_site(bait_is_fish: pd.Series, site: pd.Series, rng: np.random.Generator) -> pd.Series:
-    out = bait_is_fish.to_numpy(copy=True)
-    site_arr = site.to_numpy()
-    for s in np.unique(site_arr):
-        idx = np.where(site_arr == s)[0]
-        out[idx] = rng.permutation(out[idx])
-    return pd.Series(out, index=bait_is_fish.index)
-
-
-def bh_adjust(pvals: pd.Series) -> pd.Series:
-    vals = pvals.astype(float).to_numpy()
-    m = len(vals)
-    order = np.argsort(vals)
-    ranked = vals[order]
-    q = ranked * m / (np.arange(m) + 1)
-    q = np.minimum.accumulate(q[::-1])[::-1]
-    q = np.clip(q, 0.0, 1.0)
-    out = np.empty_like(q)
-    out[order] = q
-    return pd.Series(out, index=pvals.index)
-
-
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -221,9 +161,7 @@ def main() -> None:
         X_full = build_design(df["standort"], df["bait_is_fish"], with_interaction=True)
         X_no_interaction = build_design(df["standort"], df["bait_is_fish"], with_interaction=False)
 
-        site_cat = pd.Categorical(df["standort"], categories=SITES)
-        site_dummies = pd.get_dummies(site_cat, drop_first=True)
-        X_site_only = np.column_stack([np.ones(len(df), dtype=float)] + [site_dummies[c].astype(float).to_numpy() for c in site_dummies.columns])
+        X_site_only = np.column_stack([np.ones(len(df), dtype=float)] + site_dummies(df["standort"]))
 
         beta_full, sse_full, sst = ols_fit(y, X_full)
         r2 = float(1.0 - (sse_full / sst)) if sst > 0 else float("nan")
@@ -231,22 +169,24 @@ def main() -> None:
         f_bait, _, _, df_num_bait, df_den = nested_f_stat(y, X_full, X_site_only)
         f_inter, _, _, df_num_inter, _ = nested_f_stat(y, X_full, X_no_interaction)
 
-        f_bait_perm = []
-        f_inter_perm = []
-        for _ in range(N_PERM):
-            bait_perm = permute_bait_within_site(df["bait_is_fish"], df["standort"], rng)
-            X_full_p = build_design(df["standort"], bait_perm, with_interaction=True)
-            X_no_interaction_p = build_design(df["standort"], bait_perm, with_interaction=False)
-
-            f_b, _, _, _, _ = nested_f_stat(y, X_full_p, X_site_only)
-            f_i, _, _, _, _ = nested_f_stat(y, X_full_p, X_no_interaction_p)
-            f_bait_perm.append(f_b)
-            f_inter_perm.append(f_i)
-
-        f_bait_perm = np.array(f_bait_perm, dtype=float)
-        f_inter_perm = np.array(f_inter_perm, dtype=float)
-        p_bait = float((np.sum(f_bait_perm >= f_bait) + 1) / (len(f_bait_perm) + 1))
-        p_inter = float((np.sum(f_inter_perm >= f_inter) + 1) / (len(f_inter_perm) + 1))
+        # Bait (Haupteffekt + Interaktion, ein FG je Standort) bzw. nur Interaktion
+        # gegen das feste Standort-Design; Bait innerhalb der Standorte permutiert
+        n_site_cols = X_site_only.shape[1]
+        tests = {"bait": ("f", tuple(range(n_site_cols)))}
+        if n_site_cols > 1:
+            tests["interaction"] = ("f", tuple(range(1, n_site_cols)))
+        perm = restricted_permutation_test(
+            y,
+            fixed=X_site_only,
+            weights=X_site_only,
+            x=df["bait_is_fish"].astype(float).to_numpy(),
+            strata=df["standort"].to_numpy(),
+            tests=tests,
+            n_perm=N_PERM,
+            rng=rng,
+        )
+        p_bait = float(perm["bait"]["p_value"][0])
+        p_inter = float(perm["interaction"]["p_value"][0]) if "interaction" in perm else float("nan")
 
         # Effektrichtung des Bait-Haupteffekts ist Koeffizient bei bait_is_fish.
         beta_bait_fish_vs_algae = float(beta_full[1])
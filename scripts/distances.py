@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Vektorisierte Dissimilaritaeten fuer Video x Taxon-Matrizen.
+
+- jaccard_distance: Praesenz/Absenz, Schnittmengen ueber X @ X.T
+- sorensen_distance: Praesenz/Absenz (binaeres Bray-Curtis)
+- bray_curtis_distance: Abundanzen bzw. relative Profile, blockweise
+- relative_abundance: Zeilen auf Summe 1 skalieren (leere Zeilen bleiben 0)
+
+Alle Funktionen liefern eine quadratische Matrix oder mit condensed=True den
+oberen Dreiecksvektor (scipy-Reihenfolge, passend zu squareform). Standard ist
+float64 wie in den bisherigen Auswertungen; fuer grosse gepoolte Analysen kann
+dtype=np.float32 den Speicher halbieren. Paare ohne gemeinsame Taxa-Basis
+(beide Zeilen leer) bekommen Distanz 0.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+# Zeilen je Block fuer Bray-Curtis (Block x n x Taxa Zwischenspeicher)
+BRAY_CURTIS_BLOCK_ROWS = 64
+
+
+def _finish(dist: np.ndarray, condensed: bool, dtype: np.dtype | type) -> np.ndarray:
+    np.fill_diagonal(dist, 0.0)
+    if condensed:
+        return dist[np.triu_indices(dist.shape[0], 1)].astype(dtype, copy=False)
+    return dist.astype(dtype, copy=False)
+
+
+def _binary_overlap(binary_matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    x = (np.asarray(binary_matrix) != 0).astype(np.float64)
+    # Zaehlwerte sind ganzzahlig und damit in float64 exakt
+    inter = x @ x.T
+    richness = x.sum(axis=1)
+    return inter, richness
+
+
+def jaccard_distance(
+    binary_matrix: np.ndarray,
+    condensed: bool = False,
+    dtype: np.dtype | type = np.float64,
+) -> np.ndarray:
+    """1 - |A n B| / |A u B| fuer alle Zeilenpaare."""
+    inter, richness = _binary_overlap(binary_matrix)
+    union = richness[:, None] + richness[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dist = np.where(union > 0, 1.0 - inter / union, 0.0)
+    return _finish(dist, condensed, dtype)
+
+
+def sorensen_distance(
+    binary_matrix: np.ndarray,
+    condensed: bool = False,
+    dtype: np.dtype | type = np.float64,
+) -> np.ndarray:
+    """1 - 2 |A n B| / (|A| + |B|) fuer alle Zeilenpaare."""
+    inter, richness = _binary_overlap(binary_matrix)
+    total = richness[:, None] + richness[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dist = np.where(total > 0, 1.0 - 2.0 * inter / total, 0.0)
+    return _finish(dist, condensed, dtype)
+
+
+def bray_curtis_distance(
+    x: np.ndarray,
+    condensed: bool = False,
+    dtype: np.dtype | type = np.float64,
+) -> np.ndarray:
+    """sum |x_i - x_j| / sum (x_i + x_j) fuer alle Zeilenpaare."""
+    # C-Reihenfolge, damit die Summe je Paar wie eine 1-D-Summe (paarweise) laeuft
+    values = np.ascontiguousarray(x, dtype=np.float64)
+    n = values.shape[0]
+    dist = np.zeros((n, n), dtype=np.float64)
+    for start in range(0, n, BRAY_CURTIS_BLOCK_ROWS):
+        block = values[start : start + BRAY_CURTIS_BLOCK_ROWS, None, :]
+        num = np.abs(block - values[None, :, :]).sum(axis=2)
+        den = (block + values[None, :, :]).sum(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist[start : start + BRAY_CURTIS_BLOCK_ROWS] = np.where(den == 0, 0.0, num / den)
+    return _finish(dist, condensed, dtype)
+
+
+def relative_abundance(x: np.ndarray) -> np.ndarray:
+    values = np.asarray(x, dtype=float)
+    sums = values.sum(axis=1, keepdims=True)
+    return np.divide(values, sums, out=np.zeros_like(values), where=sums != 0)
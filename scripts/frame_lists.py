@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Vektorisierter Parser fuer die frames-Spalte der Annotationsreports.
+
+Eine ganze frames-Spalte (z. B. "[411.25,412.50]") wird in ein flaches
+float-Array plus Zeilen-Offsets zerlegt (ragged array). first/last/max/count
+je Zeile kommen direkt aus diesem Layout, ohne Python-Listen je Zeile.
+
+Zellen, die nicht dem einfachen Zahlenlisten-Format entsprechen, werden wie
+bisher ueber ast.literal_eval ausgewertet, damit das Ergebnis identisch zu
+normalize_reports.parse_frame_values bleibt.
+
+Das Modul haengt nur von numpy ab (kein pandas), damit normalize_reports.py
+schnell startet.
+"""
+
+from __future__ import annotations
+
+import ast
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterable, List
+
+import numpy as np
+
+_NUM = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_SIMPLE_CELL = re.compile(rf"\s*(?:{_NUM}|\[\s*(?:{_NUM}(?:\s*,\s*{_NUM})*\s*,?)?\s*\])\s*")
+_LIST_CHARS = re.compile(r"[\[\]\s]")
+
+
+@dataclass
+class FrameLists:
+    values: np.ndarray
+    offsets: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def row(self, i: int) -> np.ndarray:
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+    def _reduce_nonempty(self, ufunc: np.ufunc) -> np.ndarray:
+        out = np.full(len(self), np.nan, dtype=float)
+        non_empty = self.counts() > 0
+        if non_empty.any():
+            out[non_empty] = ufunc.reduceat(self.values, self.offsets[:-1][non_empty])
+        return out
+
+    def first(self) -> np.ndarray:
+        out = np.full(len(self), np.nan, dtype=float)
+        non_empty = self.counts() > 0
+        out[non_empty] = self.values[self.offsets[:-1][non_empty]]
+        return out
+
+    def last(self) -> np.ndarray:
+        out = np.full(len(self), np.nan, dtype=float)
+        non_empty = self.counts() > 0
+        out[non_empty] = self.values[self.offsets[1:][non_empty] - 1]
+        return out
+
+    def max(self) -> np.ndarray:
+        return self._reduce_nonempty(np.maximum)
+
+    def min(self) -> np.ndarray:
+        return self._reduce_nonempty(np.minimum)
+
+    def row_ids(self) -> np.ndarray:
+        """Zeilenindex je Einzelwert (fuer gruppierte Auswertungen ueber alle Werte)."""
+        return np.repeat(np.arange(len(self)), self.counts())
+
+    def filter_values(self, keep: np.ndarray) -> "FrameLists":
+        """Nur Einzelwerte mit keep=True behalten (z. B. <= 47 min); Zeilen bleiben erhalten."""
+        kept_counts = np.bincount(self.row_ids()[keep], minlength=len(self))
+        offsets = np.concatenate([[0], np.cumsum(kept_counts)]).astype(np.int64)
+        return FrameLists(values=self.values[keep], offsets=offsets)
+
+
+def _literal_frame_values(text: str) -> List[float]:
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return []
+
+    if isinstance(value, (int, float)):
+        return [float(value)]
+    if isinstance(value, list):
+        return [float(item) for item in value if isinstance(item, (int, float))]
+    return []
+
+
+def _cell_text(cell: object) -> str:
+    if cell is None or (isinstance(cell, float) and math.isnan(cell)):
+        return ""
+    return str(cell).strip()
+
+
+def parse_frame_column(cells: Iterable[object]) -> FrameLists:
+    """Parst eine komplette frames-Spalte in das Ragged-Array-Layout."""
+    text = [_cell_text(cell) for cell in cells]
+    n = len(text)
+
+    counts = np.zeros(n, dtype=np.int64)
+    bodies: List[str] = []
+    fallback: List[int] = []
+    for i, cell in enumerate(text):
+        if not cell:
+            continue
+        if _SIMPLE_CELL.fullmatch(cell) is None:
+            fallback.append(i)
+            continue
+        body = _LIST_CHARS.sub("", cell).rstrip(",")
+        if body:
+            counts[i] = body.count(",") + 1
+            bodies.append(body)
+    joined = ",".join(bodies)
+    values = np.array(joined.split(","), dtype=float) if joined else np.empty(0, dtype=float)
+
+    if fallback:
+        pieces = np.split(values, np.cumsum(counts)[:-1])
+        for i in fallback:
+            parsed = _literal_frame_values(text[i])
+            pieces[i] = np.asarray(parsed, dtype=float)
+            counts[i] = len(parsed)
+        values = np.concatenate(pieces) if pieces else np.empty(0, dtype=float)
+
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return FrameLists(values=values.astype(float), offsets=offsets)
@@ -35,6 +35,11 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv, read_video_csvs
+from effect_sizes import cliffs_delta
+from multiple_testing import bh_adjust, holm_adjust
+from parallel_videos import map_videos
+
 ROOT = Path(__file__).resolve().parents[1]
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min" / "Annotation_reports_coral_reef"
 NURSERY_CUT_ROOT = ROOT / "normalized_reports" / "cut_47min" / "Annotation_reports_Nursery"
@@ -171,53 +176,12 @@ def get_composite_groups(family: str, word_group: str | None, diets: List[str])
     return hits
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def bh_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order, start=1):
-        adjusted_ordered[i - 1] = p_values[idx] * m / i
-    for i in range(m - 2, -1, -1):
-        adjusted_ordered[i] = min(adjusted_ordered[i], adjusted_ordered[i + 1])
-    adjusted_ordered = np.clip(adjusted_ordered, 0.0, 1.0)
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = sum(1 for xi in x for yi in y if xi > yi)
-    lt = sum(1 for xi in x for yi in y if xi < yi)
-    return float((gt - lt) / total)
-
-
-def load_video_features_feeding(csv_path: Path) -> Dict[str, object]:
+def load_video_features_feeding(csv_path: Path, df: pd.DataFrame | None = None) -> Dict[str, object]:
     """
     Lade Feeding-Daten: zähle pro Gruppe/Familie wie oft feeding=true.
     """
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    if df is None:
+        df = read_video_csv(csv_path)
 
     # Zähle Feeding-Events pro Gruppe
     feeding_counts: Dict[str, int] = {}
@@ -276,14 +240,14 @@ def load_all_videos_feeding(site: str) -> pd.DataFrame:
         return pd.DataFrame()
 
     video_files = sorted([f for f in video_dir.glob("*.csv") if "-" in f.name])
-    data = []
-
-    for csv_file in video_files:
-        _, standort, koeder = parse_video_metadata(csv_file.name)
-        if standort.lower() == site.lower():
-            meta = load_video_features_feeding(csv_file)
-            if meta["feeding_counts"]:
-                data.append(meta)
+    site_files = [f for f in video_files if parse_video_metadata(f.name)[1].lower() == site.lower()]
+    # Speicher einmal im Elternprozess lesen, Worker bekommen nur ihr Video
+    video_frames = read_video_csvs(site_files)
+    data = [
+        meta
+        for meta in map_videos(load_video_features_feeding, site_files, video_frames)
+        if meta["feeding_counts"]
+    ]
 
     return pd.DataFrame(data)
 
@@ -15,7 +15,8 @@ Ziel:
 
 Statistik:
 - Global je Gruppe: Kruskal-Wallis ueber Koeder.
-- Paarweise je Gruppe: Mann-Whitney U zwischen Koedern.
+- Paarweise je Gruppe: Mann-Whitney U zwischen Koedern, Cliff's delta mit
+  asymmetrischem 95%-Intervall nach Cliff.
 - Extra: Fish-baits vs Algae-baits (Mann-Whitney U).
 - Mehrfachtest-Korrektur: Holm und Benjamini-Hochberg (FDR/BH).
 
@@ -34,7 +35,12 @@ from typing import Dict, Iterable, List, Tuple
 
 import numpy as np
 import pandas as pd
-from scipy import stats
+
+from annotation_store import read_video_csv, read_video_csvs
+from effect_sizes import cliffs_delta, cliffs_delta_ci
+from multiple_testing import bh_adjust, holm_adjust
+from parallel_videos import map_videos
+from rank_tests import feature_rank_tests, mann_whitney_columns
 
 ROOT = Path(__file__).resolve().parents[1]
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min" / "Annotation_reports_coral_reef"
@@ -352,53 +358,9 @@ def get_composite_groups(
     return hits
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def bh_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order, start=1):
-        adjusted_ordered[i - 1] = p_values[idx] * m / i
-    for i in range(m - 2, -1, -1):
-        adjusted_ordered[i] = min(adjusted_ordered[i], adjusted_ordered[i + 1])
-    adjusted_ordered = np.clip(adjusted_ordered, 0.0, 1.0)
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = 0
-    lt = 0
-    for xi in x:
-        gt += np.sum(xi > y)
-        lt += np.sum(xi < y)
-    return float((gt - lt) / total)
-
-
-def load_video_features(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+def load_video_features(csv_path: Path, df: pd.DataFrame | None = None) -> Dict[str, object]:
+    if df is None:
+        df = read_video_csv(csv_path)
 
     # count[(feature_type, feature_name, frame_time)] = n
     count_map: Dict[Tuple[str, str, float], int] = {}
@@ -500,24 +462,28 @@ def prepare_feature_matrix(videos: pd.DataFrame, feature_type: str, min_present_
 def test_features_across_baits(mat: pd.DataFrame, features: Iterable[str], site: str, feature_type: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
     bait_order = sorted(mat["bait"].unique().tolist())
 
+    features = list(features)
+    global_tests, pair_tests = feature_rank_tests(mat[features], mat["bait"].to_numpy(), group_order=bait_order)
+    global_tests = global_tests.set_index("feature")
+    pair_tests = pair_tests.set_index(["feature", "group_a", "group_b"])
+    bait_matrices = {b: mat.loc[mat["bait"] == b, features].astype(float) for b in bait_order}
+
     global_rows: List[Dict[str, object]] = []
     pair_rows: List[Dict[str, object]] = []
 
     for feature in features:
-        groups = [mat.loc[mat["bait"] == b, feature].to_numpy(dtype=float) for b in bait_order]
+        groups = [bait_matrices[b][feature].to_numpy() for b in bait_order]
         total_n = int(sum(len(g) for g in groups))
         k_groups = len(groups)
 
-        try:
-            h_stat, p_val = stats.kruskal(*groups)
-        except ValueError:
-            h_stat, p_val = 0.0, 1.0
+        h_stat = global_tests.at[feature, "h_stat"]
+        p_val = global_tests.at[feature, "p_value"]
 
         eta_sq = float((h_stat - k_groups + 1) / (total_n - k_groups)) if total_n > k_groups else math.nan
         if not math.isnan(eta_sq):
             eta_sq = max(0.0, eta_sq)
 
-        means = {b: float(np.mean(mat.loc[mat["bait"] == b, feature])) for b in bait_order}
+        means = {b: float(np.mean(g)) for b, g in zip(bait_order, groups)}
         dominant_bait = max(means, key=means.get)
         weakest_bait = min(means, key=means.get)
 
@@ -540,13 +506,11 @@ def test_features_across_baits(mat: pd.DataFrame, features: Iterable[str], site:
         pair_pvals: List[float] = []
         tmp_pair: List[Dict[str, object]] = []
         for a, b in itertools.combinations(bait_order, 2):
-            xa = mat.loc[mat["bait"] == a, feature].to_numpy(dtype=float)
-            xb = mat.loc[mat["bait"] == b, feature].to_numpy(dtype=float)
-            try:
-                u_stat, p_pair = stats.mannwhitneyu(xa, xb, alternative="two-sided")
-            except ValueError:
-                u_stat, p_pair = 0.0, 1.0
+            xa = bait_matrices[a][feature].to_numpy()
+            xb = bait_matrices[b][feature].to_numpy()
+            u_stat, p_pair = pair_tests.loc[(feature, a, b), ["u_stat", "p_value"]]
             delta = cliffs_delta(xa, xb)
+            _, delta_low, delta_high = cliffs_delta_ci(xa, xb)
             pair_pvals.append(float(p_pair))
             tmp_pair.append(
                 {
@@ -562,6 +526,8 @@ def test_features_across_baits(mat: pd.DataFrame, features: Iterable[str], site:
                     "u_stat": float(u_stat),
                     "p_value": float(p_pair),
                     "cliffs_delta": delta,
+                    "cliffs_delta_ci95_low": delta_low,
+                    "cliffs_delta_ci95_high": delta_high,
                 }
             )
 
@@ -591,17 +557,18 @@ def test_fish_vs_algae(mat: pd.DataFrame, features: Iterable[str], site: str, fe
     if sub.empty:
         return pd.DataFrame()
 
-    rows: List[Dict[str, object]] = []
-    for feature in features:
-        fish = sub.loc[sub["bait_type"] == "fish", feature].to_numpy(dtype=float)
-        algae = sub.loc[sub["bait_type"] == "algae", feature].to_numpy(dtype=float)
-        if len(fish) == 0 or len(algae) == 0:
-            continue
+    features = list(features)
+    fish_matrix = sub.loc[sub["bait_type"] == "fish", features].to_numpy(dtype=float)
+    algae_matrix = sub.loc[sub["bait_type"] == "algae", features].to_numpy(dtype=float)
+    if len(fish_matrix) == 0 or len(algae_matrix) == 0:
+        return pd.DataFrame()
+    u_stats, p_vals = mann_whitney_columns(fish_matrix, algae_matrix, alternative="two-sided")
 
-        try:
-            u_stat, p_val = stats.mannwhitneyu(fish, algae, alternative="two-sided")
-        except ValueError:
-            u_stat, p_val = 0.0, 1.0
+    rows: List[Dict[str, object]] = []
+    for i, feature in enumerate(features):
+        fish = fish_matrix[:, i]
+        algae = algae_matrix[:, i]
+        u_stat, p_val = u_stats[i], p_vals[i]
 
         rows.append(
             {
@@ -772,13 +739,16 @@ def write_summary_report(
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    video_rows: List[Dict[str, object]] = []
     source_files = sorted(CUT_ROOT.glob("*.csv")) + sorted(NURSERY_CUT_ROOT.glob("*.csv"))
+    target_files = []
     for csv_path in source_files:
         date, site, _ = parse_video_metadata(csv_path.name)
         if not date or site not in TARGET_SITES:
             continue
-        video_rows.append(load_video_features(csv_path))
+        target_files.append(csv_path)
+    # Speicher einmal im Elternprozess lesen, Worker bekommen nur ihr Video
+    video_frames = read_video_csvs(target_files)
+    video_rows: List[Dict[str, object]] = map_videos(load_video_features, target_files, video_frames)
 
     videos = pd.DataFrame(video_rows)
     if videos.empty:
@@ -24,6 +24,11 @@ import pandas as pd
 from scipy import stats
 import matplotlib.pyplot as plt
 
+from annotation_store import read_video_csv
+from indicator_species import indicator_test
+from multiple_testing import bh_adjust
+from restricted_permutation import restricted_permutation_test, within_strata_permutations
+
 ROOT = Path(__file__).resolve().parents[1]
 SCRIPT_DIR = ROOT / "scripts"
 if str(SCRIPT_DIR) not in sys.path:
@@ -42,7 +47,7 @@ TARGET_SITES = ["milimani", "utumbi"]
 TARGET_BAIT_TYPES = {"fish", "algae"}
 FEATURE_TYPES = ["diet", "word_group", "family", "genus", "unspecific", "composite_group"]
 ALPHA = 0.05
-N_PERM = 299
+N_PERM = 9999
 MIN_PRESENT = 3
 MIN_PER_SITE = 2
 DUMMY_SITE = "utumbi"
@@ -101,7 +106,7 @@ def build_video_table_for_dataset(
         if site not in site_set or bait not in bait_set:
             continue
 
-        raw = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+        raw = read_video_csv(csv_path)
         behavior_tokens = {"1", "true", "t", "yes", "y", "feeding", "interested"}
         feeding_marked = raw.get("feeding", "").astype(str).str.strip().str.lower().isin(behavior_tokens)
         interested_marked = raw.get("interested", "").astype(str).str.strip().str.lower().isin(behavior_tokens)
@@ -194,67 +199,53 @@ def ols_fit(y: np.ndarray, x: np.ndarray) -> Tuple[np.ndarray, float, float]:
     return beta, ss_res, r2
 
 
-def permute_bait_within_site(site: np.ndarray, bait: np.ndarray, rng: np.random.Generator) -> np.ndarray:
-    permuted = bait.copy()
-    for current_site in np.unique(site):
-        idx = np.where(site == current_site)[0]
-        shuffled = permuted[idx].copy()
-        rng.shuffle(shuffled)
-        permuted[idx] = shuffled
-    return permuted
-
-
-def permutation_model(feature_df: pd.DataFrame, feature: str, n_perm: int = N_PERM) -> Dict[str, object]:
+def permutation_models(
+    feature_df: pd.DataFrame,
+    features: Sequence[str],
+    n_perm: int = N_PERM,
+) -> List[Dict[str, object]]:
+    """Site-adjustiertes Modell je Feature; alle Features teilen dieselben Permutationen."""
+    if not features:
+        return []
     site = feature_df["site"].to_numpy()
     bait = feature_df["bait_type"].to_numpy()
-    y = np.log1p(feature_df[feature].to_numpy(dtype=float))
+    y_all = np.log1p(feature_df[list(features)].to_numpy(dtype=float))
     x = design_matrix(site, bait)
-    beta_obs, ss_res, r2 = ols_fit(y, x)
-
-    rng = np.random.default_rng(42)
-    perm_bait = []
-    perm_inter = []
-    for _ in range(n_perm):
-        bait_perm = permute_bait_within_site(site, bait, rng)
-        x_perm = design_matrix(site, bait_perm)
-        beta_perm, _, _ = ols_fit(y, x_perm)
-        perm_bait.append(abs(beta_perm[1]))
-        perm_inter.append(abs(beta_perm[3]))
-
-    bait_p = (1 + int(np.sum(np.asarray(perm_bait) >= abs(beta_obs[1])))) / (n_perm + 1)
-    inter_p = (1 + int(np.sum(np.asarray(perm_inter) >= abs(beta_obs[3])))) / (n_perm + 1)
-    return {
-        "feature": feature,
-        "n_videos": int(len(feature_df)),
-        "n_fish": int(np.sum(bait == "fish")),
-        "n_algae": int(np.sum(bait == "algae")),
-        "mean_fish": float(feature_df.loc[feature_df["bait_type"] == "fish", feature].mean()),
-        "mean_algae": float(feature_df.loc[feature_df["bait_type"] == "algae", feature].mean()),
-        "beta_bait_fish_vs_algae": float(beta_obs[1]),
-        "beta_site_utumbi": float(beta_obs[2]),
-        "beta_interaction": float(beta_obs[3]),
-        "p_perm_bait": float(bait_p),
-        "p_perm_interaction": float(inter_p),
-        "r2": float(r2),
-        "direction": "fish" if beta_obs[1] > 0 else "algae",
-    }
-
-
-def bh_adjust(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted = np.zeros(m)
-    temp = np.zeros(m)
-    for rank, idx in enumerate(order, start=1):
-        temp[rank - 1] = p_values[idx] * m / rank
-    for i in range(m - 2, -1, -1):
-        temp[i] = min(temp[i], temp[i + 1])
-    temp = np.clip(temp, 0.0, 1.0)
-    for rank, idx in enumerate(order):
-        adjusted[idx] = temp[rank]
-    return adjusted.tolist()
+
+    # feste Spalten: Achsenabschnitt, Standort; permutiert: Bait und Bait x Standort
+    site_ind = x[:, 2]
+    perm = restricted_permutation_test(
+        y_all,
+        fixed=x[:, [0, 2]],
+        weights=np.column_stack([np.ones(len(site_ind)), site_ind]),
+        x=x[:, 1],
+        strata=site,
+        tests={"bait": ("abs_beta", 0), "interaction": ("abs_beta", 1)},
+        n_perm=n_perm,
+        rng=42,
+    )
+
+    rows: List[Dict[str, object]] = []
+    for j, feature in enumerate(features):
+        beta_obs, _, r2 = ols_fit(y_all[:, j], x)
+        rows.append(
+            {
+                "feature": feature,
+                "n_videos": int(len(feature_df)),
+                "n_fish": int(np.sum(bait == "fish")),
+                "n_algae": int(np.sum(bait == "algae")),
+                "mean_fish": float(feature_df.loc[feature_df["bait_type"] == "fish", feature].mean()),
+                "mean_algae": float(feature_df.loc[feature_df["bait_type"] == "algae", feature].mean()),
+                "beta_bait_fish_vs_algae": float(beta_obs[1]),
+                "beta_site_utumbi": float(beta_obs[2]),
+                "beta_interaction": float(beta_obs[3]),
+                "p_perm_bait": float(perm["bait"]["p_value"][j]),
+                "p_perm_interaction": float(perm["interaction"]["p_value"][j]),
+                "r2": float(r2),
+                "direction": "fish" if beta_obs[1] > 0 else "algae",
+            }
+        )
+    return rows
 
 
 def write_markdown_table(df: pd.DataFrame, path: Path, title: str) -> None:
@@ -281,7 +272,7 @@ def run_model_analysis(videos: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame
         mat = build_matrix(videos, feature_type, features)
         if mat.empty:
             continue
-        type_rows = [permutation_model(mat, feature) for feature in features]
+        type_rows = permutation_models(mat, features)
         df = pd.DataFrame(type_rows)
         df["feature_type"] = feature_type
         df["p_bh_bait"] = bh_adjust(df["p_perm_bait"].tolist())
@@ -325,7 +316,7 @@ def run_model_analysis(videos: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame
     lines.append("")
     lines.append("Modell: log1p(MaxN) ~ bait_type + site + bait_type:site")
     lines.append("")
-    lines.append("Permutationstest: Bait-Labels innerhalb der Standorte geshuffelt (299 Permutationen).")
+    lines.append(f"Permutationstest: Bait-Labels innerhalb der Standorte geshuffelt ({N_PERM} Permutationen).")
     lines.append("")
     if overview.empty:
         lines.append("Keine Modellresultate.")
@@ -347,61 +338,37 @@ def run_model_analysis(videos: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame
     return combined, overview
 
 
-def indicator_score(feature_df: pd.DataFrame, feature: str, side: str) -> Tuple[float, float, float, float, float]:
-    sub = feature_df.copy()
-    y = sub[feature].to_numpy(dtype=float)
-    mask = sub["bait_type"] == side
-    other = sub["bait_type"] != side
-    mean_side = float(np.mean(y[mask])) if np.any(mask) else 0.0
-    mean_other = float(np.mean(y[other])) if np.any(other) else 0.0
-    specificity = mean_side / (mean_side + mean_other) if (mean_side + mean_other) > 0 else 0.0
-    fidelity = float(np.mean(y[mask] > 0)) if np.any(mask) else 0.0
-    score = 100.0 * specificity * fidelity
-    return score, specificity, fidelity, mean_side, mean_other
-
-
-def permutation_indicator(feature_df: pd.DataFrame, feature: str, n_perm: int = N_PERM) -> Dict[str, object]:
-    site = feature_df["site"].to_numpy()
-    bait = feature_df["bait_type"].to_numpy()
-    scores = {}
-    for side in ["fish", "algae"]:
-        score, spec, fid, mean_side, mean_other = indicator_score(feature_df, feature, side)
-        scores[side] = {
-            "score": score,
-            "specificity": spec,
-            "fidelity": fid,
-            "mean_side": mean_side,
-            "mean_other": mean_other,
-        }
-    best_side = max(scores, key=lambda s: scores[s]["score"])
-    best_obs = scores[best_side]["score"]
-
-    rng = np.random.default_rng(123)
-    perm_scores = []
-    for _ in range(n_perm):
-        bait_perm = permute_bait_within_site(site, bait, rng)
-        perm_df = feature_df.copy()
-        perm_df["bait_type"] = bait_perm
-        perm_best = max(
-            indicator_score(perm_df, feature, "fish")[0],
-            indicator_score(perm_df, feature, "algae")[0],
-        )
-        perm_scores.append(perm_best)
-    p_perm = (1 + int(np.sum(np.asarray(perm_scores) >= best_obs))) / (n_perm + 1)
-    return {
-        "feature": feature,
-        "best_side": best_side,
-        "indval": float(best_obs),
-        "p_perm": float(p_perm),
-        "fish_score": float(scores["fish"]["score"]),
-        "algae_score": float(scores["algae"]["score"]),
-        "fish_specificity": float(scores["fish"]["specificity"]),
-        "algae_specificity": float(scores["algae"]["specificity"]),
-        "fish_fidelity": float(scores["fish"]["fidelity"]),
-        "algae_fidelity": float(scores["algae"]["fidelity"]),
-        "mean_fish": float(scores["fish"]["mean_side"]),
-        "mean_algae": float(scores["algae"]["mean_side"]),
-    }
+def permutation_indicators(
+    feature_df: pd.DataFrame,
+    features: Sequence[str],
+    n_perm: int = N_PERM,
+) -> pd.DataFrame:
+    """Fish-vs-Algae-IndVal je Feature; Bait-Typ innerhalb der Standorte permutiert."""
+    perm = within_strata_permutations(feature_df["site"].to_numpy(), n_perm, rng=123)
+    res = indicator_test(
+        feature_df[list(features)].to_numpy(dtype=float),
+        feature_df["bait_type"].to_numpy(),
+        perm,
+        groups=["fish", "algae"],
+        features=features,
+    )
+    res = res.rename(columns={"best_group": "best_side"})
+    return res[
+        [
+            "feature",
+            "best_side",
+            "indval",
+            "p_perm",
+            "fish_score",
+            "algae_score",
+            "fish_specificity",
+            "algae_specificity",
+            "fish_fidelity",
+            "algae_fidelity",
+            "mean_fish",
+            "mean_algae",
+        ]
+    ]
 
 
 def run_indicator_analysis(videos: pd.DataFrame) -> pd.DataFrame:
@@ -419,8 +386,7 @@ def run_indicator_analysis(videos: pd.DataFrame) -> pd.DataFrame:
         mat = build_matrix(videos, feature_type, features)
         if mat.empty:
             continue
-        type_rows = [permutation_indicator(mat, feature) for feature in features]
-        df = pd.DataFrame(type_rows)
+        df = permutation_indicators(mat, features)
         df["feature_type"] = feature_type
         df["p_bh"] = bh_adjust(df["p_perm"].tolist())
         df["sig_bh"] = df["p_bh"] < ALPHA
@@ -465,7 +431,7 @@ def run_indicator_analysis(videos: pd.DataFrame) -> pd.DataFrame:
     lines: List[str] = []
     lines.append("# Indikator-/Permutationstest fuer robuste Koedergruppen")
     lines.append("")
-    lines.append("Permutation: Bait-Labels innerhalb der Standorte geshuffelt (299 Permutationen).")
+    lines.append(f"Permutation: Bait-Labels innerhalb der Standorte geshuffelt ({N_PERM} Permutationen).")
     lines.append("")
     if summary.empty:
         lines.append("Keine Indicator-Resultate.")
@@ -487,6 +453,74 @@ def run_indicator_analysis(videos: pd.DataFrame) -> pd.DataFrame:
     return combined
 
 
+def run_bait_indicator_analysis(videos: pd.DataFrame) -> pd.DataFrame:
+    """IndVal je einzelnem Koeder innerhalb jedes Standorts (alle Feature-Typen)."""
+    INDICATOR_OUT.mkdir(parents=True, exist_ok=True)
+    rows: List[pd.DataFrame] = []
+
+    for site in sorted(videos["site"].unique()):
+        site_videos = videos[videos["site"] == site].reset_index(drop=True)
+        baits = sorted(site_videos["bait"].unique())
+        if len(baits) < 2:
+            continue
+        # innerhalb eines Standorts frei permutiert (ein Stratum)
+        perm = within_strata_permutations(site_videos["site"].to_numpy(), N_PERM, rng=123)
+        for feature_type in FEATURE_TYPES:
+            features = get_feature_list(site_videos, feature_type, required_sites=[site])
+            if not features:
+                continue
+            mat = build_matrix(site_videos, feature_type, features)
+            res = indicator_test(
+                mat[features].to_numpy(dtype=float),
+                mat["bait"].to_numpy(),
+                perm,
+                groups=baits,
+                features=features,
+            )
+            res["specificity"] = [row[f"{row['best_group']}_specificity"] for _, row in res.iterrows()]
+            res["fidelity"] = [row[f"{row['best_group']}_fidelity"] for _, row in res.iterrows()]
+            res = res[["feature", "best_group", "indval", "specificity", "fidelity", "p_perm"]].rename(
+                columns={"best_group": "best_bait"}
+            )
+            res.insert(0, "feature_type", feature_type)
+            res.insert(0, "site", site)
+            res["n_videos"] = int(len(site_videos))
+            res["n_baits"] = int(len(baits))
+            res["p_bh"] = bh_adjust(res["p_perm"].tolist())
+            res["sig_bh"] = res["p_bh"] < ALPHA
+            rows.append(res)
+
+    combined = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+    if not combined.empty:
+        combined = combined.sort_values(["site", "feature_type", "p_perm", "indval"], ascending=[True, True, True, False])
+        combined = combined.reset_index(drop=True)
+    combined.to_csv(INDICATOR_OUT / "bait_indicator_by_site.csv", index=False)
+
+    lines: List[str] = []
+    lines.append("# Indikatorgruppen je Koeder und Standort")
+    lines.append("")
+    lines.append(f"IndVal ueber alle Koeder eines Standorts; Koeder-Labels innerhalb des Standorts permutiert ({N_PERM} Permutationen), BH je Standort und Feature-Typ.")
+    lines.append("")
+    if combined.empty:
+        lines.append("Keine Daten.")
+    else:
+        for site, part in combined.groupby("site", sort=True):
+            lines.append(f"## {site}")
+            cols = ["feature_type", "feature", "best_bait", "indval", "specificity", "fidelity", "p_perm", "p_bh"]
+            sig = part[part["sig_bh"]]
+            if sig.empty:
+                lines.append("Keine BH-signifikanten Indikatorgruppen.")
+            else:
+                lines.append(sig.sort_values(["best_bait", "indval"], ascending=[True, False])[cols].to_markdown(index=False))
+            lines.append("")
+            lines.append("Top-5 je Koeder (explorativ):")
+            top = part.sort_values(["best_bait", "indval"], ascending=[True, False]).groupby("best_bait", sort=True).head(5)
+            lines.append(top[cols].to_markdown(index=False))
+            lines.append("")
+    (INDICATOR_OUT / "bait_indicator_by_site.md").write_text("\n".join(lines), encoding="utf-8")
+    return combined
+
+
 def apply_filters(
     videos: pd.DataFrame,
     remove_dominant: bool,
@@ -555,7 +589,7 @@ def run_sensitivity_analysis(
             mat = build_matrix(filt_videos, feature_type, feats)
             if mat.empty:
                 continue
-            rows = [permutation_model(mat, feature) for feature in feats]
+            rows = permutation_models(mat, feats)
             df = pd.DataFrame(rows)
             df["feature_type"] = feature_type
             df["p_bh_bait"] = bh_adjust(df["p_perm_bait"].tolist())
@@ -637,6 +671,7 @@ def main() -> None:
 
     # Zusaetzlich: identischer Sensitivitaetslauf fuer den Standort Nursery.
     nursery_videos = build_video_table_nursery()
+    run_bait_indicator_analysis(pd.concat([videos, nursery_videos], ignore_index=True))
     run_sensitivity_analysis(
         nursery_videos,
         out_dir=NURSERY_SENS_OUT,
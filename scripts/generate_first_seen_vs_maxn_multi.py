@@ -9,6 +9,10 @@ from collections import defaultdict
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 import numpy as np
+import pandas as pd
+
+from arrival_times import earliest_by_key
+from maxn_curves import running_maxn_steps
 
 # Konfiguration
 CORAL_REEF_DIR = "Annotation_reports_coral_reef"
@@ -73,9 +77,9 @@ def find_best_videos():
     return best_videos
 
 def analyze_video(csv_path):
-    """Analysiert Video für First Seen und MaxN"""
-    first_seen = {}
-    annotations_by_species_time = defaultdict(list)
+    """Analysiert Video für First Seen (früheste Zeit je Art) und MaxN"""
+    frame_times = []
+    species_keys = []
     
     try:
         with open(csv_path, 'r', encoding='utf-8') as f:
@@ -95,26 +99,25 @@ def analyze_video(csv_path):
                 
                 species_key = f"{family}|{label_name}"
                 
-                if species_key not in first_seen:
-                    first_seen[species_key] = frame_time
-                
-                frame_rounded = round(frame_time, 2)
-                annotations_by_species_time[(species_key, frame_rounded)].append(row)
+                frame_times.append(frame_time)
+                species_keys.append(species_key)
         
     except Exception as e:
         print(f"Fehler beim Lesen: {e}")
         return None, None
     
-    maxn_data = {}
-    
-    for (species_key, frame_time), annotations in annotations_by_species_time.items():
-        count = len(annotations)
-        
-        if species_key not in maxn_data or count > maxn_data[species_key]['count']:
-            maxn_data[species_key] = {
-                'count': count,
-                'time': frame_time
-            }
+    earliest = earliest_by_key(np.array(frame_times, dtype=float), np.array(species_keys, dtype=object))
+    first_seen = dict(zip(earliest['key'], earliest['time'].astype(float)))
+
+    # Laufendes MaxN je Art; die letzte Stufe ist MaxN mit frühester Zeit
+    codes, species = pd.factorize(np.array(species_keys, dtype=object))
+    frame_rounded = np.array([round(t, 2) for t in frame_times], dtype=float)
+    offsets, taxon, times, maxn = running_maxn_steps(np.zeros(len(codes), dtype=int), codes, frame_rounded, 1)
+    final_step = len(taxon) - 1 - np.unique(taxon[::-1], return_index=True)[1]
+    maxn_data = {
+        species[taxon[i]]: {'count': int(maxn[i]), 'time': float(times[i])}
+        for i in sorted(final_step)
+    }
     
     return first_seen, maxn_data
 
@@ -13,15 +13,18 @@ Ausgabe:
 
 from __future__ import annotations
 
-import math
 import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv
+from effect_sizes import cliffs_delta
+from multiple_testing import holm_adjust
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -84,7 +87,7 @@ def extract_family(row: pd.Series) -> str | None:
 
 def load_video_feeding(csv_path: Path) -> Dict[str, object]:
     """Lade Feeding-Daten für Herbivore aus CSV."""
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
     feeding_count = 0
     total_herbivore_entries = 0
@@ -109,22 +112,6 @@ def load_video_feeding(csv_path: Path) -> Dict[str, object]:
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
 def load_all_videos(site: str) -> pd.DataFrame:
     """Lade alle Video-Daten für einen Standort."""
     if site == "nursery":
@@ -189,10 +176,7 @@ def analyze_site(site: str) -> Dict[str, object]:
     stat, pval = stats.mannwhitneyu(algae_arr, fish_arr, alternative="greater")
 
     # Effektgröße (Cliffs Delta)
-    total = len(algae_arr) * len(fish_arr)
-    gt = sum(1 for a in algae_arr for f in fish_arr if a > f)
-    lt = sum(1 for a in algae_arr for f in fish_arr if a < f)
-    cliff_d = (gt - lt) / total if total > 0 else math.nan
+    cliff_d = cliffs_delta(algae_arr, fish_arr)
 
     result = {
         "site": site,
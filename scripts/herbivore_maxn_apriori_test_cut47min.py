@@ -20,15 +20,17 @@ Ausgabe:
 
 from __future__ import annotations
 
-import math
-import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy import stats
 
+from effect_sizes import cliffs_delta
+from maxn_engine import maxn_by_video
+from multiple_testing import holm_adjust
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -62,24 +64,6 @@ FAMILY_COMMON_NAMES = {
 }
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    if text in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}:
-        return False
-    return True
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -89,44 +73,10 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def parse_frame_time(frame_value: object) -> float | None:
-    text = clean_text(frame_value)
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def load_video_herbivore_maxn(csv_path: Path) -> Dict[str, object]:
+def load_video_herbivore_maxn(csv_path: Path, family_maxn: Dict[str, Dict[str, int]]) -> Dict[str, object]:
     """Lade MaxN für Herbivore (alle Familien zusammen)."""
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-
-    counts: Dict[Tuple[str, float], int] = {}
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-
-        family = clean_text(row.get("family", "")).lower()
-        if family not in HERBIVORE_CORE_FAMILIES:
-            continue
-
-        frame_time = parse_frame_time(row.get("frames", ""))
-        if frame_time is None:
-            continue
-
-        key = (family, frame_time)
-        counts[key] = counts.get(key, 0) + 1
-
-    # Aggregiere MaxN pro Familie
-    maxn_by_family: Dict[str, int] = {}
-    for (family, _), n in counts.items():
-        if family not in maxn_by_family or n > maxn_by_family[family]:
-            maxn_by_family[family] = int(n)
+    video_maxn = family_maxn.get(csv_path.name, {})
+    maxn_by_family = {family: n for family, n in video_maxn.items() if family in HERBIVORE_CORE_FAMILIES}
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
@@ -138,31 +88,6 @@ def load_video_herbivore_maxn(csv_path: Path) -> Dict[str, object]:
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = sum(1 for xi in x for yi in y if xi > yi)
-    lt = sum(1 for xi in x for yi in y if xi < yi)
-    return float((gt - lt) / total)
-
-
 def load_all_videos(site: str) -> pd.DataFrame:
     """Lade alle Video-Daten für einen Standort."""
     if site == "nursery":
@@ -174,12 +99,13 @@ def load_all_videos(site: str) -> pd.DataFrame:
         return pd.DataFrame()
 
     video_files = sorted([f for f in video_dir.glob("*.csv") if "-" in f.name])
+    family_maxn = maxn_by_video(level="family", behaviour="exclude")
     video_data = []
 
     for csv_file in video_files:
         _, standort, koeder = parse_video_metadata(csv_file.name)
         if standort.lower() == site.lower():
-            meta = load_video_herbivore_maxn(csv_file)
+            meta = load_video_herbivore_maxn(csv_file, family_maxn)
             if meta["maxn_by_family"]:
                 video_data.append(meta)
 
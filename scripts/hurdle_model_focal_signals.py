@@ -2,10 +2,8 @@
 from __future__ import annotations
 
 import math
-import re
 import warnings
 from pathlib import Path
-from typing import Iterable, List
 
 import matplotlib
 matplotlib.use("Agg")
@@ -14,9 +12,12 @@ import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 from scipy import stats
-from statsmodels.tools.sm_exceptions import PerfectSeparationError
 
-warnings.filterwarnings("ignore", category=sm.tools.sm_exceptions.PerfectSeparationWarning)
+from annotation_store import load_video_table
+from bootstrap_engine import bootstrap_two_sample
+from maxn_engine import compute_maxn_matrix, maxn_by_video
+from multiple_testing import bh_adjust
+from presence_models import presence_models
 
 ROOT = Path(__file__).resolve().parents[1]
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
@@ -25,6 +26,9 @@ NURSERY_DIR = CUT_ROOT / "Annotation_reports_Nursery"
 OUT_DIR = ROOT / "results" / "hurdle_model"
 FIG_DIR = ROOT / "results" / "ergaenzende_statistische_grafiken"
 
+# Standorte fuer den Lauf ueber alle nachgewiesenen Familien
+ALL_FAMILY_SITES = ["nursery", "milimani", "utumbi"]
+
 BAIT_MAP = {
     "mackerel": "fish",
     "fischmix": "fish",
@@ -90,41 +94,6 @@ def parse_video_metadata(filename: str) -> tuple[str, str, str]:
     return date, site.lower(), bait.lower()
 
 
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    return text not in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}
-
-
-def parse_frame_time(frame_value: object) -> float | None:
-    text = str(frame_value).strip()
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def bh_adjust(pvals: Iterable[float]) -> List[float]:
-    vals = np.asarray(list(pvals), dtype=float)
-    m = len(vals)
-    if m == 0:
-        return []
-    order = np.argsort(vals)
-    adjusted = np.empty(m, dtype=float)
-    ranked = vals[order]
-    tmp = ranked * m / np.arange(1, m + 1)
-    tmp = np.minimum.accumulate(tmp[::-1])[::-1]
-    tmp = np.clip(tmp, 0.0, 1.0)
-    adjusted[order] = tmp
-    return adjusted.tolist()
-
-
 def one_sided_p_from_z(z_value: float, expected_direction: str) -> float:
     if expected_direction == "algae > fish":
         return 1.0 - stats.norm.cdf(z_value)
@@ -132,21 +101,15 @@ def one_sided_p_from_z(z_value: float, expected_direction: str) -> float:
 
 
 def bootstrap_ci_median_diff(algae_vals: np.ndarray, fish_vals: np.ndarray, n_boot: int = 4000) -> tuple[float, float]:
-    if len(algae_vals) == 0 or len(fish_vals) == 0:
-        return (np.nan, np.nan)
-    rng = np.random.default_rng(20260813)
-    diffs = []
-    for _ in range(n_boot):
-        a = rng.choice(algae_vals, size=len(algae_vals), replace=True)
-        f = rng.choice(fish_vals, size=len(fish_vals), replace=True)
-        diffs.append(float(np.median(a) - np.median(f)))
-    return (float(np.percentile(diffs, 2.5)), float(np.percentile(diffs, 97.5)))
+    cis = bootstrap_two_sample(algae_vals, fish_vals, n_boot=n_boot, rng=20260813, statistics=("median_diff",))
+    return (cis["median_diff"]["low"], cis["median_diff"]["high"])
 
 
 def maxn_per_video(target: dict) -> pd.DataFrame:
     family = target["family"]
     sites = set(target["sites"])
     rows = []
+    family_maxn = maxn_by_video(level="family", behaviour="exclude")
     files = list(CORAL_REEF_DIR.glob("*.csv")) + list(NURSERY_DIR.glob("*.csv"))
     for csv_path in sorted(files):
         _, site, bait = parse_video_metadata(csv_path.name)
@@ -156,20 +119,7 @@ def maxn_per_video(target: dict) -> pd.DataFrame:
         if bait_type not in {"algae", "fish"}:
             continue
 
-        df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-        counts: dict[tuple[str, float], int] = {}
-        for _, row in df.iterrows():
-            if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-                continue
-            fam = str(row.get("family", "")).strip().lower()
-            if fam != family:
-                continue
-            frame_time = parse_frame_time(row.get("frames", ""))
-            if frame_time is None:
-                continue
-            counts[(fam, frame_time)] = counts.get((fam, frame_time), 0) + 1
-
-        maxn = max(counts.values()) if counts else 0
+        maxn = family_maxn.get(csv_path.name, {}).get(family, 0)
         rows.append(
             {
                 "signal": target["signal"],
@@ -186,55 +136,24 @@ def maxn_per_video(target: dict) -> pd.DataFrame:
 
 
 def fit_presence_model(df: pd.DataFrame, expected_direction: str) -> dict:
-    y = (df["maxn"] > 0).astype(int)
-    X = sm.add_constant(df[["bait_is_algae"]], has_constant="add")
-    out = {
-        "presence_coef": np.nan,
-        "presence_or": np.nan,
-        "presence_ci_low": np.nan,
-        "presence_ci_high": np.nan,
-        "presence_p_one_sided": np.nan,
-        "presence_p_two_sided": np.nan,
-        "presence_method": "glm_binomial",
+    y = (df["maxn"] > 0).astype(int).to_numpy()
+    X = sm.add_constant(df[["bait_is_algae"]], has_constant="add").to_numpy(dtype=float)
+    fit = presence_models(X, y[:, None]).iloc[0]
+    z_value = float(fit["z"])
+    if fit["method"] == "no_variation":
+        p_one_sided = 1.0
+    else:
+        p_one_sided = float(one_sided_p_from_z(z_value, expected_direction)) if np.isfinite(z_value) else np.nan
+    return {
+        "presence_coef": float(fit["coef"]),
+        "presence_or": float(math.exp(fit["coef"])),
+        "presence_ci_low": float(math.exp(fit["ci_low"])),
+        "presence_ci_high": float(math.exp(fit["ci_high"])),
+        "presence_p_one_sided": p_one_sided,
+        "presence_p_two_sided": float(fit["p_two_sided"]),
+        "presence_method": fit["method"],
     }
 
-    try:
-        fit = sm.GLM(y, X, family=sm.families.Binomial()).fit()
-        coef = float(fit.params["bait_is_algae"])
-        se = float(fit.bse["bait_is_algae"])
-        z_value = coef / se if se > 0 else np.nan
-        ci = fit.conf_int().loc["bait_is_algae"].to_numpy(dtype=float)
-
-        # With near-perfect separation, OR CI can explode and become numerically unstable.
-        if (not np.isfinite(coef)) or (not np.isfinite(ci).all()) or max(abs(ci[0]), abs(ci[1]), abs(coef)) > 20:
-            raise ValueError("unstable logistic estimate")
-
-        out.update(
-            {
-                "presence_coef": coef,
-                "presence_or": float(math.exp(coef)),
-                "presence_ci_low": float(math.exp(ci[0])),
-                "presence_ci_high": float(math.exp(ci[1])),
-                "presence_p_one_sided": float(one_sided_p_from_z(z_value, expected_direction)) if np.isfinite(z_value) else np.nan,
-                "presence_p_two_sided": float(fit.pvalues["bait_is_algae"]),
-            }
-        )
-    except (PerfectSeparationError, np.linalg.LinAlgError, ValueError, OverflowError):
-        algae = (df.loc[df["bait_type"] == "algae", "maxn"] > 0).astype(int)
-        fish = (df.loc[df["bait_type"] == "fish", "maxn"] > 0).astype(int)
-        table = np.array(
-            [
-                [int(algae.sum()), int(len(algae) - algae.sum())],
-                [int(fish.sum()), int(len(fish) - fish.sum())],
-            ],
-            dtype=int,
-        )
-        alt = "greater" if expected_direction == "algae > fish" else "less"
-        out["presence_p_one_sided"] = float(stats.fisher_exact(table, alternative=alt).pvalue)
-        out["presence_method"] = "fisher_fallback"
-
-    return out
-
 
 def fit_positive_intensity_model(df: pd.DataFrame, expected_direction: str) -> dict:
     pos = df[df["maxn"] > 0].copy()
@@ -287,6 +206,109 @@ def fit_positive_intensity_model(df: pd.DataFrame, expected_direction: str) -> d
     return out
 
 
+def positive_intensity_columns(maxn: np.ndarray, is_algae: np.ndarray) -> dict:
+    """
+    Intensitaetsteil (OLS-HC3 auf log1p(MaxN) der positiven Videos) fuer alle
+    Spalten von maxn (Videos x Familien) zugleich. Bei einem binaeren Regressor
+    ist der Koeffizient die Differenz der Gruppenmittel; HC3 mit h_i = 1 / n_g
+    ergibt Var = sum_g sum_i e_i^2 / (n_g - 1)^2 (wie sm.OLS(...).fit(cov_type="HC3")).
+    """
+    positive = maxn > 0
+    y = np.where(positive, np.log1p(maxn.astype(float)), np.nan)
+    coef = np.zeros(maxn.shape[1])
+    var = np.zeros(maxn.shape[1])
+    counts = {}
+    for name, mask in (("algae", is_algae), ("fish", ~is_algae)):
+        n_g = positive[mask].sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nansum(y[mask], axis=0) / n_g
+            ss = np.nansum((y[mask] - mean) ** 2, axis=0)
+            var = var + ss / (n_g - 1.0) ** 2
+        coef = coef + (mean if name == "algae" else -mean)
+        counts[name] = n_g
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se = np.sqrt(var)
+        z_value = coef / se
+    enough = (counts["algae"] >= 2) & (counts["fish"] >= 2)
+    quantile = float(stats.norm.ppf(0.975))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        medians = {
+            name: np.nanmedian(np.where(positive[mask], maxn[mask], np.nan).astype(float), axis=0)
+            for name, mask in (("algae", is_algae), ("fish", ~is_algae))
+        }
+    method = np.where(
+        (counts["algae"] == 0) | (counts["fish"] == 0),
+        "insufficient_positive_data",
+        np.where(enough, "ols_hc3", "insufficient_group_size"),
+    )
+    return {
+        "intensity_coef_log1p": np.where(enough, coef, np.nan),
+        "intensity_ci_low": np.where(enough, coef - quantile * se, np.nan),
+        "intensity_ci_high": np.where(enough, coef + quantile * se, np.nan),
+        "intensity_p_two_sided": np.where(enough & (se > 0), 2 * stats.norm.sf(np.abs(z_value)), np.nan),
+        "positive_algae_n": counts["algae"].astype(int),
+        "positive_fish_n": counts["fish"].astype(int),
+        "median_diff_positive_maxn": medians["algae"] - medians["fish"],
+        "intensity_method": method,
+    }
+
+
+def all_families_hurdle() -> pd.DataFrame:
+    """
+    Hurdle-Modell fuer jede an einem Standort nachgewiesene Familie (Algae vs
+    Fish, zweiseitig). Der Praesenzteil laeuft je Standort als ein gestapelter
+    IRLS/Firth-Fit ueber alle Familien; BH je Standort und Modellteil.
+    """
+    matrix = compute_maxn_matrix(level="family", behaviour="exclude", baits=list(BAIT_MAP))
+    videos = load_video_table().set_index("filename").loc[matrix.index]
+    frames = []
+    for site in ALL_FAMILY_SITES:
+        site_mask = (videos["standort"] == site).to_numpy()
+        sub = matrix.loc[site_mask]
+        sub = sub.loc[:, (sub > 0).any(axis=0)]
+        is_algae = (videos.loc[site_mask, "koeder"].map(BAIT_MAP) == "algae").to_numpy()
+        if sub.empty or is_algae.all() or not is_algae.any():
+            continue
+
+        maxn = sub.to_numpy()
+        present = maxn > 0
+        X = np.column_stack([np.ones(len(sub)), is_algae.astype(float)])
+        presence = presence_models(X, present.astype(float), features=list(sub.columns))
+        frame = pd.DataFrame(
+            {
+                "site": site,
+                "family": list(sub.columns),
+                "n_algae_total": int(is_algae.sum()),
+                "n_fish_total": int((~is_algae).sum()),
+                "n_algae_present": present[is_algae].sum(axis=0),
+                "n_fish_present": present[~is_algae].sum(axis=0),
+                "presence_rate_algae": present[is_algae].mean(axis=0),
+                "presence_rate_fish": present[~is_algae].mean(axis=0),
+                "presence_coef": presence["coef"].to_numpy(),
+                "presence_or": np.exp(presence["coef"].to_numpy()),
+                "presence_ci_low": np.exp(presence["ci_low"].to_numpy()),
+                "presence_ci_high": np.exp(presence["ci_high"].to_numpy()),
+                "presence_p_two_sided": presence["p_two_sided"].to_numpy(),
+                "presence_method": presence["method"].to_numpy(),
+                **positive_intensity_columns(maxn, is_algae),
+            }
+        )
+        for part in ("presence", "intensity"):
+            p_col = f"{part}_p_two_sided"
+            mask = frame[p_col].notna()
+            frame[f"{part}_q_bh"] = np.nan
+            if mask.any():
+                frame.loc[mask, f"{part}_q_bh"] = bh_adjust(frame.loc[mask, p_col].tolist())
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame()
+    out = pd.concat(frames, ignore_index=True)
+    return out.sort_values(["site", "presence_q_bh", "family"], na_position="last").reset_index(drop=True)
+
+
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     rows = []
@@ -345,7 +367,7 @@ def main() -> None:
         "# Hurdle-Modell fuer fokussierte Signale",
         "",
         "Zweistufiges Modell pro Signal:",
-        "1) Praesenzteil: GLM Binomial (logistische Regression) fuer Nachweis ja/nein.",
+        "1) Praesenzteil: GLM Binomial (logistische Regression) fuer Nachweis ja/nein; bei (quasi-)vollstaendiger Separation Firth-penalisiert mit bestraftem Likelihood-Quotienten-Test (presence_method = firth).",
         "2) Intensitaetsteil: OLS auf log1p(MaxN) nur fuer Videos mit MaxN > 0 (HC3 robuste Standardfehler).",
         "",
         "Die gerichtete Hypothese folgt der biologischen Erwartung (algae > fish bzw. fish > algae).",
@@ -370,6 +392,28 @@ def main() -> None:
             "- Konsistente Signifikanz in beiden Stufen waere der staerkste Hinweis auf einen breiten, biologisch robusten Koedereffekt.",
         ]
     )
+
+    all_families = all_families_hurdle()
+    all_families_path = OUT_DIR / "hurdle_model_all_families.csv"
+    all_families.to_csv(all_families_path, index=False)
+
+    lines.extend(
+        [
+            "",
+            "## Alle Familien je Standort",
+            "",
+            f"Dasselbe Hurdle-Modell fuer alle {len(all_families)} Standort-Familien-Kombinationen mit mindestens einem Nachweis (zweiseitig, Algae vs Fish; BH je Standort und Modellteil). Vollstaendige Tabelle: `{all_families_path.name}`.",
+            "",
+            "| site | families | firth | presence_q < 0.05 | intensity_q < 0.05 |",
+            "|:---|---:|---:|:---|:---|",
+        ]
+    )
+    for site, block in all_families.groupby("site", sort=False):
+        sig_presence = ", ".join(block.loc[block["presence_q_bh"] < 0.05, "family"]) or "-"
+        sig_intensity = ", ".join(block.loc[block["intensity_q_bh"] < 0.05, "family"]) or "-"
+        lines.append(
+            f"| {site} | {len(block)} | {int((block['presence_method'] == 'firth').sum())} | {sig_presence} | {sig_intensity} |"
+        )
     (OUT_DIR / "hurdle_model_focal_signals.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
 
     fig, axes = plt.subplots(1, 2, figsize=(12.4, 6.4), sharey=True)
@@ -385,7 +429,7 @@ def main() -> None:
             ax.hlines(i, low, high, color="#1f77b4", linewidth=2)
             ax.plot(center, i, "o", color="#1f77b4")
         else:
-            # Fisher fallback or non-estimable model
+            # non-estimable model
             ax.plot(0.0, i, "x", color="#666666")
 
     ax.axvline(0.0, color="black", linewidth=1, alpha=0.6)
@@ -417,6 +461,7 @@ def main() -> None:
     plt.close(fig)
 
     print(f"Wrote {summary_path}")
+    print(f"Wrote {all_families_path}")
     print(f"Wrote {OUT_DIR / 'hurdle_model_focal_signals.md'}")
     print(f"Wrote {FIG_DIR / '11_hurdle_model_effect_decomposition.png'}")
 
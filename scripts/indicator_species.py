@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Indikatorwerte (IndVal, Dufrene & Legendre 1997) mit Permutationstest.
+
+Fuer eine Video x Feature-Matrix und eine Gruppierung (Bait-Typ oder
+einzelner Koeder) je Gruppe k und Feature:
+
+- specificity A_k = mean_k / sum_j mean_j  (bei zwei Gruppen identisch mit
+  mean_side / (mean_side + mean_other))
+- fidelity    B_k = Anteil der Videos in k mit Wert > 0
+- indval      = 100 * A_k * B_k
+
+Die Teststatistik ist das Maximum ueber die Gruppen. Alle Features und alle
+Permutationen eines Blocks werden gemeinsam ueber Gruppensummen aus einem
+One-Hot-Produkt berechnet; die Permutationen kommen als Indexmatrix herein
+(z. B. within_strata_permutations aus restricted_permutation fuer Koeder
+innerhalb Standort).
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from restricted_permutation import count_exceedances
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _group_sums(values: np.ndarray, codes: np.ndarray, n_groups: int) -> np.ndarray:
+    # codes: (b x n) -> Summen je Gruppe (b x k x p)
+    one_hot = (codes[:, :, None] == np.arange(n_groups)).astype(float)
+    return one_hot.transpose(0, 2, 1) @ values
+
+
+def indicator_components(
+    values: np.ndarray,
+    codes: np.ndarray,
+    n_groups: int,
+) -> Dict[str, np.ndarray]:
+    """
+    specificity, fidelity, indval und Gruppenmittel je Zeile von codes.
+
+    values: (n x p); codes: (n,) oder (b x n) Gruppen-Codes 0..k-1.
+    Rueckgabe-Arrays haben die Form (b x k x p) bzw. (k x p) fuer 1-D codes.
+    """
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes)
+    single = codes.ndim == 1
+    if single:
+        codes = codes[None, :]
+
+    counts = np.stack([(codes == g).sum(axis=1) for g in range(n_groups)], axis=1).astype(float)
+    sums = _group_sums(values, codes, n_groups)
+    present = _group_sums((values > 0).astype(float), codes, n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts[:, :, None] > 0, sums / counts[:, :, None], 0.0)
+        fidelity = np.where(counts[:, :, None] > 0, present / counts[:, :, None], 0.0)
+        total = means.sum(axis=1, keepdims=True)
+        specificity = np.where(total > 0, means / total, 0.0)
+    indval = 100.0 * specificity * fidelity
+
+    out = {"specificity": specificity, "fidelity": fidelity, "indval": indval, "mean": means}
+    if single:
+        return {key: val[0] for key, val in out.items()}
+    return out
+
+
+def indicator_test(
+    values: np.ndarray,
+    labels: Sequence[object],
+    perm: np.ndarray,
+    groups: Sequence[object] | None = None,
+    features: Sequence[str] | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> pd.DataFrame:
+    """
+    IndVal-Permutationstest fuer alle Features (Spalten von values) zugleich.
+
+    perm: (n_perm x n)-Indexmatrix; die Labels werden je Zeile als labels[perm]
+    neu zugeordnet. groups legt die Gruppenreihenfolge fest (bei Gleichstand
+    gewinnt die erste Gruppe), Standard ist die sortierte Menge der Labels.
+
+    Spalten: feature, best_group, indval, p_perm sowie je Gruppe g
+    {g}_score, {g}_specificity, {g}_fidelity, mean_{g}.
+    """
+    values = np.asarray(values, dtype=float)
+    labels_arr = np.asarray(labels)
+    group_list = list(groups) if groups is not None else sorted(pd.unique(labels_arr).tolist())
+    lookup = {g: i for i, g in enumerate(group_list)}
+    codes = np.array([lookup.get(v, -1) for v in labels_arr], dtype=np.intp)
+    k = len(group_list)
+    feature_names = list(features) if features is not None else [str(i) for i in range(values.shape[1])]
+
+    obs = indicator_components(values, codes, k)
+    best_idx = np.argmax(obs["indval"], axis=0)
+    best_obs = obs["indval"].max(axis=0)
+
+    n_perm = perm.shape[0]
+    exceed = np.zeros(values.shape[1], dtype=np.int64)
+    for start in range(0, n_perm, batch_size):
+        perm_codes = codes[perm[start : start + batch_size]]
+        perm_best = indicator_components(values, perm_codes, k)["indval"].max(axis=1)
+        exceed += count_exceedances(best_obs, perm_best)
+    p_perm = (exceed + 1.0) / (n_perm + 1.0)
+
+    rows: List[Dict[str, object]] = []
+    for j, feature in enumerate(feature_names):
+        row: Dict[str, object] = {
+            "feature": feature,
+            "best_group": group_list[int(best_idx[j])],
+            "indval": float(best_obs[j]),
+            "p_perm": float(p_perm[j]),
+        }
+        for g, name in enumerate(group_list):
+            row[f"{name}_score"] = float(obs["indval"][g, j])
+            row[f"{name}_specificity"] = float(obs["specificity"][g, j])
+            row[f"{name}_fidelity"] = float(obs["fidelity"][g, j])
+            row[f"mean_{name}"] = float(obs["mean"][g, j])
+        rows.append(row)
+    return pd.DataFrame(rows)
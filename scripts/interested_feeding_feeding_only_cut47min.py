@@ -19,6 +19,10 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv
+from multiple_testing import bh_adjust, holm_adjust
+from taxonomy import taxon_keys
+
 
 ROOT = Path(__file__).resolve().parents[1]
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
@@ -39,15 +43,6 @@ def is_truthy(value: object) -> bool:
     return True
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -57,58 +52,6 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def bh_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order, start=1):
-        adjusted_ordered[i - 1] = p_values[idx] * m / i
-    for i in range(m - 2, -1, -1):
-        adjusted_ordered[i] = min(adjusted_ordered[i], adjusted_ordered[i + 1])
-    adjusted_ordered = np.clip(adjusted_ordered, 0.0, 1.0)
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
 def significance_label(p_value: float) -> str:
     if pd.isna(p_value):
         return "n/a"
@@ -145,16 +88,11 @@ def safe_kruskal(groups: List[np.ndarray]) -> Tuple[float, float]:
 
 
 def load_video_feeding(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
-    counts_by_taxon: Dict[str, int] = {}
-    for _, row in df.iterrows():
-        if not is_truthy(row.get("feeding", "")):
-            continue
-        taxon = build_taxon_key(row)
-        if not taxon:
-            continue
-        counts_by_taxon[taxon] = counts_by_taxon.get(taxon, 0) + 1
+    taxa = taxon_keys(df)
+    feeding = taxa[df["feeding"].map(is_truthy).to_numpy(dtype=bool) & (taxa != "")]
+    counts_by_taxon = {k: int(n) for k, n in pd.Series(feeding, dtype=object).value_counts(sort=False).items()}
 
     date, site, bait = parse_video_metadata(csv_path.name)
     return {
@@ -23,6 +23,11 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv
+from multiple_testing import holm_adjust
+from rank_tests import feature_rank_tests
+from taxonomy import taxon_keys
+
 
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
@@ -45,15 +50,6 @@ def is_truthy(value: object) -> bool:
     return True
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -63,41 +59,6 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
 def significance_label(p_value: float) -> str:
     if pd.isna(p_value):
         return "n/a"
@@ -117,21 +78,16 @@ def to_md(df: pd.DataFrame) -> str:
 
 
 def load_video_annotations(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-
-    counts_by_flag: Dict[str, Dict[str, int]] = {f: {} for f in FLAGS}
-    total_events: Dict[str, int] = {f: 0 for f in FLAGS}
-
-    for _, row in df.iterrows():
-        taxon = build_taxon_key(row)
-        if not taxon:
-            continue
+    df = read_video_csv(csv_path)
 
-        for flag in FLAGS:
-            if is_truthy(row.get(flag, "")):
-                total_events[flag] += 1
-                d = counts_by_flag[flag]
-                d[taxon] = d.get(taxon, 0) + 1
+    taxa = taxon_keys(df)
+    counts_by_flag: Dict[str, Dict[str, int]] = {}
+    total_events: Dict[str, int] = {}
+    for flag in FLAGS:
+        flagged = taxa[df[flag].map(is_truthy).to_numpy(dtype=bool) & (taxa != "")]
+        counts = pd.Series(flagged, dtype=object).value_counts(sort=False)
+        counts_by_flag[flag] = {k: int(n) for k, n in counts.items()}
+        total_events[flag] = int(len(flagged))
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
 
@@ -165,26 +121,24 @@ def analyze_flag_site(videos_site: pd.DataFrame, site: str, flag: str) -> Dict[s
         )
     )
 
+    taxa_matrix = pd.DataFrame(videos_site[counts_col].tolist(), columns=all_taxa).fillna(0).astype(float)
+    global_tests, pair_tests = feature_rank_tests(taxa_matrix, videos_site["koeder"].to_numpy(), group_order=bait_order)
+    global_tests = global_tests.set_index("feature")
+    pair_tests = pair_tests.set_index(["feature", "group_a", "group_b"])
+    bait_matrices = {b: taxa_matrix[(videos_site["koeder"] == b).to_numpy()] for b in bait_order}
+
     taxa_rows: List[Dict[str, object]] = []
     pairwise_rows: List[Dict[str, object]] = []
 
     for taxon in all_taxa:
-        arrays_by_bait: Dict[str, np.ndarray] = {}
-        for bait in bait_order:
-            vals = [
-                float(v.get(taxon, 0))
-                for v in videos_by_bait[bait][counts_col].tolist()
-            ]
-            arrays_by_bait[bait] = np.array(vals, dtype=float)
+        arrays_by_bait: Dict[str, np.ndarray] = {b: bait_matrices[b][taxon].to_numpy() for b in bait_order}
 
         groups = [arrays_by_bait[b] for b in bait_order]
         total_n = int(sum(len(g) for g in groups))
         n_groups = len(groups)
 
-        try:
-            h_stat, p_val = stats.kruskal(*groups)
-        except ValueError:
-            h_stat, p_val = 0.0, 1.0
+        h_stat = global_tests.at[taxon, "h_stat"]
+        p_val = global_tests.at[taxon, "p_value"]
 
         mean_by_bait = {b: float(np.mean(arrays_by_bait[b])) for b in bait_order}
         occ_by_bait = {
@@ -223,10 +177,7 @@ def analyze_flag_site(videos_site: pd.DataFrame, site: str, flag: str) -> Dict[s
         for a, b in itertools.combinations(bait_order, 2):
             xa = arrays_by_bait[a]
             xb = arrays_by_bait[b]
-            try:
-                u_stat, p = stats.mannwhitneyu(xa, xb, alternative="two-sided")
-            except ValueError:
-                u_stat, p = 0.0, 1.0
+            u_stat, p = pair_tests.loc[(taxon, a, b), ["u_stat", "p_value"]]
             p_pair.append(float(p))
             tmp_pair_rows.append(
                 {
@@ -284,10 +235,7 @@ def analyze_flag_site(videos_site: pd.DataFrame, site: str, flag: str) -> Dict[s
     for taxon in all_taxa:
         present_baits: List[str] = []
         for bait in bait_order:
-            arr = np.array(
-                [float(v.get(taxon, 0)) for v in videos_by_bait[bait][counts_col].tolist()],
-                dtype=float,
-            )
+            arr = bait_matrices[bait][taxon].to_numpy()
             if float(np.sum(arr)) > 0:
                 present_baits.append(bait)
         if len(present_baits) == 1:
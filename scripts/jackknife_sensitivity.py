@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Jackknife-Sensitivitaet fuer Mann-Whitney-U und Cliff's delta.
+
+Ein Auslassungsmuster ist eine Zeile einer booleschen (m x n)-Matrix ueber
+die gemeinsame Stichprobe (erst x, dann y; True = ausgelassen):
+
+- leave_one_out_masks: jedes Video einzeln
+- leave_k_out_masks: alle k-Teilmengen bzw. eine Zufallsauswahl davon
+- group_out_masks: ganze Gruppen (z. B. alle Videos eines Ausbringungstags)
+
+Beide Stichproben werden einmal gemeinsam sortiert (eindeutige Werte-Stufen);
+je Muster werden nur die Haeufigkeiten je Stufe um die ausgelassenen Werte
+vermindert. Daraus folgen fuer alle Muster zugleich
+U = #{x > y} + 0.5 #{x = y} ueber kumulierte Summen, die Bindungskorrektur
+sum(t^3 - t) und Cliff's delta = 2 U / (n_x n_y) - 1.
+
+p-Werte wie scipy.stats.mannwhitneyu (method="auto"): Normalapproximation mit
+Bindungs- und Stetigkeitskorrektur (rank_tests.mann_whitney_pvalue); Muster
+ohne Bindungen, bei denen eine Stichprobe hoechstens 8 Werte hat, rechnet
+scipy exakt (wird durchgereicht).
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import stats
+
+from rank_tests import ALTERNATIVES, EXACT_MAX_N, mann_whitney_pvalue
+
+DEFAULT_MAX_SETS = 5000
+
+
+def _as_rng(rng: np.random.Generator | int | None) -> np.random.Generator:
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def leave_one_out_masks(n: int) -> np.ndarray:
+    """(n x n)-Maske; Zeile i laesst Wert i aus."""
+    return np.eye(n, dtype=bool)
+
+
+def leave_k_out_masks(
+    n: int,
+    k: int,
+    max_sets: int = DEFAULT_MAX_SETS,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """
+    Alle k-Teilmengen (lexikographisch), solange es hoechstens max_sets sind,
+    sonst max_sets zufaellige k-Teilmengen (Wiederholungen moeglich).
+    """
+    if k < 0 or k > n:
+        raise ValueError(f"k muss zwischen 0 und {n} liegen")
+    if math.comb(n, k) <= max_sets:
+        combos = np.array(list(itertools.combinations(range(n), k)), dtype=np.intp).reshape(-1, k)
+    else:
+        combos = _as_rng(rng).random((max_sets, n)).argsort(axis=1)[:, :k]
+    masks = np.zeros((len(combos), n), dtype=bool)
+    np.put_along_axis(masks, combos, True, axis=1)
+    return masks
+
+
+def group_out_masks(groups: Sequence[object]) -> Tuple[List[object], np.ndarray]:
+    """Ein Muster je Gruppe (sortiert); ausgelassen werden alle Werte der Gruppe."""
+    groups_arr = np.asarray(groups)
+    labels = np.unique(groups_arr)
+    return labels.tolist(), groups_arr[None, :] == labels[:, None]
+
+
+def mann_whitney_drop(
+    x: Sequence[float],
+    y: Sequence[float],
+    drop: np.ndarray,
+    alternative: str = "two-sided",
+) -> Dict[str, np.ndarray]:
+    """
+    Mann-Whitney-U (x gegen y) fuer jedes Auslassungsmuster.
+
+    Rueckgabe-Arrays je Zeile von drop: n_x, n_y, u_statistic (U von x),
+    cliffs_delta (x gegen y), p_value; NaN, wenn eine Gruppe leer bleibt.
+    """
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f"Unbekannte Alternative: {alternative}")
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    values = np.concatenate([x, y])
+    n_total = len(values)
+    drop = np.atleast_2d(np.asarray(drop, dtype=bool))
+    if drop.shape[1] != n_total:
+        raise ValueError("drop muss eine Spalte je Wert von x und y haben")
+
+    levels, codes = np.unique(values, return_inverse=True)
+    one_hot = np.zeros((n_total, len(levels)), dtype=float)
+    one_hot[np.arange(n_total), codes] = 1.0
+    keep = (~drop).astype(float)
+    # Haeufigkeiten je Stufe nach dem Auslassen (m x Stufen), ganzzahlig exakt
+    count_x = keep[:, : len(x)] @ one_hot[: len(x)]
+    count_y = keep[:, len(x) :] @ one_hot[len(x) :]
+    n_x = count_x.sum(axis=1)
+    n_y = count_y.sum(axis=1)
+
+    below_y = np.cumsum(count_y, axis=1) - count_y
+    u_x = (count_x * (below_y + 0.5 * count_y)).sum(axis=1)
+    ties = count_x + count_y
+    tie_term = (ties**3 - ties).sum(axis=1)
+
+    p_value = mann_whitney_pvalue(u_x, n_x, n_y, tie_term, alternative)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = 2.0 * u_x / (n_x * n_y) - 1.0
+
+    exact = ((n_x <= EXACT_MAX_N) | (n_y <= EXACT_MAX_N)) & (ties.max(axis=1) <= 1) & (n_x > 0) & (n_y > 0)
+    for row in np.flatnonzero(exact):
+        kept = ~drop[row]
+        p_value[row] = stats.mannwhitneyu(
+            x[kept[: len(x)]], y[kept[len(x) :]], alternative=alternative
+        ).pvalue
+
+    empty = (n_x == 0) | (n_y == 0)
+    u_x[empty] = np.nan
+    delta[empty] = np.nan
+    p_value[empty] = np.nan
+    return {
+        "n_x": n_x.astype(int),
+        "n_y": n_y.astype(int),
+        "u_statistic": u_x,
+        "cliffs_delta": delta,
+        "p_value": p_value,
+    }
@@ -18,6 +18,10 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv
+from multiple_testing import bh_adjust, holm_adjust
+from taxonomy import taxon_keys
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -66,67 +70,6 @@ def parse_frame_seconds(frame_value: object) -> float | None:
         return None
 
 
-def build_general_taxon_key(row: pd.Series) -> str:
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-    label = clean_text(row.get("label_name", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
-def build_species_key(row: pd.Series) -> str:
-    s = clean_text(row.get("species", ""))
-    return s.lower() if s else ""
-
-
-def build_family_key(row: pd.Series) -> str:
-    s = clean_text(row.get("family", ""))
-    return s.lower() if s else ""
-
-
-def holm_adjust(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_order = np.zeros(m, dtype=float)
-    for i, idx in enumerate(order):
-        adjusted_order[i] = min(1.0, (m - i) * float(p_values[idx]))
-    adjusted_order = np.maximum.accumulate(adjusted_order)
-    out = np.empty(m, dtype=float)
-    out[order] = adjusted_order
-    return out.tolist()
-
-
-def benjamini_hochberg(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    ranked = np.array([p_values[i] for i in order], dtype=float)
-    adjusted = np.empty(m, dtype=float)
-    prev = 1.0
-    for i in range(m - 1, -1, -1):
-        rank = i + 1
-        val = (ranked[i] * m) / rank
-        prev = min(prev, val)
-        adjusted[i] = min(1.0, prev)
-    out = np.empty(m, dtype=float)
-    out[order] = adjusted
-    return out.tolist()
-
-
 def significance_label(p: float) -> str:
     if pd.isna(p):
         return "n/a"
@@ -154,79 +97,59 @@ def safe_cols(df: pd.DataFrame, cols: Sequence[str]) -> pd.DataFrame:
     return df.loc[:, list(cols)].copy()
 
 
+def counts_by_key(keys: np.ndarray) -> Dict[str, int]:
+    """Anzahl Zeilen je nicht-leerem Schluessel (Reihenfolge des ersten Auftretens)."""
+    keys = keys[keys != ""]
+    if len(keys) == 0:
+        return {}
+    return {k: int(n) for k, n in pd.Series(keys).value_counts(sort=False).items()}
+
+
+def first_seen_and_maxn(keys: np.ndarray, seconds: np.ndarray) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """
+    Erste Sichtung und MaxN (gleichzeitige Annotationen zur auf 2 Stellen
+    gerundeten Zeit) je Schluessel; Zeilen ohne Zeit zaehlen nicht.
+    """
+    valid = (keys != "") & np.isfinite(seconds)
+    if not valid.any():
+        return {}, {}
+    frame = pd.DataFrame({"key": keys[valid], "sec": seconds[valid]})
+    frame["sec_round"] = [round(float(v), 2) for v in frame["sec"]]
+    first_seen = frame.groupby("key", sort=False)["sec"].min()
+    maxn = frame.groupby(["key", "sec_round"], sort=False).size().groupby(level=0, sort=False).max()
+    return (
+        {k: float(v) for k, v in first_seen.items()},
+        {k: int(v) for k, v in maxn.items()},
+    )
+
+
 def load_video_data(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
     non_behavior = df[(~df["feeding"].map(is_truthy)) & (~df["interested"].map(is_truthy))].copy()
     feeding_df = df[df["feeding"].map(is_truthy)].copy()
     interested_df = df[df["interested"].map(is_truthy)].copy()
 
-    species_counts: Dict[str, int] = {}
-    species_first_seen: Dict[str, float] = {}
-    family_first_seen: Dict[str, float] = {}
-    species_by_time: Dict[Tuple[str, float], int] = {}
-    family_by_time: Dict[Tuple[str, float], int] = {}
-
-    species_set: set[str] = set()
-    family_set: set[str] = set()
-    general_set: set[str] = set()
-    non_behavior_frames: List[float] = []
-
-    for _, row in non_behavior.iterrows():
-        sec = parse_frame_seconds(row.get("frames", ""))
-        if sec is not None:
-            non_behavior_frames.append(sec)
-
-        g_key = build_general_taxon_key(row)
-        s_key = build_species_key(row)
-        f_key = build_family_key(row)
-
-        if g_key:
-            general_set.add(g_key)
-        if s_key:
-            species_set.add(s_key)
-            species_counts[s_key] = species_counts.get(s_key, 0) + 1
-            if sec is not None and (s_key not in species_first_seen or sec < species_first_seen[s_key]):
-                species_first_seen[s_key] = sec
-            if sec is not None:
-                k = (s_key, round(sec, 2))
-                species_by_time[k] = species_by_time.get(k, 0) + 1
-        if f_key:
-            family_set.add(f_key)
-            if sec is not None and (f_key not in family_first_seen or sec < family_first_seen[f_key]):
-                family_first_seen[f_key] = sec
-            if sec is not None:
-                k = (f_key, round(sec, 2))
-                family_by_time[k] = family_by_time.get(k, 0) + 1
-
-    species_maxn: Dict[str, int] = {}
-    for (taxon, _), n in species_by_time.items():
-        species_maxn[taxon] = max(species_maxn.get(taxon, 0), int(n))
-
-    family_maxn: Dict[str, int] = {}
-    for (taxon, _), n in family_by_time.items():
-        family_maxn[taxon] = max(family_maxn.get(taxon, 0), int(n))
-
-    feeding_species: Dict[str, int] = {}
-    feeding_family: Dict[str, int] = {}
-    interested_species: Dict[str, int] = {}
-    interested_family: Dict[str, int] = {}
-
-    for _, row in feeding_df.iterrows():
-        s = build_species_key(row)
-        f = build_family_key(row)
-        if s:
-            feeding_species[s] = feeding_species.get(s, 0) + 1
-        if f:
-            feeding_family[f] = feeding_family.get(f, 0) + 1
-
-    for _, row in interested_df.iterrows():
-        s = build_species_key(row)
-        f = build_family_key(row)
-        if s:
-            interested_species[s] = interested_species.get(s, 0) + 1
-        if f:
-            interested_family[f] = interested_family.get(f, 0) + 1
+    seconds = np.array(
+        [math.nan if s is None else s for s in non_behavior["frames"].map(parse_frame_seconds)], dtype=float
+    )
+    non_behavior_frames = seconds[np.isfinite(seconds)].tolist()
+
+    general_keys = taxon_keys(non_behavior, "taxon")
+    species_keys = taxon_keys(non_behavior, "species")
+    family_keys = taxon_keys(non_behavior, "family")
+
+    general_set = set(general_keys[general_keys != ""].tolist())
+    species_counts = counts_by_key(species_keys)
+    species_set = set(species_counts)
+    family_set = set(family_keys[family_keys != ""].tolist())
+    species_first_seen, species_maxn = first_seen_and_maxn(species_keys, seconds)
+    family_first_seen, family_maxn = first_seen_and_maxn(family_keys, seconds)
+
+    feeding_species = counts_by_key(taxon_keys(feeding_df, "species"))
+    feeding_family = counts_by_key(taxon_keys(feeding_df, "family"))
+    interested_species = counts_by_key(taxon_keys(interested_df, "species"))
+    interested_family = counts_by_key(taxon_keys(interested_df, "family"))
 
     date, standort, koeder = parse_video_meta(csv_path.name)
     return {
@@ -363,7 +286,7 @@ def run_video_metric_tests(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame
     if not global_df.empty:
         global_df = global_df.sort_values("p_value", ascending=True).reset_index(drop=True)
         global_df["p_value_holm"] = holm_adjust(global_df["p_value"].tolist())
-        global_df["p_value_bh"] = benjamini_hochberg(global_df["p_value"].tolist())
+        global_df["p_value_bh"] = bh_adjust(global_df["p_value"].tolist())
         global_df["sig_raw"] = global_df["p_value"].map(significance_label)
         global_df["sig_holm"] = global_df["p_value_holm"].map(significance_label)
         global_df["sig_bh"] = global_df["p_value_bh"].map(significance_label)
@@ -424,7 +347,7 @@ def run_taxon_tests(df: pd.DataFrame, dict_col: str, level_name: str) -> pd.Data
         return out
     out = out.sort_values("p_value", ascending=True).reset_index(drop=True)
     out["p_value_holm"] = holm_adjust(out["p_value"].tolist())
-    out["p_value_bh"] = benjamini_hochberg(out["p_value"].tolist())
+    out["p_value_bh"] = bh_adjust(out["p_value"].tolist())
     out["sig_raw"] = out["p_value"].map(significance_label)
     out["sig_holm"] = out["p_value_holm"].map(significance_label)
     out["sig_bh"] = out["p_value_bh"].map(significance_label)
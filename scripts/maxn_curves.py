@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Laufende MaxN-Kurven (MaxN bis Zeitpunkt t) je Video und Taxon.
+
+Statt je Art ein dict von Annotationen je Zeitpunkt zu durchsuchen, werden
+alle Annotationen einmal nach (Video, Taxon, Zeit) sortiert, die Anzahl je
+(Video, Taxon, gerundete Zeit) gezaehlt und das laufende Maximum je
+(Video, Taxon) per kumulativem Maximum gebildet. Gespeichert werden nur die
+Stufen (Zeitpunkte, an denen das laufende MaxN steigt) als ragged array wie
+in frame_lists.py:
+
+- offsets: Stufenbereich je Video (Laenge n_videos + 1)
+- taxon, time, maxn: je Stufe, innerhalb eines Videos nach Zeit sortiert
+- seen_time: je Stufe die ungerundete frame_time der ersten Annotation des
+  Taxons im Video (first seen wird nicht auf das MaxN-Raster gerundet)
+
+Daraus folgen ohne erneuten Durchlauf:
+- first seen je Taxon (erste Stufe), MaxN und Zeit bis zum finalen MaxN
+  (letzte Stufe), MaxN(t) auf einem beliebigen Zeitraster
+- Zeitpunkt, an dem X % der finalen Richness, der Taxa mit finalem MaxN oder
+  der MaxN-Summe erreicht sind (ceil(X * Endwert)-tes Ereignis)
+
+load_maxn_curves legt die Stufen fuer den gesamten cut_47min-Speicher als
+komprimiertes npz neben den Annotations-Speicher und baut sie neu, sobald
+sich eine Quelldatei aendert.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from annotation_store import STORE_DIR, load_video_table, store_signature
+from maxn_engine import TAXON_LEVELS, keyed_annotations
+
+CURVES_VERSION = 2
+# Endwert-Anteile gelten als erreicht, wenn sie bis auf Rundung getroffen werden
+FRACTION_TOLERANCE = 1e-9
+MEASURES = ("richness", "maxn_taxa", "maxn_sum")
+VIDEO_COLUMNS = ["area", "filename", "date", "standort", "koeder"]
+
+_CURVES_CACHE: Dict[Tuple[str, str], Tuple[List[List[object]], "MaxNCurves"]] = {}
+
+
+def running_maxn_steps(
+    video: np.ndarray,
+    taxon: np.ndarray,
+    frame_round: np.ndarray,
+    n_videos: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stufen des laufenden MaxN aus Annotationen (ein Eintrag je Zeile).
+
+    Rueckgabe (offsets, taxon, time, maxn); innerhalb eines Videos nach Zeit,
+    dann Taxon sortiert.
+    """
+    video = np.asarray(video, dtype=np.int64)
+    taxon = np.asarray(taxon, dtype=np.int64)
+    frame_round = np.asarray(frame_round, dtype=float)
+    if len(video) == 0:
+        return np.zeros(n_videos + 1, dtype=np.int64), np.empty(0, np.int32), np.empty(0), np.empty(0, np.int32)
+
+    order = np.lexsort((frame_round, taxon, video))
+    v, c, t = video[order], taxon[order], frame_round[order]
+    new_point = np.r_[True, (v[1:] != v[:-1]) | (c[1:] != c[:-1]) | (t[1:] != t[:-1])]
+    starts = np.flatnonzero(new_point)
+    count = np.diff(np.r_[starts, len(v)])
+    v, c, t = v[starts], c[starts], t[starts]
+
+    # kumulatives Maximum je (Video, Taxon): Segmente ueber einen Versatz trennen
+    new_segment = np.r_[True, (v[1:] != v[:-1]) | (c[1:] != c[:-1])]
+    segment = np.cumsum(new_segment) - 1
+    shift = int(count.max()) + 1
+    running = np.maximum.accumulate(segment * shift + count) - segment * shift
+    is_step = new_segment | np.r_[False, running[1:] > running[:-1]]
+
+    v, c, t, m = v[is_step], c[is_step], t[is_step], running[is_step]
+    order = np.lexsort((c, t, v))
+    v, c, t, m = v[order], c[order], t[order], m[order]
+    offsets = np.r_[0, np.cumsum(np.bincount(v, minlength=n_videos))]
+    return offsets, c.astype(np.int32), t, m.astype(np.int32)
+
+
+def _first_reaching(video: np.ndarray, time: np.ndarray, weight: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """
+    Je Video die erste Zeit, ab der die kumulierte Gewichtssumme target
+    erreicht (Ereignisse je Video nach Zeit sortiert); NaN ohne Ereignisse.
+    """
+    out = np.full(len(target), np.nan)
+    if len(video) == 0:
+        return out
+    total = np.cumsum(weight, dtype=float)
+    before = np.r_[0.0, total][np.searchsorted(video, np.arange(len(target)))]
+    reached = total - before[video] >= target[video] - FRACTION_TOLERANCE
+    hit_video, first = np.unique(video[reached], return_index=True)
+    out[hit_video] = time[reached][first]
+    return out
+
+
+@dataclass
+class MaxNCurves:
+    videos: pd.DataFrame
+    taxa: List[str]
+    offsets: np.ndarray
+    taxon: np.ndarray
+    time: np.ndarray
+    maxn: np.ndarray
+    seen_time: np.ndarray
+
+    @property
+    def n_videos(self) -> int:
+        return len(self.offsets) - 1
+
+    def step_video(self) -> np.ndarray:
+        """Videoindex je Stufe."""
+        return np.repeat(np.arange(self.n_videos), np.diff(self.offsets))
+
+    def _dense(self, mask: np.ndarray, values: np.ndarray, fill: float) -> np.ndarray:
+        out = np.full((self.n_videos, len(self.taxa)), fill, dtype=float)
+        out[self.step_video()[mask], self.taxon[mask]] = values[mask]
+        return out
+
+    def _first_steps(self) -> np.ndarray:
+        pair = self.step_video().astype(np.int64) * len(self.taxa) + self.taxon
+        mask = np.zeros(len(pair), dtype=bool)
+        mask[np.unique(pair, return_index=True)[1]] = True
+        return mask
+
+    def _last_steps(self) -> np.ndarray:
+        pair = self.step_video().astype(np.int64) * len(self.taxa) + self.taxon
+        mask = np.zeros(len(pair), dtype=bool)
+        mask[len(pair) - 1 - np.unique(pair[::-1], return_index=True)[1]] = True
+        return mask
+
+    def final_maxn(self) -> np.ndarray:
+        """(Videos x Taxa) finales MaxN (0 = nicht beobachtet)."""
+        return self._dense(self._last_steps(), self.maxn.astype(float), 0.0).astype(int)
+
+    def first_seen(self) -> np.ndarray:
+        """(Videos x Taxa) erste ungerundete Zeit je Taxon (NaN = nicht beobachtet)."""
+        return self._dense(self._first_steps(), self.seen_time, np.nan)
+
+    def maxn_time(self) -> np.ndarray:
+        """(Videos x Taxa) erste Zeit, zu der das finale MaxN erreicht ist."""
+        return self._dense(self._last_steps(), self.time, np.nan)
+
+    def maxn_at(self, grid: Sequence[float]) -> np.ndarray:
+        """(Videos x Taxa x Raster) laufendes MaxN bis einschliesslich grid[k]."""
+        grid = np.asarray(grid, dtype=float)
+        out = np.zeros((self.n_videos, len(self.taxa), len(grid)), dtype=np.int32)
+        position = np.searchsorted(grid, self.time, side="left")
+        inside = position < len(grid)
+        np.maximum.at(out, (self.step_video()[inside], self.taxon[inside], position[inside]), self.maxn[inside])
+        return np.maximum.accumulate(out, axis=2)
+
+    def richness_at(self, grid: Sequence[float]) -> np.ndarray:
+        """(Videos x Raster) Anzahl bis grid[k] gesehener Taxa."""
+        return (self.maxn_at(grid) > 0).sum(axis=1)
+
+    def total_maxn_at(self, grid: Sequence[float]) -> np.ndarray:
+        """(Videos x Raster) Summe des laufenden MaxN ueber alle Taxa."""
+        return self.maxn_at(grid).sum(axis=1)
+
+    def taxon_time_to_fraction(self, fraction: float) -> np.ndarray:
+        """(Videos x Taxa) erste Zeit mit laufendem MaxN >= fraction * finales MaxN."""
+        video = self.step_video()
+        target = self.final_maxn()[video, self.taxon] * fraction - FRACTION_TOLERANCE
+        reached = self.maxn >= target
+        pair = video[reached].astype(np.int64) * len(self.taxa) + self.taxon[reached]
+        _, first = np.unique(pair, return_index=True)
+        mask = np.zeros(len(video), dtype=bool)
+        mask[np.flatnonzero(reached)[first]] = True
+        return self._dense(mask, self.time, np.nan)
+
+    def time_to_fraction(self, fraction: float, measure: str = "richness") -> np.ndarray:
+        """
+        Je Video die Zeit, zu der fraction des Endwerts erreicht ist.
+
+        measure:
+        - "richness":  Anzahl gesehener Taxa (first seen)
+        - "maxn_taxa": Anzahl Taxa, die ihr finales MaxN erreicht haben
+        - "maxn_sum":  Summe des laufenden MaxN ueber alle Taxa
+        """
+        video = self.step_video()
+        time = self.time
+        if measure == "richness":
+            mask = self._first_steps()
+            weight = np.ones(len(video))
+            # ungerundete Zeiten koennen innerhalb einer gerundeten Stufe anders liegen
+            order = np.lexsort((self.seen_time, video))
+            video, time, mask = video[order], self.seen_time[order], mask[order]
+        elif measure == "maxn_taxa":
+            mask = self._last_steps()
+            weight = np.ones(len(video))
+        elif measure == "maxn_sum":
+            mask = np.ones(len(video), dtype=bool)
+            weight = self._increments()
+        else:
+            raise ValueError(f"Unbekanntes Mass: {measure}")
+        total = np.bincount(video[mask], weights=weight[mask], minlength=self.n_videos)
+        return _first_reaching(video[mask], time[mask], weight[mask], fraction * total)
+
+    def _increments(self) -> np.ndarray:
+        """Zuwachs des MaxN je Stufe gegenueber der vorigen Stufe desselben Taxons."""
+        pair = self.step_video().astype(np.int64) * len(self.taxa) + self.taxon
+        order = np.lexsort((np.arange(len(pair)), pair))
+        ordered = self.maxn[order].astype(float)
+        previous = np.r_[0.0, ordered[:-1]]
+        previous[np.r_[True, pair[order][1:] != pair[order][:-1]]] = 0.0
+        out = np.empty(len(pair))
+        out[order] = ordered - previous
+        return out
+
+    def select(self, mask: np.ndarray) -> "MaxNCurves":
+        """Teilmenge der Videos (boolesche Maske ueber self.videos)."""
+        mask = np.asarray(mask, dtype=bool)
+        counts = np.diff(self.offsets)[mask]
+        steps = np.repeat(mask, np.diff(self.offsets))
+        return MaxNCurves(
+            videos=self.videos.loc[mask].reset_index(drop=True),
+            taxa=self.taxa,
+            offsets=np.r_[0, np.cumsum(counts)].astype(np.int64),
+            taxon=self.taxon[steps],
+            time=self.time[steps],
+            maxn=self.maxn[steps],
+            seen_time=self.seen_time[steps],
+        )
+
+
+def build_maxn_curves(level: str = "label", behaviour: str = "all") -> MaxNCurves:
+    """Stufen fuer alle Videos des Speichers (Videos ohne Treffer ohne Stufen)."""
+    videos = load_video_table()[VIDEO_COLUMNS].reset_index(drop=True)
+    ann, categories = keyed_annotations(level, behaviour, None, None, "family", None, None)
+    position = pd.Series(np.arange(len(videos)), index=videos["filename"].to_numpy())
+    video = position.loc[ann["filename"].astype(str).to_numpy()].to_numpy()
+    codes = ann["taxon_code"].to_numpy()
+    offsets, taxon, time, maxn = running_maxn_steps(video, codes, ann["frame_round"].to_numpy(dtype=float), len(videos))
+    first = (
+        pd.DataFrame({"video": video, "taxon": codes, "time": ann["frame_time"].to_numpy(dtype=float)})
+        .groupby(["video", "taxon"])["time"]
+        .min()
+    )
+    step_video = np.repeat(np.arange(len(videos)), np.diff(offsets))
+    seen_time = first.reindex(pd.MultiIndex.from_arrays([step_video, taxon.astype(np.int64)])).to_numpy(dtype=float)
+    return MaxNCurves(
+        videos=videos, taxa=list(categories), offsets=offsets, taxon=taxon, time=time, maxn=maxn, seen_time=seen_time
+    )
+
+
+def _cache_path(level: str, behaviour: str) -> Path:
+    return STORE_DIR / f"maxn_curves_{level}_{behaviour}.npz"
+
+
+def _save_curves(curves: MaxNCurves, path: Path, signature: List[List[object]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        meta=np.array(json.dumps({"version": CURVES_VERSION, "sources": signature})),
+        taxa=np.array(curves.taxa, dtype=str),
+        offsets=curves.offsets,
+        taxon=curves.taxon,
+        time=curves.time,
+        maxn=curves.maxn,
+        seen_time=curves.seen_time,
+        **{f"video_{col}": curves.videos[col].to_numpy(dtype=str) for col in VIDEO_COLUMNS},
+    )
+
+
+def _read_curves(path: Path, signature: List[List[object]]) -> MaxNCurves | None:
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != CURVES_VERSION or meta.get("sources") != signature:
+            return None
+        return MaxNCurves(
+            videos=pd.DataFrame({col: data[f"video_{col}"].astype(object) for col in VIDEO_COLUMNS}),
+            taxa=[str(t) for t in data["taxa"]],
+            offsets=data["offsets"],
+            taxon=data["taxon"],
+            time=data["time"],
+            maxn=data["maxn"],
+            seen_time=data["seen_time"],
+        )
+
+
+def load_maxn_curves(
+    level: str = "label",
+    behaviour: str = "all",
+    sites: Iterable[str] | None = None,
+    baits: Iterable[str] | None = None,
+    rebuild: bool = False,
+) -> MaxNCurves:
+    """
+    Laufende MaxN-Kurven aus dem Cache (neu gebaut bei geaenderten Quellen).
+
+    Der Cache umfasst immer alle Videos; sites/baits waehlen danach aus.
+    """
+    if level not in TAXON_LEVELS or level == "functional_group":
+        raise ValueError(f"Unbekannte Taxon-Ebene: {level}")
+    signature = store_signature()
+    key = (level, behaviour)
+    cached = _CURVES_CACHE.get(key)
+    curves = cached[1] if cached is not None and cached[0] == signature and not rebuild else None
+    if curves is None and not rebuild:
+        curves = _read_curves(_cache_path(level, behaviour), signature)
+    if curves is None:
+        curves = build_maxn_curves(level, behaviour)
+        _save_curves(curves, _cache_path(level, behaviour), signature)
+    _CURVES_CACHE[key] = (signature, curves)
+
+    mask = np.ones(curves.n_videos, dtype=bool)
+    if sites is not None:
+        mask &= curves.videos["standort"].isin(list(sites)).to_numpy()
+    if baits is not None:
+        mask &= curves.videos["koeder"].isin(list(baits)).to_numpy()
+    return curves if mask.all() else curves.select(mask)
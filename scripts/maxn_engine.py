@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Gemeinsame MaxN-Berechnung auf dem Annotations-Speicher (cut_47min).
+
+MaxN je Video und Taxon = maximale Anzahl gleichzeitiger Annotationen eines
+Taxons zum selben (auf 2 Nachkommastellen gerundeten) Frame-Zeitpunkt.
+Statt je Video per iterrows zu zaehlen, wird das fuer alle Videos als eine
+gruppierte Zaehlung (Video, Taxon, Zeit) mit anschliessendem Maximum gerechnet.
+
+Optionen:
+- level: Taxon-Ebene aus taxonomy.py ("taxon", "species", "genus", "family",
+  "unspecific", ...) oder "functional_group" (ueber group_map)
+- behaviour: "exclude" (feeding/interested raus), "feeding", "interested", "all"
+- time_window: (start_s, end_s) auf den ersten Frame-Zeitwert
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from annotation_store import load_annotations, load_video_table
+from taxonomy import RANKS, taxon_codes, taxon_keys
+
+TAXON_LEVELS = RANKS + ("functional_group",)
+
+
+def _rounded_frame_time(frame_time: np.ndarray) -> np.ndarray:
+    # round() aus Python je eindeutigem Wert, damit die Zeitgruppen exakt den
+    # bisherigen parse_frame_time-Ergebnissen entsprechen
+    uniq, inverse = np.unique(frame_time, return_inverse=True)
+    rounded = np.array([round(float(v), 2) for v in uniq], dtype=float)
+    return rounded[inverse]
+
+
+def _group_list(group_map: Mapping[str, str | Iterable[str]], key: str) -> list:
+    groups = group_map.get(key)
+    if groups is None:
+        return []
+    if isinstance(groups, str):
+        return [groups]
+    return list(groups)
+
+
+def keyed_annotations(
+    level: str,
+    behaviour: str,
+    time_window: Tuple[float | None, float | None] | None,
+    group_map: Mapping[str, str | Iterable[str]] | None,
+    group_source: str,
+    sites: Iterable[str] | None,
+    baits: Iterable[str] | None,
+) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Annotationen mit gueltiger Frame-Zeit, taxon_code (Index in die
+    zurueckgegebene Taxonliste) und frame_round (gerundete Zeit fuer MaxN).
+    """
+    if level not in TAXON_LEVELS:
+        raise ValueError(f"Unbekannte Taxon-Ebene: {level}")
+
+    ann = load_annotations(sites=sites, baits=baits, behaviour=behaviour)
+    ann = ann[ann["frame_time"].notna()]
+    if time_window is not None:
+        start, end = time_window
+        if start is not None:
+            ann = ann[ann["frame_time"] >= start]
+        if end is not None:
+            ann = ann[ann["frame_time"] <= end]
+
+    if level == "functional_group":
+        if group_map is None:
+            raise ValueError("level='functional_group' benoetigt group_map.")
+        base = pd.Series(taxon_keys(ann, group_source), index=ann.index)
+        ann = ann.assign(taxon=base.map(lambda key: _group_list(group_map, key))).explode("taxon")
+        ann = ann[ann["taxon"].notna()]
+        codes, uniques = pd.factorize(ann["taxon"], sort=True)
+        categories = [str(u) for u in uniques]
+    else:
+        codes, categories = taxon_codes(ann, level)
+
+    ann = ann.assign(taxon_code=codes)
+    ann = ann[ann["taxon_code"] >= 0]
+    ann = ann.assign(frame_round=_rounded_frame_time(ann["frame_time"].to_numpy(dtype=float)))
+    return ann, categories
+
+
+def compute_maxn_long(
+    level: str = "taxon",
+    behaviour: str = "exclude",
+    time_window: Tuple[float | None, float | None] | None = None,
+    group_map: Mapping[str, str | Iterable[str]] | None = None,
+    group_source: str = "family",
+    sites: Iterable[str] | None = None,
+    baits: Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """
+    MaxN im Langformat (filename, standort, koeder, taxon, maxn).
+
+    Reihenfolge: Videos wie im Speicher, Taxa je Video in der Reihenfolge
+    ihres ersten Auftretens (wie die bisherigen dict-basierten Loader).
+    """
+    ann, categories = keyed_annotations(level, behaviour, time_window, group_map, group_source, sites, baits)
+    if ann.empty:
+        return pd.DataFrame(columns=["filename", "standort", "koeder", "taxon", "maxn"])
+
+    ann = ann.assign(video_order=ann["filename"].cat.codes.to_numpy())
+    counts = ann.groupby(["video_order", "taxon_code", "frame_round"], sort=False).agg(
+        n=("row_in_video", "size"),
+        first_row=("row_in_video", "min"),
+    )
+    per_taxon = (
+        counts.groupby(level=["video_order", "taxon_code"], sort=False)
+        .agg(maxn=("n", "max"), first_row=("first_row", "min"))
+        .reset_index()
+        .sort_values(["video_order", "first_row"], kind="stable")
+    )
+
+    videos = ann.drop_duplicates("video_order")[["video_order", "filename", "standort", "koeder"]]
+    out = per_taxon.merge(videos, on="video_order", how="left")
+    out["taxon"] = np.array(categories, dtype=object)[out["taxon_code"].to_numpy()]
+    out["maxn"] = out["maxn"].astype(int)
+    for col in ["filename", "standort", "koeder"]:
+        out[col] = out[col].astype(str)
+    return out[["filename", "standort", "koeder", "taxon", "maxn"]].reset_index(drop=True)
+
+
+def compute_maxn_matrix(
+    level: str = "taxon",
+    behaviour: str = "exclude",
+    time_window: Tuple[float | None, float | None] | None = None,
+    group_map: Mapping[str, str | Iterable[str]] | None = None,
+    group_source: str = "family",
+    sites: Iterable[str] | None = None,
+    baits: Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """Video x Taxon MaxN-Matrix (alle Videos als Zeilen, fehlende Taxa = 0)."""
+    long_df = compute_maxn_long(level, behaviour, time_window, group_map, group_source, sites, baits)
+    videos = load_video_table()
+    if sites is not None:
+        videos = videos[videos["standort"].isin(list(sites))]
+    if baits is not None:
+        videos = videos[videos["koeder"].isin(list(baits))]
+
+    matrix = long_df.pivot_table(index="filename", columns="taxon", values="maxn", aggfunc="max", fill_value=0)
+    matrix = matrix.reindex(index=videos["filename"].tolist(), columns=sorted(matrix.columns), fill_value=0)
+    matrix.index.name = "filename"
+    matrix.columns.name = "taxon"
+    return matrix.astype(int)
+
+
+def maxn_by_video(
+    level: str = "taxon",
+    behaviour: str = "exclude",
+    time_window: Tuple[float | None, float | None] | None = None,
+    group_map: Mapping[str, str | Iterable[str]] | None = None,
+    group_source: str = "family",
+) -> Dict[str, Dict[str, int]]:
+    """filename -> {taxon: maxn} fuer alle Videos (leeres dict ohne Treffer)."""
+    long_df = compute_maxn_long(level, behaviour, time_window, group_map, group_source)
+    lookup: Dict[str, Dict[str, int]] = {name: {} for name in load_video_table()["filename"]}
+    for filename, taxon, maxn in zip(long_df["filename"], long_df["taxon"], long_df["maxn"]):
+        lookup[filename][taxon] = int(maxn)
+    return lookup
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, List
 
 import matplotlib
 
@@ -10,8 +9,10 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import statsmodels.formula.api as smf
-from statsmodels.stats.multitest import multipletests
+
+from maxn_engine import compute_maxn_matrix
+from mixed_models import fit_endpoints
+from multiple_testing import adjust_frame
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -19,12 +20,37 @@ INPUT = ROOT / "results" / "visibility_analysis" / "visibility_video_level_merge
 
 OUT_DIR = ROOT / "results" / "mixed_effects_core_endpoints"
 OUT_EFFECTS = OUT_DIR / "mixed_effects_endpoint_effects.csv"
+OUT_TAXON_EFFECTS = OUT_DIR / "mixed_effects_taxon_effects.csv"
 OUT_SUMMARY = OUT_DIR / "mixed_effects_core_endpoints.md"
 
 PLOT_DIR = ROOT / "results" / "ergaenzende_statistische_grafiken"
 OUT_PLOT = PLOT_DIR / "14_mixed_effects_fish_vs_algae_forest.png"
 
 ENDPOINTS = ["species_richness", "maxn_video_peak", "first_seen_median_sec"]
+EFFECT_COLUMNS = [
+    "endpoint",
+    "n_videos",
+    "n_fish",
+    "n_algae",
+    "beta_fish_vs_algae",
+    "se",
+    "ci95_low",
+    "ci95_high",
+    "ci95_boot_low",
+    "ci95_boot_high",
+    "p_value",
+    "q_bh",
+    "q_holm",
+    "pct_change_fish_vs_algae",
+    "random_intercept_variance_site",
+    "residual_variance",
+    "converged",
+]
+
+# Taxon-Endpunkte: MaxN je Taxon, nur Taxa mit Nachweis in mindestens so vielen Videos
+MIN_TAXON_VIDEOS = 3
+N_BOOT = 999
+RNG_SEED = 20260816
 
 BAIT_TYPE = {
     "mackerel": "fish",
@@ -47,36 +73,59 @@ def prepare_input(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def fit_endpoint_mixed_model(df: pd.DataFrame, endpoint: str) -> Dict[str, float]:
-    work = df[["standort", "bait_type", "visibility_z", endpoint]].dropna().copy()
-    work["y_log"] = np.log1p(work[endpoint].astype(float))
+def fit_endpoint_mixed_models(work: pd.DataFrame, values: pd.DataFrame, n_boot: int = N_BOOT) -> pd.DataFrame:
+    """log1p(Endpunkt) ~ bait_type + visibility_z + (1 | standort) fuer alle Spalten von values."""
+    design = pd.DataFrame(
+        {
+            "standort": work["standort"],
+            "bait_is_fish": (work["bait_type"] == "fish").astype(float),
+            "visibility_z": work["visibility_z"],
+        }
+    )
+    frame = pd.concat([design, np.log1p(values.astype(float))], axis=1)
 
     # Random intercept by site captures clustered structure at standort level.
-    model = smf.mixedlm("y_log ~ C(bait_type) + visibility_z", data=work, groups=work["standort"])
-    fit = model.fit(reml=False, method="powell", maxiter=400, disp=False)
-
-    beta = float(fit.params.get("C(bait_type)[T.fish]", np.nan))
-    se = float(fit.bse.get("C(bait_type)[T.fish]", np.nan))
-    p = float(fit.pvalues.get("C(bait_type)[T.fish]", np.nan))
-
-    ci_low = beta - 1.96 * se if np.isfinite(beta) and np.isfinite(se) else np.nan
-    ci_high = beta + 1.96 * se if np.isfinite(beta) and np.isfinite(se) else np.nan
-
-    return {
-        "endpoint": endpoint,
-        "n_videos": int(len(work)),
-        "n_fish": int((work["bait_type"] == "fish").sum()),
-        "n_algae": int((work["bait_type"] == "algae").sum()),
-        "beta_fish_vs_algae": beta,
-        "se": se,
-        "ci95_low": float(ci_low),
-        "ci95_high": float(ci_high),
-        "p_value": p,
-        "pct_change_fish_vs_algae": float(np.expm1(beta) * 100.0) if np.isfinite(beta) else np.nan,
-        "random_intercept_variance_site": float(fit.cov_re.iloc[0, 0]) if fit.cov_re.shape == (1, 1) else np.nan,
-        "residual_variance": float(fit.scale),
-        "converged": bool(getattr(fit, "converged", False)),
-    }
+    fits = fit_endpoints(
+        frame,
+        list(values.columns),
+        ["bait_is_fish", "visibility_z"],
+        "standort",
+        "bait_is_fish",
+        n_boot=n_boot,
+        rng=RNG_SEED,
+        workers=None,
+    )
+
+    valid = values.notna().to_numpy() & design.notna().all(axis=1).to_numpy()[:, None]
+    is_fish = (design["bait_is_fish"] == 1.0).to_numpy()[:, None]
+    beta = fits["beta"].to_numpy()
+    se = fits["se"].to_numpy()
+    return pd.DataFrame(
+        {
+            "endpoint": list(values.columns),
+            "n_videos": fits["n_obs"].to_numpy(),
+            "n_fish": (valid & is_fish).sum(axis=0),
+            "n_algae": (valid & ~is_fish).sum(axis=0),
+            "beta_fish_vs_algae": beta,
+            "se": se,
+            "ci95_low": beta - 1.96 * se,
+            "ci95_high": beta + 1.96 * se,
+            "ci95_boot_low": fits["boot_ci_low"].to_numpy(),
+            "ci95_boot_high": fits["boot_ci_high"].to_numpy(),
+            "p_value": fits["p_value"].to_numpy(),
+            "pct_change_fish_vs_algae": np.expm1(beta) * 100.0,
+            "random_intercept_variance_site": fits["tau2"].to_numpy(),
+            "residual_variance": fits["sigma2"].to_numpy(),
+            "converged": fits["converged"].to_numpy(),
+        }
+    )
+
+
+def taxon_endpoints(work: pd.DataFrame) -> pd.DataFrame:
+    """MaxN je Taxon und Video (Zeilen wie work), nur Taxa mit Nachweis in mindestens MIN_TAXON_VIDEOS Videos."""
+    maxn = compute_maxn_matrix(level="taxon", behaviour="exclude").reindex(work["filename"]).fillna(0)
+    maxn.index = work.index
+    return maxn.loc[:, (maxn > 0).sum(axis=0) >= MIN_TAXON_VIDEOS]
 
 
 def make_forest_plot(effects_df: pd.DataFrame) -> None:
@@ -109,7 +158,7 @@ def make_forest_plot(effects_df: pd.DataFrame) -> None:
     plt.close(fig)
 
 
-def write_summary(effects_df: pd.DataFrame) -> None:
+def write_summary(effects_df: pd.DataFrame, taxon_df: pd.DataFrame) -> None:
     with OUT_SUMMARY.open("w", encoding="utf-8") as f:
         f.write("# Mixed-Effects Modell: Kernendpunkte\n\n")
         f.write("Stand: 2026-08-16\n\n")
@@ -119,6 +168,8 @@ def write_summary(effects_df: pd.DataFrame) -> None:
         f.write("- Response: log1p(Endpunkt).\n")
         f.write("- Fixed Effects: bait_type (fish vs algae) + visibility_z.\n")
         f.write("- Random Effects: Random Intercept fuer Standort.\n")
+        f.write("- Schaetzung: Maximum Likelihood ueber die profilierte Likelihood des Varianzverhaeltnisses (mixed_models.py, alle Endpunkte in einem Durchlauf).\n")
+        f.write(f"- Konfidenzintervalle: Wald (95%) und parametrischer Bootstrap ({N_BOOT} Replikate, ci95_boot_* in der CSV).\n")
         f.write("- Inferenz: p-Werte fuer fish-vs-algae-Koeffizient je Endpunkt; Korrektur via BH und Holm ueber 3 Endpunkte.\n")
         f.write("- Hinweis: Ein Random-Intercept fuer Video ist in endpoint-spezifischen Modellen nicht identifizierbar, da je Endpunkt genau eine Beobachtung pro Video vorliegt.\n\n")
 
@@ -144,6 +195,21 @@ def write_summary(effects_df: pd.DataFrame) -> None:
             f.write("- Kein endpoint-spezifischer fish-vs-algae-Effekt bleibt nach BH/Holm-Korrektur signifikant.\n")
         f.write("- Das Modell ergaenzt die bisherigen standortgetrennten Analysen um einen hierarchischen Ansatz mit Standort-Random-Intercept.\n")
 
+        sig_taxa = taxon_df[taxon_df["q_bh"] < 0.05]
+        f.write("\n## Taxon-Endpunkte\n\n")
+        f.write(
+            f"- Dasselbe Modell auf log1p(MaxN) je Taxon fuer {len(taxon_df)} Taxa mit Nachweis in mindestens {MIN_TAXON_VIDEOS} Videos; BH ueber alle Taxa (`{OUT_TAXON_EFFECTS.name}`).\n"
+        )
+        if sig_taxa.empty:
+            f.write("- Kein Taxon zeigt nach BH einen signifikanten fish-vs-algae-Effekt.\n")
+        else:
+            f.write("\n| Taxon | Beta (log1p) | Bootstrap-95%-CI | p | q_BH |\n")
+            f.write("|---|---:|---|---:|---:|\n")
+            for _, r in sig_taxa.iterrows():
+                f.write(
+                    f"| {r['taxon']} | {r['beta_fish_vs_algae']:.4f} | [{r['ci95_boot_low']:.4f}, {r['ci95_boot_high']:.4f}] | {r['p_value']:.4g} | {r['q_bh']:.4g} |\n"
+                )
+
 
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -152,43 +218,21 @@ def main() -> None:
     df = pd.read_csv(INPUT)
     work = prepare_input(df)
 
-    rows: List[Dict[str, float]] = []
-    for ep in ENDPOINTS:
-        rows.append(fit_endpoint_mixed_model(work, ep))
-
-    effects_df = pd.DataFrame(rows)
-
-    valid = effects_df["p_value"].to_numpy(dtype=float)
-    _, q_bh, _, _ = multipletests(valid, method="fdr_bh")
-    _, q_holm, _, _ = multipletests(valid, method="holm")
-    effects_df["q_bh"] = q_bh
-    effects_df["q_holm"] = q_holm
-
-    effects_df = effects_df[
-        [
-            "endpoint",
-            "n_videos",
-            "n_fish",
-            "n_algae",
-            "beta_fish_vs_algae",
-            "se",
-            "ci95_low",
-            "ci95_high",
-            "p_value",
-            "q_bh",
-            "q_holm",
-            "pct_change_fish_vs_algae",
-            "random_intercept_variance_site",
-            "residual_variance",
-            "converged",
-        ]
-    ]
+    effects_df = fit_endpoint_mixed_models(work, work[ENDPOINTS])
+    effects_df = adjust_frame(effects_df, "p_value", {"fdr_bh": "q_bh", "holm": "q_holm"})
+    effects_df = effects_df[EFFECT_COLUMNS]
+
+    taxon_df = fit_endpoint_mixed_models(work, taxon_endpoints(work)).rename(columns={"endpoint": "taxon"})
+    taxon_df = adjust_frame(taxon_df, "p_value", {"fdr_bh": "q_bh"})
+    taxon_df = taxon_df.sort_values(["p_value", "taxon"]).reset_index(drop=True)
+    taxon_df.to_csv(OUT_TAXON_EFFECTS, index=False)
 
     effects_df.to_csv(OUT_EFFECTS, index=False)
     make_forest_plot(effects_df)
-    write_summary(effects_df)
+    write_summary(effects_df, taxon_df)
 
     print(f"Wrote: {OUT_EFFECTS}")
+    print(f"Wrote: {OUT_TAXON_EFFECTS}")
     print(f"Wrote: {OUT_SUMMARY}")
     print(f"Wrote: {OUT_PLOT}")
 
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Lineare gemischte Modelle mit Random Intercept je Gruppe (z. B. Standort)
+fuer viele Endpunkte mit gemeinsamem Design.
+
+Modell: y = X beta + u_g + e, u_g ~ N(0, tau^2), e ~ N(0, sigma^2). Mit
+gamma = tau^2 / sigma^2 ist V = I + gamma Z Z' blockdiagonal und
+
+    V^-1 = I - sum_g c_g 1_g 1_g',  c_g = gamma / (1 + gamma n_g),
+    log|V| = sum_g log(1 + gamma n_g).
+
+X' V^-1 X, X' V^-1 y und y' V^-1 y folgen daher aus X' X, X' y, y' y und den
+Gruppensummen von X und y; beta und sigma^2 sind fuer festes gamma
+geschlossen loesbar. Die profilierte (RE)ML-Log-Likelihood haengt nur noch
+von gamma ab und wird fuer alle Endpunkte (Spalten von Y) zugleich
+maximiert: Gitter ueber gamma (inklusive Rand gamma = 0), danach
+Goldener Schnitt zwischen den Nachbarn des besten Gitterpunkts. Mit
+gamma_start (Warmstart, z. B. aus einem frueheren Fit) wird nur ein enges
+Gitter um den Startwert ausgewertet.
+
+Kovarianz der festen Effekte: sigma^2 (X' V^-1 X)^-1 (wie lme4/nlme;
+statsmodels MixedLM invertiert die beobachtete Hesse-Matrix einschliesslich
+der Varianzparameter), Wald-z und Normal-p-Werte. Parametrischer Bootstrap: Replikate
+aus dem geschaetzten Modell werden als weitere Spalten mit Warmstart gefittet.
+fit_endpoints gruppiert Endpunkte nach gemeinsamem Fehlmuster und kann die
+Spaltenbloecke auf mehrere Prozesse verteilen (parallel_videos.map_videos).
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+from parallel_videos import map_videos, resolve_workers
+
+DEFAULT_BATCH_SIZE = 2000
+GAMMA_GRID = np.concatenate([[0.0], np.logspace(-4, 4, 33)])
+# Warmstart: Gitter ueber +-WARM_SPAN Dekaden um den Startwert
+WARM_SPAN = 1.0
+WARM_POINTS = 9
+GOLDEN_STEPS = 60
+CI_LEVEL = 0.95
+
+_GOLDEN = (np.sqrt(5.0) - 1.0) / 2.0
+
+
+def _as_rng(rng: np.random.Generator | int | None) -> np.random.Generator:
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+class _Design:
+    """Gemeinsames Design: X, Gruppen und die daraus abgeleiteten Summen."""
+
+    def __init__(self, x: np.ndarray, groups: Sequence[object]):
+        self.x = np.asarray(x, dtype=float)
+        self.codes, uniques = pd.factorize(np.asarray(groups), sort=True)
+        self.n, self.p = self.x.shape
+        self.indicator = np.eye(len(uniques))[self.codes]
+        self.sizes = self.indicator.sum(axis=0)
+        self.xtx = self.x.T @ self.x
+        self.group_x = self.indicator.T @ self.x
+
+    def profile(
+        self,
+        gamma: np.ndarray,
+        xty: np.ndarray,
+        group_y: np.ndarray,
+        yty: np.ndarray,
+        reml: bool,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Profil-Log-Likelihood fuer gamma (k x m) und m Endpunkte.
+
+        Rueckgabe: loglik (k x m), beta (k x m x p), sigma^2 (k x m),
+        X' V^-1 X (k x m x p x p).
+        """
+        c = gamma[..., None] / (1.0 + gamma[..., None] * self.sizes)
+        info = self.xtx - np.einsum("kmg,gi,gj->kmij", c, self.group_x, self.group_x)
+        rhs = xty.T - np.einsum("kmg,gi,gm->kmi", c, self.group_x, group_y)
+        beta = np.linalg.solve(info, rhs[..., None])[..., 0]
+        quad = yty - np.einsum("kmg,gm->km", c, group_y**2)
+        rss = quad - np.einsum("kmi,kmi->km", beta, rhs)
+        logdet_v = np.log1p(gamma[..., None] * self.sizes).sum(axis=-1)
+        dof = self.n - self.p if reml else self.n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sigma2 = rss / dof
+            loglik = -0.5 * (dof * (np.log(2 * np.pi * sigma2) + 1.0) + logdet_v)
+        if reml:
+            loglik = loglik - 0.5 * np.linalg.slogdet(info)[1]
+        return np.where(np.isfinite(loglik), loglik, -np.inf), beta, sigma2, info
+
+
+def _search_grid(gamma_start: np.ndarray | None, m: int) -> np.ndarray:
+    if gamma_start is None:
+        return np.repeat(GAMMA_GRID[:, None], m, axis=1)
+    centre = np.log10(np.maximum(np.broadcast_to(np.asarray(gamma_start, dtype=float), (m,)), GAMMA_GRID[1]))
+    offsets = np.linspace(-WARM_SPAN, WARM_SPAN, WARM_POINTS)
+    return np.vstack([np.zeros((1, m)), 10.0 ** (centre[None, :] + offsets[:, None])])
+
+
+def _fit_block(
+    design: _Design,
+    y: np.ndarray,
+    gamma_start: np.ndarray | None,
+    reml: bool,
+) -> Dict[str, np.ndarray]:
+    m = y.shape[1]
+    cols = np.arange(m)
+    xty = design.x.T @ y
+    group_y = design.indicator.T @ y
+    yty = (y**2).sum(axis=0)
+
+    grid = _search_grid(gamma_start, m)
+    loglik, _, _, _ = design.profile(grid, xty, group_y, yty, reml)
+    best = np.argmax(loglik, axis=0)
+    lo = grid[np.maximum(best - 1, 0), cols]
+    hi = grid[np.minimum(best + 1, len(grid) - 1), cols]
+    at_upper = best == len(grid) - 1
+
+    # Goldener Schnitt je Endpunkt im Intervall [lo, hi]
+    a = hi - _GOLDEN * (hi - lo)
+    b = lo + _GOLDEN * (hi - lo)
+    fa = design.profile(a[None, :], xty, group_y, yty, reml)[0][0]
+    fb = design.profile(b[None, :], xty, group_y, yty, reml)[0][0]
+    for _ in range(GOLDEN_STEPS):
+        left = fa >= fb
+        hi = np.where(left, b, hi)
+        lo = np.where(left, lo, a)
+        b_new = np.where(left, a, lo + _GOLDEN * (hi - lo))
+        a_new = np.where(left, hi - _GOLDEN * (hi - lo), b)
+        f_eval = design.profile(np.where(left, a_new, b_new)[None, :], xty, group_y, yty, reml)[0][0]
+        fa, fb = np.where(left, f_eval, fb), np.where(left, fa, f_eval)
+        a, b = a_new, b_new
+
+    candidates = np.vstack([grid[best, cols], a, b])
+    ll_cand, _, _, _ = design.profile(candidates, xty, group_y, yty, reml)
+    pick = np.argmax(ll_cand, axis=0)
+    gamma = candidates[pick, cols]
+    loglik, beta, sigma2, info = design.profile(gamma[None, :], xty, group_y, yty, reml)
+    sigma2 = sigma2[0]
+    cov = sigma2[:, None, None] * np.linalg.inv(info[0])
+    return {
+        "beta": beta[0],
+        "cov": cov,
+        "sigma2": sigma2,
+        "tau2": gamma * sigma2,
+        "gamma": gamma,
+        "loglik": loglik[0],
+        "converged": ~at_upper & np.isfinite(loglik[0]) & (sigma2 > 0),
+    }
+
+
+def random_intercept_fit(
+    x: np.ndarray,
+    y: np.ndarray,
+    groups: Sequence[object],
+    gamma_start: np.ndarray | float | None = None,
+    reml: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, np.ndarray]:
+    """
+    Random-Intercept-LMM je Spalte von y (n x m) auf das Design x (n x p).
+
+    Rueckgabe: beta (m x p), cov (m x p x p), sigma2, tau2, gamma
+    (= tau2 / sigma2), loglik (profilierte (RE)ML-Log-Likelihood), converged
+    (False, wenn gamma am oberen Gitterrand liegt oder sigma2 = 0).
+    """
+    design = _Design(x, groups)
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 1:
+        y = y[:, None]
+    m = y.shape[1]
+    start = None if gamma_start is None else np.broadcast_to(np.asarray(gamma_start, dtype=float), (m,))
+    parts: List[Dict[str, np.ndarray]] = []
+    for lo in range(0, m, batch_size):
+        sl = slice(lo, lo + batch_size)
+        parts.append(_fit_block(design, y[:, sl], None if start is None else start[sl], reml))
+    if not parts:
+        p = design.p
+        return {
+            "beta": np.empty((0, p)),
+            "cov": np.empty((0, p, p)),
+            **{k: np.empty(0) for k in ("sigma2", "tau2", "gamma", "loglik")},
+            "converged": np.empty(0, dtype=bool),
+        }
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def parametric_bootstrap(
+    x: np.ndarray,
+    groups: Sequence[object],
+    fit: Dict[str, np.ndarray],
+    term: int,
+    n_boot: int,
+    rngs: Sequence[np.random.Generator],
+    reml: bool = False,
+    ci_level: float = CI_LEVEL,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Perzentil-Intervalle fuer beta[term] aus dem parametrischen Bootstrap.
+
+    Je Endpunkt j werden n_boot Datensaetze aus (beta, tau2, sigma2) mit
+    rngs[j] simuliert und mit Warmstart bei gamma_j gefittet.
+    """
+    design = _Design(x, groups)
+    n_groups = design.indicator.shape[1]
+    m = len(fit["gamma"])
+    mean = design.x @ fit["beta"].T
+    blocks = []
+    for j in range(m):
+        u = rngs[j].standard_normal((n_boot, n_groups)) * np.sqrt(fit["tau2"][j])
+        e = rngs[j].standard_normal((n_boot, design.n)) * np.sqrt(fit["sigma2"][j])
+        blocks.append((mean[:, j][None, :] + u[:, design.codes] + e).T)
+    y_boot = np.hstack(blocks) if blocks else np.empty((design.n, 0))
+    boot = random_intercept_fit(x, y_boot, groups, gamma_start=np.repeat(fit["gamma"], n_boot), reml=reml)
+    estimates = boot["beta"][:, term].reshape(m, n_boot)
+    alpha = (1.0 - ci_level) / 2.0
+    return np.quantile(estimates, alpha, axis=1), np.quantile(estimates, 1.0 - alpha, axis=1)
+
+
+def _fit_task(
+    x: np.ndarray,
+    y: np.ndarray,
+    groups: np.ndarray,
+    term: int,
+    n_boot: int,
+    rngs: Sequence[np.random.Generator],
+    reml: bool,
+) -> Dict[str, np.ndarray]:
+    fit = random_intercept_fit(x, y, groups, reml=reml)
+    if n_boot > 0:
+        fit["boot_low"], fit["boot_high"] = parametric_bootstrap(x, groups, fit, term, n_boot, rngs, reml=reml)
+    return fit
+
+
+def fit_endpoints(
+    frame: pd.DataFrame,
+    endpoints: Sequence[str],
+    design_columns: Sequence[str],
+    group_column: str,
+    term: str,
+    n_boot: int = 0,
+    rng: np.random.Generator | int | None = None,
+    reml: bool = False,
+    workers: int | None = 1,
+) -> pd.DataFrame:
+    """
+    Random-Intercept-LMM fuer jeden Endpunkt (Spalte von frame).
+
+    Design: Achsenabschnitt + design_columns (numerisch), Random Intercept je
+    group_column; Zeilen mit fehlenden Werten fallen je Endpunkt weg, Endpunkte
+    mit gleichem Fehlmuster teilen einen Fit. term: ausgewertete Design-Spalte.
+
+    workers > 1 verteilt Spaltenbloecke auf Prozesse; die Bootstrap-Stroeme
+    stammen je Endpunkt aus rng.spawn, das Ergebnis haengt daher (bis auf
+    Rundungsdifferenzen) nicht von workers ab.
+
+    Spalten: endpoint, n_obs, beta, se, z, p_value, ci_low, ci_high,
+    (boot_ci_low, boot_ci_high bei n_boot > 0), tau2, sigma2, loglik, converged.
+    """
+    endpoints = list(endpoints)
+    term_index = 1 + list(design_columns).index(term)
+    rngs = _as_rng(rng).spawn(len(endpoints)) if n_boot > 0 else [None] * len(endpoints)
+    base_valid = frame[list(design_columns) + [group_column]].notna().all(axis=1).to_numpy()
+    values = frame[endpoints].to_numpy(dtype=float)
+    valid = base_valid[:, None] & np.isfinite(values)
+
+    patterns: Dict[bytes, List[int]] = {}
+    for j in range(len(endpoints)):
+        patterns.setdefault(valid[:, j].tobytes(), []).append(j)
+
+    n_workers = resolve_workers(workers)
+    tasks = []
+    for cols in patterns.values():
+        rows = valid[:, cols[0]]
+        x = np.column_stack([np.ones(int(rows.sum())), frame.loc[rows, list(design_columns)].to_numpy(dtype=float)])
+        groups = frame.loc[rows, group_column].to_numpy()
+        for chunk in np.array_split(np.asarray(cols), min(n_workers, len(cols))):
+            tasks.append((chunk, x, values[np.ix_(rows, chunk)], groups))
+
+    fits = map_videos(
+        _fit_task,
+        [t[1] for t in tasks],
+        [t[2] for t in tasks],
+        [t[3] for t in tasks],
+        [term_index] * len(tasks),
+        [n_boot] * len(tasks),
+        [[rngs[j] for j in t[0]] for t in tasks],
+        [reml] * len(tasks),
+        workers=n_workers,
+    )
+
+    z_crit = float(stats.norm.ppf(0.5 + CI_LEVEL / 2))
+    rows_out: Dict[int, dict] = {}
+    for (chunk, x, _, _), fit in zip(tasks, fits):
+        for k, j in enumerate(chunk):
+            beta = float(fit["beta"][k, term_index])
+            se = float(np.sqrt(fit["cov"][k, term_index, term_index]))
+            z = beta / se if se > 0 else np.nan
+            row = {
+                "endpoint": endpoints[j],
+                "n_obs": int(len(x)),
+                "beta": beta,
+                "se": se,
+                "z": z,
+                "p_value": float(2 * special.ndtr(-abs(z))) if np.isfinite(z) else np.nan,
+                "ci_low": beta - z_crit * se,
+                "ci_high": beta + z_crit * se,
+            }
+            if n_boot > 0:
+                row["boot_ci_low"] = float(fit["boot_low"][k])
+                row["boot_ci_high"] = float(fit["boot_high"][k])
+            row.update(
+                {
+                    "tau2": float(fit["tau2"][k]),
+                    "sigma2": float(fit["sigma2"][k]),
+                    "loglik": float(fit["loglik"][k]),
+                    "converged": bool(fit["converged"][k]),
+                }
+            )
+            rows_out[j] = row
+    return pd.DataFrame([rows_out[j] for j in range(len(endpoints))])
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Gemeinsame Korrekturen fuer multiples Testen (vektorisiert, auch gruppiert).
+
+Methoden (Namen wie in statsmodels.multipletests, soweit vorhanden):
+
+- "bonferroni": min(1, m p)
+- "holm":       Step-down, max_{j <= i} (m - j + 1) p_(j)
+- "hochberg":   Step-up, min_{j >= i} (m - j + 1) p_(j)
+- "fdr_bh":     Benjamini-Hochberg, min_{j >= i} p_(j) m / j
+- "fdr_by":     Benjamini-Yekutieli, BH mal sum_{k=1..m} 1/k
+- "storey":     Storey-q-Werte, pi0 * BH mit pi0 = #{p > lambda} / (m (1 - lambda)),
+                hoechstens 1 (fester lambda-Wert, Standard 0.5); liegt kein p-Wert
+                ueber lambda, ist die Schaetzung 0 und es gilt pi0 = 1 (= BH)
+
+Nicht-endliche p-Werte (NaN, z. B. nicht testbare Zeilen) bleiben NaN und
+zaehlen nicht zu m; m ist die Zahl der tatsaechlich gerechneten Tests. Die
+frueheren Skriptkopien (holm_adjust, bh_adjust, ...) zaehlten NaN zu m und
+gaben bei Holm 1.0 statt NaN zurueck; mit NaN in der Eingabe sind die Werte
+hier daher kleiner bzw. NaN.
+
+Mit groups wird je Familie (z. B. je Standort oder Endpunkt) getrennt
+korrigiert; alle Familien werden gemeinsam in einem Durchlauf sortiert
+(np.lexsort) und die kumulierten Minima/Maxima je Familie ueber pandas
+groupby gebildet. Rechenreihenfolge wie in den bisherigen Skriptkopien
+(p * m / Rang); gegenueber statsmodels (p / (Rang / m)) und der BY-Variante
+der Kopien koennen sich Werte in der letzten Stelle (1 ulp) unterscheiden.
+"""
+
+from __future__ import annotations
+
+from typing import Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+METHODS = ("bonferroni", "holm", "hochberg", "fdr_bh", "fdr_by", "storey")
+STOREY_LAMBDA = 0.5
+
+
+def _segment_cummax(values: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    return pd.Series(values).groupby(segments, sort=False).cummax().to_numpy()
+
+
+def _segment_reverse_cummin(values: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    rev = pd.Series(values[::-1]).groupby(segments[::-1], sort=False).cummin().to_numpy()
+    return rev[::-1]
+
+
+def adjust_pvalues(
+    p_values: Sequence[float] | np.ndarray | pd.Series,
+    method: str = "fdr_bh",
+    groups: Sequence[object] | np.ndarray | pd.Series | None = None,
+    storey_lambda: float = STOREY_LAMBDA,
+) -> np.ndarray | pd.Series:
+    """
+    Adjustierte p-Werte (bzw. q-Werte) in der Reihenfolge der Eingabe.
+
+    Eine pd.Series kommt als Series mit gleichem Index zurueck, sonst ein
+    np.ndarray. groups: Familienzugehoerigkeit je p-Wert (None = eine Familie).
+    NaN-Eintraege bleiben NaN und werden bei m nicht mitgezaehlt.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unbekannte Korrekturmethode: {method}")
+    index = p_values.index if isinstance(p_values, pd.Series) else None
+    p = np.asarray(p_values, dtype=float).ravel()
+    out = np.full(p.shape, np.nan, dtype=float)
+
+    valid = np.flatnonzero(np.isfinite(p))
+    if len(valid):
+        if groups is None:
+            codes = np.zeros(len(p), dtype=np.intp)
+        else:
+            codes = pd.factorize(pd.Series(list(groups), dtype=object), use_na_sentinel=False)[0]
+        order = valid[np.lexsort((p[valid], codes[valid]))]
+        seg_codes = codes[order]
+        ranked = p[order]
+
+        starts = np.r_[0, np.flatnonzero(seg_codes[1:] != seg_codes[:-1]) + 1]
+        sizes = np.diff(np.r_[starts, len(order)])
+        segments = np.repeat(np.arange(len(starts)), sizes)
+        m = np.repeat(sizes, sizes)
+        rank = np.arange(len(order)) - np.repeat(starts, sizes) + 1
+
+        if method == "bonferroni":
+            adjusted = ranked * m
+        elif method == "holm":
+            adjusted = _segment_cummax((m - rank + 1) * ranked, segments)
+        elif method == "hochberg":
+            adjusted = _segment_reverse_cummin((m - rank + 1) * ranked, segments)
+        else:
+            adjusted = _segment_reverse_cummin(ranked * m / rank, segments)
+            if method == "fdr_by":
+                harmonic = np.cumsum(1.0 / np.arange(1, sizes.max() + 1))
+                adjusted = adjusted * harmonic[m - 1]
+            elif method == "storey":
+                above = np.bincount(segments, weights=(ranked > storey_lambda).astype(float), minlength=len(starts))
+                # ohne p > lambda waere pi0 = 0 und jeder q-Wert 0: dann konservativ pi0 = 1
+                pi0 = np.where(above > 0, np.minimum(1.0, above / (sizes * (1.0 - storey_lambda))), 1.0)
+                adjusted = adjusted * pi0[segments]
+        out[order] = np.clip(adjusted, 0.0, 1.0)
+
+    if index is not None:
+        return pd.Series(out, index=index)
+    return out
+
+
+def bonferroni_adjust(p_values: Sequence[float] | np.ndarray | pd.Series) -> np.ndarray | pd.Series:
+    return adjust_pvalues(p_values, "bonferroni")
+
+
+def holm_adjust(p_values: Sequence[float] | np.ndarray | pd.Series) -> np.ndarray | pd.Series:
+    return adjust_pvalues(p_values, "holm")
+
+
+def hochberg_adjust(p_values: Sequence[float] | np.ndarray | pd.Series) -> np.ndarray | pd.Series:
+    return adjust_pvalues(p_values, "hochberg")
+
+
+def bh_adjust(p_values: Sequence[float] | np.ndarray | pd.Series) -> np.ndarray | pd.Series:
+    return adjust_pvalues(p_values, "fdr_bh")
+
+
+def by_adjust(p_values: Sequence[float] | np.ndarray | pd.Series) -> np.ndarray | pd.Series:
+    return adjust_pvalues(p_values, "fdr_by")
+
+
+def storey_qvalues(
+    p_values: Sequence[float] | np.ndarray | pd.Series,
+    storey_lambda: float = STOREY_LAMBDA,
+) -> np.ndarray | pd.Series:
+    return adjust_pvalues(p_values, "storey", storey_lambda=storey_lambda)
+
+
+def adjust_frame(
+    df: pd.DataFrame,
+    p_col: str,
+    columns: Mapping[str, str],
+    by: str | Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Kopie von df mit einer adjustierten Spalte je Methode.
+
+    columns: Methode -> Zielspalte, z. B. {"fdr_bh": "q_bh", "holm": "q_holm"}.
+    by: Spalte(n), die die Testfamilien festlegen (je Familie eigene
+    Korrektur); None = ganze Tabelle als eine Familie.
+    """
+    out = df.copy()
+    groups = None
+    if by is not None:
+        keys = [by] if isinstance(by, str) else list(by)
+        groups = out.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    p = out[p_col].astype(float).to_numpy()
+    for method, col in columns.items():
+        out[col] = adjust_pvalues(p, method, groups=groups)
+    return out
+
+
+if __name__ == "__main__":
+    # Regressionspruefung: kein p-Wert ueber lambda -> Storey faellt auf BH zurueck
+    example = [0.01, 0.02, 0.03, 0.5, 0.04]
+    q = storey_qvalues(example)
+    assert np.allclose(q, bh_adjust(example)) and q[3] == 0.5, q
+    print("multiple_testing: ok")
@@ -14,7 +14,6 @@ Ausgabe:
 
 from __future__ import annotations
 
-import itertools
 import math
 import re
 from dataclasses import dataclass
@@ -25,6 +24,12 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv
+from effect_sizes import cliffs_delta
+from multiple_testing import bh_adjust, holm_adjust
+from permutation_tests import permutation_test
+from taxonomy import taxon_keys
+
 ROOT = Path(__file__).resolve().parent.parent
 INPUT_DIR = ROOT / "normalized_reports" / "cut_47min" / "Annotation_reports_Nursery"
 OUT_DIR = ROOT / "results" / "nursery_methodik_vergleich"
@@ -84,38 +89,6 @@ def parse_frame_seconds(frame_value: object) -> float | None:
         return None
 
 
-def benjamini_hochberg(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    ranked = np.array([p_values[i] for i in order], dtype=float)
-    adjusted = np.empty(m, dtype=float)
-    prev = 1.0
-    for i in range(m - 1, -1, -1):
-        rank = i + 1
-        val = (ranked[i] * m) / rank
-        prev = min(prev, val)
-        adjusted[i] = min(1.0, prev)
-    out = np.empty(m, dtype=float)
-    out[order] = adjusted
-    return out.tolist()
-
-
-def holm_adjust(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_order = np.zeros(m, dtype=float)
-    for i, idx in enumerate(order):
-        adjusted_order[i] = min(1.0, (m - i) * float(p_values[idx]))
-    adjusted_order = np.maximum.accumulate(adjusted_order)
-    out = np.empty(m, dtype=float)
-    out[order] = adjusted_order
-    return out.tolist()
-
-
 def significance_label(p_value: float) -> str:
     if pd.isna(p_value):
         return "n/a"
@@ -128,52 +101,15 @@ def significance_label(p_value: float) -> str:
     return "ns"
 
 
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = 0
-    lt = 0
-    for xi in x:
-        gt += int(np.sum(xi > y))
-        lt += int(np.sum(xi < y))
-    return float((gt - lt) / total)
-
-
 def permutation_pvalue_mean_diff(
     x: np.ndarray, y: np.ndarray, n_perm: int = 10000, seed: int = 42
 ) -> float:
     if len(x) == 0 or len(y) == 0:
         return math.nan
-    obs = abs(float(np.mean(x) - np.mean(y)))
-    joined = np.concatenate([x, y])
-    n_x = len(x)
-
-    # Fuer sehr kleine n ist exakte Enumeration stabiler als random Permutationen.
-    if len(joined) <= 14:
-        ge = 0
-        total = 0
-        idx = np.arange(len(joined))
-        for comb in itertools.combinations(idx, n_x):
-            mask = np.zeros(len(joined), dtype=bool)
-            mask[list(comb)] = True
-            a = joined[mask]
-            b = joined[~mask]
-            stat = abs(float(np.mean(a) - np.mean(b)))
-            ge += int(stat >= obs)
-            total += 1
-        return ge / total if total else math.nan
-
-    rng = np.random.default_rng(seed)
-    ge = 0
-    for _ in range(n_perm):
-        perm = rng.permutation(joined)
-        a = perm[:n_x]
-        b = perm[n_x:]
-        stat = abs(float(np.mean(a) - np.mean(b)))
-        if stat >= obs:
-            ge += 1
-    return (ge + 1.0) / (n_perm + 1.0)
+    # exakt (Enumeration bzw. Summen-DP), Monte-Carlo nur fuer grosse nicht-ganzzahlige Faelle
+    joined = np.concatenate([x, y]).astype(float)
+    in_x = np.arange(len(joined)) < len(x)
+    return float(permutation_test(joined, in_x, n_perm=n_perm, rng=seed)["p_value"])
 
 
 def to_md(df: pd.DataFrame) -> str:
@@ -191,119 +127,59 @@ def safe_cols(df: pd.DataFrame, cols: Sequence[str]) -> pd.DataFrame:
     return df.loc[:, list(cols)].copy()
 
 
-def build_general_taxon_key(row: pd.Series) -> str:
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-    label = clean_text(row.get("label_name", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
-def build_species_key(row: pd.Series) -> str:
-    species = clean_text(row.get("species", ""))
-    if not species:
-        return ""
-    return species.lower()
-
-
-def build_family_key(row: pd.Series) -> str:
-    family = clean_text(row.get("family", ""))
-    if not family:
-        return ""
-    return family.lower()
+def counts_by_key(keys: np.ndarray) -> Dict[str, int]:
+    """Anzahl Zeilen je nicht-leerem Schluessel (Reihenfolge des ersten Auftretens)."""
+    keys = keys[keys != ""]
+    if len(keys) == 0:
+        return {}
+    return {k: int(n) for k, n in pd.Series(keys).value_counts(sort=False).items()}
+
+
+def first_seen_and_maxn(keys: np.ndarray, seconds: np.ndarray) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """
+    Erste Sichtung und MaxN (gleichzeitige Annotationen zur auf 2 Stellen
+    gerundeten Zeit) je Schluessel; Zeilen ohne Zeit zaehlen nicht.
+    """
+    valid = (keys != "") & np.isfinite(seconds)
+    if not valid.any():
+        return {}, {}
+    frame = pd.DataFrame({"key": keys[valid], "sec": seconds[valid]})
+    frame["sec_round"] = [round(float(v), 2) for v in frame["sec"]]
+    first_seen = frame.groupby("key", sort=False)["sec"].min()
+    maxn = frame.groupby(["key", "sec_round"], sort=False).size().groupby(level=0, sort=False).max()
+    return (
+        {k: float(v) for k, v in first_seen.items()},
+        {k: int(v) for k, v in maxn.items()},
+    )
 
 
 def load_video_data(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
     non_behavior = df[(~df["feeding"].map(is_truthy)) & (~df["interested"].map(is_truthy))].copy()
     feeding_df = df[df["feeding"].map(is_truthy)].copy()
     interested_df = df[df["interested"].map(is_truthy)].copy()
 
-    general_taxa: set[str] = set()
-    species_taxa: set[str] = set()
-    family_taxa: set[str] = set()
-
-    species_counts: Dict[str, int] = {}
-    family_counts: Dict[str, int] = {}
-    species_first_seen: Dict[str, float] = {}
-    family_first_seen: Dict[str, float] = {}
-
-    general_by_time: Dict[Tuple[str, float], int] = {}
-    species_by_time: Dict[Tuple[str, float], int] = {}
-    family_by_time: Dict[Tuple[str, float], int] = {}
-
-    non_behavior_frames: List[float] = []
-
-    for _, row in non_behavior.iterrows():
-        sec = parse_frame_seconds(row.get("frames", ""))
-        if sec is not None:
-            non_behavior_frames.append(sec)
-
-        g_key = build_general_taxon_key(row)
-        s_key = build_species_key(row)
-        f_key = build_family_key(row)
-
-        if g_key:
-            general_taxa.add(g_key)
-        if s_key:
-            species_taxa.add(s_key)
-            species_counts[s_key] = species_counts.get(s_key, 0) + 1
-            if sec is not None and (s_key not in species_first_seen or sec < species_first_seen[s_key]):
-                species_first_seen[s_key] = sec
-        if f_key:
-            family_taxa.add(f_key)
-            family_counts[f_key] = family_counts.get(f_key, 0) + 1
-            if sec is not None and (f_key not in family_first_seen or sec < family_first_seen[f_key]):
-                family_first_seen[f_key] = sec
-
-        if sec is not None:
-            if g_key:
-                general_by_time[(g_key, round(sec, 2))] = general_by_time.get((g_key, round(sec, 2)), 0) + 1
-            if s_key:
-                species_by_time[(s_key, round(sec, 2))] = species_by_time.get((s_key, round(sec, 2)), 0) + 1
-            if f_key:
-                family_by_time[(f_key, round(sec, 2))] = family_by_time.get((f_key, round(sec, 2)), 0) + 1
-
-    species_maxn: Dict[str, int] = {}
-    for (taxon, _), n in species_by_time.items():
-        species_maxn[taxon] = max(species_maxn.get(taxon, 0), int(n))
-
-    family_maxn: Dict[str, int] = {}
-    for (taxon, _), n in family_by_time.items():
-        family_maxn[taxon] = max(family_maxn.get(taxon, 0), int(n))
-
-    feeding_species: Dict[str, int] = {}
-    feeding_family: Dict[str, int] = {}
-    interested_species: Dict[str, int] = {}
-    interested_family: Dict[str, int] = {}
-
-    for _, row in feeding_df.iterrows():
-        s_key = build_species_key(row)
-        f_key = build_family_key(row)
-        if s_key:
-            feeding_species[s_key] = feeding_species.get(s_key, 0) + 1
-        if f_key:
-            feeding_family[f_key] = feeding_family.get(f_key, 0) + 1
-
-    for _, row in interested_df.iterrows():
-        s_key = build_species_key(row)
-        f_key = build_family_key(row)
-        if s_key:
-            interested_species[s_key] = interested_species.get(s_key, 0) + 1
-        if f_key:
-            interested_family[f_key] = interested_family.get(f_key, 0) + 1
+    seconds = np.array(
+        [math.nan if s is None else s for s in non_behavior["frames"].map(parse_frame_seconds)], dtype=float
+    )
+    non_behavior_frames = seconds[np.isfinite(seconds)].tolist()
+
+    general_keys = taxon_keys(non_behavior, "taxon")
+    species_keys = taxon_keys(non_behavior, "species")
+    family_keys = taxon_keys(non_behavior, "family")
+
+    general_taxa = set(general_keys[general_keys != ""].tolist())
+    species_counts = counts_by_key(species_keys)
+    species_taxa = set(species_counts)
+    family_taxa = set(family_keys[family_keys != ""].tolist())
+    species_first_seen, species_maxn = first_seen_and_maxn(species_keys, seconds)
+    family_first_seen, family_maxn = first_seen_and_maxn(family_keys, seconds)
+
+    feeding_species = counts_by_key(taxon_keys(feeding_df, "species"))
+    feeding_family = counts_by_key(taxon_keys(feeding_df, "family"))
+    interested_species = counts_by_key(taxon_keys(interested_df, "species"))
+    interested_family = counts_by_key(taxon_keys(interested_df, "family"))
 
     date, site, bait = parse_video_meta(csv_path.name)
     duration_sec = float(np.nanmax(non_behavior_frames)) if non_behavior_frames else math.nan
@@ -481,7 +357,7 @@ def run_metric_tests(df: pd.DataFrame, block: ComparisonBlock) -> pd.DataFrame:
 
     out = out.sort_values("p_value", ascending=True).reset_index(drop=True)
     out["p_value_holm"] = holm_adjust(out["p_value"].tolist())
-    out["p_value_bh"] = benjamini_hochberg(out["p_value"].tolist())
+    out["p_value_bh"] = bh_adjust(out["p_value"].tolist())
     out["sig_raw"] = out["p_value"].map(significance_label)
     out["sig_holm"] = out["p_value_holm"].map(significance_label)
     out["sig_bh"] = out["p_value_bh"].map(significance_label)
@@ -650,7 +526,7 @@ def run_taxon_tests(
 
     out = out.sort_values("p_value", ascending=True).reset_index(drop=True)
     out["p_value_holm"] = holm_adjust(out["p_value"].tolist())
-    out["p_value_bh"] = benjamini_hochberg(out["p_value"].tolist())
+    out["p_value_bh"] = bh_adjust(out["p_value"].tolist())
     out["sig_raw"] = out["p_value"].map(significance_label)
     out["sig_holm"] = out["p_value_holm"].map(significance_label)
     out["sig_bh"] = out["p_value_bh"].map(significance_label)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Gemeinsame Hauptkoordinatenanalyse (PCoA) und PERMDISP (Anderson 2006).
+
+PCoA: Gower-Matrix B = -1/2 J D^2 J (J = Zentriermatrix), Eigenzerlegung,
+Koordinaten = Eigenvektoren * sqrt(Eigenwert) fuer alle positiven
+Eigenwerte (> EIGEN_TOLERANCE), absteigend sortiert. Die Zerlegung wird je
+Distanzmatrix zwischengespeichert (Schluessel: Inhalt der Matrix), damit
+Plots, Dispersion und weitere Achsen dieselbe Rechnung teilen. Ab
+TRUNCATED_MIN_N Videos und fester Achsenzahl werden nur die groessten
+Eigenpaare mit scipy.sparse.linalg.eigsh (Lanczos) bestimmt.
+
+PERMDISP: Distanz jedes Videos zum Zentrum seiner Gruppe im PCoA-Raum, dann
+einfaktorielle ANOVA auf diesen Distanzen. Die Permutationen (Gruppenlabels
+ueber die festen Distanzen, Zufallsstrom wie rng.permutation) werden
+blockweise ueber eine Permutations-Indexmatrix bewertet: Gruppenmittel und
+Quadratsummen aller Permutationen eines Blocks per np.bincount. Die
+beobachtete Statistik laeuft durch dieselbe Routine.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse.linalg import eigsh
+
+from permanova import permutation_indices
+
+DEFAULT_BATCH_SIZE = 2000
+EIGEN_TOLERANCE = 1e-12
+# ab dieser Groesse wird bei fester Achsenzahl nur ein Teil des Spektrums berechnet
+TRUNCATED_MIN_N = 1000
+EIGEN_CACHE_SIZE = 32
+
+_EIGEN_CACHE: Dict[Tuple[str, int | None], Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _as_rng(rng: np.random.Generator | int | None) -> np.random.Generator:
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def gower_matrix(dist: np.ndarray) -> np.ndarray:
+    """Doppelt zentrierte Matrix B = -1/2 J D^2 J."""
+    n = dist.shape[0]
+    j = np.eye(n) - np.ones((n, n)) / n
+    return -0.5 * j @ dist**2 @ j
+
+
+def pcoa_eigen(dist: np.ndarray, n_components: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Positive Eigenwerte (absteigend) und zugehoerige Eigenvektoren von B.
+
+    n_components=None: volles Spektrum; sonst hoechstens n_components Achsen
+    (bei grossen Matrizen ueber eigsh).
+    """
+    dist = np.ascontiguousarray(dist, dtype=float)
+    n = dist.shape[0]
+    truncated = n_components is not None and n >= TRUNCATED_MIN_N and n_components < n - 1
+    key = (hashlib.sha1(dist.tobytes()).hexdigest() + str(dist.shape), n_components if truncated else None)
+    cached = _EIGEN_CACHE.get(key)
+    if cached is None:
+        b = gower_matrix(dist)
+        if truncated:
+            # fester Startvektor: reproduzierbare Vorzeichen (der Einsvektor liegt im Kern von B)
+            start = np.random.default_rng(0).random(n)
+            eigvals, eigvecs = eigsh(b, k=n_components, which="LA", v0=start)
+        else:
+            eigvals, eigvecs = np.linalg.eigh(b)
+        order = np.argsort(eigvals)[::-1]
+        eigvals = eigvals[order]
+        eigvecs = eigvecs[:, order]
+        positive = eigvals > EIGEN_TOLERANCE
+        cached = (eigvals[positive], eigvecs[:, positive])
+        if len(_EIGEN_CACHE) >= EIGEN_CACHE_SIZE:
+            _EIGEN_CACHE.pop(next(iter(_EIGEN_CACHE)))
+        _EIGEN_CACHE[key] = cached
+
+    eigvals, eigvecs = cached
+    if n_components is not None:
+        return eigvals[:n_components], eigvecs[:, :n_components]
+    return eigvals, eigvecs
+
+
+def pcoa_coordinates(dist: np.ndarray, n_components: int | None = None) -> np.ndarray:
+    """
+    PCoA-Koordinaten (Videos x Achsen).
+
+    n_components=None: alle positiven Achsen (mindestens eine Nullspalte);
+    sonst genau n_components Spalten, fehlende Achsen mit Nullen aufgefuellt.
+    """
+    n = dist.shape[0]
+    eigvals, eigvecs = pcoa_eigen(dist, n_components)
+    coords = eigvecs * np.sqrt(eigvals)
+    width = 1 if n_components is None else n_components
+    if coords.shape[1] < width:
+        coords = np.hstack([coords, np.zeros((n, width - coords.shape[1]))])
+    return coords
+
+
+def distances_to_centroid(coords: np.ndarray, groups: Sequence[object]) -> np.ndarray:
+    """Euklidische Distanz jedes Punkts zum Mittelpunkt seiner Gruppe."""
+    groups_arr = np.asarray(groups)
+    out = np.zeros(len(groups_arr), dtype=float)
+    for g in pd.unique(groups_arr):
+        idx = np.flatnonzero(groups_arr == g)
+        center = coords[idx].mean(axis=0)
+        out[idx] = np.sqrt(np.sum((coords[idx] - center) ** 2, axis=1))
+    return out
+
+
+class _AnovaKernel:
+    """Einfaktorielle ANOVA fuer feste Werte und permutierte Gruppenlabels."""
+
+    def __init__(self, values: np.ndarray, groups: Sequence[object]):
+        self.values = np.asarray(values, dtype=float)
+        self.codes, uniques = pd.factorize(np.asarray(groups), sort=False)
+        self.n = len(self.codes)
+        self.k = len(uniques)
+        self.sizes = np.bincount(self.codes, minlength=self.k).astype(float)
+        self.mean = float(np.mean(self.values)) if self.n else math.nan
+
+    def f_stat(self, perm: np.ndarray) -> np.ndarray:
+        """F je Zeile von perm (Permutationsindizes der Gruppenlabels)."""
+        b = perm.shape[0]
+        df_between = self.k - 1
+        df_within = self.n - self.k
+        if self.k < 2 or df_within <= 0:
+            return np.full(b, np.nan)
+        labels = self.codes[perm] + (np.arange(b) * self.k)[:, None]
+        weights = np.broadcast_to(self.values, labels.shape).ravel()
+        sizes = np.tile(self.sizes, b)
+        means = np.bincount(labels.ravel(), weights=weights, minlength=b * self.k) / sizes
+        ss_between = (sizes * (means - self.mean) ** 2).reshape(b, self.k).sum(axis=1)
+        resid = self.values[None, :] - means[labels]
+        ss_within = (resid**2).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            f = (ss_between / df_between) / (ss_within / df_within)
+        return np.where(ss_within > 0, f, np.nan)
+
+
+def dispersion_test(
+    values: np.ndarray,
+    groups: Sequence[object],
+    n_perm: int = 9999,
+    rng: np.random.Generator | int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Tuple[float, float]:
+    """
+    (F, p) der ANOVA auf values mit Permutation der Gruppenlabels.
+
+    NaN, wenn F nicht definiert ist (weniger als 2 Gruppen, n <= Gruppen,
+    keine Streuung innerhalb der Gruppen). Nicht-endliche Permutationswerte
+    zaehlen nie als >= beobachtet; p = (#{F_perm >= F_obs} + 1) / (n_perm + 1).
+    """
+    generator = _as_rng(rng)
+    kernel = _AnovaKernel(values, groups)
+    f_obs = float(kernel.f_stat(np.arange(kernel.n)[None, :])[0]) if kernel.n else math.nan
+    if not np.isfinite(f_obs):
+        return math.nan, math.nan
+
+    ge_count = 0
+    for start in range(0, n_perm, batch_size):
+        size = min(batch_size, n_perm - start)
+        f_perm = kernel.f_stat(permutation_indices(kernel.n, size, generator))
+        ge_count += int((np.isfinite(f_perm) & (f_perm >= f_obs)).sum())
+    return f_obs, (ge_count + 1.0) / (n_perm + 1.0)
+
+
+def permdisp(
+    dist: np.ndarray,
+    groups: Sequence[object],
+    n_perm: int = 9999,
+    rng: np.random.Generator | int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Tuple[np.ndarray, float, float]:
+    """PERMDISP auf einer Distanzmatrix: (Distanzen zum Gruppenzentrum, F, p)."""
+    d_cent = distances_to_centroid(pcoa_coordinates(dist), groups)
+    f_stat, p_value = dispersion_test(d_cent, groups, n_perm=n_perm, rng=rng, batch_size=batch_size)
+    return d_cent, f_stat, p_value
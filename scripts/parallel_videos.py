@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Parallele Verarbeitung je Video (Prozess-Pool) mit deterministischer Reihenfolge.
+
+map_videos(func, items) verhaelt sich wie list(map(func, items)): die
+Ergebnisse kommen immer in der Reihenfolge der Eingabe zurueck, unabhaengig
+davon, welcher Prozess zuerst fertig ist. func muss auf Modulebene definiert
+sein (picklebar).
+
+Anzahl Prozesse:
+- Argument workers, sonst Umgebungsvariable VIDEO_WORKERS, sonst Anzahl CPUs
+- workers <= 1 (oder nur ein Element) laeuft seriell im aktuellen Prozess
+- innerhalb eines Worker-Prozesses laeuft map_videos immer seriell (keine
+  verschachtelten Pools)
+
+func sollte keine gemeinsamen Caches (z. B. den Annotations-Speicher) selbst
+aufbauen; die Daten werden im Elternprozess geladen und als Argumente
+uebergeben (siehe annotation_store.read_video_csvs).
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, TypeVar
+
+WORKERS_ENV = "VIDEO_WORKERS"
+
+_IN_WORKER = False
+
+T = TypeVar("T")
+
+
+def _mark_worker() -> None:
+    global _IN_WORKER
+    _IN_WORKER = True
+
+
+def in_worker_process() -> bool:
+    """True innerhalb eines von map_videos gestarteten Worker-Prozesses."""
+    return _IN_WORKER
+
+
+def resolve_workers(workers: int | None = None, n_items: int | None = None) -> int:
+    if workers is None:
+        env_value = os.environ.get(WORKERS_ENV, "").strip()
+        workers = int(env_value) if env_value else (os.cpu_count() or 1)
+    workers = max(1, int(workers))
+    if n_items is not None:
+        workers = min(workers, max(1, n_items))
+    return workers
+
+
+def map_videos(
+    func: Callable[..., T],
+    *iterables: Iterable[object],
+    workers: int | None = None,
+    chunksize: int = 1,
+) -> List[T]:
+    """Wendet func je Video an (wie map mit mehreren Iterables), Ergebnis in Eingabereihenfolge."""
+    columns = [list(it) for it in iterables]
+    n_items = min((len(col) for col in columns), default=0)
+    n_workers = resolve_workers(workers, n_items)
+    if n_workers <= 1 or _IN_WORKER:
+        return [func(*args) for args in zip(*columns)]
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_mark_worker) as executor:
+        return list(executor.map(func, *columns, chunksize=chunksize))
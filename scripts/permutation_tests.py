@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Permutationstests fuer Zwei-Gruppen-Vergleiche: exakt, wo moeglich, sonst
+gebuendeltes Monte-Carlo.
+
+Eine Statistik ist eine vektorisierte Funktion statistic(values, in_x), die
+fuer eine (b x n)-Matrix von Gruppenmasken (True = Gruppe x) b Werte liefert.
+Der Test waehlt automatisch:
+
+1. "exact_dp": fuer summenbasierte Statistiken (mean_difference, rank_sum)
+   mit ganzzahligen bzw. halbzahligen Werten (Mittelraenge) die exakte
+   Nullverteilung der Gruppensumme per dynamischer Programmierung (Anzahl
+   Teilmengen je Summe), bei Strata als Faltung der Verteilungen je Stratum
+2. "exact": vollstaendige Enumeration aller Zuordnungen als Maskenmatrix
+   (Kombinationen je Stratum, kartesisches Produkt ueber Strata), solange
+   hoechstens max_exact Zuordnungen entstehen
+3. "monte_carlo": n_perm Permutationen innerhalb der Strata als Indexmatrix
+   (restricted_permutation.within_strata_permutations), blockweise bewertet
+
+p-Werte: exakt #{T >= T_obs} / #Zuordnungen (inklusive beobachteter), Monte
+Carlo (#{T >= T_obs} + 1) / (n_perm + 1); Gleichstaende bis auf Rundung
+zaehlen mit. alternative "two-sided" vergleicht |T|, "greater" T, "less" -T.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from scipy import stats
+
+from restricted_permutation import TIE_TOLERANCE, within_strata_permutations
+
+Statistic = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+DEFAULT_MAX_EXACT = 200_000
+DEFAULT_BATCH_SIZE = 2000
+# groesste Summenspanne fuer die DP-Tabelle (Anzahl Summenwerte)
+MAX_DP_SUM_RANGE = 1_000_000
+ALTERNATIVES = ("two-sided", "greater", "less")
+
+
+def mean_difference(values: np.ndarray, in_x: np.ndarray) -> np.ndarray:
+    """mean(x) - mean(y) je Zeile der Maske."""
+    in_x = np.atleast_2d(in_x)
+    x_mask = in_x.astype(float)
+    y_mask = 1.0 - x_mask
+    v = np.atleast_2d(values)
+    return (v * x_mask).sum(axis=1) / x_mask.sum(axis=1) - (v * y_mask).sum(axis=1) / y_mask.sum(axis=1)
+
+
+def rank_sum(values: np.ndarray, in_x: np.ndarray) -> np.ndarray:
+    """Wilcoxon-Rangsumme der Gruppe x minus Erwartung n_x (n + 1) / 2 (Mittelraenge)."""
+    ranks = stats.rankdata(values)
+    in_x = np.atleast_2d(in_x)
+    expected = in_x.sum(axis=1) * (len(ranks) + 1) / 2.0
+    return (np.atleast_2d(ranks) * in_x).sum(axis=1) - expected
+
+
+def _sum_scores(statistic: Statistic, values: np.ndarray) -> np.ndarray | None:
+    # Werte, deren Gruppensumme die Statistik monoton festlegt
+    if statistic is mean_difference:
+        return values
+    if statistic is rank_sum:
+        return stats.rankdata(values)
+    return None
+
+
+def _oriented(stat: np.ndarray, alternative: str) -> np.ndarray:
+    if alternative == "two-sided":
+        return np.abs(stat)
+    if alternative == "less":
+        return -stat
+    return stat
+
+
+def _integer_scores(scores: np.ndarray) -> np.ndarray | None:
+    for scale in (1.0, 2.0):
+        scaled = scores * scale
+        rounded = np.round(scaled)
+        if np.all(np.abs(scaled - rounded) < 1e-9):
+            return rounded.astype(np.int64)
+    return None
+
+
+def _subset_sum_counts(scores: np.ndarray, k: int, dtype: type = np.int64) -> np.ndarray:
+    """Anzahl k-Teilmengen je Summe (Index = Summe) fuer nichtnegative ganze scores."""
+    total = int(scores.sum())
+    dp = np.zeros((k + 1, total + 1), dtype=dtype)
+    dp[0, 0] = 1
+    for score in scores:
+        s = int(score)
+        prev = dp.copy()
+        if s == 0:
+            dp[1:] += prev[:-1]
+        else:
+            dp[1:, s:] += prev[:-1, :-s]
+    return dp[k]
+
+
+def _exact_dp(
+    statistic: Statistic,
+    values: np.ndarray,
+    in_x: np.ndarray,
+    strata_blocks: List[np.ndarray],
+    observed: float,
+    alternative: str,
+) -> float | None:
+    scores = _sum_scores(statistic, values)
+    if scores is None:
+        return None
+    int_scores = _integer_scores(scores)
+    if int_scores is None:
+        return None
+    scale = 1.0 if np.allclose(int_scores, scores) else 2.0
+    # ganzzahlige Zaehler, solange die Gesamtzahl der Zuordnungen in int64 passt
+    dtype = np.int64 if _n_assignments(in_x, strata_blocks) < 2**62 else np.float64
+
+    # Verteilung der Gruppensumme (ganzzahlig skaliert, je Stratum verschoben)
+    counts = np.ones(1, dtype=dtype)
+    offset = 0
+    for idx in strata_blocks:
+        block = int_scores[idx]
+        low = int(block.min())
+        shifted = block - low
+        k = int(in_x[idx].sum())
+        if int(shifted.sum()) + 1 > MAX_DP_SUM_RANGE:
+            return None
+        counts = np.convolve(counts, _subset_sum_counts(shifted, k, dtype))
+        offset += low * k
+        if len(counts) > MAX_DP_SUM_RANGE:
+            return None
+
+    sums = (np.arange(len(counts)) + offset) / scale
+    possible = counts > 0
+    sums = sums[possible]
+    counts = counts[possible]
+    n_x = int(in_x.sum())
+    n_y = len(values) - n_x
+    if statistic is mean_difference:
+        total = float(values.sum())
+        null_stats = sums / n_x - (total - sums) / n_y
+    else:
+        null_stats = sums - n_x * (len(values) + 1) / 2.0
+    target = float(_oriented(np.array([observed]), alternative)[0])
+    tol = TIE_TOLERANCE * max(1.0, abs(target))
+    hits = _oriented(null_stats, alternative) >= target - tol
+    return float(counts[hits].sum() / counts.sum())
+
+
+def _exact_masks(in_x: np.ndarray, strata_blocks: List[np.ndarray]) -> np.ndarray:
+    n = len(in_x)
+    masks = np.zeros((1, n), dtype=bool)
+    for idx in strata_blocks:
+        k = int(in_x[idx].sum())
+        n_combos = math.comb(len(idx), k)
+        combos = np.array(list(itertools.combinations(range(len(idx)), k)), dtype=np.intp).reshape(n_combos, k)
+        block = np.zeros((len(combos), len(idx)), dtype=bool)
+        np.put_along_axis(block, combos, True, axis=1)
+        rep = np.repeat(masks, len(block), axis=0)
+        rep[:, idx] = np.tile(block, (len(masks), 1))
+        masks = rep
+    return masks
+
+
+def _n_assignments(in_x: np.ndarray, strata_blocks: List[np.ndarray]) -> int:
+    total = 1
+    for idx in strata_blocks:
+        total *= math.comb(len(idx), int(in_x[idx].sum()))
+    return total
+
+
+def permutation_test(
+    values: Sequence[float],
+    in_x: Sequence[bool],
+    statistic: Statistic = mean_difference,
+    strata: Sequence[object] | None = None,
+    alternative: str = "two-sided",
+    n_perm: int = 9999,
+    rng: np.random.Generator | int | None = None,
+    max_exact: int = DEFAULT_MAX_EXACT,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, object]:
+    """
+    Permutationstest Gruppe x gegen Rest; Zuordnungen nur innerhalb der Strata.
+
+    Rueckgabe: statistic (beobachtet), p_value, method ("exact_dp", "exact",
+    "monte_carlo"), n_assignments (Zahl der bewerteten bzw. moeglichen
+    Zuordnungen).
+    """
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f"Unbekannte Alternative: {alternative}")
+    values = np.asarray(values, dtype=float)
+    in_x = np.asarray(in_x, dtype=bool)
+    n_x = int(in_x.sum())
+    if n_x == 0 or n_x == len(values):
+        return {"statistic": math.nan, "p_value": math.nan, "method": "", "n_assignments": 0}
+
+    strata_arr = np.zeros(len(values), dtype=int) if strata is None else np.asarray(strata)
+    blocks = [np.flatnonzero(strata_arr == s) for s in np.unique(strata_arr)]
+    observed = float(statistic(values, in_x[None, :])[0])
+    target = _oriented(np.array([observed]), alternative)[0]
+    n_total = _n_assignments(in_x, blocks)
+
+    p_dp = _exact_dp(statistic, values, in_x, blocks, observed, alternative)
+    if p_dp is not None:
+        return {"statistic": observed, "p_value": p_dp, "method": "exact_dp", "n_assignments": n_total}
+
+    tol = TIE_TOLERANCE * max(1.0, abs(float(target)))
+    if n_total <= max_exact:
+        masks = _exact_masks(in_x, blocks)
+        ge = 0
+        for start in range(0, len(masks), batch_size):
+            null = _oriented(statistic(values, masks[start : start + batch_size]), alternative)
+            ge += int((null >= target - tol).sum())
+        return {"statistic": observed, "p_value": ge / len(masks), "method": "exact", "n_assignments": len(masks)}
+
+    perm = within_strata_permutations(strata_arr, n_perm, rng)
+    ge = 0
+    for start in range(0, n_perm, batch_size):
+        null = _oriented(statistic(values, in_x[perm[start : start + batch_size]]), alternative)
+        ge += int((np.isfinite(null) & (null >= target - tol)).sum())
+    return {
+        "statistic": observed,
+        "p_value": (ge + 1.0) / (n_perm + 1.0),
+        "method": "monte_carlo",
+        "n_assignments": n_perm,
+    }
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+Dependency-aware rebuild of the analysis outputs under results/.
+
+Every analysis script is registered as a step with its declared inputs
+(normalized CSVs, intermediate result files) and outputs. Dependencies are
+derived from the declarations: a step depends on every step whose outputs
+cover one of its inputs, and on every step whose script it imports (e.g. all
+store-based scripts depend on annotation_store).
+
+A step is skipped when its fingerprint is unchanged and its outputs exist.
+The fingerprint is a content hash over the script, the local modules it
+imports (recursively) and all input files. Fingerprints are kept in
+results/pipeline_state.json. Independent steps run in parallel.
+
+Not registered (maintenance tools, not result producers):
+normalize_reports.py, manual_split_video_cutoff.py, reduce_columns_47min.py,
+validation.py, validate_cut47min.py, validate_taxa_consistency.py,
+generate_first_seen_vs_maxn_multi.py.
+
+Usage:
+    python scripts/pipeline.py                 # rebuild everything that is stale
+    python scripts/pipeline.py hurdle_model    # one step plus its upstream steps
+    python scripts/pipeline.py --dry-run       # show what would run
+    python scripts/pipeline.py --force --jobs 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+from parallel_videos import WORKERS_ENV, resolve_workers
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPT_DIR = ROOT / "scripts"
+STATE_FILE = ROOT / "results" / "pipeline_state.json"
+
+CUT_ALL = "normalized_reports/cut_47min/*/*.csv"
+CUT_CORAL = "normalized_reports/cut_47min/Annotation_reports_coral_reef/*.csv"
+CUT_NURSERY = "normalized_reports/cut_47min/Annotation_reports_Nursery/*.csv"
+FIG_DIR = "results/ergaenzende_statistische_grafiken"
+VIS_DIR = "results/visibility_analysis"
+VIS_MERGED = f"{VIS_DIR}/visibility_video_level_merged.csv"
+HERB_DIR = "results/herbivore_analysis"
+IF_DIR = "results/interested_feeding"
+MACKEREL_DIR = "results/mackerel_standortvergleich"
+NURSERY_DIR = "results/nursery_methodik_vergleich"
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    script: str
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+
+
+STEPS: List[Step] = [
+    Step("annotation_store", "scripts/annotation_store.py", (CUT_ALL,), ("normalized_reports/annotation_store",)),
+    Step("species_richness", "scripts/species_richness_cut47min_analysis.py", (CUT_ALL,), ("results/species_richness_report",)),
+    Step("standortvergleich", "scripts/standortvergleich_cut47min_analysis.py", (CUT_ALL,), ("results/Standortvergleich",)),
+    Step("artenvergleich_koeder", "scripts/artenvergleich_koeder_cut47min.py", (CUT_ALL,), ("results/artenvergleich_köder",)),
+    Step("artenvergleich_standort", "scripts/artenvergleich_standort_cut47min.py", (CUT_ALL,), ("results/Artenvergleich_standort",)),
+    Step("taxa_haeufigkeit_koeder", "scripts/taxa_haeufigkeit_koeder_cut47min.py", (CUT_ALL,), ("results/taxahäufigkeitköder",)),
+    Step("taxa_haeufigkeit_standort", "scripts/taxa_haeufigkeit_standort_cut47min.py", (CUT_ALL,), ("results/taxahäufigkeitstandord",)),
+    Step(
+        "artenvergleich_artenhaeufigkeit",
+        "scripts/artenvergleich_artenhaeufigkeit_koeder_cut47min.py",
+        ("results/artenvergleich_köder/*/*.csv", "results/taxahäufigkeitköder/*/*.csv"),
+        ("results/artenvergleich_artenhäufigkeit",),
+    ),
+    Step(
+        "interested_feeding_koeder",
+        "scripts/interested_feeding_koeder_cut47min.py",
+        (CUT_ALL, "results/taxahäufigkeitköder/*/*_taxon_maxn_by_koeder_summary.csv"),
+        (
+            f"{IF_DIR}/interested_feeding_video_level.csv",
+            f"{IF_DIR}/interested_feeding_site_summary.csv",
+            f"{IF_DIR}/interested_feeding_summary.md",
+            f"{IF_DIR}/interested_feeding_taxon_event_long.csv",
+        ),
+    ),
+    Step(
+        "interested_feeding_feeding_only",
+        "scripts/interested_feeding_feeding_only_cut47min.py",
+        (CUT_ALL,),
+        (f"{IF_DIR}/feeding_site_summary.csv", f"{IF_DIR}/feeding_summary.md"),
+    ),
+    Step(
+        "mackerel_standortvergleich",
+        "scripts/mackerel_standortvergleich_cut47min.py",
+        (CUT_ALL,),
+        (f"{MACKEREL_DIR}/data", f"{MACKEREL_DIR}/mackerel_standortvergleich.md"),
+    ),
+    Step(
+        "mackerel_taxa_composition",
+        "scripts/mackerel_taxa_composition_tests.py",
+        (f"{MACKEREL_DIR}/data/mackerel_video_metrics.csv",),
+        (f"{MACKEREL_DIR}/taxa_composition",),
+    ),
+    Step(
+        "plot_mackerel_species_richness",
+        "scripts/plot_mackerel_species_richness.py",
+        (f"{MACKEREL_DIR}/data/mackerel_video_metrics.csv", f"{MACKEREL_DIR}/data/mackerel_video_metrics_global_tests.csv"),
+        (f"{MACKEREL_DIR}/figures",),
+    ),
+    Step(
+        "nursery_methodik",
+        "scripts/nursery_methodik_koeder_analysis.py",
+        (CUT_NURSERY,),
+        (f"{NURSERY_DIR}/data", f"{NURSERY_DIR}/nursery_methodik_koeder_bericht.md"),
+    ),
+    Step(
+        "nursery_taxa_composition",
+        "scripts/nursery_taxa_composition_tests.py",
+        (f"{NURSERY_DIR}/data/nursery_video_metrics.csv",),
+        (f"{NURSERY_DIR}/taxa_composition",),
+    ),
+    Step("zeitvergleich", "scripts/zeitvergleich_taxa_utumbi_milimani_cut47min.py", (CUT_CORAL,), ("results/zeitvergleich_taxa_utumbi_milimani",)),
+    Step(
+        "zeitpunkte_firstseen_maxn",
+        "scripts/zeitpunkte_firstseen_maxn_cut47min.py",
+        (CUT_ALL,),
+        (
+            "results/time_firstseen_MaxN/standort_koeder_durchschnitt_90pct_cut47min_videos.csv",
+            "results/time_firstseen_MaxN/standort_koeder_durchschnitt_90pct_cut47min_videos.md",
+            "results/time_firstseen_MaxN/zeitpunkte_anteile_cut47min_videos.csv",
+            "results/time_firstseen_MaxN/kurven_standort_koeder_cut47min.csv",
+            "results/time_firstseen_MaxN/kurven_standort_koeder_cut47min.png",
+        ),
+    ),
+    Step("funktionsvergleich_koeder", "scripts/funktionsvergleich_koeder_cut47min.py", (CUT_ALL,), ("results/funktionsvergleich",)),
+    Step("funktionsvergleich_feeding", "scripts/funktionsvergleich_feeding_koeder_cut47min.py", (CUT_ALL,), ("results/funktionsvergleich_feeding",)),
+    Step(
+        "funktionsvergleich_offene_punkte",
+        "scripts/funktionsvergleich_offene_punkte_1_3.py",
+        (CUT_ALL,),
+        (
+            "results/funktionsvergleich_modell",
+            "results/funktionsvergleich_indicator",
+            "results/funktionsvergleich_sensitivity",
+            f"{NURSERY_DIR}/funktionsvergleich_sensitivity",
+            "results/funktionsvergleich_offene_punkte_1_3.md",
+        ),
+    ),
+    Step(
+        "herbivore_feeding_responsiveness",
+        "scripts/herbivore_feeding_responsiveness_cut47min.py",
+        (CUT_ALL,),
+        (f"{HERB_DIR}/herbivore_feeding_responsiveness.csv", f"{HERB_DIR}/herbivore_feeding_responsiveness.md"),
+    ),
+    Step(
+        "herbivore_maxn_apriori",
+        "scripts/herbivore_maxn_apriori_test_cut47min.py",
+        (CUT_ALL,),
+        (
+            f"{HERB_DIR}/herbivore_maxn_apriori_test.csv",
+            f"{HERB_DIR}/herbivore_maxn_apriori_test.md",
+            f"{HERB_DIR}/herbivore_maxn_by_family.csv",
+        ),
+    ),
+    Step("algae_responsiveness", "scripts/algae_responsiveness_ranking_cut47min.py", (CUT_ALL,), ("results/algae_responsiveness",)),
+    Step(
+        "composition_open_tests",
+        "scripts/composition_open_tests_permdisp_rarefaction.py",
+        (CUT_ALL,),
+        (
+            "results/composition_robustness",
+            f"{FIG_DIR}/12_permdisp_dispersion_by_site.png",
+            f"{FIG_DIR}/13_rarefaction_standardized_richness.png",
+        ),
+    ),
+    Step(
+        "hurdle_model",
+        "scripts/hurdle_model_focal_signals.py",
+        (CUT_ALL,),
+        ("results/hurdle_model", f"{FIG_DIR}/11_hurdle_model_effect_decomposition.png"),
+    ),
+    Step(
+        "presence_absence_model",
+        "scripts/presence_absence_model.py",
+        (CUT_ALL,),
+        ("results/presence_absence_model", f"{FIG_DIR}/10_presence_absence_focal_signals.png"),
+    ),
+    Step(
+        "leave_one_video_out",
+        "scripts/systematic_leave_one_video_out_sensitivity.py",
+        (CUT_ALL,),
+        ("results/leave_one_video_out_sensitivity", f"{FIG_DIR}/09_leave_one_video_out_robustness.png"),
+    ),
+    Step(
+        "bootstrap_effectsizes",
+        "scripts/bootstrap_effectsizes_and_prevalence_threshold.py",
+        (CUT_ALL, f"{HERB_DIR}/herbivore_maxn_by_family.csv"),
+        ("results/effectsize_bootstrap", "results/prevalence_threshold_model"),
+    ),
+    Step(
+        "plot_prevalence_threshold",
+        "scripts/plot_prevalence_threshold_model.py",
+        ("results/prevalence_threshold_model/prevalence_threshold_summary.csv",),
+        (
+            f"{FIG_DIR}/15_prevalence_threshold_fisher_results.png",
+            f"{FIG_DIR}/15b_prevalence_threshold_summary_counts.png",
+            f"{FIG_DIR}/15c_prevalence_threshold_direction_breakdown.png",
+        ),
+    ),
+    # update_visibility_analysis also reads the merged table it rewrites; that
+    # self-input is not part of the fingerprint (it would always be stale)
+    Step(
+        "update_visibility",
+        "scripts/update_visibility_analysis.py",
+        ("Zeitplan-Aktuell-CNR4PQP(Automatisch wiederhergestellt).xlsx",),
+        (
+            VIS_MERGED,
+            f"{VIS_DIR}/visibility_missing_videos.csv",
+            f"{VIS_DIR}/visibility_coverage_by_site_bait.csv",
+            f"{VIS_DIR}/visibility_vs_metrics_correlations.csv",
+        ),
+    ),
+    Step(
+        "visibility_adjusted_models",
+        "scripts/visibility_adjusted_models.py",
+        (VIS_MERGED,),
+        (
+            f"{VIS_DIR}/visibility_adjusted_model_results.csv",
+            f"{VIS_DIR}/visibility_adjusted_partial_spearman.csv",
+            f"{VIS_DIR}/visibility_adjusted_summary.md",
+        ),
+    ),
+    Step(
+        "visibility_additional_tests",
+        "scripts/visibility_additional_tests.py",
+        (VIS_MERGED,),
+        (
+            f"{VIS_DIR}/visibility_additional_tests.csv",
+            f"{VIS_DIR}/visibility_additional_tests_adjusted.csv",
+            f"{VIS_DIR}/visibility_additional_tests_summary.md",
+        ),
+    ),
+    Step(
+        "visibility_site_stratified",
+        "scripts/visibility_site_stratified_tests.py",
+        (VIS_MERGED,),
+        (
+            f"{VIS_DIR}/visibility_site_stratified_tests.csv",
+            f"{VIS_DIR}/visibility_site_stratified_tests_adjusted.csv",
+            f"{VIS_DIR}/visibility_site_stratified_tests_summary.md",
+        ),
+    ),
+    Step(
+        "plot_visibility_key_results",
+        "scripts/plot_visibility_key_results.py",
+        (
+            f"{VIS_DIR}/visibility_vs_metrics_correlations.csv",
+            f"{VIS_DIR}/visibility_adjusted_model_results.csv",
+            f"{VIS_DIR}/visibility_additional_tests_adjusted.csv",
+            f"{VIS_DIR}/visibility_site_stratified_tests_adjusted.csv",
+        ),
+        (f"{VIS_DIR}/figures",),
+    ),
+    Step(
+        "core_endpoints",
+        "scripts/core_endpoints_bait_site_interaction.py",
+        (CUT_ALL, VIS_MERGED, f"{IF_DIR}/interested_feeding_video_level.csv"),
+        ("results/core_endpoints_bait_site_interaction",),
+    ),
+    Step(
+        "mixed_effects",
+        "scripts/mixed_effects_core_endpoints.py",
+        (VIS_MERGED,),
+        ("results/mixed_effects_core_endpoints", f"{FIG_DIR}/14_mixed_effects_fish_vs_algae_forest.png"),
+    ),
+    Step(
+        "check_core_consistency",
+        "scripts/check_core_result_consistency.py",
+        (
+            "results/species_richness_report/species_richness_all_46_videos.csv",
+            "results/species_richness_report/one_pager_species_richness.md",
+            "results/Standortvergleich/standortvergleich_video_level.csv",
+            f"{VIS_DIR}/visibility_summary.md",
+            f"{VIS_DIR}/visibility_vs_metrics_correlations.csv",
+            f"{VIS_DIR}/visibility_adjusted_summary.md",
+            f"{VIS_DIR}/visibility_adjusted_model_results.csv",
+        ),
+    ),
+]
+
+
+def _static_prefix(pattern: str) -> str:
+    parts = []
+    for part in pattern.split("/"):
+        if any(ch in part for ch in "*?["):
+            break
+        parts.append(part)
+    return "/".join(parts)
+
+
+def _covers(output: str, pattern: str) -> bool:
+    prefix = _static_prefix(pattern)
+    return prefix == output or prefix.startswith(output + "/") or output.startswith(prefix + "/")
+
+
+def local_imports(script: Path) -> Set[str]:
+    """Names of the scripts/ modules a script imports (transitively)."""
+    seen: Set[str] = set()
+    todo = [script]
+    while todo:
+        path = todo.pop()
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module_path = SCRIPT_DIR / f"{name.split('.')[0]}.py"
+                if name not in seen and module_path.exists() and module_path != script:
+                    seen.add(name)
+                    todo.append(module_path)
+    return seen
+
+
+def build_graph(steps: Sequence[Step]) -> Dict[str, Set[str]]:
+    """step name -> names of the steps it depends on."""
+    by_module = {Path(step.script).stem: step.name for step in steps}
+    graph: Dict[str, Set[str]] = {}
+    for step in steps:
+        deps: Set[str] = set()
+        for other in steps:
+            if other.name == step.name:
+                continue
+            if any(_covers(out, pattern) for out in other.outputs for pattern in step.inputs):
+                deps.add(other.name)
+        for module in local_imports(ROOT / step.script):
+            if module in by_module and by_module[module] != step.name:
+                deps.add(by_module[module])
+        graph[step.name] = deps
+    topological_order(graph)
+    return graph
+
+
+def topological_order(graph: Dict[str, Set[str]]) -> List[str]:
+    order: List[str] = []
+    state: Dict[str, int] = {}
+
+    def visit(name: str, trail: Tuple[str, ...]) -> None:
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError("Cycle in pipeline: " + " -> ".join(trail + (name,)))
+        state[name] = 1
+        for dep in sorted(graph[name]):
+            visit(dep, trail + (name,))
+        state[name] = 2
+        order.append(name)
+
+    for name in graph:
+        visit(name, ())
+    return order
+
+
+def upstream_closure(graph: Dict[str, Set[str]], targets: Iterable[str]) -> Set[str]:
+    selected: Set[str] = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name in selected:
+            continue
+        if name not in graph:
+            raise KeyError(f"Unknown step: {name}")
+        selected.add(name)
+        todo.extend(graph[name])
+    return selected
+
+
+def expand_inputs(step: Step) -> List[Path]:
+    files: Set[Path] = set()
+    own_outputs = {ROOT / out for out in step.outputs}
+    for pattern in step.inputs:
+        if any(ch in pattern for ch in "*?["):
+            matches = ROOT.glob(pattern)
+        else:
+            path = ROOT / pattern
+            matches = path.rglob("*") if path.is_dir() else [path]
+        files.update(p for p in matches if p.is_file() and p not in own_outputs)
+    return sorted(files)
+
+
+_HASH_CACHE: Dict[Tuple[Path, int, int], str] = {}
+
+
+def file_digest(path: Path) -> str:
+    stat = path.stat()
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _HASH_CACHE:
+        _HASH_CACHE[key] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return _HASH_CACHE[key]
+
+
+def fingerprint(step: Step) -> str:
+    digest = hashlib.sha256()
+    script = ROOT / step.script
+    sources = [script] + [SCRIPT_DIR / f"{m.split('.')[0]}.py" for m in sorted(local_imports(script))]
+    for path in sources + expand_inputs(step):
+        digest.update(str(path.relative_to(ROOT)).encode("utf-8"))
+        digest.update(file_digest(path).encode("ascii") if path.exists() else b"missing")
+    return digest.hexdigest()
+
+
+def outputs_exist(step: Step) -> bool:
+    return all((ROOT / out).exists() for out in step.outputs)
+
+
+def load_state() -> Dict[str, str]:
+    if not STATE_FILE.exists():
+        return {}
+    return json.loads(STATE_FILE.read_text(encoding="utf-8")).get("steps", {})
+
+
+def save_state(state: Dict[str, str]) -> None:
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STATE_FILE.write_text(json.dumps({"steps": state}, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def run_script(step: Step, env: Dict[str, str]) -> Tuple[int, str, float]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(ROOT / step.script)],
+        cwd=str(ROOT),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    return result.returncode, result.stdout, time.perf_counter() - start
+
+
+def run_pipeline(
+    targets: Sequence[str] | None = None,
+    jobs: int | None = None,
+    force: bool = False,
+    dry_run: bool = False,
+    verbose: bool = False,
+) -> int:
+    steps = {step.name: step for step in STEPS}
+    graph = build_graph(STEPS)
+    selected = upstream_closure(graph, targets) if targets else set(graph)
+    order = [name for name in topological_order(graph) if name in selected]
+    pending_deps = {name: graph[name] & selected for name in order}
+
+    state = load_state()
+    n_jobs = resolve_workers(jobs, len(order))
+    env = dict(os.environ)
+    if n_jobs > 1:
+        # Parallelism is spent on steps; scripts run their video loops serially unless set explicitly
+        env.setdefault(WORKERS_ENV, "1")
+
+    if dry_run:
+        for name in order:
+            step = steps[name]
+            current = not force and state.get(name) == fingerprint(step) and outputs_exist(step)
+            deps = ", ".join(sorted(pending_deps[name])) or "-"
+            print(f"[{'SKIP' if current else 'RUN '}] {name}  (after: {deps})")
+        return 0
+
+    print(f"Using Python: {sys.executable} ({n_jobs} parallel)")
+    done: Set[str] = set()
+    failed: Set[str] = set()
+    blocked: Set[str] = set()
+    running: Dict[Future, str] = {}
+    n_run = n_skipped = 0
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        while True:
+            for name in order:
+                if name in done or name in failed or name in blocked or name in running.values():
+                    continue
+                deps = pending_deps[name]
+                if deps & (failed | blocked):
+                    blocked.add(name)
+                    print(f"[BLOCKED] {name}")
+                    continue
+                if not deps <= done:
+                    continue
+                step = steps[name]
+                step_fingerprint = fingerprint(step)
+                if not force and state.get(name) == step_fingerprint and outputs_exist(step):
+                    done.add(name)
+                    n_skipped += 1
+                    print(f"[SKIP] {name} (up to date)")
+                    continue
+                print(f"[RUN] {step.script}")
+                future = executor.submit(run_script, step, env)
+                running[future] = name
+
+            if not running:
+                # Steps are visited in topological order, so nothing is left waiting here
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, output, seconds = future.result()
+                if verbose or returncode != 0:
+                    print(output.rstrip())
+                if returncode != 0:
+                    failed.add(name)
+                    print(f"[FAIL] {name} (exit={returncode})")
+                    continue
+                n_run += 1
+                done.add(name)
+                state[name] = fingerprint(steps[name])
+                save_state(state)
+                print(f"[OK] {name} ({seconds:.1f}s)")
+
+    print(f"\nPipeline finished: {n_run} run, {n_skipped} up to date, {len(failed)} failed, {len(blocked)} blocked.")
+    return 1 if failed or blocked else 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild stale analysis outputs in dependency order.")
+    parser.add_argument("targets", nargs="*", help="steps to build (default: all); upstream steps are included")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel steps (default: VIDEO_WORKERS or CPU count)")
+    parser.add_argument("--force", action="store_true", help="ignore stored fingerprints and rerun every selected step")
+    parser.add_argument("--dry-run", action="store_true", help="only print which steps would run")
+    parser.add_argument("--list", action="store_true", help="list registered steps and their dependencies")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print script output of successful steps")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        graph = build_graph(STEPS)
+        for name in topological_order(graph):
+            print(f"{name}: {', '.join(sorted(graph[name])) or '-'}")
+        return 0
+    return run_pipeline(args.targets or None, args.jobs, args.force, args.dry_run, args.verbose)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,6 +7,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from bootstrap_engine import bootstrap_mean, bootstrap_two_sample
+
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA_FILE = ROOT / "results" / "mackerel_standortvergleich" / "data" / "mackerel_video_metrics.csv"
@@ -22,10 +24,7 @@ SITE_COLORS = {
 
 
 def bootstrap_ci(values: np.ndarray, n_boot: int = 5000, seed: int = 42) -> tuple[float, float]:
-    rng = np.random.default_rng(seed)
-    samples = rng.choice(values, size=(n_boot, len(values)), replace=True)
-    means = samples.mean(axis=1)
-    return float(np.percentile(means, 2.5)), float(np.percentile(means, 97.5))
+    return bootstrap_mean(values, n_boot=n_boot, rng=seed)
 
 
 def bootstrap_diff_ci(
@@ -34,11 +33,8 @@ def bootstrap_diff_ci(
     n_boot: int = 5000,
     seed: int = 99,
 ) -> tuple[float, float, float]:
-    rng = np.random.default_rng(seed)
-    boot_a = rng.choice(values_a, size=(n_boot, len(values_a)), replace=True).mean(axis=1)
-    boot_b = rng.choice(values_b, size=(n_boot, len(values_b)), replace=True).mean(axis=1)
-    diff = boot_a - boot_b
-    return float(diff.mean()), float(np.percentile(diff, 2.5)), float(np.percentile(diff, 97.5))
+    diff = bootstrap_two_sample(values_a, values_b, n_boot=n_boot, rng=seed, statistics=("mean_diff",))["mean_diff"]
+    return diff["boot_mean"], diff["low"], diff["high"]
 
 
 def main() -> None:
@@ -1,9 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import re
 from pathlib import Path
-from typing import Iterable, List
 
 import matplotlib
 matplotlib.use("Agg")
@@ -12,6 +10,11 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import load_video_table
+from maxn_engine import compute_maxn_matrix
+from multiple_testing import bh_adjust
+from presence_models import presence_models
+
 ROOT = Path(__file__).resolve().parents[1]
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -81,85 +84,15 @@ TARGETS = [
 ]
 
 
-def parse_video_metadata(filename: str) -> tuple[str, str, str]:
-    stem = filename.replace(".csv", "")
-    parts = stem.split("-", 2)
-    if len(parts) < 3:
-        return "", "unknown", "unknown"
-    date, site, bait = parts
-    return date, site.lower(), bait.lower()
-
-
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    return text not in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}
-
-
-def parse_frame_time(frame_value: object) -> float | None:
-    text = str(frame_value).strip()
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def bh_adjust(pvals: Iterable[float]) -> List[float]:
-    vals = np.asarray(list(pvals), dtype=float)
-    m = len(vals)
-    if m == 0:
-        return []
-    order = np.argsort(vals)
-    adjusted = np.empty(m, dtype=float)
-    ranked = vals[order]
-    tmp = ranked * m / np.arange(1, m + 1)
-    tmp = np.minimum.accumulate(tmp[::-1])[::-1]
-    tmp = np.clip(tmp, 0.0, 1.0)
-    adjusted[order] = tmp
-    return adjusted.tolist()
-
-
-def family_presence_by_site(target: dict) -> dict:
+def family_presence_by_site(target: dict, presence: pd.DataFrame, bait_type: np.ndarray) -> dict:
     family = target["family"]
     sites = set(target["sites"])
-    algae_present = []
-    fish_present = []
-    algae_total = 0
-    fish_total = 0
-
-    files = list(CORAL_REEF_DIR.glob("*.csv")) + list(NURSERY_DIR.glob("*.csv"))
-    for csv_path in sorted(files):
-        _, site, bait = parse_video_metadata(csv_path.name)
-        if site not in sites or bait not in BAIT_MAP:
-            continue
-        bait_type = BAIT_MAP[bait]
-        if bait_type not in {"algae", "fish"}:
-            continue
-
-        df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-        maxn = 0
-        for _, row in df.iterrows():
-            if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-                continue
-            fam = str(row.get("family", "")).strip().lower()
-            if fam != family:
-                continue
-            frame_time = parse_frame_time(row.get("frames", ""))
-            if frame_time is None:
-                continue
-            maxn = max(maxn, 1)
-        if bait_type == "algae":
-            algae_total += 1
-            algae_present.append(int(maxn > 0))
-        else:
-            fish_total += 1
-            fish_present.append(int(maxn > 0))
+    in_sites = presence.index.get_level_values("standort").isin(sites)
+    present = presence.loc[in_sites, family] if family in presence.columns else pd.Series(False, index=presence.index[in_sites])
+    algae_present = present[bait_type[in_sites] == "algae"].astype(int).tolist()
+    fish_present = present[bait_type[in_sites] == "fish"].astype(int).tolist()
+    algae_total = len(algae_present)
+    fish_total = len(fish_present)
 
     table = np.array(
         [
@@ -197,9 +130,45 @@ def family_presence_by_site(target: dict) -> dict:
     }
 
 
+def logistic_presence(targets: list[dict], presence: pd.DataFrame, bait_type: np.ndarray) -> dict:
+    """signal -> logistische Praesenzspalten; ein gestapelter Fit je Standortmenge."""
+    out = {}
+    site_sets = {tuple(sorted(t["sites"])) for t in targets}
+    for sites in sorted(site_sets):
+        group = [t for t in targets if tuple(sorted(t["sites"])) == sites]
+        in_sites = presence.index.get_level_values("standort").isin(sites)
+        y = presence.loc[in_sites].reindex(columns=[t["family"] for t in group], fill_value=False)
+        is_algae = (bait_type[in_sites] == "algae").astype(float)
+        X = np.column_stack([np.ones(len(is_algae)), is_algae])
+        fits = presence_models(X, y.to_numpy(dtype=float))
+        for target, fit in zip(group, fits.itertuples(index=False)):
+            if fit.method == "no_variation":
+                p_one = 1.0
+            elif target["direction"] == "greater":
+                p_one = float(stats.norm.sf(fit.z))
+            else:
+                p_one = float(stats.norm.cdf(fit.z))
+            out[target["signal"]] = {
+                "logit_or": float(np.exp(fit.coef)),
+                "logit_ci_low": float(np.exp(fit.ci_low)),
+                "logit_ci_high": float(np.exp(fit.ci_high)),
+                "logit_p_one_sided": p_one,
+                "logit_method": fit.method,
+            }
+    return out
+
+
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    results = [family_presence_by_site(t) for t in TARGETS]
+    maxn = compute_maxn_matrix(level="family", behaviour="exclude", baits=list(BAIT_MAP))
+    videos = load_video_table().set_index("filename").loc[maxn.index]
+    presence = (maxn > 0).set_index(pd.Index(videos["standort"], name="standort"), append=True)
+    bait_type = videos["koeder"].map(BAIT_MAP).to_numpy()
+
+    results = [family_presence_by_site(t, presence, bait_type) for t in TARGETS]
+    logistic = logistic_presence(TARGETS, presence, bait_type)
+    for r in results:
+        r.update(logistic[r["signal"]])
     pvals = [r["fisher_p"] for r in results]
     bh = bh_adjust(pvals)
     for r, adj in zip(results, bh):
@@ -214,6 +183,7 @@ def main() -> None:
         "# Präsenz-/Absenz-Modell für fokussierte Taxa und Familien",
         "",
         "Methodik: Videoebene, Presence/Absence je Taxon/Familie; Fisher-Exact-Test mit gerichteter Alternative auf den biologisch erwarteten Effekt.",
+        "Ergaenzend in der CSV: logistisches Praesenzmodell (logit_*; bei Separation Firth-penalisiert mit bestraftem LR-Test), gemeinsam fuer alle Familien einer Standortmenge geschaetzt.",
         "",
         "- For the herbivore signal in Nursery, the key question is whether the signal is driven by actual occurrence differences or by stronger abundance once present.",
         "- For the broader coral-reef fish-vs-algae signals, the question is whether one bait type triggers consistently more occurrence of the focal taxon.",
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Logistische Praesenzmodelle (Nachweis ja/nein) fuer viele Taxa zugleich.
+
+Alle Taxa teilen dieselbe Designmatrix X (Videos x Parameter, z. B.
+[1, bait_is_algae]); die Antworten liegen als (Videos x Taxa)-0/1-Matrix Y
+vor. IRLS laeuft fuer alle Spalten gleichzeitig: Gewichte, Fisher-Information
+X' W X (Taxa x p x p) und Newton-Schritte werden per einsum bzw.
+np.linalg.pinv ueber den Taxon-Stapel gerechnet.
+
+Firth (1993) / Heinze & Schemper (2002): Die Likelihood wird um
+1/2 log det(X' W X) bestraft; im Score steht y - mu + h (1/2 - mu) mit den
+Hebelwerten h der gewichteten Hutmatrix. Die Schaetzer bleiben bei
+(quasi-)vollstaendiger Separation endlich. Schritte werden wie in logistf
+auf MAX_STEP begrenzt und halbiert, solange die (bestrafte) Log-Likelihood
+sinkt.
+
+presence_models kombiniert beides: Maximum Likelihood mit Wald-Statistik,
+wo die Schaetzung stabil ist; sonst (Separation, |Koeffizient| oder
+Wald-Grenze > UNSTABLE_LIMIT) Firth mit bestraftem Likelihood-Quotienten-Test
+(Nullmodell mit fixiertem Koeffizienten und Strafterm des vollen Designs,
+wie logistf) und Wald-Intervall aus der bestraften Information. Spalten
+ohne Variation (Taxon in allen oder in keinem Video) enthalten keine
+Information ueber den Effekt: kein Schaetzer, p = 1 (wie Fisher exakt),
+method "no_variation".
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+MAX_ITER = 100
+TOLERANCE = 1e-8
+MAX_STEP = 5.0
+MAX_HALVING = 25
+# groessere |log(OR)| bzw. Wald-Grenzen gelten als separiert/instabil
+UNSTABLE_LIMIT = 20.0
+CI_LEVEL = 0.95
+
+
+def _information(x: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """X' W X je Spalte von w: (Taxa x p x p)."""
+    return np.einsum("ni,nm,nj->mij", x, w, x)
+
+
+def _loglik(x: np.ndarray, y: np.ndarray, coef: np.ndarray, firth: bool) -> np.ndarray:
+    """(Bestrafte) Log-Likelihood je Taxon; -inf bei singulaerer Information."""
+    eta = x @ coef.T
+    # y * eta - log(1 + exp(eta)), numerisch stabil
+    ll = (y * eta - np.logaddexp(0.0, eta)).sum(axis=0)
+    if firth:
+        mu = special.expit(eta)
+        sign, logdet = np.linalg.slogdet(_information(x, mu * (1 - mu)))
+        ll = ll + np.where(sign > 0, 0.5 * logdet, -np.inf)
+    return ll
+
+
+def logistic_fit(
+    x: np.ndarray,
+    y: np.ndarray,
+    firth: bool = False,
+    fixed: Sequence[bool] | None = None,
+    max_iter: int = MAX_ITER,
+    tol: float = TOLERANCE,
+) -> Dict[str, np.ndarray]:
+    """
+    Logistische Regression je Spalte von y auf das gemeinsame Design x.
+
+    fixed: je Parameter True = bei 0 festhalten (Nullmodell fuer den
+    bestraften LR-Test; die Strafe nutzt weiter das volle Design).
+
+    Rueckgabe: coef (Taxa x p), cov (Taxa x p x p, inverse Information der
+    freien Parameter, sonst NaN), loglik (bestraft bei firth), converged.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 1:
+        y = y[:, None]
+    n_taxa = y.shape[1]
+    n_par = x.shape[1]
+    free = np.ones(n_par, dtype=bool) if fixed is None else ~np.asarray(fixed, dtype=bool)
+    sub = np.ix_(np.arange(n_taxa), free, free)
+
+    coef = np.zeros((n_taxa, n_par))
+    loglik = _loglik(x, y, coef, firth)
+    converged = np.zeros(n_taxa, dtype=bool)
+    active = np.ones(n_taxa, dtype=bool)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        c = coef[idx]
+        ya = y[:, idx]
+        mu = special.expit(x @ c.T)
+        w = mu * (1 - mu)
+        info = _information(x, w)
+        resid = ya - mu
+        if firth:
+            inv = np.linalg.pinv(info)
+            hat = w * np.einsum("ni,mij,nj->nm", x, inv, x)
+            resid = resid + hat * (0.5 - mu)
+        score = (x.T @ resid).T
+        step_free = np.einsum("mij,mj->mi", np.linalg.pinv(info[:, free][:, :, free]), score[:, free])
+        step = np.zeros_like(c)
+        step[:, free] = step_free
+        largest = np.abs(step).max(axis=1, keepdims=True)
+        step = np.where(largest > MAX_STEP, step * MAX_STEP / np.maximum(largest, MAX_STEP), step)
+
+        ll_old = loglik[idx]
+        new = c + step
+        ll_new = _loglik(x, ya, new, firth)
+        for _ in range(MAX_HALVING):
+            worse = ~(ll_new >= ll_old - 1e-12)
+            if not worse.any():
+                break
+            step[worse] *= 0.5
+            new[worse] = c[worse] + step[worse]
+            ll_new[worse] = _loglik(x, ya[:, worse], new[worse], firth)
+
+        coef[idx] = new
+        loglik[idx] = ll_new
+        done = (np.abs(step).max(axis=1) < tol) | (np.abs(ll_new - ll_old) < tol * (np.abs(ll_new) + tol))
+        converged[idx[done]] = True
+        active[idx[done]] = False
+
+    mu = special.expit(x @ coef.T)
+    info = _information(x, mu * (1 - mu))[:, free][:, :, free]
+    cov = np.full((n_taxa, n_par, n_par), np.nan)
+    cov[sub] = np.linalg.pinv(info)
+    return {"coef": coef, "cov": cov, "loglik": loglik, "converged": converged}
+
+
+def presence_models(
+    x: np.ndarray,
+    y: np.ndarray,
+    term: int = 1,
+    features: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Logistisches Praesenzmodell je Spalte von y, ausgewertet fuer Parameter term.
+
+    Spalten: feature, coef (log-OR), se, z, ci_low, ci_high (log-OR-Skala),
+    p_two_sided, method ("glm_binomial", "firth" oder "no_variation"),
+    converged. Bei Firth
+    ist z die vorzeichenbehaftete Wurzel der bestraften LR-Statistik
+    (Grundlage fuer einseitige p-Werte), p_two_sided = chi2.sf(LR, 1).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 1:
+        y = y[:, None]
+    n_taxa = y.shape[1]
+    quantile = float(stats.norm.ppf(0.5 + CI_LEVEL / 2))
+
+    ml = logistic_fit(x, y)
+    coef = ml["coef"][:, term]
+    se = np.sqrt(ml["cov"][:, term, term])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = coef / se
+    low, high = coef - quantile * se, coef + quantile * se
+    stable = ml["converged"] & np.isfinite(coef) & np.isfinite(low) & np.isfinite(high)
+    stable &= np.maximum.reduce([np.abs(coef), np.abs(low), np.abs(high)]) <= UNSTABLE_LIMIT
+    p_two = 2 * special.ndtr(-np.abs(z))
+    method = np.where(stable, "glm_binomial", "firth").astype(object)
+    converged = ml["converged"].copy()
+
+    # konstante Antwort: Firth lieferte sonst einen LR-Test nur aus dem Strafterm
+    constant = np.all(y == y[:1], axis=0)
+    sep = np.flatnonzero(~stable & ~constant)
+    if len(sep):
+        full = logistic_fit(x, y[:, sep], firth=True)
+        fixed = np.zeros(x.shape[1], dtype=bool)
+        fixed[term] = True
+        null = logistic_fit(x, y[:, sep], firth=True, fixed=fixed)
+        b = full["coef"][:, term]
+        s = np.sqrt(full["cov"][:, term, term])
+        lr = np.maximum(2 * (full["loglik"] - null["loglik"]), 0.0)
+        coef[sep] = b
+        se[sep] = s
+        z[sep] = np.sign(b) * np.sqrt(lr)
+        low[sep], high[sep] = b - quantile * s, b + quantile * s
+        p_two[sep] = special.chdtrc(1, lr)
+        converged[sep] = full["converged"] & null["converged"]
+
+    coef[constant] = se[constant] = z[constant] = low[constant] = high[constant] = np.nan
+    p_two[constant] = 1.0
+    method[constant] = "no_variation"
+    converged[constant] = True
+
+    return pd.DataFrame(
+        {
+            "feature": list(features) if features is not None else list(range(n_taxa)),
+            "coef": coef,
+            "se": se,
+            "z": z,
+            "ci_low": low,
+            "ci_high": high,
+            "p_two_sided": p_two,
+            "method": method,
+            "converged": converged,
+        }
+    )
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Kruskal-Wallis und Mann-Whitney-U spaltenweise fuer ganze Merkmalsmatrizen.
+
+Eingabe ist eine (Videos x Merkmale)-Matrix (z. B. MaxN je Taxon) und eine
+Gruppenzuordnung je Video (z. B. Koeder). Statt je Merkmal Gruppen-Arrays zu
+bilden und stats.kruskal / stats.mannwhitneyu aufzurufen, werden alle Spalten
+in einem Durchlauf gerankt (stats.rankdata, axis=0):
+
+- Kruskal-Wallis: H aus den Rangsummen je Gruppe, geteilt durch die
+  Bindungskorrektur 1 - sum(t^3 - t) / (N^3 - N); p = chi2.sf(H, k - 1)
+- Mann-Whitney-U je Gruppenpaar: U von Gruppe a aus den Raengen im
+  gemeinsamen Paar-Sample; Normalapproximation mit Bindungs- und
+  Stetigkeitskorrektur
+
+Die Bindungssumme sum(t^3 - t) folgt je Spalte aus min/max-Raengen:
+jeder Wert liegt in einer Bindungsgruppe der Groesse t = max - min + 1 und
+traegt t^2 - 1 bei. Rechenreihenfolge wie scipy 1.17, die Werte sind
+bitgleich. Spalten ohne Bindungen, bei denen eine Stichprobe hoechstens 8
+Werte hat, rechnet scipy (method="auto") exakt; diese werden einzeln an
+stats.mannwhitneyu durchgereicht. Spalten mit NaN ergeben NaN (wie scipy).
+
+feature_rank_tests liefert zwei Tabellen im Langformat (je Merkmal bzw. je
+Merkmal und Gruppenpaar).
+"""
+
+from __future__ import annotations
+
+import itertools
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+ALTERNATIVES = ("two-sided", "greater", "less")
+# scipy waehlt den exakten Test, wenn eine Stichprobe so klein ist und keine Bindungen vorliegen
+EXACT_MAX_N = 8
+
+
+def _rank_columns(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mittlere Raenge je Spalte und sum(t^3 - t) je Spalte."""
+    ranks = stats.rankdata(values, method="average", axis=0)
+    ties = stats.rankdata(values, method="max", axis=0) - stats.rankdata(values, method="min", axis=0) + 1
+    return ranks, (ties**2 - 1).sum(axis=0)
+
+
+def mann_whitney_pvalue(
+    u_x: np.ndarray,
+    n_x: np.ndarray | float,
+    n_y: np.ndarray | float,
+    tie_term: np.ndarray,
+    alternative: str = "two-sided",
+) -> np.ndarray:
+    """Asymptotischer p-Wert wie scipy.stats.mannwhitneyu (mit Stetigkeitskorrektur)."""
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f"Unbekannte Alternative: {alternative}")
+    u_y = n_x * n_y - u_x
+    if alternative == "greater":
+        u_test, factor = u_x, 1.0
+    elif alternative == "less":
+        u_test, factor = u_y, 1.0
+    else:
+        u_test, factor = np.maximum(u_x, u_y), 2.0
+    n = n_x + n_y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # gleiche Rechenreihenfolge wie scipy (_get_mwu_z)
+        s = np.sqrt(n_x * n_y / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        z = (u_test - n_x * n_y / 2 - 0.5) / s
+    return np.clip(special.ndtr(-z) * factor, 0.0, 1.0)
+
+
+def kruskal_columns(groups: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kruskal-Wallis je Spalte; groups: eine (n_i x Merkmale)-Matrix je Gruppe.
+
+    Rueckgabe (H, p); NaN bei leerer Gruppe, NaN-Werten oder konstanter Spalte.
+    """
+    if len(groups) < 2:
+        raise ValueError("Kruskal-Wallis braucht mindestens zwei Gruppen")
+    sizes = [len(g) for g in groups]
+    values = np.concatenate([np.asarray(g, dtype=float) for g in groups], axis=0)
+    n_features = values.shape[1]
+    if min(sizes) == 0:
+        return np.full(n_features, np.nan), np.full(n_features, np.nan)
+
+    ranks, tie_term = _rank_columns(values)
+    total = sum(sizes)
+    bounds = list(itertools.accumulate(sizes, initial=0))
+    ssbn = sum(ranks[bounds[i] : bounds[i + 1]].sum(axis=0) ** 2 / sizes[i] for i in range(len(sizes)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correction = 1 - tie_term / (total**3 - total)
+        h = 12.0 / (total * (total + 1)) * ssbn - 3 * (total + 1)
+        h = h / correction
+    h[np.isnan(values).any(axis=0)] = np.nan
+    return h, special.chdtrc(len(sizes) - 1, h)
+
+
+def mann_whitney_columns(
+    x: np.ndarray,
+    y: np.ndarray,
+    alternative: str = "two-sided",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mann-Whitney-U (x gegen y) je Spalte; x: (n_x x Merkmale), y: (n_y x Merkmale).
+
+    Rueckgabe (U von x, p); NaN bei leerer Stichprobe oder NaN-Werten.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_x, n_y = len(x), len(y)
+    n_features = x.shape[1]
+    if n_x == 0 or n_y == 0:
+        return np.full(n_features, np.nan), np.full(n_features, np.nan)
+
+    ranks, tie_term = _rank_columns(np.concatenate([x, y], axis=0))
+    u_x = ranks[:n_x].sum(axis=0) - n_x * (n_x + 1) / 2
+    p_value = mann_whitney_pvalue(u_x, n_x, n_y, tie_term, alternative)
+
+    if min(n_x, n_y) <= EXACT_MAX_N:
+        for col in np.flatnonzero(tie_term == 0):
+            p_value[col] = stats.mannwhitneyu(x[:, col], y[:, col], alternative=alternative).pvalue
+
+    has_nan = np.isnan(x).any(axis=0) | np.isnan(y).any(axis=0)
+    u_x[has_nan] = np.nan
+    p_value[has_nan] = np.nan
+    return u_x, p_value
+
+
+def feature_rank_tests(
+    values: pd.DataFrame,
+    groups: Sequence[object] | pd.Series,
+    group_order: Sequence[object] | None = None,
+    alternative: str = "two-sided",
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Kruskal-Wallis und paarweise Mann-Whitney-U fuer alle Spalten von values.
+
+    groups: Gruppe je Zeile von values; group_order: Gruppenreihenfolge
+    (Standard: sortiert), bestimmt auch die Paare (itertools.combinations).
+
+    Rueckgabe:
+    - global_df:   feature, n_total, n_groups, h_stat, p_value
+    - pairwise_df: feature, group_a, group_b, n_a, n_b, u_stat, p_value
+    """
+    labels = np.asarray(groups, dtype=object)
+    order = sorted(pd.unique(labels).tolist()) if group_order is None else list(group_order)
+    features = list(values.columns)
+    matrix = values.to_numpy(dtype=float)
+    by_group: Dict[object, np.ndarray] = {g: matrix[labels == g] for g in order}
+
+    h_stat, p_value = kruskal_columns([by_group[g] for g in order])
+    global_df = pd.DataFrame(
+        {
+            "feature": features,
+            "n_total": int(sum(len(m) for m in by_group.values())),
+            "n_groups": len(order),
+            "h_stat": h_stat,
+            "p_value": p_value,
+        }
+    )
+
+    pair_frames: List[pd.DataFrame] = []
+    for a, b in itertools.combinations(order, 2):
+        u_stat, p_pair = mann_whitney_columns(by_group[a], by_group[b], alternative=alternative)
+        pair_frames.append(
+            pd.DataFrame(
+                {
+                    "feature": features,
+                    "group_a": a,
+                    "group_b": b,
+                    "n_a": len(by_group[a]),
+                    "n_b": len(by_group[b]),
+                    "u_stat": u_stat,
+                    "p_value": p_pair,
+                }
+            )
+        )
+    pairwise_columns = ["feature", "group_a", "group_b", "n_a", "n_b", "u_stat", "p_value"]
+    pairwise_df = pd.concat(pair_frames, ignore_index=True) if pair_frames else pd.DataFrame(columns=pairwise_columns)
+    return global_df, pairwise_df
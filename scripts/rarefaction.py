@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Stichprobenbasierte Rarefaction, Artenakkumulation und Richness-Schaetzer
+auf Video x Taxon-Inzidenzmatrizen.
+
+Die Inzidenz liegt bitgepackt vor (np.packbits, ein Bit je Taxon); die
+Vereinigung der Taxa mehrerer Videos ist ein bitweises ODER, die Richness
+die Anzahl gesetzter Bits (np.bitwise_count). Damit werden alle
+Monte-Carlo-Replikate zugleich ausgewertet statt Python-Mengen je Replikat
+zu vereinigen; die Teilmengen kommen wie bisher aus
+rng.choice(n, size=k, replace=False) (gleicher Zufallsstrom).
+
+Analytisch (Colwell, Mao & Chang 2004) aus den Inzidenzhaeufigkeiten
+Q_j = #{Taxa in genau j von H Videos}:
+
+    tau(h)     = S_obs - sum_j alpha_jh Q_j,  alpha_jh = C(H - h, j) / C(H, j)
+    sigma^2(h) = sum_j (1 - alpha_jh)^2 Q_j - tau(h)^2 / S_est
+
+(Mao Tau, erwartete Richness bei h zufaellig gezogenen Videos, S_est = Chao2).
+Extrapolation: Chao2 (bias-korrigiert), ICE (Schwelle 10 Videos) und
+Jackknife erster/zweiter Ordnung.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+DEFAULT_BATCH_SIZE = 2000
+# Taxa in hoechstens so vielen Videos gelten fuer ICE als selten
+ICE_RARE_THRESHOLD = 10
+CI_LEVEL = 0.95
+
+
+def incidence_matrix(
+    taxa_sets: Sequence[Iterable[str]],
+    taxa: Sequence[str] | None = None,
+) -> Tuple[np.ndarray, List[str]]:
+    """Boolesche (Videos x Taxa)-Matrix; Taxa sortiert, falls nicht vorgegeben."""
+    universe = sorted(set().union(*[set(t) for t in taxa_sets])) if taxa is None else list(taxa)
+    index = {t: i for i, t in enumerate(universe)}
+    mat = np.zeros((len(taxa_sets), len(universe)), dtype=bool)
+    for row, taxa_row in enumerate(taxa_sets):
+        cols = [index[t] for t in taxa_row if t in index]
+        mat[row, cols] = True
+    return mat, universe
+
+
+def pack_incidence(incidence: np.ndarray) -> np.ndarray:
+    """Bitgepackte Inzidenz (Videos x ceil(Taxa / 8)), uint8."""
+    return np.packbits(np.asarray(incidence, dtype=bool), axis=1)
+
+
+def subsample_indices(n: int, k: int, n_rep: int, rng: np.random.Generator) -> np.ndarray:
+    """(n_rep x k)-Indexmatrix ohne Zuruecklegen; gleicher Zufallsstrom wie rng.choice je Replikat."""
+    out = np.empty((n_rep, k), dtype=np.intp)
+    for i in range(n_rep):
+        out[i] = rng.choice(n, size=k, replace=False)
+    return out
+
+
+def union_richness(
+    packed: np.ndarray,
+    subsets: np.ndarray,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> np.ndarray:
+    """Anzahl verschiedener Taxa je Zeile von subsets (Videoindizes)."""
+    out = np.empty(len(subsets), dtype=float)
+    for start in range(0, len(subsets), batch_size):
+        block = packed[subsets[start : start + batch_size]]
+        union = np.bitwise_or.reduce(block, axis=1)
+        out[start : start + batch_size] = np.bitwise_count(union).sum(axis=1)
+    return out
+
+
+def rarefied_richness_mc(
+    incidence: np.ndarray,
+    k: int,
+    n_rep: int,
+    rng: np.random.Generator,
+) -> Tuple[float, float, float]:
+    """Monte-Carlo-Rarefaction auf k Videos: (Mittel, 2.5 %-, 97.5 %-Perzentil)."""
+    subsets = subsample_indices(len(incidence), k, n_rep, rng)
+    vals = union_richness(pack_incidence(incidence), subsets)
+    return float(np.mean(vals)), float(np.percentile(vals, 2.5)), float(np.percentile(vals, 97.5))
+
+
+def frequency_counts(incidence: np.ndarray) -> np.ndarray:
+    """Q_j fuer j = 0..H (Q_0 = nicht beobachtete Taxa der Spaltenmenge)."""
+    incidence = np.asarray(incidence, dtype=bool)
+    return np.bincount(incidence.sum(axis=0), minlength=incidence.shape[0] + 1)
+
+
+def richness_estimators(incidence: np.ndarray) -> Dict[str, float]:
+    """
+    S_obs, Chao2 (bias-korrigiert), ICE, Jackknife 1 und 2.
+
+    ICE ist NaN, wenn alle seltenen Taxa Einzelfunde sind (Abdeckung 0) oder
+    nur ein Video seltene Taxa enthaelt.
+    """
+    q = frequency_counts(incidence).astype(float)
+    m = float(len(q) - 1)
+    s_obs = float(q[1:].sum())
+    q1 = q[1] if m >= 1 else 0.0
+    q2 = q[2] if m >= 2 else 0.0
+    out = {"s_obs": s_obs, "chao2": math.nan, "ice": math.nan, "jackknife1": math.nan, "jackknife2": math.nan}
+    if m < 1:
+        return out
+
+    out["chao2"] = float(s_obs + (m - 1) / m * q1 * (q1 - 1) / (2 * (q2 + 1)))
+    out["jackknife1"] = float(s_obs + q1 * (m - 1) / m)
+    if m >= 2:
+        out["jackknife2"] = float(s_obs + q1 * (2 * m - 3) / m - q2 * (m - 2) ** 2 / (m * (m - 1)))
+
+    j = np.arange(len(q))
+    rare = (j >= 1) & (j <= ICE_RARE_THRESHOLD)
+    s_rare = float(q[rare].sum())
+    n_rare = float((j * q)[rare].sum())
+    incidence = np.asarray(incidence, dtype=bool)
+    rare_taxa = np.isin(incidence.sum(axis=0), j[rare])
+    m_rare = float(incidence[:, rare_taxa].any(axis=1).sum())
+    if n_rare > 0 and q1 < n_rare and m_rare > 1:
+        coverage = 1 - q1 / n_rare
+        gamma2 = s_rare / coverage * m_rare / (m_rare - 1) * float((j * (j - 1) * q)[rare].sum()) / n_rare**2 - 1
+        out["ice"] = float((s_obs - s_rare) + s_rare / coverage + q1 / coverage * max(gamma2, 0.0))
+    elif n_rare == 0:
+        out["ice"] = s_obs
+    return out
+
+
+def mao_tau(incidence: np.ndarray, sizes: Sequence[int] | None = None) -> pd.DataFrame:
+    """
+    Erwartete Richness bei h Videos (Mao Tau) mit Standardabweichung und
+    95 %-Normalintervall; sizes: h-Werte (Standard 1..H).
+    """
+    q = frequency_counts(incidence).astype(float)
+    n_videos = len(q) - 1
+    h = np.arange(1, n_videos + 1) if sizes is None else np.asarray(sizes, dtype=int)
+    j = np.arange(1, n_videos + 1)
+    s_obs = float(q[1:].sum())
+
+    hh = h[:, None].astype(float)
+    jj = j[None, :].astype(float)
+    valid = (h[:, None] + j[None, :]) <= n_videos
+    with np.errstate(invalid="ignore"):
+        log_alpha = (
+            special.gammaln(n_videos - hh + 1)
+            + special.gammaln(n_videos - jj + 1)
+            - special.gammaln(np.where(valid, n_videos - hh - jj + 1, 1.0))
+            - special.gammaln(n_videos + 1)
+        )
+    alpha = np.where(valid, np.exp(log_alpha), 0.0)
+    expected = s_obs - alpha @ q[1:]
+
+    s_est = richness_estimators(incidence)["chao2"] if n_videos else math.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (1 - alpha) ** 2 @ q[1:] - expected**2 / s_est
+    sd = np.sqrt(np.maximum(variance, 0.0))
+    z = float(stats.norm.ppf(0.5 + CI_LEVEL / 2))
+    return pd.DataFrame(
+        {
+            "n_videos": h,
+            "expected_richness": expected,
+            "sd": sd,
+            "ci95_low": np.maximum(expected - z * sd, 0.0),
+            "ci95_high": expected + z * sd,
+        }
+    )
+
+
+def accumulation_curves(
+    taxa_sets: Sequence[Set[str]],
+    groups: Sequence[object] | pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Mao-Tau-Kurven (h = 1..n_Gruppe) fuer alle Gruppen zugleich.
+
+    groups: eine Spalte bzw. ein DataFrame mit den Gruppierungsspalten (z. B.
+    standort, koeder); die Gruppenspalten stehen vor den Kurvenspalten.
+    """
+    keys = groups if isinstance(groups, pd.DataFrame) else pd.DataFrame({"group": list(groups)})
+    incidence, _ = incidence_matrix(taxa_sets)
+    key_cols = list(keys.columns)
+    frames: List[pd.DataFrame] = []
+    for key, idx in keys.reset_index(drop=True).groupby(key_cols, sort=True).indices.items():
+        curve = mao_tau(incidence[idx])
+        key_values = key if isinstance(key, tuple) else (key,)
+        for col, value in zip(key_cols, key_values):
+            curve[col] = value
+        frames.append(curve[key_cols + [c for c in curve.columns if c not in key_cols]])
+    if not frames:
+        return pd.DataFrame(columns=key_cols + ["n_videos", "expected_richness", "sd", "ci95_low", "ci95_high"])
+    return pd.concat(frames, ignore_index=True)
@@ -1,45 +1,43 @@
 #!/usr/bin/env python3
 """
-Rebuilds the core analysis outputs in a deterministic order.
+Rebuilds the core analysis outputs via the dependency-aware pipeline.
+
+Only stale steps are rerun (see scripts/pipeline.py); independent steps run
+in parallel. Use --all to rebuild every registered analysis, not just the
+core set.
 
 Usage:
-    python scripts/rebuild_core_results.py
+    python scripts/rebuild_core_results.py [--all] [--force] [--jobs N] [--dry-run]
 """
 
 from __future__ import annotations
 
-import subprocess
-import sys
-from pathlib import Path
-
+import argparse
 
-ROOT = Path(__file__).resolve().parents[1]
+from pipeline import run_pipeline
 
-SCRIPTS = [
-    "scripts/species_richness_cut47min_analysis.py",
-    "scripts/standortvergleich_cut47min_analysis.py",
-    "scripts/update_visibility_analysis.py",
-    "scripts/visibility_adjusted_models.py",
-    "scripts/visibility_additional_tests.py",
-    "scripts/visibility_site_stratified_tests.py",
+CORE_STEPS = [
+    "annotation_store",
+    "species_richness",
+    "standortvergleich",
+    "update_visibility",
+    "visibility_adjusted_models",
+    "visibility_additional_tests",
+    "visibility_site_stratified",
 ]
 
 
 def main() -> int:
-    python_exe = sys.executable
-    print(f"Using Python: {python_exe}")
-
-    for rel_path in SCRIPTS:
-        script_path = ROOT / rel_path
-        print(f"\n[RUN] {rel_path}")
-        result = subprocess.run([python_exe, str(script_path)], cwd=str(ROOT))
-        if result.returncode != 0:
-            print(f"[FAIL] {rel_path} (exit={result.returncode})")
-            return result.returncode
-        print(f"[OK] {rel_path}")
-
-    print("\nCore rebuild finished successfully.")
-    return 0
+    parser = argparse.ArgumentParser(description="Rebuild the core analysis outputs.")
+    parser.add_argument("--all", action="store_true", help="rebuild all registered analyses, not only the core set")
+    parser.add_argument("--force", action="store_true", help="rerun steps even if their inputs are unchanged")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel steps (default: VIDEO_WORKERS or CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="only print which steps would run")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print script output of successful steps")
+    args = parser.parse_args()
+
+    targets = None if args.all else CORE_STEPS
+    return run_pipeline(targets, jobs=args.jobs, force=args.force, dry_run=args.dry_run, verbose=args.verbose)
 
 
 if __name__ == "__main__":
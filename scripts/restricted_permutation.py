@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Eingeschraenkte Permutationstests (innerhalb Strata) fuer OLS-Modelle.
+
+Typischer Fall: log1p(y) ~ bait + site + bait:site, wobei die Bait-Labels nur
+innerhalb der Standorte permutiert werden. Das Design zerfaellt in
+
+- feste Spalten F (Achsenabschnitt, Standort-Dummies), die sich unter der
+  Permutation nicht aendern, und
+- permutierte Spalten Z = x_perm * W (x = Bait-Indikator, W = Gewichte, z. B.
+  Einsen fuer den Haupteffekt und Standort-Dummies fuer die Interaktion).
+
+F wird einmal per QR zerlegt (SVD bei Rangdefizit); nach Frisch-Waugh-Lovell
+folgen die Koeffizienten von Z und die Residuenquadratsumme aller
+Permutationen aus wenigen Matrixprodukten (Z~ = Z - Q Q'Z, Z~'Z~ und Z~'Y je
+Permutation) statt einem lstsq je Permutation. Mehrere Zielvariablen (Spalten
+von Y) werden mit denselben Permutationen gemeinsam ausgewertet.
+
+Fuer Regressionen mit robustem Standardfehler liefert HC3TermPermutation den
+HC3-t-Wert eines einzelnen permutierten Regressors (z. B. Sichtweite) fuer
+alle Permutationen eines Blocks auf dem einmal aus der Formel gebauten Design
+(blocked_permutation_pvalue).
+
+Die Permutationen werden wie in den bisherigen Schleifen gezogen: je
+Permutation ein rng.permutation je Stratum, Strata in sortierter Reihenfolge
+(np.unique). Bei p-Werten zaehlen Permutationswerte als >= beobachtet, wenn sie
+den beobachteten Wert bis auf eine kleine Rundungstoleranz erreichen.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Mapping, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_BATCH_SIZE = 1000
+# Gleichstaende bis auf Rundung (wie EPS = sqrt(.Machine$double.eps) in vegan)
+TIE_TOLERANCE = float(np.sqrt(np.finfo(float).eps))
+LEVERAGE_TOLERANCE = 1e-10
+
+
+def _as_rng(rng: np.random.Generator | int | None) -> np.random.Generator:
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def block_permutations(
+    blocks: Sequence[np.ndarray],
+    n: int,
+    n_perm: int,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """(n_perm x n)-Indexmatrix; je Zeile ein rng.permutation je Block (in Block-Reihenfolge)."""
+    generator = _as_rng(rng)
+    out = np.empty((n_perm, n), dtype=np.intp)
+    for b in range(n_perm):
+        row = np.arange(n)
+        for idx in blocks:
+            row[idx] = idx[generator.permutation(len(idx))]
+        out[b] = row
+    return out
+
+
+def within_strata_permutations(
+    strata: Sequence[object],
+    n_perm: int,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """(n_perm x n)-Indexmatrix; je Zeile eine Permutation nur innerhalb der Strata."""
+    strata_arr = np.asarray(strata)
+    blocks = [np.flatnonzero(strata_arr == s) for s in np.unique(strata_arr)]
+    return block_permutations(blocks, len(strata_arr), n_perm, rng)
+
+
+def count_exceedances(observed: np.ndarray, perm_values: np.ndarray) -> np.ndarray:
+    """Anzahl Permutationswerte >= beobachtet (je Spalte, mit Rundungstoleranz)."""
+    observed = np.asarray(observed, dtype=float)
+    tol = TIE_TOLERANCE * np.maximum(1.0, np.abs(observed))
+    with np.errstate(invalid="ignore"):
+        hits = np.isfinite(perm_values) & (perm_values >= observed - tol)
+    return hits.sum(axis=0)
+
+
+class RestrictedOLS:
+    """Vorbereitete Zerlegung fuer feste Spalten F und Gewichte W (Z = x * W)."""
+
+    def __init__(self, fixed: np.ndarray, weights: np.ndarray, y: np.ndarray):
+        self.fixed = np.asarray(fixed, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.y = y[:, None] if y.ndim == 1 else y
+        self.n, self.q = self.fixed.shape
+        self.r = self.weights.shape[1]
+        self.q_basis = self._column_basis(self.fixed)
+        self.y_resid = self.y - self.q_basis @ (self.q_basis.T @ self.y)
+        self.sse_fixed = (self.y_resid**2).sum(axis=0)
+
+    @staticmethod
+    def _column_basis(matrix: np.ndarray) -> np.ndarray:
+        # Orthonormale Basis des Spaltenraums; bei Rangdefizit (z. B. Standort-
+        # Dummy ohne Videos) fallen die leeren Richtungen weg
+        q, r = np.linalg.qr(matrix)
+        diag = np.abs(np.diag(r))
+        if len(diag) and diag.min() > diag.max() * max(matrix.shape) * np.finfo(float).eps:
+            return q
+        u, sv, _ = np.linalg.svd(matrix, full_matrices=False)
+        return u[:, sv > sv.max() * max(matrix.shape) * np.finfo(float).eps]
+
+    def cross_products(self, x_perm: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(Z~'Z~, Z~'Y) je Zeile von x_perm (Formen b x r x r und b x r x p)."""
+        b = x_perm.shape[0]
+        z = x_perm[:, :, None] * self.weights[None, :, :]
+        z_flat = z.transpose(1, 0, 2).reshape(self.n, b * self.r)
+        z_resid = z_flat - self.q_basis @ (self.q_basis.T @ z_flat)
+        z_resid = z_resid.reshape(self.n, b, self.r)
+        gram = np.einsum("nbi,nbj->bij", z_resid, z_resid)
+        cross = np.einsum("nbi,np->bip", z_resid, self.y_resid)
+        return gram, cross
+
+    @staticmethod
+    def solve(gram: np.ndarray, cross: np.ndarray) -> np.ndarray:
+        try:
+            return np.linalg.solve(gram, cross)
+        except np.linalg.LinAlgError:
+            # Rangdefizit (z. B. ein Standort nur mit einem Bait-Typ)
+            return np.linalg.pinv(gram) @ cross
+
+    def statistics(
+        self,
+        x_perm: np.ndarray,
+        tests: Mapping[str, Tuple[str, object]],
+    ) -> Dict[str, np.ndarray]:
+        """
+        Teststatistiken je Permutation (Zeilen) und Zielvariable (Spalten).
+
+        tests: Name -> ("abs_beta", j) fuer |Koeffizient der Z-Spalte j| oder
+        ("f", cols) fuer den genesteten F-Test ohne die Z-Spalten cols.
+        """
+        gram, cross = self.cross_products(x_perm)
+        beta = self.solve(gram, cross)
+        sse_full = self.sse_fixed[None, :] - (cross * beta).sum(axis=1)
+        df_full = self.n - self.q - self.r
+
+        out: Dict[str, np.ndarray] = {}
+        for name, (kind, spec) in tests.items():
+            if kind == "abs_beta":
+                out[name] = np.abs(beta[:, int(spec), :])
+            elif kind == "f":
+                dropped = [int(c) for c in spec]
+                kept = [c for c in range(self.r) if c not in dropped]
+                if kept:
+                    sub_gram = gram[:, kept][:, :, kept]
+                    sub_cross = cross[:, kept, :]
+                    sse_red = self.sse_fixed[None, :] - (sub_cross * self.solve(sub_gram, sub_cross)).sum(axis=1)
+                else:
+                    sse_red = np.broadcast_to(self.sse_fixed[None, :], sse_full.shape)
+                df_num = len(dropped)
+                if df_num <= 0 or df_full <= 0:
+                    out[name] = np.full(sse_full.shape, np.nan)
+                    continue
+                ms_den = sse_full / df_full
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    f_val = ((sse_red - sse_full) / df_num) / ms_den
+                out[name] = np.where(ms_den > 0, f_val, np.nan)
+            else:
+                raise ValueError(f"Unbekannter Testtyp: {kind}")
+        return out
+
+
+def restricted_permutation_test(
+    y: np.ndarray,
+    fixed: np.ndarray,
+    weights: np.ndarray,
+    x: np.ndarray,
+    strata: Sequence[object],
+    tests: Mapping[str, Tuple[str, object]],
+    n_perm: int,
+    rng: np.random.Generator | int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Permutationstest fuer OLS mit x innerhalb der Strata permutiert.
+
+    y: Vektor oder (n x p)-Matrix (p Zielvariablen mit denselben Permutationen).
+    Rueckgabe je Test: {"observed": (p,), "p_value": (p,)} mit
+    p = (#{T_perm >= T_obs} + 1) / (n_perm + 1).
+    """
+    model = RestrictedOLS(fixed, weights, y)
+    x = np.asarray(x, dtype=float)
+    observed = model.statistics(x[None, :], tests)
+    counts = {name: np.zeros(model.y.shape[1], dtype=np.int64) for name in tests}
+
+    perm = within_strata_permutations(strata, n_perm, rng)
+    for start in range(0, n_perm, batch_size):
+        perm_stats = model.statistics(x[perm[start : start + batch_size]], tests)
+        for name in tests:
+            counts[name] += count_exceedances(observed[name][0], perm_stats[name])
+
+    return {
+        name: {
+            "observed": observed[name][0],
+            "p_value": (counts[name] + 1.0) / (n_perm + 1.0),
+        }
+        for name in tests
+    }
+
+
+class HC3TermPermutation:
+    """
+    Robuster (HC3) t-Wert eines einzelnen permutierten Regressors x bei festen
+    uebrigen Designspalten F, fuer viele Permutationen von x zugleich.
+
+    Mit x~ = (I - Q Q') x (Frisch-Waugh-Lovell) gilt beta = x~'y / x~'x~,
+    e = y~ - x~ beta, h = h_F + x~^2 / x~'x~ und
+    Var_HC3(beta) = sum x~^2 e^2 / (1 - h)^2 / (x~'x~)^2.
+    """
+
+    def __init__(self, fixed: np.ndarray, y: np.ndarray):
+        fixed = np.asarray(fixed, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.q_basis = RestrictedOLS._column_basis(fixed)
+        self.lev_fixed = (self.q_basis**2).sum(axis=1)
+        self.y_resid = y - self.q_basis @ (self.q_basis.T @ y)
+
+    def t_values(self, x_perm: np.ndarray) -> np.ndarray:
+        """t-Werte je Zeile von x_perm (b x n)."""
+        x_t = np.asarray(x_perm, dtype=float).T
+        x_resid = x_t - self.q_basis @ (self.q_basis.T @ x_t)
+        sxx = (x_resid**2).sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta = (x_resid * self.y_resid[:, None]).sum(axis=0) / sxx
+            resid = self.y_resid[:, None] - x_resid * beta
+            lev = self.lev_fixed[:, None] + x_resid**2 / sxx
+            omega = resid**2 / (1.0 - lev) ** 2
+            var = (x_resid**2 * omega).sum(axis=0) / sxx**2
+            t_val = beta / np.sqrt(var)
+        # Hebelwert 1 (z. B. Koeder mit nur einem Video): HC3-Varianz unendlich,
+        # statsmodels liefert dann t = 0
+        return np.where((lev >= 1.0 - LEVERAGE_TOLERANCE).any(axis=0), 0.0, t_val)
+
+
+def blocked_permutation_pvalue(
+    df: pd.DataFrame,
+    formula: str,
+    term: str,
+    block_cols: Sequence[str] | None = None,
+    n_perm: int = 3000,
+    seed: int | np.random.Generator | None = 42,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> float:
+    """
+    Permutations-p-Wert fuer |t_HC3| des Terms in smf.ols(formula).
+
+    Das Design wird einmal aus der Formel gebaut; permutiert wird nur die
+    Spalte term innerhalb der Bloecke df.groupby(block_cols, sort=False) (ohne
+    block_cols ueber alle Zeilen), in derselben Zufallsreihenfolge wie die
+    frueheren Schleifen mit rng.permutation je Block.
+    """
+    # statsmodels nur fuer den Formelpfad laden (Designaufbau via patsy)
+    import statsmodels.formula.api as smf
+
+    model = smf.ols(formula, data=df)
+    exog = np.asarray(model.exog, dtype=float)
+    col = list(model.exog_names).index(term)
+    fixed = np.delete(exog, col, axis=1)
+    x = exog[:, col]
+    engine = HC3TermPermutation(fixed, np.asarray(model.endog, dtype=float))
+    t_obs = np.abs(engine.t_values(x[None, :]))
+
+    if block_cols:
+        groups = df.groupby(list(block_cols), sort=False).groups
+        blocks = [df.index.get_indexer(labels) for labels in groups.values()]
+    else:
+        blocks = [np.arange(len(df))]
+    perm = block_permutations(blocks, len(df), n_perm, seed)
+
+    ge = 0
+    for start in range(0, n_perm, batch_size):
+        t_perm = np.abs(engine.t_values(x[perm[start : start + batch_size]]))
+        ge += int(count_exceedances(t_obs, t_perm[:, None])[0])
+    return (ge + 1) / (n_perm + 1)
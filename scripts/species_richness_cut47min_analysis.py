@@ -18,6 +18,10 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import read_video_csv
+from multiple_testing import holm_adjust
+from taxonomy import taxon_keys
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 OUT_ROOT = ROOT / "results"
@@ -58,15 +62,6 @@ def is_truthy(value: object) -> bool:
     return True
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -76,46 +71,15 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    """
-    User rule:
-    - species if available
-    - else next hierarchy level (genus/family/label), e.g. Parrotfishes
-    - feeding/interested ignored upstream
-    """
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
 def load_video_richness(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
     rows_total = len(df)
-    taxon_keys: set[str] = set()
-    rows_used = 0
-
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-
-        key = build_taxon_key(row)
-        if key:
-            taxon_keys.add(key)
-            rows_used += 1
+    non_behavior = ~(df["feeding"].map(is_truthy) | df["interested"].map(is_truthy))
+    keys = taxon_keys(df[non_behavior])
+    keys = keys[keys != ""]
+    rows_used = len(keys)
+    video_taxa: set[str] = set(keys.tolist())
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
@@ -123,7 +87,7 @@ def load_video_richness(csv_path: Path) -> Dict[str, object]:
         "date": date,
         "standort": standort,
         "koeder": koeder,
-        "species_richness": len(taxon_keys),
+        "species_richness": len(video_taxa),
         "rows_total": rows_total,
         "rows_used": rows_used,
         "is_short_video": csv_path.name == SHORT_VIDEO_NAME,
@@ -132,26 +96,6 @@ def load_video_richness(csv_path: Path) -> Dict[str, object]:
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-
-    return adjusted.tolist()
-
-
 def pairwise_mannwhitney(df: pd.DataFrame, group_col: str) -> pd.DataFrame:
     levels = sorted(df[group_col].dropna().unique().tolist())
     rows: List[Dict[str, object]] = []
@@ -27,6 +27,12 @@ from scipy.cluster.hierarchy import dendrogram, linkage
 from scipy import stats
 from scipy.spatial.distance import pdist, squareform
 
+from annotation_store import read_video_csv
+from multiple_testing import holm_adjust
+from ordination import pcoa_coordinates
+from permutation_tests import permutation_test
+from taxonomy import taxon_keys
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -54,15 +60,6 @@ def is_truthy(value: object) -> bool:
     return True
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -72,37 +69,14 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
 def load_video_data(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
+    df = read_video_csv(csv_path)
 
-    taxa: set[str] = set()
-    rows_used = 0
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-        key = build_taxon_key(row)
-        if key:
-            taxa.add(key)
-            rows_used += 1
+    non_behavior = ~(df["feeding"].map(is_truthy) | df["interested"].map(is_truthy))
+    keys = taxon_keys(df[non_behavior])
+    keys = keys[keys != ""]
+    taxa: set[str] = set(keys.tolist())
+    rows_used = len(keys)
 
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
@@ -117,22 +91,6 @@ def load_video_data(csv_path: Path) -> Dict[str, object]:
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
 def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
     total = len(x) * len(y)
     if total == 0:
@@ -208,7 +166,9 @@ def stratified_permutation_utumbi_vs_milimani(videos_df: pd.DataFrame, n_perm: i
     if sub.empty:
         return {
             "test": "Stratifizierter Permutationstest (Utumbi vs Milimani | by koeder)",
-            "n_perm": n_perm,
+            "method": "",
+            "n_perm": math.nan,
+            "n_assignments": 0,
             "n_rows": 0,
             "n_baits": 0,
             "stat_mean_diff": math.nan,
@@ -221,28 +181,23 @@ def stratified_permutation_utumbi_vs_milimani(videos_df: pd.DataFrame, n_perm: i
     y = sub.loc[sub["standort"] == "milimani", "species_richness"].astype(float).values
     obs = float(np.mean(x) - np.mean(y))
 
-    parts = []
-    for bait, part in sub.groupby("koeder"):
-        vals = part["species_richness"].astype(float).to_numpy()
-        labels = part["standort"].astype(str).to_numpy().copy()
-        parts.append((vals, labels))
-
-    perm_stats = np.empty(n_perm, dtype=float)
-    for i in range(n_perm):
-        x_vals = []
-        y_vals = []
-        for vals, labels in parts:
-            shuffled = labels.copy()
-            RNG.shuffle(shuffled)
-            x_vals.extend(vals[shuffled == "utumbi"])
-            y_vals.extend(vals[shuffled == "milimani"])
-        perm_stats[i] = float(np.mean(x_vals) - np.mean(y_vals))
-
-    p_val = float(np.mean(np.abs(perm_stats) >= abs(obs)))
+    # exakte Nullverteilung (Summen-DP je Koeder) statt Zufallspermutationen,
+    # Monte-Carlo mit n_perm nur als Rueckfall
+    result = permutation_test(
+        sub["species_richness"].astype(float).to_numpy(),
+        (sub["standort"] == "utumbi").to_numpy(),
+        strata=sub["koeder"].to_numpy(),
+        n_perm=n_perm,
+        rng=RNG,
+    )
+    p_val = float(result["p_value"])
 
     return {
         "test": "Stratifizierter Permutationstest (Utumbi vs Milimani | by koeder)",
-        "n_perm": n_perm,
+        "method": result["method"],
+        # n_perm nur bei Monte-Carlo; exakte Tests bewerten alle Zuordnungen
+        "n_perm": n_perm if result["method"] == "monte_carlo" else math.nan,
+        "n_assignments": int(result["n_assignments"]),
         "n_rows": int(len(sub)),
         "n_baits": int(len(valid_baits)),
         "stat_mean_diff": obs,
@@ -289,30 +244,8 @@ def pcoa_from_jaccard(binary_matrix: np.ndarray) -> np.ndarray:
     if binary_matrix.shape[0] < 3:
         return np.zeros((binary_matrix.shape[0], 2))
 
-    dist_vec = pdist(binary_matrix, metric="jaccard")
-    dist_mat = squareform(dist_vec)
-
-    n = dist_mat.shape[0]
-    d2 = dist_mat ** 2
-    j = np.eye(n) - np.ones((n, n)) / n
-    b = -0.5 * j @ d2 @ j
-
-    eigvals, eigvecs = np.linalg.eigh(b)
-    idx = np.argsort(eigvals)[::-1]
-    eigvals = eigvals[idx]
-    eigvecs = eigvecs[:, idx]
-
-    positive = eigvals > 1e-12
-    eigvals = eigvals[positive]
-    eigvecs = eigvecs[:, positive]
-
-    if len(eigvals) == 0:
-        return np.zeros((n, 2))
-
-    coords = eigvecs * np.sqrt(eigvals)
-    if coords.shape[1] == 1:
-        coords = np.column_stack([coords[:, 0], np.zeros(n)])
-    return coords[:, :2]
+    dist_mat = squareform(pdist(binary_matrix, metric="jaccard"))
+    return pcoa_coordinates(dist_mat, n_components=2)
 
 
 def create_figures(videos_df: pd.DataFrame, overlap_df: pd.DataFrame, site_sets: Dict[str, set[str]]) -> None:
@@ -502,6 +435,10 @@ def build_markdown_report(
             f"- {r['test']}: p={r['p_value']:.4g}, signifikant={bool(r['significant_0_05'])}, "
             f"Mittelwertdifferenz (Utumbi-Milimani)={r['stat_mean_diff']:.3f}"
         )
+        if r["method"] == "monte_carlo":
+            lines.append(f"- Methode: Monte-Carlo mit {int(r['n_perm'])} Permutationen")
+        else:
+            lines.append(f"- Methode: {r['method']} (exakt, {int(r['n_assignments'])} Zuordnungen)")
         lines.append(f"- {r['note']}")
     lines.append("")
     lines.append("## Statistik-Tabellen")
@@ -1,21 +1,20 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import re
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy import stats
+
+from annotation_store import load_video_table
+from jackknife_sensitivity import group_out_masks, leave_k_out_masks, leave_one_out_masks, mann_whitney_drop
+from maxn_engine import compute_maxn_matrix
 
 ROOT = Path(__file__).resolve().parents[1]
-CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
-CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
-NURSERY_DIR = CUT_ROOT / "Annotation_reports_Nursery"
 OUT_DIR = ROOT / "results" / "leave_one_video_out_sensitivity"
 FIG_DIR = ROOT / "results" / "ergaenzende_statistische_grafiken"
 
@@ -29,6 +28,17 @@ BAIT_MAP = {
     "algae_strings": "algae",
 }
 
+SITE_GROUPS = {
+    "nursery": ["nursery"],
+    "coral_reef": ["milimani", "utumbi"],
+}
+ALPHA = 0.05
+LEAVE_K = 2
+MAX_LEAVE_K_SETS = 5000
+SEED = 20260901
+
+ENDPOINT_LEVELS = ("species", "genus", "family")
+
 TARGET_FAMILIES = [
     "acanthuridae",
     "labridae",
@@ -37,101 +47,160 @@ TARGET_FAMILIES = [
 ]
 
 
-def parse_video_metadata(filename: str) -> tuple[str, str, str]:
-    stem = filename.replace(".csv", "")
-    parts = stem.split("-", 2)
-    if len(parts) < 3:
-        return "", "unknown", "unknown"
-    date, site, bait = parts
-    return date, site.lower(), bait.lower()
-
-
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    return text not in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}
-
-
-def parse_frame_time(frame_value: object) -> float | None:
-    text = str(frame_value).strip()
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def family_values_for_signal(site_filter: Iterable[str], family: str) -> tuple[np.ndarray, np.ndarray]:
-    rows: List[dict[str, object]] = []
-    for csv_path in sorted(list(CORAL_REEF_DIR.glob("*.csv")) + list(NURSERY_DIR.glob("*.csv"))):
-        _, site, bait = parse_video_metadata(csv_path.name)
-        if site not in set(site_filter):
-            continue
-        if bait not in BAIT_MAP:
-            continue
-
-        df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-        counts: dict[tuple[str, float], int] = {}
-        for _, row in df.iterrows():
-            if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-                continue
-            fam = str(row.get("family", "")).strip().lower()
-            if fam != family:
-                continue
-            frame_time = parse_frame_time(row.get("frames", ""))
-            if frame_time is None:
-                continue
-            counts[(fam, frame_time)] = counts.get((fam, frame_time), 0) + 1
-
-        maxn = max(counts.values()) if counts else 0
-        rows.append(
-            {
-                "filename": csv_path.name,
-                "site": site,
-                "bait_type": BAIT_MAP[bait],
-                "maxn": int(maxn),
-            }
-        )
-
-    algae = np.array([row["maxn"] for row in rows if row["bait_type"] == "algae"], dtype=float)
-    fish = np.array([row["maxn"] for row in rows if row["bait_type"] == "fish"], dtype=float)
+def load_family_table() -> pd.DataFrame:
+    """
+    Eine Zeile je Video (nur Koeder aus BAIT_MAP) mit filename, date, site,
+    bait_type und einer MaxN-Spalte je Familie (ohne feeding/interested).
+    """
+    videos = load_video_table()
+    videos = videos[videos["koeder"].isin(list(BAIT_MAP))].reset_index(drop=True)
+    matrix = compute_maxn_matrix(level="family", behaviour="exclude")
+    table = pd.DataFrame(
+        {
+            "filename": videos["filename"],
+            "date": videos["date"].astype(str),
+            "site": videos["standort"],
+            "bait_type": videos["koeder"].map(BAIT_MAP),
+        }
+    )
+    families = matrix.reindex(videos["filename"]).reset_index(drop=True)
+    return pd.concat([table, families], axis=1)
+
+
+def load_endpoint_table(filenames: Iterable[str]) -> pd.DataFrame:
+    """
+    Alle Jackknife-Endpunkte je Video (Zeilen in Reihenfolge von filenames),
+    Spalten zweistufig (level, endpoint):
+    - species / genus / family: MaxN je Taxon (ohne feeding/interested)
+    - video: taxon_richness (Taxa mit MaxN > 0), maxn_sum (Summe MaxN auf
+      Taxon-Ebene), feeding_maxn_sum und interested_maxn_sum
+    """
+    filenames = list(filenames)
+    blocks = {
+        level: compute_maxn_matrix(level=level, behaviour="exclude").reindex(filenames, fill_value=0)
+        for level in ENDPOINT_LEVELS
+    }
+    taxa = compute_maxn_matrix(level="taxon", behaviour="exclude").reindex(filenames, fill_value=0)
+    video = pd.DataFrame(
+        {
+            "taxon_richness": (taxa > 0).sum(axis=1),
+            "maxn_sum": taxa.sum(axis=1),
+            "feeding_maxn_sum": compute_maxn_matrix(level="taxon", behaviour="feeding")
+            .reindex(filenames, fill_value=0)
+            .sum(axis=1),
+            "interested_maxn_sum": compute_maxn_matrix(level="taxon", behaviour="interested")
+            .reindex(filenames, fill_value=0)
+            .sum(axis=1),
+        }
+    )
+    endpoints = pd.concat({**blocks, "video": video}, axis=1)
+    endpoints.columns.names = ["level", "endpoint"]
+    return endpoints.reset_index(drop=True)
+
+
+def family_values_for_signal(table: pd.DataFrame, site_filter: Iterable[str], family: str) -> tuple[np.ndarray, np.ndarray]:
+    sub = table[table["site"].isin(list(site_filter))]
+    values = sub[family].to_numpy(dtype=float) if family in sub.columns else np.zeros(len(sub))
+    algae = values[(sub["bait_type"] == "algae").to_numpy()]
+    fish = values[(sub["bait_type"] == "fish").to_numpy()]
     return algae, fish
 
 
 def leave_one_video_out_pvalues(algae: np.ndarray, fish: np.ndarray, alternative: str) -> tuple[float, np.ndarray, float, float, float, int]:
-    if alternative == "greater":
-        base_p = stats.mannwhitneyu(algae, fish, alternative="greater").pvalue
-        all_values = np.concatenate([algae, fish])
-        labels = np.array(["algae"] * len(algae) + ["fish"] * len(fish))
-    else:
-        base_p = stats.mannwhitneyu(fish, algae, alternative="greater").pvalue
-        all_values = np.concatenate([fish, algae])
-        labels = np.array(["fish"] * len(fish) + ["algae"] * len(algae))
-
-    loo_p = []
-    for i in range(len(all_values)):
-        keep = np.ones(len(all_values), dtype=bool)
-        keep[i] = False
-        kept_values = all_values[keep]
-        kept_labels = labels[keep]
-        left = kept_values[kept_labels == "algae"] if alternative == "greater" else kept_values[kept_labels == "fish"]
-        right = kept_values[kept_labels == "fish"] if alternative == "greater" else kept_values[kept_labels == "algae"]
-        if len(left) == 0 or len(right) == 0:
-            continue
-        loo_p.append(stats.mannwhitneyu(left, right, alternative="greater").pvalue)
-
-    arr = np.asarray(loo_p, dtype=float)
+    # einseitig in der vorgegebenen Richtung: erste Gruppe > zweite Gruppe
+    left, right = (algae, fish) if alternative == "greater" else (fish, algae)
+    n = len(left) + len(right)
+    base_p = mann_whitney_drop(left, right, np.zeros((1, n), dtype=bool), "greater")["p_value"][0]
+    loo = mann_whitney_drop(left, right, leave_one_out_masks(n), "greater")["p_value"]
+    arr = loo[np.isfinite(loo)]
     return float(base_p), arr, float(arr.min()), float(arr.max()), float(np.median(arr)), int(np.sum(arr < 0.05))
 
 
+def endpoint_jackknife(
+    table: pd.DataFrame, endpoints: pd.DataFrame, group: str, site_filter: Iterable[str]
+) -> tuple[list[dict], list[dict]]:
+    """
+    Zweiseitiger Fish-vs-Algae-Vergleich je Endpunkt (Taxon auf jeder Ebene
+    und Video-Endpunkte, siehe load_endpoint_table) unter Leave-one-video-out,
+    Leave-k-out und Leave-one-deployment-day-out. Die Auslassungsmuster werden
+    einmal je Standortgruppe gebaut und fuer alle Endpunkte verwendet.
+    """
+    in_group = table["site"].isin(list(site_filter)).to_numpy()
+    is_fish = (table["bait_type"] == "fish").to_numpy()
+    order = np.concatenate([np.flatnonzero(in_group & is_fish), np.flatnonzero(in_group & ~is_fish)])
+    ordered = table.iloc[order].reset_index(drop=True)
+    values_all = endpoints.iloc[order].reset_index(drop=True)
+    n_fish = int((in_group & is_fish).sum())
+    n = len(ordered)
+    if n_fish == 0 or n_fish == n:
+        return [], []
+
+    day_labels, day_masks = group_out_masks(ordered["date"].to_numpy())
+    schemes = {
+        "loo": (ordered["filename"].tolist(), leave_one_out_masks(n)),
+        f"l{LEAVE_K}o": (None, leave_k_out_masks(n, LEAVE_K, MAX_LEAVE_K_SETS, rng=SEED)),
+        "day": (day_labels, day_masks),
+    }
+    columns = [col for col in values_all.columns if col[0] == "video" or values_all[col].sum() > 0]
+
+    summary_rows: list[dict] = []
+    long_rows: list[dict] = []
+    for level, endpoint in columns:
+        values = values_all[(level, endpoint)].to_numpy(dtype=float)
+        fish, algae = values[:n_fish], values[n_fish:]
+        base = mann_whitney_drop(fish, algae, np.zeros((1, n), dtype=bool))
+        row: dict[str, object] = {
+            "group": group,
+            "level": level,
+            "endpoint": endpoint,
+            "n_fish": n_fish,
+            "n_algae": n - n_fish,
+            "mean_fish": float(fish.mean()),
+            "mean_algae": float(algae.mean()),
+            "base_u": float(base["u_statistic"][0]),
+            "base_cliffs_delta": float(base["cliffs_delta"][0]),
+            "base_p": float(base["p_value"][0]),
+        }
+        robust = row["base_p"] < ALPHA
+        for scheme, (labels, masks) in schemes.items():
+            res = mann_whitney_drop(fish, algae, masks)
+            valid = np.isfinite(res["p_value"])
+            p_vals = res["p_value"][valid]
+            deltas = res["cliffs_delta"][valid]
+            row[f"{scheme}_n_sets"] = int(valid.sum())
+            row[f"{scheme}_p_min"] = float(p_vals.min()) if len(p_vals) else np.nan
+            row[f"{scheme}_p_median"] = float(np.median(p_vals)) if len(p_vals) else np.nan
+            row[f"{scheme}_p_max"] = float(p_vals.max()) if len(p_vals) else np.nan
+            row[f"{scheme}_n_below_0_05"] = int(np.sum(p_vals < ALPHA))
+            row[f"{scheme}_delta_min"] = float(deltas.min()) if len(deltas) else np.nan
+            row[f"{scheme}_delta_max"] = float(deltas.max()) if len(deltas) else np.nan
+            robust = robust and len(p_vals) > 0 and bool(np.all(p_vals < ALPHA))
+            if labels is None:
+                continue
+            for i, label in enumerate(labels):
+                long_rows.append(
+                    {
+                        "group": group,
+                        "level": level,
+                        "endpoint": endpoint,
+                        "scheme": scheme,
+                        "dropped": label,
+                        "n_fish": int(res["n_x"][i]),
+                        "n_algae": int(res["n_y"][i]),
+                        "u_statistic": float(res["u_statistic"][i]),
+                        "cliffs_delta": float(res["cliffs_delta"][i]),
+                        "p_value": float(res["p_value"][i]),
+                    }
+                )
+        row["significant_all_schemes"] = bool(robust)
+        summary_rows.append(row)
+    return summary_rows, long_rows
+
+
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     results = []
+    table = load_family_table()
 
     signal_specs = [
         {
@@ -169,7 +238,7 @@ def main() -> None:
     ]
 
     for spec in signal_specs:
-        algae, fish = family_values_for_signal(spec["site_filter"], spec["family"])
+        algae, fish = family_values_for_signal(table, spec["site_filter"], spec["family"])
         if len(algae) == 0 or len(fish) == 0:
             continue
         base_p, loo_p, loo_min, loo_max, loo_median, count_lt_0_05 = leave_one_video_out_pvalues(algae, fish, spec["alternative"])
@@ -194,6 +263,19 @@ def main() -> None:
     summary_path = OUT_DIR / "leave_one_video_out_sensitivity_summary.csv"
     summary_df.to_csv(summary_path, index=False)
 
+    endpoints = load_endpoint_table(table["filename"])
+    jackknife_rows: list[dict] = []
+    jackknife_long: list[dict] = []
+    for group, site_filter in SITE_GROUPS.items():
+        rows, long_rows = endpoint_jackknife(table, endpoints, group, site_filter)
+        jackknife_rows.extend(rows)
+        jackknife_long.extend(long_rows)
+    jackknife_df = pd.DataFrame(jackknife_rows)
+    jackknife_path = OUT_DIR / "jackknife_all_endpoints_summary.csv"
+    jackknife_df.to_csv(jackknife_path, index=False)
+    long_path = OUT_DIR / "jackknife_all_endpoints_long.csv"
+    pd.DataFrame(jackknife_long).to_csv(long_path, index=False)
+
     lines = [
         "# Systematische Leave-one-video-out-Sensitivitaet",
         "",
@@ -215,7 +297,26 @@ def main() -> None:
         "- Nursery: Acanthuridae bleibt bei jedem einzelnen Video-Remove signifikant (LOO p-Werte zwischen 0.0079 und 0.0138), was zeigt, dass das Ergebnis nicht durch ein einzelnes Video getrieben wird.",
         "- Coral reef: Labridae, Balistidae und Muraenidae bleiben unter ausschliesslicher Entfernung eines einzelnen Videos ebenfalls durchgehend signifikant; damit sind die fish-vs-algae-Hauptsignale robust gegen einzelne Ausreisser.",
         "- Die Schlussfolgerung ist daher konsistent: Die zentralen Effekte sind nicht auf einzelne extreme Videos zurückzuführen; die Hauptergebnisse bleiben stabil, auch wenn die Stichprobe um ein Video kleiner wird.",
+        "",
+        "## Vollstaendiger Jackknife ueber alle Taxa und Endpunkte",
+        "",
+        f"Endpunkte: MaxN je Taxon auf den Ebenen {', '.join(ENDPOINT_LEVELS)} sowie je Video taxon_richness, maxn_sum, feeding_maxn_sum und interested_maxn_sum (level video).",
+        "",
+        f"Zweiseitiger Mann-Whitney-Test Fish vs. Algae je Endpunkt und Standortgruppe; Auslassen je eines Videos (loo), aller {LEAVE_K}er-Kombinationen von Videos (l{LEAVE_K}o) und aller Videos eines Ausbringungstags (day). Cliff's delta > 0: Fish > Algae. Vollstaendige Tabellen: `jackknife_all_endpoints_summary.csv` und `jackknife_all_endpoints_long.csv` (loo/day je ausgelassenem Video bzw. Tag).",
+        "",
+        f"| group | level | endpoint | delta | base_p | loo_p_max | l{LEAVE_K}o_p_max | l{LEAVE_K}o_n_below_0_05 / n | day_p_max | stabil |",
+        "|:---|:---|:---|---:|---:|---:|---:|---:|---:|:---|",
     ])
+    significant = jackknife_df[jackknife_df["base_p"] < ALPHA] if not jackknife_df.empty else jackknife_df
+    for row in significant.to_dict("records"):
+        lines.append(
+            f"| {row['group']} | {row['level']} | {row['endpoint']} | {row['base_cliffs_delta']:.3f} | {row['base_p']:.6f} | "
+            f"{row['loo_p_max']:.6f} | {row[f'l{LEAVE_K}o_p_max']:.6f} | "
+            f"{row[f'l{LEAVE_K}o_n_below_0_05']} / {row[f'l{LEAVE_K}o_n_sets']} | {row['day_p_max']:.6f} | "
+            f"{'ja' if row['significant_all_schemes'] else 'nein'} |"
+        )
+    if significant.empty:
+        lines.append("| - | - | kein Endpunkt mit base_p < 0.05 | | | | | | | |")
     (OUT_DIR / "leave_one_video_out_sensitivity.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
 
     plt.rcParams.update({
@@ -253,6 +354,8 @@ def main() -> None:
     plt.close(fig)
 
     print(f"Wrote {summary_path}")
+    print(f"Wrote {jackknife_path}")
+    print(f"Wrote {long_path}")
     print(f"Wrote {OUT_DIR / 'leave_one_video_out_sensitivity.md'}")
     print(f"Wrote {FIG_DIR / '09_leave_one_video_out_robustness.png'}")
 
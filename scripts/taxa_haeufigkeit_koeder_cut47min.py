@@ -16,14 +16,17 @@ from __future__ import annotations
 
 import itertools
 import math
-import re
 from pathlib import Path
 from typing import Dict, List, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy import stats
+
+from effect_sizes import cliffs_delta
+from maxn_engine import maxn_by_video
+from multiple_testing import holm_adjust
+from rank_tests import feature_rank_tests
 
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
@@ -37,24 +40,6 @@ SITES = ["milimani", "utumbi", "nursery"]
 ALPHA = 0.05
 
 
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    if text in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}:
-        return False
-    return True
-
-
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -64,100 +49,17 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
-def parse_frame_time(frame_value: object) -> float | None:
-    text = clean_text(frame_value)
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def load_video_maxn(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-
-    counts: Dict[Tuple[str, float], int] = {}
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-
-        taxon = build_taxon_key(row)
-        if not taxon:
-            continue
-
-        frame_time = parse_frame_time(row.get("frames", ""))
-        if frame_time is None:
-            continue
-
-        key = (taxon, frame_time)
-        counts[key] = counts.get(key, 0) + 1
-
-    maxn_by_taxon: Dict[str, int] = {}
-    for (taxon, _), n in counts.items():
-        if taxon not in maxn_by_taxon or n > maxn_by_taxon[taxon]:
-            maxn_by_taxon[taxon] = int(n)
-
+def load_video_maxn(csv_path: Path, maxn_lookup: Dict[str, Dict[str, int]]) -> Dict[str, object]:
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
         "filename": csv_path.name,
         "date": date,
         "standort": standort,
         "koeder": koeder,
-        "maxn_by_taxon": maxn_by_taxon,
+        "maxn_by_taxon": dict(maxn_lookup.get(csv_path.name, {})),
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = 0
-    lt = 0
-    for xi in x:
-        gt += np.sum(xi > y)
-        lt += np.sum(xi < y)
-    return float((gt - lt) / total)
-
-
 def significance_label(p_val: float) -> str:
     if p_val < 0.001:
         return "***"
@@ -218,9 +120,13 @@ def create_site_figures(site: str, taxon_tests_df: pd.DataFrame, taxon_bait_df:
 
 def analyze_site(videos_site: pd.DataFrame, site: str) -> Dict[str, pd.DataFrame]:
     bait_order = sorted(videos_site["koeder"].unique().tolist())
-    site_videos = {b: videos_site[videos_site["koeder"] == b].copy() for b in bait_order}
+    all_taxa = sorted(set().union(*videos_site["maxn_by_taxon"].map(dict.keys).tolist()))
 
-    all_taxa = sorted(set().union(*[set().union(*site_videos[b]["maxn_by_taxon"].map(dict.keys).tolist()) for b in bait_order]))
+    taxa_matrix = pd.DataFrame(videos_site["maxn_by_taxon"].tolist(), columns=all_taxa).fillna(0).astype(float)
+    global_tests, pair_tests = feature_rank_tests(taxa_matrix, videos_site["koeder"].to_numpy(), group_order=bait_order)
+    global_tests = global_tests.set_index("feature")
+    pair_tests = pair_tests.set_index(["feature", "group_a", "group_b"])
+    bait_matrices = {b: taxa_matrix[(videos_site["koeder"] == b).to_numpy()] for b in bait_order}
 
     taxon_rows: List[Dict[str, object]] = []
     bait_rows: List[Dict[str, object]] = []
@@ -229,8 +135,7 @@ def analyze_site(videos_site: pd.DataFrame, site: str) -> Dict[str, pd.DataFrame
     for taxon in all_taxa:
         bait_arrays: Dict[str, np.ndarray] = {}
         for bait in bait_order:
-            vals = [float(v.maxn_by_taxon.get(taxon, 0)) for v in site_videos[bait].itertuples(index=False)]
-            arr = np.array(vals, dtype=float)
+            arr = bait_matrices[bait][taxon].to_numpy()
             bait_arrays[bait] = arr
 
             bait_rows.append(
@@ -250,10 +155,8 @@ def analyze_site(videos_site: pd.DataFrame, site: str) -> Dict[str, pd.DataFrame
         groups = [bait_arrays[b] for b in bait_order]
         total_n = int(sum(len(g) for g in groups))
         k_groups = len(groups)
-        try:
-            h_stat, p_val = stats.kruskal(*groups)
-        except ValueError:
-            h_stat, p_val = 0.0, 1.0
+        h_stat = global_tests.at[taxon, "h_stat"]
+        p_val = global_tests.at[taxon, "p_value"]
 
         eta_sq = float((h_stat - k_groups + 1) / (total_n - k_groups)) if total_n > k_groups else math.nan
         eta_sq = max(0.0, eta_sq) if not math.isnan(eta_sq) else math.nan
@@ -284,10 +187,7 @@ def analyze_site(videos_site: pd.DataFrame, site: str) -> Dict[str, pd.DataFrame
         for a, b in itertools.combinations(bait_order, 2):
             xa = bait_arrays[a]
             xb = bait_arrays[b]
-            try:
-                u_stat, p_pair = stats.mannwhitneyu(xa, xb, alternative="two-sided")
-            except ValueError:
-                u_stat, p_pair = 0.0, 1.0
+            u_stat, p_pair = pair_tests.loc[(taxon, a, b), ["u_stat", "p_value"]]
             pair_ps.append(float(p_pair))
             pair_tmp.append(
                 {
@@ -474,7 +374,8 @@ def main() -> None:
     if not files:
         raise FileNotFoundError("Keine CSV-Dateien unter normalized_reports/cut_47min gefunden.")
 
-    records = [load_video_maxn(p) for p in files]
+    maxn_lookup = maxn_by_video(level="taxon", behaviour="exclude")
+    records = [load_video_maxn(p, maxn_lookup) for p in files]
     videos_df = pd.DataFrame(records)
     videos_df = videos_df[videos_df["standort"].isin(SITES)].copy()
     videos_df = videos_df.sort_values(["standort", "date", "filename"]).reset_index(drop=True)
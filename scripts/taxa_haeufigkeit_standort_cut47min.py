@@ -15,7 +15,6 @@ from __future__ import annotations
 
 import itertools
 import math
-import re
 from pathlib import Path
 from typing import Dict, List, Tuple
 
@@ -24,6 +23,10 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from effect_sizes import cliffs_delta
+from maxn_engine import maxn_by_video
+from multiple_testing import holm_adjust
+
 ROOT = Path(__file__).resolve().parent.parent
 CUT_ROOT = ROOT / "normalized_reports" / "cut_47min"
 CORAL_REEF_DIR = CUT_ROOT / "Annotation_reports_coral_reef"
@@ -36,24 +39,6 @@ SITES = ["milimani", "utumbi", "nursery"]
 ALPHA = 0.05
 
 
-def is_truthy(value: object) -> bool:
-    if value is None:
-        return False
-    text = str(value).strip().lower()
-    if text in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}:
-        return False
-    return True
-
-
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
 def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     stem = filename.replace(".csv", "")
     parts = stem.split("-", 2)
@@ -63,100 +48,17 @@ def parse_video_metadata(filename: str) -> Tuple[str, str, str]:
     return (date, standort.lower(), koeder.lower())
 
 
-def build_taxon_key(row: pd.Series) -> str:
-    label = clean_text(row.get("label_name", ""))
-    species = clean_text(row.get("species", ""))
-    genus = clean_text(row.get("genus", ""))
-    family = clean_text(row.get("family", ""))
-
-    if species:
-        return f"species::{species.lower()}"
-    if genus:
-        return f"genus::{genus.lower()}"
-    if family:
-        if label:
-            return f"family_label::{label.lower()}"
-        return f"family::{family.lower()}"
-    if label:
-        return f"label::{label.lower()}"
-    return ""
-
-
-def parse_frame_time(frame_value: object) -> float | None:
-    text = clean_text(frame_value)
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return round(float(match.group(0)), 2)
-    except ValueError:
-        return None
-
-
-def load_video_maxn(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-
-    counts: Dict[Tuple[str, float], int] = {}
-    for _, row in df.iterrows():
-        if is_truthy(row.get("feeding", "")) or is_truthy(row.get("interested", "")):
-            continue
-
-        taxon = build_taxon_key(row)
-        if not taxon:
-            continue
-
-        frame_time = parse_frame_time(row.get("frames", ""))
-        if frame_time is None:
-            continue
-
-        key = (taxon, frame_time)
-        counts[key] = counts.get(key, 0) + 1
-
-    maxn_by_taxon: Dict[str, int] = {}
-    for (taxon, _), n in counts.items():
-        if taxon not in maxn_by_taxon or n > maxn_by_taxon[taxon]:
-            maxn_by_taxon[taxon] = int(n)
-
+def load_video_maxn(csv_path: Path, maxn_lookup: Dict[str, Dict[str, int]]) -> Dict[str, object]:
     date, standort, koeder = parse_video_metadata(csv_path.name)
     return {
         "filename": csv_path.name,
         "date": date,
         "standort": standort,
         "koeder": koeder,
-        "maxn_by_taxon": maxn_by_taxon,
+        "maxn_by_taxon": dict(maxn_lookup.get(csv_path.name, {})),
     }
 
 
-def holm_adjust(p_values: List[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_ordered = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted_ordered[i] = min(1.0, (m - i) * p_values[idx])
-    for i in range(1, m):
-        adjusted_ordered[i] = max(adjusted_ordered[i], adjusted_ordered[i - 1])
-    adjusted = np.zeros(m)
-    for i, idx in enumerate(order):
-        adjusted[idx] = adjusted_ordered[i]
-    return adjusted.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = 0
-    lt = 0
-    for xi in x:
-        gt += np.sum(xi > y)
-        lt += np.sum(xi < y)
-    return float((gt - lt) / total)
-
-
 def significance_label(p_val: float) -> str:
     if p_val < 0.001:
         return "***"
@@ -303,7 +205,8 @@ def main() -> None:
     if not files:
         raise FileNotFoundError("Keine CSV-Dateien unter normalized_reports/cut_47min gefunden.")
 
-    records = [load_video_maxn(p) for p in files]
+    maxn_lookup = maxn_by_video(level="taxon", behaviour="exclude")
+    records = [load_video_maxn(p, maxn_lookup) for p in files]
     videos_df = pd.DataFrame(records)
     videos_df = videos_df[videos_df["standort"].isin(SITES)].copy()
     videos_df = videos_df.sort_values(["standort", "date", "filename"]).reset_index(drop=True)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Gemeinsame Taxon-Schluessel fuer alle cut_47min-Analysen.
+
+Statt jede Annotationszeile einzeln zu normalisieren, wird eine Lookup-Tabelle
+ueber die eindeutigen (label_name, species, genus, family, unspecific)-Tupel
+gebaut (wenige hundert statt zehntausender Zeilen). Jede Zeile bekommt darueber
+einen ganzzahligen Taxon-Code je Ebene.
+
+Ebenen:
+- "taxon": species > genus > family_label > family > label
+  (Regel aus Richness-, Haeufigkeits- und Kompositionsanalysen)
+- "species_fallback": species (ohne Praefix) > genus:: > family:: > label::
+  (Regel aus dem Zeitvergleich)
+- "species", "genus", "family", "unspecific", "label": jeweiliger Wert klein
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+TAXON_COLUMNS = ["label_name", "species", "genus", "family", "unspecific"]
+RANKS = ("taxon", "species_fallback", "species", "genus", "family", "unspecific", "label")
+
+
+def clean_text(value: object) -> str:
+    if value is None:
+        return ""
+    text = str(value).strip()
+    if text.lower() in {"", "nan", "none", "null"}:
+        return ""
+    return text
+
+
+@lru_cache(maxsize=None)
+def resolve_taxon(label: str, species: str, genus: str, family: str, unspecific: str, rank: str) -> str:
+    """Taxon-Schluessel fuer ein bereits bereinigtes, klein geschriebenes Tupel."""
+    if rank == "taxon":
+        if species:
+            return f"species::{species}"
+        if genus:
+            return f"genus::{genus}"
+        if family:
+            if label:
+                return f"family_label::{label}"
+            return f"family::{family}"
+        if label:
+            return f"label::{label}"
+        return ""
+    if rank == "species_fallback":
+        if species:
+            return species
+        if genus:
+            return f"genus::{genus}"
+        if family:
+            return f"family::{family}"
+        if label:
+            return f"label::{label}"
+        return ""
+    if rank == "species":
+        return species
+    if rank == "genus":
+        return genus
+    if rank == "family":
+        return family
+    if rank == "unspecific":
+        return unspecific
+    if rank == "label":
+        return label
+    raise ValueError(f"Unbekannte Taxon-Ebene: {rank}")
+
+
+def _tuple_index(annotations: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
+    """Index je Zeile auf die eindeutigen bereinigten Taxon-Tupel."""
+    cleaned = {}
+    for col in TAXON_COLUMNS:
+        if col in annotations.columns:
+            cat = annotations[col].astype("category")
+            lookup = np.array([clean_text(v).lower() for v in cat.cat.categories] + [""], dtype=object)
+            # Code -1 (NaN) zeigt auf den angehaengten Leerstring
+            cleaned[col] = lookup[cat.cat.codes.to_numpy()]
+        else:
+            cleaned[col] = np.full(len(annotations), "", dtype=object)
+
+    grouped = pd.DataFrame(cleaned).groupby(TAXON_COLUMNS, sort=True)
+    row_index = grouped.ngroup().to_numpy()
+    tuples = grouped.size().reset_index()[TAXON_COLUMNS]
+    return row_index, tuples
+
+
+def build_taxon_lookup(annotations: pd.DataFrame) -> pd.DataFrame:
+    """Eindeutige Taxon-Tupel mit dem Schluessel je Ebene (eine Zeile je Tupel)."""
+    _, tuples = _tuple_index(annotations)
+    for rank in RANKS:
+        tuples[f"key_{rank}"] = [resolve_taxon(*values, rank) for values in tuples[TAXON_COLUMNS].itertuples(index=False)]
+    return tuples
+
+
+def taxon_codes(annotations: pd.DataFrame, rank: str = "taxon") -> Tuple[np.ndarray, List[str]]:
+    """
+    Ganzzahliger Taxon-Code je Zeile (-1 = kein Schluessel) und die sortierte
+    Liste der Schluessel, auf die die Codes zeigen.
+    """
+    if rank not in RANKS:
+        raise ValueError(f"Unbekannte Taxon-Ebene: {rank}")
+    if len(annotations) == 0:
+        return np.empty(0, dtype=np.int32), []
+
+    row_index, tuples = _tuple_index(annotations)
+    tuple_keys = [resolve_taxon(*values, rank) for values in tuples[TAXON_COLUMNS].itertuples(index=False)]
+    categories = sorted({k for k in tuple_keys if k})
+    code_of = {key: i for i, key in enumerate(categories)}
+    tuple_codes = np.array([code_of.get(k, -1) for k in tuple_keys], dtype=np.int32)
+    return tuple_codes[row_index], categories
+
+
+def taxon_keys(annotations: pd.DataFrame, rank: str = "taxon") -> np.ndarray:
+    """Taxon-Schluessel je Zeile als String-Array (leerer String = kein Schluessel)."""
+    codes, categories = taxon_codes(annotations, rank)
+    lookup = np.array(categories + [""], dtype=object)
+    return lookup[codes]
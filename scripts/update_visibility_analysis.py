@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 from scipy.stats import kendalltau, pearsonr, spearmanr
 
+from multiple_testing import bh_adjust
+
 
 ROOT = Path(__file__).resolve().parents[1]
 RESULTS_DIR = ROOT / "results" / "visibility_analysis"
@@ -45,27 +47,6 @@ BAIT_MAP = {
 }
 
 
-def bh_adjust(pvals: pd.Series) -> pd.Series:
-    vals = pvals.astype(float).to_numpy()
-    mask = np.isfinite(vals)
-    out = np.full(vals.shape, np.nan, dtype=float)
-    if not mask.any():
-        return pd.Series(out, index=pvals.index)
-
-    valid = vals[mask]
-    m = len(valid)
-    order = np.argsort(valid)
-    ranked = valid[order]
-    q = ranked * m / (np.arange(m) + 1)
-    q = np.minimum.accumulate(q[::-1])[::-1]
-    q = np.clip(q, 0.0, 1.0)
-
-    q_unsorted = np.empty_like(q)
-    q_unsorted[order] = q
-    out[np.where(mask)[0]] = q_unsorted
-    return pd.Series(out, index=pvals.index)
-
-
 def norm_text(value: object) -> str:
     if pd.isna(value):
         return ""
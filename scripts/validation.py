@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Regelbasierte Validierung der cut_47min-Annotationsreports.
+
+Die Regeln sind deklarativ (Rule: ID, Gruppe, Schweregrad, Beschreibung,
+Pruefung, Detailspalten) und werden in einem Durchlauf ueber die gesamte
+Annotationstabelle ausgewertet:
+
+- scope "file":  je Datei (Kopfzeile, Zeilenzahl), parallel je Datei gelesen
+- scope "row":   vektorisiert ueber alle Zeilen des Annotations-Speichers
+- scope "tuple": je eindeutigem Taxonomie-Tupel (label_name, label_hierarchy,
+  unspecific, family, genus, species), danach auf alle Zeilen uebertragen
+
+Gruppen: schema, ids, time, taxonomy, behaviour. Schweregrade: error,
+warning, info. Der Report enthaelt jede betroffene Zeile (nicht nur die
+ersten Treffer je Datei) und wird maschinenlesbar geschrieben:
+
+- results/validation/validation_issues.csv   (eine Zeile je Treffer)
+- results/validation/validation_summary.csv  (Treffer je Regel)
+- results/validation/validation_report.json  (Status, Zaehlungen je Regel/Datei)
+
+Laeufe mit --group schreiben ohne --out-dir nach results/validation/<gruppen>/,
+damit der Gesamtreport nicht ueberschrieben wird. csv_line ist die
+physische Startzeile des Datensatzes in der CSV (Kopfzeile = 1, mehrzeilige
+Felder mitgezaehlt); leer, wenn sie sich nicht eindeutig zuordnen laesst.
+
+Usage:
+    python scripts/validation.py                   # alle Regeln
+    python scripts/validation.py --group taxonomy  # nur Taxonomie-Regeln (results/validation/taxonomy/)
+    python scripts/validation.py --strict          # Exit-Code 1 bei error-Treffern
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from annotation_store import RAW_COLUMNS, list_video_files, load_annotation_store, parse_video_metadata
+from parallel_videos import map_videos
+
+ROOT = Path(__file__).resolve().parent.parent
+OUT_DIR = ROOT / "results" / "validation"
+
+CUTOFF_SEC = 47 * 60
+# Synthetische Zeilen (Genus Chromis / Indian Half-and-Half bei Sekunde 1), siehe add_species_at_second1.py
+PLACEHOLDER_IDS = (999000001, 999000002)
+HIERARCHY_SEPARATOR = " > "
+TUPLE_COLUMNS = ["label_name", "label_hierarchy", "unspecific", "family", "genus", "species"]
+SEVERITIES = ("error", "warning", "info")
+GROUPS = ("schema", "ids", "time", "taxonomy", "behaviour")
+ISSUE_COLUMNS = [
+    "rule_id",
+    "group",
+    "severity",
+    "area",
+    "filename",
+    "row_in_video",
+    "csv_line",
+    "video_annotation_label_id",
+    "label_name",
+    "detail",
+]
+
+
+@dataclass(frozen=True)
+class Rule:
+    rule_id: str
+    group: str
+    severity: str
+    scope: str
+    description: str
+    check: Callable[[pd.DataFrame], np.ndarray]
+    detail_columns: Tuple[str, ...] = ()
+
+
+def _text(frame: pd.DataFrame, column: str) -> pd.Series:
+    return frame[column].astype(object).fillna("").astype(str).str.strip()
+
+
+def _hierarchy_levels(tuples: pd.DataFrame) -> pd.Series:
+    return _text(tuples, "label_hierarchy").str.split(HIERARCHY_SEPARATOR, regex=False)
+
+
+def _contains(values: pd.Series, parts: pd.Series) -> np.ndarray:
+    return np.array([p in v for v, p in zip(values, parts)], dtype=bool)
+
+
+def _is_element(levels: pd.Series, values: pd.Series) -> np.ndarray:
+    return np.array([v in lv for lv, v in zip(levels, values)], dtype=bool)
+
+
+# --- Dateiregeln (frame: eine Zeile je Datei) ------------------------------
+
+
+def _missing_columns(files: pd.DataFrame) -> np.ndarray:
+    return (files["missing_columns"] != "").to_numpy()
+
+
+def _bad_filename(files: pd.DataFrame) -> np.ndarray:
+    return ((files["standort"] == "unknown") | (files["date"].str.len() != 8)).to_numpy()
+
+
+def _empty_file(files: pd.DataFrame) -> np.ndarray:
+    return (files["rows_csv"] == 0).to_numpy()
+
+
+def _multiline_record(files: pd.DataFrame) -> np.ndarray:
+    # offenes Anfuehrungszeichen verschluckt die folgenden Zeilen
+    return (files["lines_csv"] > files["rows_csv"]).to_numpy()
+
+
+def _skipped_rows(files: pd.DataFrame) -> np.ndarray:
+    return (files["rows_csv"] != files["rows_store"]).to_numpy()
+
+
+# --- Zeilenregeln (frame: Annotations-Speicher) ----------------------------
+
+
+def _id_missing(table: pd.DataFrame) -> np.ndarray:
+    return table["video_annotation_label_id"].isna().to_numpy()
+
+
+def _id_duplicate(table: pd.DataFrame) -> np.ndarray:
+    ids = table["video_annotation_label_id"]
+    dup = table.assign(_id=ids).duplicated(["area", "filename", "_id"], keep=False).to_numpy()
+    return dup & ids.notna().to_numpy()
+
+
+def _id_placeholder(table: pd.DataFrame) -> np.ndarray:
+    return table["video_annotation_label_id"].isin(PLACEHOLDER_IDS).fillna(False).to_numpy(dtype=bool)
+
+
+def _frames_missing(table: pd.DataFrame) -> np.ndarray:
+    return (table["frame_count"] == 0).to_numpy()
+
+
+def _time_negative(table: pd.DataFrame) -> np.ndarray:
+    return (table["frame_time"] < 0).to_numpy()
+
+
+def _time_after_cutoff(table: pd.DataFrame) -> np.ndarray:
+    return (table["frame_time_max"] > CUTOFF_SEC).to_numpy()
+
+
+def _behaviour_flag(table: pd.DataFrame, suffix: str, flag: str) -> np.ndarray:
+    label = table["label_name"].astype(object).fillna("").astype(str).str.strip().str.lower()
+    return (label.str.endswith(suffix) != table[flag]).to_numpy()
+
+
+def _feeding_label(table: pd.DataFrame) -> np.ndarray:
+    return _behaviour_flag(table, "feeding", "is_feeding")
+
+
+def _interested_label(table: pd.DataFrame) -> np.ndarray:
+    return _behaviour_flag(table, "interested", "is_interested")
+
+
+def _flag_value(table: pd.DataFrame) -> np.ndarray:
+    out = np.zeros(len(table), dtype=bool)
+    for column in ["feeding", "interested"]:
+        value = table[column].astype(object).fillna("").astype(str).str.strip().str.lower()
+        out |= ((value != "") & (value != column)).to_numpy()
+    return out
+
+
+# --- Taxonomie-Regeln (frame: eindeutige Tupel) ----------------------------
+
+
+def _hierarchy_label(tuples: pd.DataFrame) -> np.ndarray:
+    return (_hierarchy_levels(tuples).str[-1] != _text(tuples, "label_name")).to_numpy()
+
+
+def _hierarchy_unspecific(tuples: pd.DataFrame) -> np.ndarray:
+    return (_hierarchy_levels(tuples).str[0] != _text(tuples, "unspecific")).to_numpy()
+
+
+def _hierarchy_family(tuples: pd.DataFrame) -> np.ndarray:
+    family = _text(tuples, "family")
+    return (family != "").to_numpy() & ~_contains(_text(tuples, "label_hierarchy"), "(" + family + ")")
+
+
+def _hierarchy_species(tuples: pd.DataFrame) -> np.ndarray:
+    species = _text(tuples, "species")
+    return (species != "").to_numpy() & ~_is_element(_hierarchy_levels(tuples), species)
+
+
+def _species_missing(tuples: pd.DataFrame) -> np.ndarray:
+    # Ebene 4 = Verhalten unter einer Art; die Art selbst fehlt in species
+    return ((_hierarchy_levels(tuples).str.len() >= 4) & (_text(tuples, "species") == "")).to_numpy()
+
+
+def _empty_family(tuples: pd.DataFrame) -> np.ndarray:
+    has_lower = (_text(tuples, "genus") != "") | (_text(tuples, "species") != "")
+    return ((_text(tuples, "family") == "") & has_lower).to_numpy()
+
+
+def _empty_genus(tuples: pd.DataFrame) -> np.ndarray:
+    return ((_text(tuples, "genus") == "") & (_text(tuples, "species") != "")).to_numpy()
+
+
+def _genus_prefix(tuples: pd.DataFrame) -> np.ndarray:
+    return _text(tuples, "genus").str.startswith("Genus ").to_numpy()
+
+
+def _genus_not_in_label(tuples: pd.DataFrame) -> np.ndarray:
+    label, genus, species = _text(tuples, "label_name"), _text(tuples, "genus"), _text(tuples, "species")
+    candidate = ((genus != "") & (species != "") & ~label.str.startswith("Genus ")).to_numpy()
+    return candidate & ~_contains(label, genus)
+
+
+def _species_not_in_label(tuples: pd.DataFrame) -> np.ndarray:
+    label, family = _text(tuples, "label_name"), _text(tuples, "family")
+    genus, species = _text(tuples, "genus"), _text(tuples, "species")
+    full = ((family != "") & (genus != "") & (species != "")).to_numpy()
+    return full & ~_contains(label, species) & ~_contains(label, family)
+
+
+RULES: List[Rule] = [
+    Rule("schema_missing_columns", "schema", "error", "file", "Pflichtspalten fehlen in der Kopfzeile", _missing_columns, ("missing_columns",)),
+    Rule("schema_filename", "schema", "error", "file", "Dateiname nicht im Format <yyyymmdd>-<standort>-<koeder>.csv", _bad_filename),
+    Rule("schema_empty_file", "schema", "warning", "file", "Datei ohne Annotationszeilen", _empty_file),
+    Rule("schema_multiline_record", "schema", "error", "file", "Datensatz ueber mehrere Textzeilen (nicht geschlossenes Anfuehrungszeichen?)", _multiline_record, ("lines_csv", "rows_csv")),
+    Rule("schema_skipped_rows", "schema", "error", "file", "CSV-Zeilen fehlen im Speicher (fehlerhafte Zeilen uebersprungen)", _skipped_rows, ("rows_csv", "rows_store")),
+    Rule("id_missing", "ids", "error", "row", "video_annotation_label_id fehlt oder ist nicht numerisch", _id_missing),
+    Rule("id_duplicate", "ids", "error", "row", "video_annotation_label_id mehrfach in derselben Datei", _id_duplicate),
+    Rule("id_placeholder", "ids", "warning", "row", "Platzhalter-ID einer nachgetragenen Zeile (999000001/999000002)", _id_placeholder),
+    Rule("time_frames_missing", "time", "error", "row", "frames enthaelt keinen Zeitwert", _frames_missing, ("frames",)),
+    Rule("time_negative", "time", "error", "row", "negativer Frame-Zeitwert", _time_negative, ("frame_time",)),
+    Rule("time_after_cutoff", "time", "warning", "row", "Frame-Zeit nach 47 min (cut_47min)", _time_after_cutoff, ("frame_time_max",)),
+    Rule("behaviour_feeding_label", "behaviour", "warning", "row", "feeding-Flag passt nicht zum Label (... Feeding)", _feeding_label, ("feeding",)),
+    Rule("behaviour_interested_label", "behaviour", "warning", "row", "interested-Flag passt nicht zum Label (... Interested)", _interested_label, ("interested",)),
+    Rule("behaviour_flag_value", "behaviour", "info", "row", "Flag-Wert weicht vom Spaltennamen ab (z. B. True statt feeding)", _flag_value, ("feeding", "interested")),
+    Rule("taxonomy_hierarchy_label", "taxonomy", "error", "tuple", "letzte Ebene von label_hierarchy ist nicht label_name", _hierarchy_label, ("label_hierarchy",)),
+    Rule("taxonomy_hierarchy_unspecific", "taxonomy", "warning", "tuple", "erste Ebene von label_hierarchy ist nicht unspecific", _hierarchy_unspecific, ("label_hierarchy", "unspecific")),
+    Rule("taxonomy_hierarchy_family", "taxonomy", "warning", "tuple", "family fehlt als '(Familie)' in label_hierarchy", _hierarchy_family, ("label_hierarchy", "family")),
+    Rule("taxonomy_hierarchy_species", "taxonomy", "warning", "tuple", "species ist keine Ebene von label_hierarchy", _hierarchy_species, ("label_hierarchy", "species")),
+    Rule("taxonomy_species_missing", "taxonomy", "warning", "tuple", "label_hierarchy unterhalb einer Art, aber species leer", _species_missing, ("label_hierarchy", "genus")),
+    Rule("taxonomy_empty_family", "taxonomy", "warning", "tuple", "family leer, aber genus/species gesetzt", _empty_family, ("genus", "species")),
+    Rule("taxonomy_empty_genus", "taxonomy", "warning", "tuple", "genus leer, aber species gesetzt", _empty_genus, ("species",)),
+    Rule("taxonomy_genus_prefix", "taxonomy", "warning", "tuple", "genus enthaelt das Praefix 'Genus '", _genus_prefix, ("genus",)),
+    Rule("taxonomy_genus_not_in_label", "taxonomy", "info", "tuple", "genus kommt in label_name nicht vor", _genus_not_in_label, ("genus",)),
+    Rule("taxonomy_species_not_in_label", "taxonomy", "info", "tuple", "weder species noch family kommen in label_name vor", _species_not_in_label, ("family", "genus", "species")),
+]
+
+
+def _file_info(csv_path: Path) -> Dict[str, object]:
+    """
+    Kopfzeile, Anzahl Datenzeilen und Startzeile je Datensatz einer CSV
+    (csv-Modul, mehrzeilige Felder korrekt).
+    """
+    record_lines: List[int] = []
+    record_ids: List[str] = []
+    with csv_path.open("r", encoding="utf-8", newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, [])
+        id_col = header.index("video_annotation_label_id") if "video_annotation_label_id" in header else None
+        start = reader.line_num + 1
+        for row in reader:
+            if row:
+                record_lines.append(start)
+                record_ids.append(row[id_col] if id_col is not None and id_col < len(row) else "")
+            start = reader.line_num + 1
+        n_rows = len(record_lines)
+        n_lines = reader.line_num - 1
+    date, standort, koeder = parse_video_metadata(csv_path.name)
+    missing = [col for col in RAW_COLUMNS if col not in header]
+    return {
+        "area": csv_path.parent.name,
+        "filename": csv_path.name,
+        "date": date,
+        "standort": standort,
+        "koeder": koeder,
+        "missing_columns": ",".join(missing),
+        "rows_csv": n_rows,
+        "lines_csv": n_lines,
+        "record_lines": np.array(record_lines, dtype=np.int64),
+        "record_ids": pd.to_numeric(pd.Series(record_ids, dtype=object), errors="coerce").to_numpy(dtype=float),
+    }
+
+
+def _detail(frame: pd.DataFrame, columns: Sequence[str]) -> pd.Series:
+    if not columns:
+        return pd.Series("", index=frame.index)
+    parts = [col + "=" + frame[col].astype(object).fillna("").astype(str) for col in columns]
+    out = parts[0]
+    for part in parts[1:]:
+        out = out + "; " + part
+    return out
+
+
+def _csv_lines(table: pd.DataFrame, files: pd.DataFrame) -> pd.arrays.IntegerArray:
+    """
+    CSV-Startzeile je Zeile des Speichers. Stimmt die Datensatzzahl mit dem
+    Speicher ueberein, ueber row_in_video; sonst (uebersprungene Zeilen) ueber
+    video_annotation_label_id, soweit die ID in der Datei eindeutig ist. NA,
+    wenn keine sichere Zuordnung moeglich ist.
+    """
+    out = np.full(len(table), -1, dtype=np.int64)
+    records = {
+        (a, f): (rl, ri) for a, f, rl, ri in zip(files["area"], files["filename"], files["record_lines"], files["record_ids"])
+    }
+    row_in_video = table["row_in_video"].to_numpy()
+    label_ids = table["video_annotation_label_id"].to_numpy(dtype=float, na_value=np.nan)
+    for (area, filename), idx in table.groupby(["area", "filename"], observed=True).indices.items():
+        record_lines, record_ids = records.get((str(area), str(filename)), (None, None))
+        if record_lines is None:
+            continue
+        if len(record_lines) == len(idx):
+            out[idx] = record_lines[row_in_video[idx]]
+            continue
+        ids = pd.Series(record_lines, index=record_ids)
+        ids = ids[ids.index.notna() & ~ids.index.duplicated(keep=False)]
+        out[idx] = ids.reindex(label_ids[idx]).fillna(-1).to_numpy(dtype=np.int64)
+    return pd.array(np.where(out >= 0, out, None), dtype="Int64")
+
+
+def _row_issues(rule: Rule, table: pd.DataFrame, mask: np.ndarray, csv_line: pd.arrays.IntegerArray) -> pd.DataFrame:
+    hit = table.loc[mask]
+    return pd.DataFrame(
+        {
+            "rule_id": rule.rule_id,
+            "group": rule.group,
+            "severity": rule.severity,
+            "area": hit["area"].astype(str).to_numpy(),
+            "filename": hit["filename"].astype(str).to_numpy(),
+            "row_in_video": hit["row_in_video"].to_numpy(),
+            "csv_line": csv_line[mask],
+            "video_annotation_label_id": hit["video_annotation_label_id"].to_numpy(),
+            "label_name": hit["label_name"].astype(object).to_numpy(),
+            "detail": _detail(hit, rule.detail_columns).to_numpy(),
+        }
+    )
+
+
+def _file_issues(rule: Rule, files: pd.DataFrame, mask: np.ndarray) -> pd.DataFrame:
+    hit = files.loc[mask]
+    return pd.DataFrame(
+        {
+            "rule_id": rule.rule_id,
+            "group": rule.group,
+            "severity": rule.severity,
+            "area": hit["area"].to_numpy(),
+            "filename": hit["filename"].to_numpy(),
+            "row_in_video": pd.NA,
+            "csv_line": pd.NA,
+            "video_annotation_label_id": pd.NA,
+            "label_name": None,
+            "detail": _detail(hit, rule.detail_columns).to_numpy(),
+        }
+    )
+
+
+def run_validation(
+    groups: Sequence[str] | None = None,
+    rules: Sequence[Rule] = tuple(RULES),
+    workers: int | None = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Wertet alle Regeln (optional nur die Gruppen in groups) aus.
+
+    Rueckgabe: (issues, files) mit einer Zeile je Treffer bzw. je Datei.
+    """
+    selected = [r for r in rules if groups is None or r.group in groups]
+    paths = list_video_files()
+    files = pd.DataFrame(map_videos(_file_info, paths, workers=workers))
+    table = load_annotation_store()
+    if files.empty:
+        return pd.DataFrame(columns=ISSUE_COLUMNS), files
+
+    rows_store = table.groupby(["area", "filename"], observed=True).size().rename("rows_store").reset_index()
+    rows_store[["area", "filename"]] = rows_store[["area", "filename"]].astype(str)
+    files = files.merge(rows_store, on=["area", "filename"], how="left")
+    files["rows_store"] = files["rows_store"].fillna(0).astype(int)
+
+    csv_line = _csv_lines(table, files)
+    files = files.drop(columns=["record_lines", "record_ids"])
+
+    tuple_codes = table.groupby(TUPLE_COLUMNS, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    first_row = pd.Series(np.arange(len(table))).groupby(tuple_codes).first()
+    tuples = table.iloc[first_row.to_numpy()][TUPLE_COLUMNS].reset_index(drop=True)
+
+    frames: List[pd.DataFrame] = []
+    for rule in selected:
+        if rule.scope == "file":
+            frames.append(_file_issues(rule, files, rule.check(files)))
+        elif rule.scope == "row":
+            frames.append(_row_issues(rule, table, rule.check(table), csv_line))
+        elif rule.scope == "tuple":
+            frames.append(_row_issues(rule, table, rule.check(tuples)[tuple_codes], csv_line))
+        else:
+            raise ValueError(f"Unbekannter Regel-Scope: {rule.scope}")
+
+    frames = [f for f in frames if not f.empty]
+    issues = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ISSUE_COLUMNS)
+    return issues[ISSUE_COLUMNS], files
+
+
+def summarize_issues(issues: pd.DataFrame, rules: Sequence[Rule] = tuple(RULES)) -> pd.DataFrame:
+    """Treffer und betroffene Dateien je Regel (auch Regeln ohne Treffer)."""
+    counts = issues.groupby("rule_id").agg(n_issues=("rule_id", "size"), n_files=("filename", "nunique"))
+    out = pd.DataFrame(
+        [{"rule_id": r.rule_id, "group": r.group, "severity": r.severity, "description": r.description} for r in rules]
+    )
+    out = out.merge(counts, left_on="rule_id", right_index=True, how="left")
+    out[["n_issues", "n_files"]] = out[["n_issues", "n_files"]].fillna(0).astype(int)
+    return out
+
+
+def validation_status(issues: pd.DataFrame) -> str:
+    if (issues["severity"] == "error").any():
+        return "red"
+    if (issues["severity"] == "warning").any():
+        return "yellow"
+    return "green"
+
+
+def write_report(issues: pd.DataFrame, files: pd.DataFrame, summary: pd.DataFrame, runtime_sec: float, out_dir: Path) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    issues.to_csv(out_dir / "validation_issues.csv", index=False)
+    summary.to_csv(out_dir / "validation_summary.csv", index=False)
+    per_file = issues.groupby(["filename", "severity"]).size().unstack(fill_value=0)
+    report = {
+        "status": validation_status(issues),
+        "n_files": int(len(files)),
+        "n_rows": int(files["rows_store"].sum()) if not files.empty else 0,
+        "runtime_sec": round(runtime_sec, 3),
+        "issues_by_severity": {s: int((issues["severity"] == s).sum()) for s in SEVERITIES},
+        "rules": summary.to_dict(orient="records"),
+        "files": {
+            name: {str(sev): int(n) for sev, n in row.items() if n} for name, row in per_file.iterrows()
+        },
+    }
+    (out_dir / "validation_report.json").write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def print_summary(summary: pd.DataFrame, issues: pd.DataFrame, files: pd.DataFrame, runtime_sec: float) -> None:
+    print("=" * 80)
+    print("VALIDIERUNG CUT_47MIN")
+    print("=" * 80)
+    print(f"Dateien: {len(files)} | Zeilen: {int(files['rows_store'].sum()) if not files.empty else 0} | Laufzeit: {runtime_sec:.2f} s")
+    print("")
+    for row in summary.itertuples(index=False):
+        marker = "  " if row.n_issues == 0 else "!!" if row.severity == "error" else " !"
+        print(f"{marker} [{row.severity:<7}] {row.rule_id:<32} {row.n_issues:>6} Treffer in {row.n_files:>3} Dateien")
+    print("")
+    print(f"Status: {validation_status(issues).upper()}")
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--group", action="append", choices=GROUPS, help="nur diese Regelgruppe(n)")
+    parser.add_argument("--strict", action="store_true", help="Exit-Code 1 bei Treffern mit Schweregrad error")
+    parser.add_argument("--out-dir", type=Path, default=None, help="Standard: results/validation[/<gruppen>]")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.out_dir is None:
+        args.out_dir = OUT_DIR / "_".join(dict.fromkeys(args.group)) if args.group else OUT_DIR
+
+    start = time.perf_counter()
+    issues, files = run_validation(args.group, workers=args.workers)
+    rules = [r for r in RULES if args.group is None or r.group in args.group]
+    summary = summarize_issues(issues, rules)
+    runtime = time.perf_counter() - start
+    write_report(issues, files, summary, runtime, args.out_dir)
+    print_summary(summary, issues, files, runtime)
+    print(f"Report: {args.out_dir / 'validation_report.json'}")
+    return 1 if args.strict and (issues["severity"] == "error").any() else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,7 +5,9 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 import statsmodels.formula.api as smf
-from statsmodels.stats.multitest import multipletests
+
+from multiple_testing import adjust_frame
+from restricted_permutation import blocked_permutation_pvalue
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -16,6 +18,9 @@ OUT_MAIN = RESULTS_DIR / "visibility_additional_tests.csv"
 OUT_ADJUST = RESULTS_DIR / "visibility_additional_tests_adjusted.csv"
 OUT_SUMMARY = RESULTS_DIR / "visibility_additional_tests_summary.md"
 
+CORRECTION_METHODS = ["fdr_bh", "holm", "bonferroni", "fdr_by"]
+N_PERM = 3000
+
 
 METRICS = [
     "maxn_video_peak",
@@ -35,53 +40,6 @@ def robust_visibility_stats(model, term: str) -> tuple[float, float, float, floa
     return coef, pval, tval, float(ci_low), float(ci_high)
 
 
-def blocked_permutation_pvalue(
-    df: pd.DataFrame,
-    formula: str,
-    term: str,
-    block_cols: list[str],
-    n_perm: int = 3000,
-    seed: int = 42,
-) -> float:
-    rng = np.random.default_rng(seed)
-
-    model_obs = smf.ols(formula, data=df).fit()
-    _, _, t_obs, _, _ = robust_visibility_stats(model_obs, term)
-    t_obs_abs = abs(t_obs)
-
-    permuted = df.copy()
-    ge = 0
-
-    for _ in range(n_perm):
-        vis = df[term].copy()
-        for _, idx in df.groupby(block_cols, sort=False).groups.items():
-            idx = list(idx)
-            if len(idx) >= 2:
-                vis.iloc[idx] = rng.permutation(vis.iloc[idx].to_numpy())
-        permuted[term] = vis
-
-        model_perm = smf.ols(formula, data=permuted).fit()
-        _, _, t_perm, _, _ = robust_visibility_stats(model_perm, term)
-        if abs(t_perm) >= t_obs_abs:
-            ge += 1
-
-    return (ge + 1) / (n_perm + 1)
-
-
-def add_multiple_testing_corrections(df: pd.DataFrame, p_col: str, prefix: str) -> pd.DataFrame:
-    out = df.copy()
-    pvals = out[p_col].astype(float).to_numpy()
-    mask = np.isfinite(pvals)
-
-    for method in ["fdr_bh", "holm", "bonferroni", "fdr_by"]:
-        col = f"{prefix}_{method}"
-        out[col] = np.nan
-        if mask.any():
-            _, qvals, _, _ = multipletests(pvals[mask], method=method)
-            out.loc[mask, col] = qvals
-    return out
-
-
 def main() -> None:
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -105,7 +63,7 @@ def main() -> None:
             formula=linear_formula,
             term="visibility_c",
             block_cols=["standort", "koeder"],
-            n_perm=3000,
+            n_perm=N_PERM,
             seed=42,
         )
 
@@ -140,10 +98,10 @@ def main() -> None:
     main_df.to_csv(OUT_MAIN, index=False)
 
     adjusted = main_df.copy()
-    adjusted = add_multiple_testing_corrections(adjusted, "p_hc3", "q_hc3")
-    adjusted = add_multiple_testing_corrections(adjusted, "p_perm_blocked", "q_perm_blocked")
-    adjusted = add_multiple_testing_corrections(adjusted, "p_quad_visibility_c2", "q_quad")
-    adjusted = add_multiple_testing_corrections(adjusted, "p_quantile_median", "q_quantile")
+    adjusted = adjust_frame(adjusted, "p_hc3", {method: f"q_hc3_{method}" for method in CORRECTION_METHODS})
+    adjusted = adjust_frame(adjusted, "p_perm_blocked", {method: f"q_perm_blocked_{method}" for method in CORRECTION_METHODS})
+    adjusted = adjust_frame(adjusted, "p_quad_visibility_c2", {method: f"q_quad_{method}" for method in CORRECTION_METHODS})
+    adjusted = adjust_frame(adjusted, "p_quantile_median", {method: f"q_quantile_{method}" for method in CORRECTION_METHODS})
     adjusted.to_csv(OUT_ADJUST, index=False)
 
     with OUT_SUMMARY.open("w", encoding="utf-8") as f:
@@ -7,6 +7,9 @@ import pandas as pd
 from scipy.stats import spearmanr
 import statsmodels.formula.api as smf
 
+from multiple_testing import bh_adjust
+from restricted_permutation import blocked_permutation_pvalue
+
 
 ROOT = Path(__file__).resolve().parents[1]
 RESULTS_DIR = ROOT / "results" / "visibility_analysis"
@@ -16,25 +19,7 @@ OUT_COEF = RESULTS_DIR / "visibility_adjusted_model_results.csv"
 OUT_PARTIAL = RESULTS_DIR / "visibility_adjusted_partial_spearman.csv"
 OUT_SUMMARY = RESULTS_DIR / "visibility_adjusted_summary.md"
 
-
-def bh_adjust(pvals: pd.Series) -> pd.Series:
-    vals = pvals.astype(float).to_numpy()
-    mask = np.isfinite(vals)
-    out = np.full(vals.shape, np.nan, dtype=float)
-    if not mask.any():
-        return pd.Series(out, index=pvals.index)
-
-    valid = vals[mask]
-    m = len(valid)
-    order = np.argsort(valid)
-    ranked = valid[order]
-    q = ranked * m / (np.arange(m) + 1)
-    q = np.minimum.accumulate(q[::-1])[::-1]
-    q = np.clip(q, 0.0, 1.0)
-    q_unsorted = np.empty_like(q)
-    q_unsorted[order] = q
-    out[np.where(mask)[0]] = q_unsorted
-    return pd.Series(out, index=pvals.index)
+N_PERM = 3000
 
 
 def robust_stat_for_visibility(model) -> tuple[float, float, float, float]:
@@ -48,23 +33,6 @@ def robust_stat_for_visibility(model) -> tuple[float, float, float, float]:
     return coef, pval, tval, float(ci_low), float(ci_high)
 
 
-def permutation_pvalue(df: pd.DataFrame, formula: str, n_perm: int = 3000, seed: int = 42) -> float:
-    rng = np.random.default_rng(seed)
-    model_obs = smf.ols(formula, data=df).fit()
-    _, _, t_obs, _, _ = robust_stat_for_visibility(model_obs)
-
-    t_abs = abs(t_obs)
-    ge = 0
-    work = df.copy()
-    for _ in range(n_perm):
-        work["visibility_mean"] = rng.permutation(df["visibility_mean"].to_numpy())
-        model_perm = smf.ols(formula, data=work).fit()
-        _, _, t_perm, _, _ = robust_stat_for_visibility(model_perm)
-        if abs(t_perm) >= t_abs:
-            ge += 1
-    return (ge + 1) / (n_perm + 1)
-
-
 def partial_spearman(df: pd.DataFrame, response_log_col: str) -> tuple[float, float]:
     y_model = smf.ols(f"{response_log_col} ~ C(standort) + C(koeder)", data=df).fit()
     x_model = smf.ols("visibility_mean ~ C(standort) + C(koeder)", data=df).fit()
@@ -97,7 +65,7 @@ def main() -> None:
         formula = "y_log ~ visibility_mean + C(standort) + C(koeder)"
         model = smf.ols(formula, data=work).fit()
         coef, pval, tval, ci_low, ci_high = robust_stat_for_visibility(model)
-        p_perm = permutation_pvalue(work, formula=formula, n_perm=3000, seed=42)
+        p_perm = blocked_permutation_pvalue(work, formula=formula, term="visibility_mean", n_perm=N_PERM, seed=42)
 
         model_rows.append(
             {
@@ -157,7 +125,7 @@ def main() -> None:
         f.write("## Methode\n\n")
         f.write("- Datengrundlage: visibility_video_level_merged.csv (nur Zeilen mit vorhandener Sichtweite).\n")
         f.write("- Modell pro Endpunkt: OLS auf log1p(Endpunkt) mit Kovariaten visibility_mean, Standort und Koeder.\n")
-        f.write("- Inferenz: robuste HC3-Standardfehler, zusaetzlich Permutationstest (3000 Permutationen).\n")
+        f.write(f"- Inferenz: robuste HC3-Standardfehler, zusaetzlich Permutationstest ({N_PERM} Permutationen).\n")
         f.write("- Multiple Tests: Benjamini-Hochberg (BH/FDR) ueber die drei Endpunkte.\n")
         f.write("- Robustheitscheck: partielle Spearman-Korrelation (um Standort und Koeder bereinigt).\n\n")
 
@@ -6,7 +6,9 @@ import warnings
 import numpy as np
 import pandas as pd
 import statsmodels.formula.api as smf
-from statsmodels.stats.multitest import multipletests
+
+from multiple_testing import adjust_frame
+from restricted_permutation import blocked_permutation_pvalue
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -17,6 +19,9 @@ OUT_MAIN = RESULTS_DIR / "visibility_site_stratified_tests.csv"
 OUT_ADJUST = RESULTS_DIR / "visibility_site_stratified_tests_adjusted.csv"
 OUT_SUMMARY = RESULTS_DIR / "visibility_site_stratified_tests_summary.md"
 
+CORRECTION_METHODS = ["fdr_bh", "holm", "bonferroni", "fdr_by"]
+N_PERM = 1000
+
 METRICS = [
     "maxn_video_peak",
     "species_richness",
@@ -35,53 +40,6 @@ def robust_term_stats(model, term: str) -> tuple[float, float, float, float, flo
     return coef, pval, tval, float(ci_low), float(ci_high)
 
 
-def blocked_permutation_pvalue(
-    df: pd.DataFrame,
-    formula: str,
-    term: str,
-    block_col: str,
-    n_perm: int = 1000,
-    seed: int = 42,
-) -> float:
-    rng = np.random.default_rng(seed)
-
-    model_obs = smf.ols(formula, data=df).fit()
-    _, _, t_obs, _, _ = robust_term_stats(model_obs, term)
-    t_obs_abs = abs(t_obs)
-
-    permuted = df.copy()
-    ge = 0
-
-    for _ in range(n_perm):
-        vis = df[term].copy()
-        for _, idx in df.groupby(block_col, sort=False).groups.items():
-            idx = list(idx)
-            if len(idx) >= 2:
-                vis.loc[idx] = rng.permutation(vis.loc[idx].to_numpy())
-        permuted[term] = vis
-
-        model_perm = smf.ols(formula, data=permuted).fit()
-        _, _, t_perm, _, _ = robust_term_stats(model_perm, term)
-        if abs(t_perm) >= t_obs_abs:
-            ge += 1
-
-    return (ge + 1) / (n_perm + 1)
-
-
-def add_corrections(df: pd.DataFrame, p_col: str, prefix: str) -> pd.DataFrame:
-    out = df.copy()
-    pvals = out[p_col].astype(float).to_numpy()
-    mask = np.isfinite(pvals)
-
-    for method in ["fdr_bh", "holm", "bonferroni", "fdr_by"]:
-        col = f"{prefix}_{method}"
-        out[col] = np.nan
-        if mask.any():
-            _, qvals, _, _ = multipletests(pvals[mask], method=method)
-            out.loc[mask, col] = qvals
-    return out
-
-
 def main() -> None:
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -137,8 +95,8 @@ def main() -> None:
                 work,
                 formula=formula,
                 term="visibility_c",
-                block_col="koeder",
-                n_perm=1000,
+                block_cols=["koeder"],
+                n_perm=N_PERM,
                 seed=42,
             )
 
@@ -164,8 +122,8 @@ def main() -> None:
     out.to_csv(OUT_MAIN, index=False)
 
     adj = out.copy()
-    adj = add_corrections(adj, "p_hc3", "q_hc3")
-    adj = add_corrections(adj, "p_perm_blocked", "q_perm")
+    adj = adjust_frame(adj, "p_hc3", {method: f"q_hc3_{method}" for method in CORRECTION_METHODS})
+    adj = adjust_frame(adj, "p_perm_blocked", {method: f"q_perm_{method}" for method in CORRECTION_METHODS})
     adj.to_csv(OUT_ADJUST, index=False)
 
     with OUT_SUMMARY.open("w", encoding="utf-8") as f:
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Zeitpunkte, zu denen X % von First Seen bzw. MaxN erreicht sind (cut_47min).
+
+Alle Werte kommen aus einem gecachten Satz laufender MaxN-Kurven
+(maxn_curves.py, Taxon-Ebene label, alle Annotationen):
+
+- first_seen_X: Zeit, bis ceil(X * S) der S Taxa eines Videos gesehen wurden
+- maxn_X:       Zeit, bis ceil(X * S) Taxa ihr finales MaxN erreicht haben
+- maxn_sum_X:   Zeit, bis die Summe des laufenden MaxN X der finalen Summe erreicht
+
+Ausgabe:
+- results/time_firstseen_MaxN/standort_koeder_durchschnitt_90pct_cut47min_videos.csv/.md
+- results/time_firstseen_MaxN/zeitpunkte_anteile_cut47min_videos.csv (je Video und Anteil)
+- results/time_firstseen_MaxN/kurven_standort_koeder_cut47min.csv (mittlere Kurven, 1-min-Raster)
+- results/time_firstseen_MaxN/kurven_standort_koeder_cut47min.png
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from maxn_curves import MaxNCurves, load_maxn_curves
+
+ROOT = Path(__file__).resolve().parent.parent
+OUT_DIR = ROOT / "results" / "time_firstseen_MaxN"
+OUT_TABLE = OUT_DIR / "standort_koeder_durchschnitt_90pct_cut47min_videos.csv"
+OUT_FRACTIONS = OUT_DIR / "zeitpunkte_anteile_cut47min_videos.csv"
+OUT_CURVES = OUT_DIR / "kurven_standort_koeder_cut47min.csv"
+OUT_FIGURE = OUT_DIR / "kurven_standort_koeder_cut47min.png"
+
+SITE_ORDER = ["milimani", "utumbi", "nursery"]
+FRACTIONS = (0.5, 0.75, 0.9, 1.0)
+MEASURE_COLUMNS = {"richness": "first_seen", "maxn_taxa": "maxn", "maxn_sum": "maxn_sum"}
+CURVE_GRID = np.arange(0.0, 47 * 60 + 1, 60.0)
+
+
+def to_mmss(seconds: float) -> str:
+    if pd.isna(seconds):
+        return ""
+    total = int(round(seconds))
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+def fraction_table(curves: MaxNCurves) -> pd.DataFrame:
+    """Je Video und Anteil die Zeitpunkte aller Masse."""
+    frames: List[pd.DataFrame] = []
+    for fraction in FRACTIONS:
+        part = curves.videos[["filename", "standort", "koeder"]].copy()
+        part.insert(3, "anteil", fraction)
+        for measure, column in MEASURE_COLUMNS.items():
+            part[f"{column}_sekunden"] = curves.time_to_fraction(fraction, measure)
+        frames.append(part)
+    out = pd.concat(frames, ignore_index=True)
+    out["standort"] = pd.Categorical(out["standort"], categories=SITE_ORDER, ordered=True)
+    return out.sort_values(["anteil", "standort", "koeder", "filename"]).reset_index(drop=True)
+
+
+def summary_90(per_video: pd.DataFrame) -> pd.DataFrame:
+    """Durchschnitt der 90 %-Zeitpunkte je Standort (ALL) und Standort x Koeder."""
+    sub = per_video[per_video["anteil"] == 0.9]
+    rows: List[Dict[str, object]] = []
+    for site in SITE_ORDER:
+        site_df = sub[sub["standort"] == site]
+        if site_df.empty:
+            continue
+        groups = [("ALL", site_df)] + [(bait, part) for bait, part in site_df.groupby("koeder", sort=True)]
+        for bait, part in groups:
+            first_seen = float(part["first_seen_sekunden"].mean())
+            maxn = float(part["maxn_sekunden"].mean())
+            rows.append(
+                {
+                    "standort": site,
+                    "koeder": bait,
+                    "anzahl_dateien": int(len(part)),
+                    "first_seen_90_durchschnitt_sekunden": round(first_seen, 2),
+                    "first_seen_90_durchschnitt_mmss": to_mmss(first_seen),
+                    "maxn_90_durchschnitt_sekunden": round(maxn, 2),
+                    "maxn_90_durchschnitt_mmss": to_mmss(maxn),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def mean_curves(curves: MaxNCurves) -> pd.DataFrame:
+    """Mittlere Richness- und MaxN-Summen-Kurve je Standort x Koeder."""
+    richness = curves.richness_at(CURVE_GRID)
+    total = curves.total_maxn_at(CURVE_GRID)
+    frames: List[pd.DataFrame] = []
+    for (site, bait), idx in curves.videos.groupby(["standort", "koeder"], sort=True).indices.items():
+        frames.append(
+            pd.DataFrame(
+                {
+                    "standort": site,
+                    "koeder": bait,
+                    "anzahl_dateien": len(idx),
+                    "minute": CURVE_GRID / 60.0,
+                    "richness_mittel": richness[idx].mean(axis=0),
+                    "maxn_summe_mittel": total[idx].mean(axis=0),
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def plot_curves(curve_df: pd.DataFrame) -> None:
+    sites = [s for s in SITE_ORDER if s in set(curve_df["standort"])]
+    fig, axes = plt.subplots(2, len(sites), figsize=(5 * len(sites), 8), dpi=140, sharex=True, squeeze=False)
+    for col, site in enumerate(sites):
+        site_df = curve_df[curve_df["standort"] == site]
+        for bait, part in site_df.groupby("koeder", sort=True):
+            label = f"{bait} (n={int(part['anzahl_dateien'].iloc[0])})"
+            axes[0, col].step(part["minute"], part["richness_mittel"], where="post", label=label)
+            axes[1, col].step(part["minute"], part["maxn_summe_mittel"], where="post", label=label)
+        axes[0, col].set_title(site)
+        axes[1, col].set_xlabel("Minute")
+        axes[0, col].legend(fontsize=7)
+    axes[0, 0].set_ylabel("Richness (mittel)")
+    axes[1, 0].set_ylabel("Summe laufendes MaxN (mittel)")
+    fig.tight_layout()
+    fig.savefig(OUT_FIGURE)
+    plt.close(fig)
+
+
+def write_md(summary: pd.DataFrame) -> None:
+    lines = [
+        "# 90%-Zeitpunkte First Seen und MaxN - Gekuerzte Videos (cut_47min)",
+        "",
+        "Quelle: normalized_reports/cut_47min",
+        "",
+        "Je Video: Zeit, bis 90 % der Taxa gesehen wurden (first_seen) bzw. ihr finales MaxN erreicht haben (maxn);",
+        "Taxon-Ebene label, alle Annotationen. Weitere Anteile: zeitpunkte_anteile_cut47min_videos.csv.",
+        "",
+        "## Tabelle",
+        "",
+        summary.to_markdown(index=False) if not summary.empty else "Keine Daten.",
+    ]
+    OUT_TABLE.with_suffix(".md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    curves = load_maxn_curves(level="label", behaviour="all", sites=SITE_ORDER)
+
+    per_video = fraction_table(curves)
+    summary = summary_90(per_video)
+    curve_df = mean_curves(curves)
+
+    per_video.to_csv(OUT_FRACTIONS, index=False)
+    summary.to_csv(OUT_TABLE, index=False)
+    curve_df.to_csv(OUT_CURVES, index=False)
+    write_md(summary)
+    plot_curves(curve_df)
+
+    print("Erstellt:")
+    for path in [OUT_TABLE, OUT_TABLE.with_suffix(".md"), OUT_FRACTIONS, OUT_CURVES, OUT_FIGURE]:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
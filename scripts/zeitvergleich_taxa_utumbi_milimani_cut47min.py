@@ -6,6 +6,8 @@ Fragestellungen:
 1) Gibt es je Standort und Koeder Unterschiede, welche Arten frueh erscheinen?
 2) Gibt es je Standort und Koeder Unterschiede, welche Arten frueh feeding sind?
 3) Optionaler Standortvergleich (Utumbi vs Milimani) innerhalb gleicher Koeder.
+4) Ankunftszeiten mit Zensierung beim 47-min-Schnitt: Kaplan-Meier je Koeder
+   und Log-Rank-Test ueber die Koeder (arrival_times.py).
 
 Ausgabe:
 - results/zeitvergleich_taxa_utumbi_milimani/
@@ -13,16 +15,19 @@ Ausgabe:
 
 from __future__ import annotations
 
-import itertools
 import math
-import re
 from pathlib import Path
-from typing import Dict, List, Sequence, Tuple
+from typing import Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy import stats
 
+from annotation_store import load_video_table
+from arrival_times import CUTOFF_SEC, MIN_LOGRANK_EVENTS, arrival_table, first_event_times, survival_by_group
+from effect_sizes import cliffs_delta
+from multiple_testing import adjust_frame
+
 ROOT = Path(__file__).resolve().parent.parent
 INPUT_DIR = ROOT / "normalized_reports" / "cut_47min" / "Annotation_reports_coral_reef"
 OUT_DIR = ROOT / "results" / "zeitvergleich_taxa_utumbi_milimani"
@@ -32,169 +37,30 @@ TARGET_SITES = {"utumbi", "milimani"}
 ALPHA = 0.05
 
 
-def clean_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip()
-    if text.lower() in {"", "nan", "none", "null"}:
-        return ""
-    return text
-
-
-def is_truthy(value: object) -> bool:
-    text = clean_text(value).lower()
-    if text in {"", "0", "false", "f", "no", "n", "none", "null", "nan"}:
-        return False
-    return True
-
-
-def parse_video_meta(filename: str) -> Tuple[str, str, str]:
-    stem = filename.replace(".csv", "")
-    parts = stem.split("-", 2)
-    if len(parts) < 3:
-        return "", "unknown", "unknown"
-    return parts[0], parts[1].lower(), parts[2].lower()
-
-
-def parse_frame_seconds(frame_value: object) -> float | None:
-    text = clean_text(frame_value)
-    if not text:
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", text)
-    if not match:
-        return None
-    try:
-        return float(match.group(0))
-    except ValueError:
-        return None
-
-
-def build_species_key(row: pd.Series) -> str:
-    species = clean_text(row.get("species", ""))
-    if species:
-        return species.lower()
-
-    genus = clean_text(row.get("genus", ""))
-    if genus:
-        return f"genus::{genus.lower()}"
-
-    family = clean_text(row.get("family", ""))
-    if family:
-        return f"family::{family.lower()}"
-
-    label = clean_text(row.get("label_name", ""))
-    if label:
-        return f"label::{label.lower()}"
-
-    return ""
-
-
-def holm_adjust(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    adjusted_order = np.zeros(m, dtype=float)
-    for i, idx in enumerate(order):
-        adjusted_order[i] = min(1.0, (m - i) * float(p_values[idx]))
-    adjusted_order = np.maximum.accumulate(adjusted_order)
-    out = np.empty(m, dtype=float)
-    out[order] = adjusted_order
-    return out.tolist()
-
-
-def benjamini_hochberg(p_values: Sequence[float]) -> List[float]:
-    m = len(p_values)
-    if m == 0:
-        return []
-    order = np.argsort(p_values)
-    ranked = np.array([p_values[i] for i in order], dtype=float)
-    adjusted = np.empty(m, dtype=float)
-    prev = 1.0
-    for i in range(m - 1, -1, -1):
-        rank = i + 1
-        val = (ranked[i] * m) / rank
-        prev = min(prev, val)
-        adjusted[i] = min(1.0, prev)
-    out = np.empty(m, dtype=float)
-    out[order] = adjusted
-    return out.tolist()
-
-
-def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
-    total = len(x) * len(y)
-    if total == 0:
-        return math.nan
-    gt = 0
-    lt = 0
-    for xi in x:
-        gt += int(np.sum(xi > y))
-        lt += int(np.sum(xi < y))
-    return float((gt - lt) / total)
-
-
 def to_md(df: pd.DataFrame) -> str:
     if df.empty:
         return "Keine Daten."
     return df.to_markdown(index=False)
 
 
-def load_video_taxa_timings(csv_path: Path) -> Dict[str, object]:
-    df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
-
-    non_behavior = df[(~df["feeding"].map(is_truthy)) & (~df["interested"].map(is_truthy))].copy()
-    feeding_df = df[df["feeding"].map(is_truthy)].copy()
+def load_metric_long(event: str, metric_name: str) -> pd.DataFrame:
+    """Erste Zeit je Video und Taxon (Langformat) fuer die Zielstandorte."""
+    times = first_event_times(event, level="species_fallback", sites=TARGET_SITES)
+    return times.rename(columns={"time_sec": metric_name}).drop(columns="first_row")
 
-    first_seen_by_species: Dict[str, float] = {}
-    first_feeding_by_species: Dict[str, float] = {}
 
-    for _, row in non_behavior.iterrows():
-        taxon = build_species_key(row)
-        sec = parse_frame_seconds(row.get("frames", ""))
-        if not taxon or sec is None:
-            continue
-        prev = first_seen_by_species.get(taxon)
-        if prev is None or sec < prev:
-            first_seen_by_species[taxon] = sec
-
-    for _, row in feeding_df.iterrows():
-        taxon = build_species_key(row)
-        sec = parse_frame_seconds(row.get("frames", ""))
-        if not taxon or sec is None:
-            continue
-        prev = first_feeding_by_species.get(taxon)
-        if prev is None or sec < prev:
-            first_feeding_by_species[taxon] = sec
-
-    date, site, bait = parse_video_meta(csv_path.name)
-    return {
-        "filename": csv_path.name,
-        "date": date,
-        "standort": site,
-        "koeder": bait,
-        "first_seen_by_species": first_seen_by_species,
-        "first_feeding_by_species": first_feeding_by_species,
-    }
-
-
-def explode_metric(records_df: pd.DataFrame, dict_col: str, metric_name: str) -> pd.DataFrame:
-    rows: List[Dict[str, object]] = []
-    for rec in records_df.itertuples(index=False):
-        d = getattr(rec, dict_col)
-        if not isinstance(d, dict):
-            continue
-        for taxon, sec in d.items():
-            rows.append(
-                {
-                    "filename": rec.filename,
-                    "date": rec.date,
-                    "standort": rec.standort,
-                    "koeder": rec.koeder,
-                    "taxon": taxon,
-                    metric_name: float(sec),
-                }
-            )
-    return pd.DataFrame(rows)
+def build_video_records(metrics: Dict[str, Tuple[str, pd.DataFrame]]) -> pd.DataFrame:
+    """Eine Zeile je Video mit {taxon: Sekunden}-Dicts je Metrik (Taxa nach erster Zeile)."""
+    videos = load_video_table()
+    videos = videos[(videos["area"] == INPUT_DIR.name) & videos["standort"].isin(TARGET_SITES)]
+    rec_df = videos[["filename", "date", "standort", "koeder"]].copy()
+    for dict_col, (metric_name, long_df) in metrics.items():
+        by_video = {
+            filename: dict(zip(part["taxon"], part[metric_name]))
+            for filename, part in long_df.groupby("filename", sort=False)
+        }
+        rec_df[dict_col] = [by_video.get(f, {}) for f in rec_df["filename"]]
+    return rec_df.sort_values(["standort", "date", "filename"]).reset_index(drop=True)
 
 
 def per_site_per_bait_taxon_tests(metric_df: pd.DataFrame, metric_col: str) -> pd.DataFrame:
@@ -253,13 +119,7 @@ def per_site_per_bait_taxon_tests(metric_df: pd.DataFrame, metric_col: str) -> p
     if out.empty:
         return out
 
-    out["p_value_holm"] = np.nan
-    out["p_value_bh"] = np.nan
-
-    for (site, metric), idx in out.groupby(["standort", "metric"]).groups.items():
-        pvals = out.loc[idx, "p_value"].to_numpy(dtype=float)
-        out.loc[idx, "p_value_holm"] = holm_adjust(pvals)
-        out.loc[idx, "p_value_bh"] = benjamini_hochberg(pvals)
+    out = adjust_frame(out, "p_value", {"holm": "p_value_holm", "fdr_bh": "p_value_bh"}, by=["standort", "metric"])
 
     out["sig_raw_0_05"] = out["p_value"] < ALPHA
     out["sig_holm_0_05"] = out["p_value_holm"] < ALPHA
@@ -303,13 +163,7 @@ def pairwise_site_tests_within_bait(metric_df: pd.DataFrame, metric_col: str) ->
     if out.empty:
         return out
 
-    out["p_value_holm"] = np.nan
-    out["p_value_bh"] = np.nan
-
-    for (bait, metric), idx in out.groupby(["koeder", "metric"]).groups.items():
-        pvals = out.loc[idx, "p_value"].to_numpy(dtype=float)
-        out.loc[idx, "p_value_holm"] = holm_adjust(pvals)
-        out.loc[idx, "p_value_bh"] = benjamini_hochberg(pvals)
+    out = adjust_frame(out, "p_value", {"holm": "p_value_holm", "fdr_bh": "p_value_bh"}, by=["koeder", "metric"])
 
     out["sig_raw_0_05"] = out["p_value"] < ALPHA
     out["sig_holm_0_05"] = out["p_value_holm"] < ALPHA
@@ -318,6 +172,22 @@ def pairwise_site_tests_within_bait(metric_df: pd.DataFrame, metric_col: str) ->
     return out.sort_values(["koeder", "metric", "p_value_bh", "p_value"]).reset_index(drop=True)
 
 
+def logrank_bait_tests(arrivals: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Kaplan-Meier je Standort x Ereignis x Koeder und Log-Rank ueber die Koeder
+    je Taxon; nicht angekommene Taxa sind bei CUTOFF_SEC zensiert.
+    """
+    curves, tests = survival_by_group(arrivals, strata=("standort", "event"), group="koeder")
+    if tests.empty:
+        return curves, tests
+    tests = tests[tests["n_observed"] > 0].reset_index(drop=True)
+    tests = adjust_frame(tests, "p_value", {"holm": "p_value_holm", "fdr_bh": "p_value_bh"}, by=["standort", "event"])
+    tests["sig_raw_0_05"] = tests["p_value"] < ALPHA
+    tests["sig_holm_0_05"] = tests["p_value_holm"] < ALPHA
+    tests["sig_bh_0_05"] = tests["p_value_bh"] < ALPHA
+    return curves, tests.sort_values(["standort", "event", "p_value_bh", "p_value"]).reset_index(drop=True)
+
+
 def summarize_video_level(metric_df: pd.DataFrame, metric_col: str) -> pd.DataFrame:
     rows: List[Dict[str, object]] = []
     for (site, bait, filename), part in metric_df.groupby(["standort", "koeder", "filename"]):
@@ -346,6 +216,7 @@ def write_report(
     site_compare_tests: pd.DataFrame,
     first_seen_video_summary: pd.DataFrame,
     first_feeding_video_summary: pd.DataFrame,
+    logrank_tests: pd.DataFrame,
 ) -> None:
     lines: List[str] = []
     lines.append("# Zeitvergleich Taxa: Utumbi vs Milimani (cut_47min)")
@@ -416,6 +287,29 @@ def write_report(
     lines.append(to_md(sub.head(40)))
     lines.append("")
 
+    lines.append("## Ankunftszeiten mit Zensierung (Kaplan-Meier / Log-Rank)")
+    lines.append(
+        f"- Nicht angekommene Taxa gelten als rechtszensiert bei {CUTOFF_SEC // 60} min; "
+        "Taxonmenge je Standort = alle dort beobachteten Taxa."
+    )
+    lines.append("- Log-Rank ueber die Koeder je Standort, Ereignis und Taxon; KM-Median je Koeder (leer = nicht erreicht).")
+    lines.append(
+        f"- Taxa mit weniger als {MIN_LOGRANK_EVENTS} Ankuenften werden nicht getestet (chi2/p leer) "
+        "und zaehlen nicht zur Holm/BH-Familie."
+    )
+    lines.append("- KM-Kurven im 5-min-Raster: data/km_curves_by_site_bait.csv")
+    for site in ["milimani", "utumbi"]:
+        for event in ["first_seen", "first_feeding", "first_interested"]:
+            if logrank_tests.empty:
+                sub = logrank_tests
+            else:
+                sub = logrank_tests[(logrank_tests["standort"] == site) & (logrank_tests["event"] == event)]
+            n_sig = int(sub["sig_bh_0_05"].sum()) if not sub.empty else 0
+            lines.append("")
+            lines.append(f"### Standort {site}: {event} (BH-signifikante Taxa: {n_sig})")
+            lines.append(to_md(sub.head(20)))
+    lines.append("")
+
     lines.append("## Interpretation")
     lines.append("- Relevante robuste Befunde sind primar jene mit BH- oder Holm-Signifikanz.")
     lines.append("- Roh-p-Werte ohne Korrektur nur als explorativ interpretieren.")
@@ -431,13 +325,17 @@ def main() -> None:
     if not files:
         raise FileNotFoundError("Keine CSV-Dateien in normalized_reports/cut_47min/Annotation_reports_coral_reef gefunden.")
 
-    records = [load_video_taxa_timings(p) for p in files]
-    rec_df = pd.DataFrame(records)
-    rec_df = rec_df[rec_df["standort"].isin(TARGET_SITES)].copy()
-    rec_df = rec_df.sort_values(["standort", "date", "filename"]).reset_index(drop=True)
-
-    first_seen_long = explode_metric(rec_df, "first_seen_by_species", "first_seen_species_sec")
-    first_feeding_long = explode_metric(rec_df, "first_feeding_by_species", "first_feeding_species_sec")
+    seen = load_metric_long("first_seen", "first_seen_species_sec")
+    feeding = load_metric_long("first_feeding", "first_feeding_species_sec")
+    rec_df = build_video_records(
+        {
+            "first_seen_by_species": ("first_seen_species_sec", seen),
+            "first_feeding_by_species": ("first_feeding_species_sec", feeding),
+        }
+    )
+    video_order = {f: i for i, f in enumerate(rec_df["filename"])}
+    first_seen_long = seen.sort_values("filename", key=lambda c: c.map(video_order), kind="stable").reset_index(drop=True)
+    first_feeding_long = feeding.sort_values("filename", key=lambda c: c.map(video_order), kind="stable").reset_index(drop=True)
 
     first_seen_video_summary = summarize_video_level(first_seen_long, "first_seen_species_sec")
     first_feeding_video_summary = summarize_video_level(first_feeding_long, "first_feeding_species_sec")
@@ -450,6 +348,9 @@ def main() -> None:
     first_feeding_site_cmp = pairwise_site_tests_within_bait(first_feeding_long, "first_feeding_species_sec")
     site_compare_tests = pd.concat([first_seen_site_cmp, first_feeding_site_cmp], ignore_index=True)
 
+    arrivals = arrival_table(level="species_fallback", sites=TARGET_SITES)
+    km_curves, logrank_tests = logrank_bait_tests(arrivals)
+
     rec_df.to_csv(DATA_DIR / "utumbi_milimani_video_records.csv", index=False)
     first_seen_long.to_csv(DATA_DIR / "first_seen_species_long.csv", index=False)
     first_feeding_long.to_csv(DATA_DIR / "first_feeding_species_long.csv", index=False)
@@ -457,6 +358,9 @@ def main() -> None:
     first_feeding_video_summary.to_csv(DATA_DIR / "first_feeding_species_video_summary.csv", index=False)
     site_bait_tests.to_csv(DATA_DIR / "site_bait_taxon_time_tests.csv", index=False)
     site_compare_tests.to_csv(DATA_DIR / "site_comparison_within_bait_taxon_time_tests.csv", index=False)
+    arrivals.to_csv(DATA_DIR / "arrival_times_long.csv", index=False)
+    km_curves.to_csv(DATA_DIR / "km_curves_by_site_bait.csv", index=False)
+    logrank_tests.to_csv(DATA_DIR / "km_logrank_by_site.csv", index=False)
 
     write_report(
         first_seen_long=first_seen_long,
@@ -465,12 +369,14 @@ def main() -> None:
         site_compare_tests=site_compare_tests,
         first_seen_video_summary=first_seen_video_summary,
         first_feeding_video_summary=first_feeding_video_summary,
+        logrank_tests=logrank_tests,
     )
 
     print("Erstellt:")
     print(OUT_DIR / "zeitvergleich_taxa_utumbi_milimani.md")
     print(DATA_DIR / "site_bait_taxon_time_tests.csv")
     print(DATA_DIR / "site_comparison_within_bait_taxon_time_tests.csv")
+    print(DATA_DIR / "km_logrank_by_site.csv")
 
 
 if __name__ == "__main__":